@@ -7,7 +7,10 @@ from jose import JWTError, jwt
 from passlib.context import CryptContext
 from fastapi import HTTPException, status, Depends
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
+import hashlib
+import hmac
 import os
+import uuid
 
 # 直接使用bcrypt库，避免passlib的bug
 import bcrypt
@@ -19,30 +22,48 @@ ALGORITHM = "HS256"
 ACCESS_TOKEN_EXPIRE_MINUTES = settings.access_token_expire_minutes
 REFRESH_TOKEN_EXPIRE_DAYS = 7
 
+# bcrypt 哈希前缀（$2a$/$2b$/$2y$ + 两位成本因子）
+BCRYPT_PREFIXES = ("$2a$", "$2b$", "$2y$")
+
 class AuthService:
     """认证服务类"""
     
     @staticmethod
     def verify_password(plain_password: str, hashed_password: str) -> bool:
-        """验证密码"""
+        """验证密码
+        
+        旧版无盐 SHA-256 哈希只在 allow_legacy_password_hashes 开启时接受，
+        登录成功后由 needs_rehash 判断并重新哈希为 bcrypt。
+        """
+        if not hashed_password:
+            return False
         try:
-            # 首先尝试bcrypt验证
-            if '$2b$' in hashed_password:
+            # 首先尝试bcrypt验证（与哈希时一致，截断到72字节）
+            if hashed_password.startswith(BCRYPT_PREFIXES):
                 return bcrypt.checkpw(
-                    plain_password.encode('utf-8'),
+                    plain_password[:72].encode('utf-8'),
                     hashed_password.encode('utf-8')
                 )
-            # 如果不是bcrypt，尝试SHA256验证
-            elif len(hashed_password) == 64:  # SHA256哈希长度
-                import hashlib
+            # 旧版SHA256哈希（64位十六进制）
+            elif len(hashed_password) == 64 and settings.allow_legacy_password_hashes:
                 input_hash = hashlib.sha256(plain_password.encode()).hexdigest()
-                return input_hash == hashed_password
+                return hmac.compare_digest(input_hash, hashed_password)
             else:
                 return False
         except Exception as e:
             print(f"密码验证错误: {str(e)}")
             return False
     
+    @staticmethod
+    def needs_rehash(hashed_password: str) -> bool:
+        """密码哈希是否需要重新生成：旧版SHA256哈希，或bcrypt成本因子与配置不同"""
+        if not hashed_password or not hashed_password.startswith(BCRYPT_PREFIXES):
+            return True
+        try:
+            return int(hashed_password[4:6]) != settings.bcrypt_rounds
+        except ValueError:
+            return True
+    
     @staticmethod
     def validate_password_strength(password: str) -> tuple[bool, str]:
         """验证密码强度
@@ -96,7 +117,7 @@ class AuthService:
         # bcrypt限制密码长度为72字节
         password = password[:72]
         try:
-            salt = bcrypt.gensalt()
+            salt = bcrypt.gensalt(rounds=settings.bcrypt_rounds)
             hashed = bcrypt.hashpw(
                 password.encode('utf-8'),
                 salt
@@ -115,7 +136,8 @@ class AuthService:
         else:
             expire = datetime.now(timezone.utc) + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
         
-        to_encode.update({"exp": expire})
+        # jti 保证同一秒内签发的令牌也各不相同（令牌表按摘要唯一）
+        to_encode.update({"exp": expire, "jti": uuid.uuid4().hex})
         encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
         return encoded_jwt
     
@@ -133,33 +155,53 @@ class AuthService:
     
     @staticmethod
     def get_current_user(token: str, db) -> Optional[dict]:
-        """从令牌获取当前用户信息"""
-        payload = AuthService.verify_token(token)
-        if not payload:
-            raise HTTPException(
-                status_code=status.HTTP_401_UNAUTHORIZED,
-                detail="无效的令牌",
-                headers={"WWW-Authenticate": "Bearer"},
-            )
+        """从令牌获取当前用户信息
         
-        # 检查令牌是否在黑名单中
-        from crud import token_crud
-        if token_crud.is_token_revoked(db, token):
+        令牌载荷、撤销状态和用户快照优先取自认证缓存，命中时不解码JWT、不查询数据库；
+        缓存中的令牌条目不会超过令牌本身的过期时间。
+        """
+        from utils.auth_cache import get_auth_cache
+        cache = get_auth_cache()
+        
+        cached = cache.get_token(token)
+        if cached:
+            payload, revoked = cached
+        else:
+            payload = AuthService.verify_token(token)
+            if not payload:
+                raise HTTPException(
+                    status_code=status.HTTP_401_UNAUTHORIZED,
+                    detail="无效的令牌",
+                    headers={"WWW-Authenticate": "Bearer"},
+                )
+            
+            # 检查令牌是否在黑名单中
+            from crud import token_crud
+            revoked = token_crud.is_token_revoked(db, token)
+            cache.set_token(token, payload, revoked)
+        
+        if revoked:
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
                 detail="令牌已被撤销",
                 headers={"WWW-Authenticate": "Bearer"},
             )
         
+        user_id = int(payload.get("sub"))
+        user = cache.get_user(user_id)
+        if user is not None:
+            return user
+        
         # 从数据库获取用户信息
         from crud import user_crud
-        user = user_crud.get_user(db, user_id=int(payload.get("sub")))
+        user = user_crud.get_user(db, user_id=user_id)
         if user is None:
             raise HTTPException(
                 status_code=status.HTTP_401_UNAUTHORIZED,
                 detail="用户不存在",
                 headers={"WWW-Authenticate": "Bearer"},
             )
+        cache.set_user(user)
         
         return user
     
@@ -172,7 +214,7 @@ class AuthService:
         else:
             expire = datetime.now(timezone.utc) + timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS)
         
-        to_encode.update({"exp": expire, "type": "refresh"})
+        to_encode.update({"exp": expire, "type": "refresh", "jti": uuid.uuid4().hex})
         encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
         return encoded_jwt
     
@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+# 体育教学辅助网站 - bcrypt 成本因子校准
+# 在生产服务器上测量各成本因子下一次密码校验的耗时，选取不超过登录延迟预算的最大成本因子，
+# 结果写入 .env 的 bcrypt_rounds。成本因子每加1耗时翻倍；登录同时占用密码哈希线程池，
+# 预算应按线程池满载时仍可接受的单次耗时来定。
+#
+# 用法: python calibrate_bcrypt.py [预算毫秒数，默认250] [每个成本因子的测量次数，默认5]
+
+import statistics
+import sys
+import time
+
+import bcrypt
+
+from config import settings
+
+# OWASP 建议 bcrypt 成本因子不低于10
+MIN_ROUNDS = 10
+MAX_ROUNDS = 16
+
+
+def measure(rounds: int, samples: int) -> float:
+    """指定成本因子下一次校验的耗时中位数（毫秒）"""
+    password = b"Calibrate#2024"
+    hashed = bcrypt.hashpw(password, bcrypt.gensalt(rounds=rounds))
+    timings = []
+    for _ in range(samples):
+        started = time.perf_counter()
+        bcrypt.checkpw(password, hashed)
+        timings.append((time.perf_counter() - started) * 1000)
+    return statistics.median(timings)
+
+
+def calibrate(budget_ms: float, samples: int = 5) -> tuple[int, dict]:
+    """返回 (不超过预算的最大成本因子, {成本因子: 耗时毫秒})，预算过小时返回最小成本因子"""
+    timings = {}
+    chosen = MIN_ROUNDS
+    for rounds in range(MIN_ROUNDS, MAX_ROUNDS + 1):
+        timings[rounds] = measure(rounds, samples)
+        if timings[rounds] > budget_ms:
+            break
+        chosen = rounds
+    return chosen, timings
+
+
+if __name__ == "__main__":
+    budget_ms = float(sys.argv[1]) if len(sys.argv) > 1 else 250
+    samples = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+
+    chosen, timings = calibrate(budget_ms, samples)
+    for rounds, elapsed in timings.items():
+        mark = "✓" if rounds <= chosen else "✗"
+        print(f"{mark} 成本因子 {rounds}: {elapsed:.1f}ms")
+    print()
+    if timings[MIN_ROUNDS] > budget_ms:
+        print(f"⚠ 最小成本因子 {MIN_ROUNDS} 已超过预算 {budget_ms:.0f}ms，仍建议使用 {MIN_ROUNDS}")
+    print(f"✓ 登录延迟预算 {budget_ms:.0f}ms，建议成本因子: {chosen}（当前配置: {settings.bcrypt_rounds}）")
+    print(f"  在 .env 中设置 bcrypt_rounds={chosen}，已有哈希在用户下次登录时自动升级")
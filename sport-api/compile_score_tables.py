@@ -0,0 +1,33 @@
+#!/usr/bin/env python3
+# 体育教学辅助网站 - 预编译国家学生体质健康标准评分表
+# 将评分表CSV编译为带版本号的JSON文件，API启动时直接加载，无需解析CSV
+#
+# 用法: python compile_score_tables.py [CSV目录] [输出文件]
+
+import sys
+import time
+
+from config import settings
+from utils.score_standards import ScoreStandardEngine
+
+
+def compile_score_tables(source_dir: str, output_path: str) -> ScoreStandardEngine:
+    """解析评分表CSV并写入预编译文件"""
+    engine = ScoreStandardEngine().load_directory(source_dir)
+    engine.save_artifact(output_path)
+    return engine
+
+
+if __name__ == "__main__":
+    source_dir = sys.argv[1] if len(sys.argv) > 1 else settings.score_standards_dir
+    output_path = sys.argv[2] if len(sys.argv) > 2 else settings.score_tables_artifact
+
+    engine = compile_score_tables(source_dir, output_path)
+    stats = engine.get_stats()
+    print(f"✓ 已编译 {stats['source_files']} 个评分表文件: {stats['score_tables']} 张评分表, {stats['bonus_tables']} 张加分表")
+    print(f"✓ 评分表版本: {engine.version}")
+    print(f"✓ 输出文件: {output_path}")
+
+    started = time.perf_counter()
+    ScoreStandardEngine().load_artifact(output_path)
+    print(f"✓ 预编译文件加载耗时: {(time.perf_counter() - started) * 1000:.2f}ms")
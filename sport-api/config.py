@@ -41,6 +41,47 @@ class Settings(BaseSettings):
     max_file_size: int = 10 * 1024 * 1024  # 10MB
     allowed_file_extensions: list = [".jpg", ".jpeg", ".png", ".pdf", ".xlsx", ".xls"]
     
+    # 国家学生体质健康标准评分表目录（CSV）
+    score_standards_dir: str = os.path.join(
+        os.path.dirname(os.path.abspath(__file__)), "..", "国家学生体质健康标准"
+    )
+    # 预编译评分表文件（由 compile_score_tables.py 生成，存在时优先加载）
+    score_tables_artifact: str = os.path.join(
+        os.path.dirname(os.path.abspath(__file__)), "data", "score_tables.json"
+    )
+    # 体测排名索引的队列有效期（秒），多进程部署时过期后重新从数据库加载
+    rank_index_ttl: int = 300
+    # 学生搜索索引有效期（秒），过期后从数据库重建
+    student_search_ttl: int = 300
+    # 认证缓存（令牌撤销状态、当前用户快照）有效期（秒）和条目上限，
+    # 多进程部署时其他进程的登出、角色/状态修改最多延迟一个有效期生效
+    auth_cache_ttl: int = 30
+    auth_cache_max_entries: int = 10000
+    # 权限快照（用户可访问的班级、学生ID集合）有效期（秒）和条目上限
+    permission_cache_ttl: int = 300
+    permission_cache_max_entries: int = 10000
+    # bcrypt 成本因子（每加1校验耗时翻倍），用 calibrate_bcrypt.py 按登录延迟预算选取；
+    # 修改后旧哈希在用户下次登录时按新成本重新生成
+    bcrypt_rounds: int = 12
+    # 是否接受旧版无盐 SHA-256 密码哈希（登录成功后自动升级为 bcrypt）。
+    # migrate_legacy_password_hashes.py 显示已无旧哈希后应关闭
+    allow_legacy_password_hashes: bool = True
+    # 密码哈希线程池：并发计算数和最大排队数（超过时登录返回503）
+    password_hash_workers: int = 4
+    password_hash_max_queue: int = 200
+    
+    # 后台任务配置：本地进程池大小和结果文件目录
+    job_workers: int = 2
+    job_result_dir: str = os.path.join(
+        os.path.dirname(os.path.abspath(__file__)), "data", "jobs"
+    )
+    # 服务进程为自己提交的未完成任务写心跳的间隔（秒）；
+    # 心跳超过 job_heartbeat_timeout 秒未更新的任务视为所属进程已退出，标记为失败
+    job_heartbeat_interval: int = 30
+    job_heartbeat_timeout: int = 120
+    # 任务结果文件和遗留上传文件的保留天数，由清理过期令牌任务一并清理
+    job_result_retention_days: int = 7
+    
     # CORS配置
     cors_origins: list = [
         # 生产环境域名
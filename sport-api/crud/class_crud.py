@@ -2,14 +2,18 @@ from sqlalchemy.orm import Session
 from sqlalchemy import and_, or_
 from sqlalchemy.orm import joinedload
 from models import Class
+from utils.permissions import get_permission_cache
+from utils.rank_index import get_rank_index
+from utils.query_scope import apply_scope, class_scope
 from typing import List, Optional
 
 class ClassCrud:
     def get_class(self, db: Session, class_id: int):
         return db.query(Class).filter(Class.id == class_id).first()
 
-    def get_classes(self, db: Session, school_id: int = None, school_year_id: int = None, grade: str = None, skip: int = 0, limit: int = 100):
-        query = db.query(Class)
+    def get_classes(self, db: Session, school_id: int = None, school_year_id: int = None, grade: str = None, skip: int = 0, limit: int = 100, user=None):
+        """获取班级列表；传入 user 时只返回其可见的班级"""
+        query = apply_scope(db.query(Class), class_scope(user))
         
         # 添加筛选条件
         if school_id:
@@ -26,6 +30,7 @@ class ClassCrud:
         db.add(db_class)
         db.commit()
         db.refresh(db_class)
+        get_permission_cache().clear()
         return db_class
 
     def update_class(self, db: Session, class_id: int, class_data: dict):
@@ -35,6 +40,9 @@ class ClassCrud:
                 setattr(db_class, key, value)
             db.commit()
             db.refresh(db_class)
+            get_permission_cache().clear()
+            # 学年、年级变化后体测记录所属的排名队列随之变化
+            get_rank_index().clear()
         return db_class
 
     def delete_class(self, db: Session, class_id: int, force: bool = False):
@@ -48,7 +56,8 @@ class ClassCrud:
         Returns:
             dict: 包含 success 和 message 字段
         """
-        from models import StudentClassRelation
+        from models import StudentClassRelation, Student
+        from crud.student_crud import sync_current_class
         
         db_class = self.get_class(db, class_id)
         if not db_class:
@@ -67,16 +76,26 @@ class ClassCrud:
             }
         
         try:
-            # 删除关联的学生班级关系
+            # 删除关联的学生班级关系，并同步仍指向该班级的学生的当前班级
             db.query(StudentClassRelation).filter(StudentClassRelation.class_id == class_id).delete()
+            student_ids = [row.id for row in db.query(Student.id).filter(Student.current_class_id == class_id)]
+            sync_current_class(db, student_ids)
             
-            # 删除关联的体测数据
+            # 删除关联的体测数据，同一事务中从汇总表扣减它们的贡献
             from models import PhysicalTest
+            from crud.physical_test_summary_crud import (
+                get_class_contributions, build_summary_deltas, apply_summary_deltas
+            )
+            apply_summary_deltas(db, build_summary_deltas([
+                (key, values, -1) for key, values in get_class_contributions(db, class_id)
+            ]))
             db.query(PhysicalTest).filter(PhysicalTest.class_id == class_id).delete()
             
             # 删除班级
             db.delete(db_class)
             db.commit()
+            get_permission_cache().clear()
+            get_rank_index().clear()
             return {"success": True, "message": "班级删除成功"}
         except Exception as e:
             db.rollback()
@@ -92,7 +111,7 @@ class ClassCrud:
         )
         
         if school_year_id:
-            query = query.join(Class).filter(Class.school_year_id == school_year_id)
+            query = query.join(Class, Class.id == StudentClassRelation.class_id).filter(Class.school_year_id == school_year_id)
         
         relations = query.options(joinedload(StudentClassRelation.student)).all()
         
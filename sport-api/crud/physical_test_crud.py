@@ -1,16 +1,26 @@
 # 体育教学辅助网站 - 体测数据CRUD操作
 # 用于处理体测数据的数据库操作
 
+import time
+from sqlalchemy import update, select, or_, and_, case, distinct, func
 from sqlalchemy.orm import Session, joinedload
-from models import PhysicalTest, Student, Class, SchoolYear
+from models import PhysicalTest, Student, Class, SchoolYear, School, GenderEnum
 from schemas import PhysicalTestCreate, PhysicalTestUpdate
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, Iterator, Tuple
+from crud.physical_test_summary_crud import (
+    get_test_contribution, update_summary_for_change, build_summary_deltas, apply_summary_deltas
+)
+from utils.rank_index import get_rank_index
+from utils.pagination import paginate, cached_count
+from utils.query_scope import apply_scope, physical_test_scope
+from utils.score_standards import (
+    MEASUREMENT_FIELDS, get_score_engine, measurement_fingerprint, calculate_grade
+)
 
-# 获取体测记录列表
-def get_physical_tests(db: Session, skip: int = 0, limit: int = 100) -> List[dict]:
-    """获取体测记录列表"""
-    tests = db.query(PhysicalTest).offset(skip).limit(limit).all()
-    return [{
+# 体测记录转字典
+def _physical_test_to_dict(test: PhysicalTest) -> dict:
+    """体测记录列表项"""
+    return {
         "id": test.id,
         "student_id": test.student_id,
         "studentName": test.student.real_name if test.student else "",
@@ -39,12 +49,36 @@ def get_physical_tests(db: Session, skip: int = 0, limit: int = 100) -> List[dic
         "is_official": test.is_official,
         "created_at": test.created_at,
         "updated_at": test.updated_at
-    } for test in tests]
+    }
+
+# 获取体测记录列表
+def get_physical_tests(db: Session, skip: int = 0, limit: int = 100, user=None) -> List[dict]:
+    """获取体测记录列表"""
+    tests = apply_scope(db.query(PhysicalTest), physical_test_scope(user)).offset(skip).limit(limit).all()
+    return [_physical_test_to_dict(test) for test in tests]
+
+# 体测记录列表的排序：测试日期倒序，同一天按ID倒序
+PHYSICAL_TEST_PAGE_ORDER = ((PhysicalTest.test_date, True), (PhysicalTest.id, True))
+
+# 游标分页获取体测记录列表
+def get_physical_tests_page(db: Session, limit: int = 100, cursor: Optional[str] = None, skip: int = 0,
+                            include_total: bool = False, user=None) -> Tuple[List[dict], Optional[str], Optional[int]]:
+    """按(测试日期, ID)游标分页获取体测记录列表，返回 (本页记录, 下一页游标, 总数)
+    
+    预加载学生和班级，避免逐条懒加载；总数可选，使用带缓存的计数。传入 user 时只返回其可见的记录。
+    """
+    query = apply_scope(db.query(PhysicalTest), physical_test_scope(user))
+    total = cached_count(query) if include_total else None
+    tests, next_cursor = paginate(
+        query.options(joinedload(PhysicalTest.student), joinedload(PhysicalTest.class_)),
+        PHYSICAL_TEST_PAGE_ORDER, limit, cursor, skip
+    )
+    return [_physical_test_to_dict(test) for test in tests], next_cursor, total
 
 # 根据学生ID获取体测记录
-def get_physical_tests_by_student(db: Session, student_id: int) -> List[dict]:
+def get_physical_tests_by_student(db: Session, student_id: int, user=None) -> List[dict]:
     """根据学生ID获取体测记录"""
-    tests = db.query(PhysicalTest).filter(PhysicalTest.student_id == student_id).all()
+    tests = apply_scope(db.query(PhysicalTest), physical_test_scope(user)).filter(PhysicalTest.student_id == student_id).all()
     return [{"id": test.id,
         "student_id": test.student_id,
         "studentName": test.student.real_name if test.student else "",
@@ -78,9 +112,9 @@ def get_physical_tests_by_student(db: Session, student_id: int) -> List[dict]:
     } for test in tests]
 
 # 根据班级ID获取体测记录
-def get_physical_tests_by_class(db: Session, class_id: int) -> List[dict]:
+def get_physical_tests_by_class(db: Session, class_id: int, user=None) -> List[dict]:
     """根据班级ID获取体测记录"""
-    tests = db.query(PhysicalTest).filter(PhysicalTest.class_id == class_id).all()
+    tests = apply_scope(db.query(PhysicalTest), physical_test_scope(user)).filter(PhysicalTest.class_id == class_id).all()
     return [{"id": test.id,
         "student_id": test.student_id,
         "studentName": test.student.real_name if test.student else "",
@@ -156,9 +190,12 @@ def get_physical_test(db: Session, physical_test_id: int) -> Optional[dict]:
 def create_physical_test(db: Session, physical_test: PhysicalTestCreate) -> PhysicalTest:
     """创建体测记录"""
     db_physical_test = PhysicalTest(**physical_test.model_dump())
+    refresh_measurement_fingerprint(db_physical_test)
     db.add(db_physical_test)
+    update_summary_for_change(db, None, get_test_contribution(db, db_physical_test))
     db.commit()
     db.refresh(db_physical_test)
+    get_rank_index().apply_change(db, db_physical_test)
     return db_physical_test
 
 # 更新体测记录
@@ -167,54 +204,79 @@ def update_physical_test(db: Session, physical_test_id: int, physical_test: Phys
     # 直接查询数据库获取原始对象
     db_physical_test = db.query(PhysicalTest).filter(PhysicalTest.id == physical_test_id).first()
     if db_physical_test:
+        before = get_test_contribution(db, db_physical_test)
+        before_cohort = get_rank_index().get_test_cohort(db, db_physical_test)
         update_data = physical_test.model_dump(exclude_unset=True)
         for field, value in update_data.items():
             setattr(db_physical_test, field, value)
+        refresh_measurement_fingerprint(db_physical_test)
+        update_summary_for_change(db, before, get_test_contribution(db, db_physical_test))
         db.commit()
         db.refresh(db_physical_test)
+        get_rank_index().apply_change(db, db_physical_test, before_cohort)
         return True
     return False
 
 # 删除体测记录
 def delete_physical_test(db: Session, physical_test_id: int) -> bool:
     """删除体测记录"""
-    db_physical_test = get_physical_test(db, physical_test_id)
+    db_physical_test = db.query(PhysicalTest).filter(PhysicalTest.id == physical_test_id).first()
     if db_physical_test:
+        update_summary_for_change(db, get_test_contribution(db, db_physical_test), None)
         db.delete(db_physical_test)
         db.commit()
+        get_rank_index().remove_test(physical_test_id)
         return True
     return False
 
+# 应用体测历史过滤条件
+def _apply_history_filters(query, filters: Optional[Dict[str, Any]], join_class: bool = True, user=None):
+    """应用体测历史的过滤条件；join_class 为 False 表示查询已关联班级表，传入 user 时限定其可见范围"""
+    query = apply_scope(query, physical_test_scope(user))
+    if not filters:
+        return query
+    
+    if filters.get('student_id'):
+        query = query.filter(PhysicalTest.student_id == filters['student_id'])
+    
+    if filters.get('class_id'):
+        query = query.filter(PhysicalTest.class_id == filters['class_id'])
+    
+    if filters.get('grade') or filters.get('school_year_id') or filters.get('school_id') or filters.get('area'):
+        # 通过班级关联过滤年级、学年、学校和区域（只关联一次班级表）
+        if join_class:
+            query = query.join(Class, Class.id == PhysicalTest.class_id)
+        if filters.get('grade'):
+            query = query.filter(Class.grade == filters['grade'])
+        if filters.get('school_year_id'):
+            query = query.filter(Class.school_year_id == filters['school_year_id'])
+        if filters.get('school_id'):
+            query = query.filter(Class.school_id == filters['school_id'])
+        if filters.get('area'):
+            query = query.filter(Class.school_id.in_(
+                select(School.id).where(School.area == filters['area'])
+            ))
+    
+    if filters.get('test_type'):
+        query = query.filter(PhysicalTest.test_type == filters['test_type'])
+    
+    if filters.get('start_date'):
+        query = query.filter(PhysicalTest.test_date >= filters['start_date'])
+    
+    if filters.get('end_date'):
+        query = query.filter(PhysicalTest.test_date <= filters['end_date'])
+    
+    return query
+
 # 获取体测历史数据，支持多条件过滤
-def get_physical_test_history(db: Session, filters: Optional[Dict[str, Any]] = None, skip: int = 0, limit: int = 100) -> List[dict]:
+def get_physical_test_history(db: Session, filters: Optional[Dict[str, Any]] = None, skip: int = 0, limit: int = 100,
+                              user=None) -> List[dict]:
     """获取体测历史数据，支持多条件过滤"""
     # 构建查询，使用joinedload预加载关联数据
     query = db.query(PhysicalTest).options(joinedload(PhysicalTest.student)).options(joinedload(PhysicalTest.class_))
     
     # 应用过滤条件
-    if filters:
-        if filters.get('student_id'):
-            query = query.filter(PhysicalTest.student_id == filters['student_id'])
-        
-        if filters.get('class_id'):
-            query = query.filter(PhysicalTest.class_id == filters['class_id'])
-        
-        if filters.get('grade'):
-            # 通过班级关联过滤年级
-            query = query.join(Class).filter(Class.grade == filters['grade'])
-        
-        if filters.get('school_year_id'):
-            # 通过班级关联过滤学年ID
-            query = query.join(Class).filter(Class.school_year_id == filters['school_year_id'])
-        
-        if filters.get('test_type'):
-            query = query.filter(PhysicalTest.test_type == filters['test_type'])
-        
-        if filters.get('start_date'):
-            query = query.filter(PhysicalTest.test_date >= filters['start_date'])
-        
-        if filters.get('end_date'):
-            query = query.filter(PhysicalTest.test_date <= filters['end_date'])
+    query = _apply_history_filters(query, filters, user=user)
     
     # 排序
     query = query.order_by(PhysicalTest.test_date.desc())
@@ -262,49 +324,124 @@ def get_physical_test_history(db: Session, filters: Optional[Dict[str, Any]] = N
         "updated_at": test.updated_at
     } for test in tests]
 
-# 获取体测统计数据
-def get_physical_test_statistics(db: Session) -> dict:
-    """获取体测统计数据"""
-    # 获取总学生数
-    total_students = db.query(Student).count()
+# 体测历史导出字段及表头
+HISTORY_EXPORT_HEADERS = {
+    "id": "记录ID",
+    "student_id": "学生ID",
+    "student_no": "学号",
+    "real_name": "姓名",
+    "education_id": "教育ID",
+    "gender": "性别",
+    "class_id": "班级ID",
+    "class_name": "班级",
+    "student_grade": "年级",
+    "academic_year": "学年",
+    "test_date": "测试日期",
+    "test_type": "测试类型",
+    "height": "身高(cm)",
+    "weight": "体重(kg)",
+    "vital_capacity": "肺活量(ml)",
+    "run_50m": "50米跑(秒)",
+    "run_800m": "800米跑(秒)",
+    "run_1000m": "1000米跑(秒)",
+    "sit_and_reach": "坐位体前屈(cm)",
+    "standing_long_jump": "立定跳远(cm)",
+    "pull_up": "引体向上(个)",
+    "skip_rope": "跳绳(个/分钟)",
+    "sit_ups": "一分钟仰卧起坐(个)",
+    "run_50m_8": "50米×8往返跑(秒)",
+    "total_score": "总分",
+    "grade": "等级",
+    "tester_name": "测试员",
+    "test_notes": "备注",
+    "is_official": "是否正式测试",
+}
+HISTORY_EXPORT_FIELDS = tuple(HISTORY_EXPORT_HEADERS)
+
+# 流式读取体测历史数据
+def iter_physical_test_history(db: Session, filters: Optional[Dict[str, Any]] = None, chunk_size: int = 1000,
+                               user=None) -> Iterator[dict]:
+    """逐行产生体测历史数据，用于导出
     
-    # 获取已测试学生数（去重）
-    tested_students = db.query(PhysicalTest.student_id).distinct().count()
+    只查询导出所需的列（不构造ORM对象），并用 yield_per 分批从游标读取，
+    内存占用与导出行数无关。
+    """
+    query = db.query(
+        PhysicalTest.id,
+        PhysicalTest.student_id,
+        Student.student_no,
+        Student.real_name,
+        Student.education_id,
+        Student.gender,
+        PhysicalTest.class_id,
+        Class.class_name,
+        Class.grade.label("student_grade"),
+        SchoolYear.academic_year,
+        PhysicalTest.test_date,
+        PhysicalTest.test_type,
+        *[getattr(PhysicalTest, field) for field in MEASUREMENT_FIELDS],
+        PhysicalTest.total_score,
+        PhysicalTest.grade,
+        PhysicalTest.tester_name,
+        PhysicalTest.test_notes,
+        PhysicalTest.is_official
+    ).outerjoin(Student, Student.id == PhysicalTest.student_id
+    ).outerjoin(Class, Class.id == PhysicalTest.class_id
+    ).outerjoin(SchoolYear, SchoolYear.id == Class.school_year_id)
     
-    # 获取所有体测记录
-    all_tests = db.query(PhysicalTest).all()
+    query = _apply_history_filters(query, filters, join_class=False, user=user)
+    query = query.order_by(PhysicalTest.test_date.desc(), PhysicalTest.id.desc())
     
-    # 计算平均分
-    if all_tests:
-        total_score = sum(test.total_score or 0 for test in all_tests)
-        average_score = total_score / len(all_tests)
-    else:
-        average_score = 0.0
+    # 服务端游标分批读取
+    query = query.execution_options(stream_results=True)
+    for row in query.yield_per(chunk_size):
+        record = dict(row._mapping)
+        record["gender"] = getattr(record["gender"], "value", record["gender"])
+        yield record
+
+# 获取体测统计数据
+def get_physical_test_statistics(db: Session) -> dict:
+    """获取体测统计数据
     
-    # 计算各等级比例
-    if all_tests:
+    单条聚合SQL完成计数、平均分和各等级分段统计（CASE 分段 + SUM/COUNT），
+    不再把全部体测记录加载到内存，内存占用与记录数无关。
+    """
+    score = PhysicalTest.total_score
+    row = db.query(
+        # 总学生数
+        db.query(func.count(Student.id)).scalar_subquery().label("total_students"),
+        # 已测试学生数（去重）
+        func.count(distinct(PhysicalTest.student_id)).label("tested_students"),
+        func.count(PhysicalTest.id).label("total_tests"),
+        # 未计分记录按0分计入平均分
+        func.coalesce(func.sum(score), 0).label("score_sum"),
         # 优秀: >=90分
-        excellent_count = len([test for test in all_tests if test.total_score and test.total_score >= 90])
+        func.sum(case((score >= 90, 1), else_=0)).label("excellent_count"),
         # 良好: 80-89分
-        good_count = len([test for test in all_tests if test.total_score and 80 <= test.total_score < 90])
+        func.sum(case((and_(score >= 80, score < 90), 1), else_=0)).label("good_count"),
         # 及格: 60-79分
-        pass_count = len([test for test in all_tests if test.total_score and 60 <= test.total_score < 80])
-        # 不及格: <60分
-        fail_count = len([test for test in all_tests if test.total_score and test.total_score < 60])
-        
-        excellent_rate = excellent_count / len(all_tests) * 100
-        good_rate = good_count / len(all_tests) * 100
-        pass_rate = pass_count / len(all_tests) * 100
-        fail_rate = fail_count / len(all_tests) * 100
+        func.sum(case((and_(score >= 60, score < 80), 1), else_=0)).label("pass_count"),
+        # 不及格: <60分（0分视为未计分，不计入）
+        func.sum(case((and_(score < 60, score != 0), 1), else_=0)).label("fail_count")
+    ).one()
+    
+    total_tests = row.total_tests or 0
+    if total_tests:
+        average_score = float(row.score_sum) / total_tests
+        excellent_rate = row.excellent_count / total_tests * 100
+        good_rate = row.good_count / total_tests * 100
+        pass_rate = row.pass_count / total_tests * 100
+        fail_rate = row.fail_count / total_tests * 100
     else:
+        average_score = 0.0
         excellent_rate = 0.0
         good_rate = 0.0
         pass_rate = 0.0
         fail_rate = 0.0
     
     return {
-        "total_students": total_students,
-        "tested_students": tested_students,
+        "total_students": row.total_students or 0,
+        "tested_students": row.tested_students or 0,
         "excellent_rate": excellent_rate,
         "good_rate": good_rate,
         "pass_rate": pass_rate,
@@ -517,14 +654,272 @@ def get_item_analysis(db: Session, class_id: int = None, grade: str = None, scho
     
     return result
 
+# 多维分析支持的维度
+ANALYTICS_FACETS = ('score_band', 'level', 'grade', 'class', 'gender', 'item')
+
+# 单项分析的项目
+ANALYSIS_ITEMS = ('height', 'weight', 'vital_capacity', 'run_50m', 'run_800m', 'run_1000m',
+                  'sit_and_reach', 'standing_long_jump', 'pull_up', 'skip_rope')
+
+# 分数段 -> 等级
+SCORE_BAND_LEVELS = {"0-59": "fail", "60-69": "pass", "70-79": "pass", "80-89": "good", "90-100": "excellent"}
+
+def _new_score_accumulator() -> dict:
+    """创建总分累加器"""
+    return {"count": 0, "sum": 0.0, "max": None, "min": None,
+            "excellent": 0, "good": 0, "pass": 0, "fail": 0}
+
+def _accumulate_score(acc: dict, row, level: str):
+    """把一个分组的已计分统计合并进累加器"""
+    if not row.scored_count:
+        return
+    acc["count"] += row.scored_count
+    acc["sum"] += float(row.scored_sum)
+    acc["max"] = row.scored_max if acc["max"] is None else max(acc["max"], row.scored_max)
+    acc["min"] = row.scored_min if acc["min"] is None else min(acc["min"], row.scored_min)
+    acc[level] += row.scored_count
+
+def _score_summary(acc: dict) -> dict:
+    """累加器 -> 平均分、最值及等级分布"""
+    count = acc["count"]
+    return {
+        "average": round(acc["sum"] / count, 2),
+        "count": count,
+        "max": acc["max"],
+        "min": acc["min"],
+        "excellent": acc["excellent"],
+        "good": acc["good"],
+        "pass": acc["pass"],
+        "fail": acc["fail"],
+        "excellent_rate": round(acc["excellent"] / count * 100, 2),
+        "good_rate": round(acc["good"] / count * 100, 2),
+        "pass_rate": round(acc["pass"] / count * 100, 2),
+        "fail_rate": round(acc["fail"] / count * 100, 2)
+    }
+
+# 获取多维分析数据
+def get_physical_test_analytics(db: Session, facets: List[str] = None, class_id: int = None,
+                                grade: str = None, school_year_id: int = None) -> dict:
+    """一次分组查询计算多个维度的统计数据
+    
+    按(班级, 性别, 分数段)分组聚合总分和各单项的 COUNT/SUM/MAX/MIN，
+    再在内存中把少量分组结果汇总为各维度：
+    score_band 分数段分布、level 等级分布、grade 年级对比、class 班级对比、
+    gender 性别对比、item 单项分析。未计分（空或0分）的记录只计入分数段分布。
+    """
+    facets = [facet for facet in (facets or ANALYTICS_FACETS) if facet in ANALYTICS_FACETS]
+    
+    score = PhysicalTest.total_score
+    scored = func.nullif(score, 0)
+    band_score = func.coalesce(score, 0)
+    band = case(
+        (band_score < 60, "0-59"),
+        (band_score < 70, "60-69"),
+        (band_score < 80, "70-79"),
+        (band_score < 90, "80-89"),
+        else_="90-100"
+    ).label("band")
+    
+    item_columns = []
+    for item in ANALYSIS_ITEMS:
+        column = getattr(PhysicalTest, item)
+        item_columns += [
+            func.count(column).label(f"{item}_count"),
+            func.sum(column).label(f"{item}_sum"),
+            func.max(column).label(f"{item}_max"),
+            func.min(column).label(f"{item}_min")
+        ]
+    
+    query = db.query(
+        PhysicalTest.class_id,
+        Class.class_name,
+        Class.grade.label("class_grade"),
+        Student.gender,
+        band,
+        func.count(PhysicalTest.id).label("total_count"),
+        func.count(scored).label("scored_count"),
+        func.sum(scored).label("scored_sum"),
+        func.max(scored).label("scored_max"),
+        func.min(scored).label("scored_min"),
+        *item_columns
+    ).outerjoin(Class, Class.id == PhysicalTest.class_id
+    ).outerjoin(Student, Student.id == PhysicalTest.student_id)
+    
+    if class_id:
+        query = query.filter(PhysicalTest.class_id == class_id)
+    if grade:
+        query = query.filter(PhysicalTest.grade == grade)
+    if school_year_id:
+        query = query.filter(Class.school_year_id == school_year_id)
+    
+    rows = query.group_by(
+        PhysicalTest.class_id, Class.class_name, Class.grade, Student.gender, band
+    ).all()
+    
+    # 汇总分组结果
+    total = 0
+    bands = {key: 0 for key in SCORE_BAND_LEVELS}
+    overall = _new_score_accumulator()
+    grades = {}
+    classes = {}
+    genders = {"male": _new_score_accumulator(), "female": _new_score_accumulator()}
+    items = {item: {"count": 0, "sum": 0.0, "max": None, "min": None} for item in ANALYSIS_ITEMS}
+    
+    for row in rows:
+        level = SCORE_BAND_LEVELS[row.band]
+        total += row.total_count
+        bands[row.band] += row.total_count
+        _accumulate_score(overall, row, level)
+        
+        grade_name = row.class_grade or "未知年级"
+        _accumulate_score(grades.setdefault(grade_name, _new_score_accumulator()), row, level)
+        
+        if row.class_id is not None:
+            class_acc = classes.setdefault(row.class_id, _new_score_accumulator())
+            class_acc["class_name"] = row.class_name
+            _accumulate_score(class_acc, row, level)
+        
+        gender = getattr(row.gender, 'value', row.gender)
+        if gender in genders:
+            _accumulate_score(genders[gender], row, level)
+        
+        for item in ANALYSIS_ITEMS:
+            count = getattr(row, f"{item}_count")
+            if not count:
+                continue
+            acc = items[item]
+            item_max = getattr(row, f"{item}_max")
+            item_min = getattr(row, f"{item}_min")
+            acc["count"] += count
+            acc["sum"] += float(getattr(row, f"{item}_sum"))
+            acc["max"] = item_max if acc["max"] is None else max(acc["max"], item_max)
+            acc["min"] = item_min if acc["min"] is None else min(acc["min"], item_min)
+    
+    result = {"total": total}
+    if 'score_band' in facets:
+        result["score_band"] = bands
+    if 'level' in facets:
+        if total == 0:
+            result["level"] = {"excellent": 0, "good": 0, "pass": 0, "fail": 0}
+        else:
+            result["level"] = {
+                **{key: overall[key] for key in ("excellent", "good", "pass", "fail")},
+                **{f"{key}_rate": round(overall[key] / total * 100, 2) for key in ("excellent", "good", "pass", "fail")}
+            }
+    if 'grade' in facets:
+        result["grade"] = {name: _score_summary(acc) for name, acc in grades.items() if acc["count"]}
+    if 'class' in facets:
+        result["class"] = {
+            class_key: {"class_name": acc["class_name"], **_score_summary(acc)}
+            for class_key, acc in classes.items() if acc["count"]
+        }
+    if 'gender' in facets:
+        result["gender"] = {
+            gender: {
+                "average": round(acc["sum"] / acc["count"], 2) if acc["count"] else 0,
+                "count": acc["count"]
+            }
+            for gender, acc in genders.items()
+        }
+    if 'item' in facets:
+        result["item"] = {
+            item: {
+                "average": round(acc["sum"] / acc["count"], 2),
+                "max": acc["max"],
+                "min": acc["min"],
+                "count": acc["count"]
+            } if acc["count"] else {"average": 0, "max": 0, "min": 0, "count": 0}
+            for item, acc in items.items()
+        }
+    return result
+
+# 获取体测记录的年级排名
+def get_physical_test_rank(db: Session, physical_test_id: int, items: List[str] = None) -> Optional[dict]:
+    """查询体测记录各项目在同学年、同年级、同性别、同测试类型中的名次和百分位"""
+    test = db.query(PhysicalTest).filter(PhysicalTest.id == physical_test_id).first()
+    if not test:
+        return None
+    return {
+        "physical_test_id": test.id,
+        "student_id": test.student_id,
+        "items": get_rank_index().rank_test(db, test, items or ['total_score'])
+    }
+
+# 获取年级队列前N名
+def get_cohort_top(db: Session, school_year_id: int, grade_level: int, gender: str,
+                   test_type: str, item: str = 'total_score', limit: int = 10, user=None) -> List[dict]:
+    """获取同学年、同年级、同性别、同测试类型中某项目的前N名
+    
+    指定 user 时只列出用户可见的记录，名次仍为在整个年级中的名次。
+    """
+    ranking = get_rank_index().get_ranking(db, (school_year_id, grade_level, gender, test_type), item)
+    scope = physical_test_scope(user)
+    test_ids = None
+    if scope is not None:
+        test_ids = {row.id for row in db.query(PhysicalTest.id).filter(scope, PhysicalTest.test_type == test_type)}
+    top = ranking.top(limit, test_ids)
+    names = dict(db.query(Student.id, Student.real_name).filter(
+        Student.id.in_([entry['student_id'] for entry in top])
+    ).all()) if top else {}
+    for entry in top:
+        entry['student_name'] = names.get(entry['student_id'])
+    return top
+
+# 获取班级学生的年级排名
+def get_class_rankings(db: Session, class_id: int, item: str = 'total_score', test_type: str = None) -> List[dict]:
+    """列出班级内体测记录及其在年级中的名次和百分位，按年级名次排序"""
+    class_obj = db.query(Class).filter(Class.id == class_id).first()
+    if not class_obj:
+        return []
+    
+    column = getattr(PhysicalTest, item)
+    query = db.query(
+        PhysicalTest.id, PhysicalTest.student_id, PhysicalTest.test_type,
+        Student.real_name, Student.gender, column.label('value')
+    ).join(Student, Student.id == PhysicalTest.student_id
+    ).filter(PhysicalTest.class_id == class_id)
+    if test_type:
+        query = query.filter(PhysicalTest.test_type == test_type)
+    
+    rank_index = get_rank_index()
+    rankings = []
+    for row in query.all():
+        gender = getattr(row.gender, 'value', row.gender)
+        entry = {
+            'physical_test_id': row.id,
+            'student_id': row.student_id,
+            'student_name': row.real_name,
+            'gender': gender,
+            'test_type': row.test_type,
+            'value': row.value,
+            'rank': None,
+            'total': None,
+            'percentile': None
+        }
+        if row.value is not None and not (item == 'total_score' and not row.value):
+            cohort = (class_obj.school_year_id, class_obj.grade_level, gender, row.test_type)
+            entry.update(rank_index.get_ranking(db, cohort, item).rank(row.value))
+        rankings.append(entry)
+    
+    rankings.sort(key=lambda entry: (entry['percentile'] is None, -(entry['percentile'] or 0)))
+    return rankings
+
+# 刷新体测记录的原始成绩指纹
+def refresh_measurement_fingerprint(test: PhysicalTest) -> str:
+    """根据当前原始成绩和班级重新计算指纹，写入 measurement_fingerprint"""
+    test.measurement_fingerprint = measurement_fingerprint(
+        {field: getattr(test, field) for field in MEASUREMENT_FIELDS}, test.class_id
+    )
+    return test.measurement_fingerprint
+
 # 计算体测成绩总分和等级
 def calculate_physical_test_score(db: Session, physical_test_id: int) -> dict:
-    """计算体测成绩总分和等级"""
+    """按《国家学生体质健康标准》评分表计算体测成绩总分和等级"""
     test = db.query(PhysicalTest).filter(PhysicalTest.id == physical_test_id).first()
     if not test:
         return None
     
-    # 获取学生信息（用于性别和年级判断）
+    # 获取学生信息（用于性别判断）
     student = db.query(Student).filter(Student.id == test.student_id).first()
     if not student:
         return None
@@ -533,257 +928,193 @@ def calculate_physical_test_score(db: Session, physical_test_id: int) -> dict:
     class_obj = db.query(Class).filter(Class.id == test.class_id).first()
     grade_level = class_obj.grade_level if class_obj else None
     
-    # 计算各项得分（简化版，实际应根据国家体测标准）
-    scores = {}
-    
-    # 身高体重指数BMI
-    if test.height and test.weight:
-        bmi = test.weight / ((test.height / 100) ** 2)
-        scores['bmi'] = calculate_bmi_score(bmi, student.gender)
-    else:
-        scores['bmi'] = 0
-    
-    # 肺活量
-    if test.vital_capacity:
-        scores['vital_capacity'] = calculate_vital_capacity_score(test.vital_capacity, student.gender, grade_level)
-    else:
-        scores['vital_capacity'] = 0
-    
-    # 50米跑
-    if test.run_50m:
-        scores['run_50m'] = calculate_run_50m_score(test.run_50m, student.gender, grade_level)
-    else:
-        scores['run_50m'] = 0
-    
-    # 800米跑（女生）或1000米跑（男生）
-    if student.gender == 'female' and test.run_800m:
-        scores['run_long'] = calculate_run_800m_score(test.run_800m, grade_level)
-    elif student.gender == 'male' and test.run_1000m:
-        scores['run_long'] = calculate_run_1000m_score(test.run_1000m, grade_level)
-    else:
-        scores['run_long'] = 0
-    
-    # 坐位体前屈
-    if test.sit_and_reach:
-        scores['sit_and_reach'] = calculate_sit_and_reach_score(test.sit_and_reach, student.gender, grade_level)
-    else:
-        scores['sit_and_reach'] = 0
-    
-    # 立定跳远
-    if test.standing_long_jump:
-        scores['standing_long_jump'] = calculate_standing_long_jump_score(test.standing_long_jump, student.gender, grade_level)
-    else:
-        scores['standing_long_jump'] = 0
+    engine = get_score_engine()
+    measurements = {field: getattr(test, field) for field in MEASUREMENT_FIELDS}
+    result = engine.calculate(measurements, student.gender, grade_level)
+    if result is None:
+        return None
     
-    # 引体向上（男生）或跳绳（女生）
-    if student.gender == 'male' and test.pull_up:
-        scores['strength'] = calculate_pull_up_score(test.pull_up, grade_level)
-    elif student.gender == 'female' and test.skip_rope:
-        scores['strength'] = calculate_skip_rope_score(test.skip_rope, grade_level)
-    else:
-        scores['strength'] = 0
+    # 更新数据库，同时记录计分依据（成绩指纹、评分表版本）
+    before = get_test_contribution(db, test)
+    test.total_score = result['total_score']
+    test.grade = result['grade']
+    test.score_fingerprint = refresh_measurement_fingerprint(test)
+    test.score_version = engine.version
+    update_summary_for_change(db, before, get_test_contribution(db, test))
+    db.commit()
+    get_rank_index().apply_change(db, test)
     
-    # 计算总分
-    total_score = sum(scores.values())
+    return result
+
+# 按块向量化计分并批量写回
+def _score_rows(db: Session, rows: list, chunk_size: int, progress_callback=None) -> dict:
+    """对联表查询结果按块向量化计分，每块执行一次批量UPDATE并提交
     
-    # 计算等级
-    grade = calculate_grade(total_score)
+    progress_callback(已处理行数, 总行数) 在每块提交后调用
+    """
+    import numpy as np
     
-    # 更新数据库
-    test.total_score = total_score
-    test.grade = grade
-    db.commit()
+    engine = get_score_engine()
+    results = []
+    chunks = []
+    for offset in range(0, len(rows), chunk_size):
+        chunk_started = time.perf_counter()
+        chunk = rows[offset:offset + chunk_size]
+        
+        # 行 -> 列（None 自动转换为 NaN）
+        columns = {
+            field: np.array([getattr(row, field) for row in chunk], dtype=float)
+            for field in MEASUREMENT_FIELDS
+        }
+        scored = engine.calculate_batch(
+            columns,
+            [row.gender for row in chunk],
+            [row.grade_level for row in chunk]
+        )
+        
+        mappings = []
+        scored_rows = []
+        summary_changes = []
+        for index, row in enumerate(chunk):
+            if not scored['valid'][index]:
+                continue
+            total_score = float(scored['total_score'][index])
+            grade = str(scored['grade'][index])
+            fingerprint = measurement_fingerprint(
+                {field: getattr(row, field) for field in MEASUREMENT_FIELDS}, row.class_id
+            )
+            scored_rows.append(row)
+            mappings.append({
+                'id': row.id,
+                'total_score': total_score,
+                'grade': grade,
+                'measurement_fingerprint': fingerprint,
+                'score_fingerprint': fingerprint,
+                'score_version': engine.version
+            })
+            results.append({
+                'test_id': row.id,
+                'student_id': row.student_id,
+                'total_score': total_score,
+                'grade': grade
+            })
+            # 汇总表只需调整总分
+            summary_key = (row.school_year_id, row.class_id, row.test_type, getattr(row.gender, 'value', row.gender))
+            if row.total_score:
+                summary_changes.append((summary_key, {'total_score': row.total_score}, -1))
+            if total_score:
+                summary_changes.append((summary_key, {'total_score': total_score}, 1))
+        score_ms = round((time.perf_counter() - chunk_started) * 1000, 2)
+        
+        # 每块一次批量UPDATE（按主键executemany）
+        update_started = time.perf_counter()
+        if mappings:
+            db.execute(update(PhysicalTest), mappings)
+            apply_summary_deltas(db, build_summary_deltas(summary_changes))
+            db.commit()
+            rank_index = get_rank_index()
+            for row, mapping in zip(scored_rows, mappings):
+                cohort = (row.school_year_id, row.grade_level, getattr(row.gender, 'value', row.gender), row.test_type)
+                rank_index.update_value(cohort, 'total_score', row.id, row.student_id, mapping['total_score'])
+        update_ms = round((time.perf_counter() - update_started) * 1000, 2)
+        
+        chunks.append({
+            'offset': offset,
+            'rows': len(chunk),
+            'updated': len(mappings),
+            'score_ms': score_ms,
+            'update_ms': update_ms
+        })
+        if progress_callback:
+            progress_callback(offset + len(chunk), len(rows))
     
     return {
-        'total_score': total_score,
-        'grade': grade,
-        'item_scores': scores
+        'total': len(results),
+        'skipped': len(rows) - len(results),
+        'results': results,
+        'version': engine.version,
+        'chunks': chunks
     }
 
-# 辅助函数：计算BMI得分
-def calculate_bmi_score(bmi: float, gender: str) -> float:
-    """计算BMI得分（简化版）"""
-    if 18.5 <= bmi <= 23.9:
-        return 10.0
-    elif 17 <= bmi < 18.5 or 24 <= bmi <= 27:
-        return 8.0
-    elif 16 <= bmi < 17 or 27 < bmi <= 28:
-        return 6.0
-    else:
-        return 4.0
-
-# 辅助函数：计算肺活量得分
-def calculate_vital_capacity_score(vital_capacity: int, gender: str, grade_level: int) -> float:
-    """计算肺活量得分（简化版）"""
-    if gender == 'male':
-        if vital_capacity >= 4000:
-            return 10.0
-        elif vital_capacity >= 3500:
-            return 8.0
-        elif vital_capacity >= 3000:
-            return 6.0
-        else:
-            return 4.0
-    else:
-        if vital_capacity >= 3000:
-            return 10.0
-        elif vital_capacity >= 2500:
-            return 8.0
-        elif vital_capacity >= 2000:
-            return 6.0
-        else:
-            return 4.0
-
-# 辅助函数：计算50米跑得分
-def calculate_run_50m_score(time: float, gender: str, grade_level: int) -> float:
-    """计算50米跑得分（简化版）"""
-    if gender == 'male':
-        if time <= 7.0:
-            return 10.0
-        elif time <= 7.5:
-            return 8.0
-        elif time <= 8.0:
-            return 6.0
-        else:
-            return 4.0
-    else:
-        if time <= 8.0:
-            return 10.0
-        elif time <= 8.5:
-            return 8.0
-        elif time <= 9.0:
-            return 6.0
-        else:
-            return 4.0
-
-# 辅助函数：计算800米跑得分
-def calculate_run_800m_score(time: int, grade_level: int) -> float:
-    """计算800米跑得分（简化版）"""
-    if time <= 240:
-        return 10.0
-    elif time <= 270:
-        return 8.0
-    elif time <= 300:
-        return 6.0
-    else:
-        return 4.0
-
-# 辅助函数：计算1000米跑得分
-def calculate_run_1000m_score(time: int, grade_level: int) -> float:
-    """计算1000米跑得分（简化版）"""
-    if time <= 240:
-        return 10.0
-    elif time <= 270:
-        return 8.0
-    elif time <= 300:
-        return 6.0
-    else:
-        return 4.0
-
-# 辅助函数：计算坐位体前屈得分
-def calculate_sit_and_reach_score(score: float, gender: str, grade_level: int) -> float:
-    """计算坐位体前屈得分（简化版）"""
-    if gender == 'male':
-        if score >= 15:
-            return 10.0
-        elif score >= 10:
-            return 8.0
-        elif score >= 5:
-            return 6.0
-        else:
-            return 4.0
-    else:
-        if score >= 18:
-            return 10.0
-        elif score >= 13:
-            return 8.0
-        elif score >= 8:
-            return 6.0
-        else:
-            return 4.0
-
-# 辅助函数：计算立定跳远得分
-def calculate_standing_long_jump_score(score: int, gender: str, grade_level: int) -> float:
-    """计算立定跳远得分（简化版）"""
-    if gender == 'male':
-        if score >= 240:
-            return 10.0
-        elif score >= 220:
-            return 8.0
-        elif score >= 200:
-            return 6.0
-        else:
-            return 4.0
-    else:
-        if score >= 190:
-            return 10.0
-        elif score >= 170:
-            return 8.0
-        elif score >= 150:
-            return 6.0
-        else:
-            return 4.0
-
-# 辅助函数：计算引体向上得分
-def calculate_pull_up_score(count: int, grade_level: int) -> float:
-    """计算引体向上得分（简化版）"""
-    if count >= 10:
-        return 10.0
-    elif count >= 7:
-        return 8.0
-    elif count >= 4:
-        return 6.0
-    else:
-        return 4.0
-
-# 辅助函数：计算跳绳得分
-def calculate_skip_rope_score(count: int, grade_level: int) -> float:
-    """计算跳绳得分（简化版）"""
-    if count >= 160:
-        return 10.0
-    elif count >= 140:
-        return 8.0
-    elif count >= 120:
-        return 6.0
-    else:
-        return 4.0
-
-# 辅助函数：计算等级
-def calculate_grade(total_score: float) -> str:
-    """根据总分计算等级"""
-    if total_score >= 90:
-        return "A"
-    elif total_score >= 80:
-        return "B"
-    elif total_score >= 60:
-        return "C"
-    else:
-        return "D"
-
-# 批量计算成绩
-def batch_calculate_scores(db: Session, class_id: int = None, school_year_id: int = None) -> dict:
-    """批量计算体测成绩"""
-    query = db.query(PhysicalTest)
+# 构建计分所需的联表查询
+def _scoring_query(db: Session, class_id: int = None, school_year_id: int = None):
+    """一次联表取出原始成绩、学生性别和班级年级"""
+    query = db.query(
+        PhysicalTest.id,
+        PhysicalTest.student_id,
+        PhysicalTest.class_id,
+        PhysicalTest.test_type,
+        PhysicalTest.total_score,
+        Student.gender,
+        Class.grade_level,
+        Class.school_year_id,
+        *[getattr(PhysicalTest, field) for field in MEASUREMENT_FIELDS]
+    ).join(Student, Student.id == PhysicalTest.student_id
+    ).outerjoin(Class, Class.id == PhysicalTest.class_id)
     
     if class_id:
         query = query.filter(PhysicalTest.class_id == class_id)
     if school_year_id:
-        query = query.join(Class).filter(Class.school_year_id == school_year_id)
+        query = query.filter(Class.school_year_id == school_year_id)
+    return query
+
+# 有评分表的记录
+def _scorable():
+    """可以评分的条件：班级年级在评分标准范围内、性别已知（与评分引擎的判断一致）"""
+    return and_(
+        Class.grade_level.isnot(None),
+        Class.grade_level >= 1,
+        Student.gender.in_([GenderEnum.male, GenderEnum.female])
+    )
+
+# 批量计算成绩
+def batch_calculate_scores(db: Session, class_id: int = None, school_year_id: int = None, chunk_size: int = 1000,
+                           progress_callback=None) -> dict:
+    """批量计算体测成绩（列式向量化）
     
-    tests = query.all()
-    results = []
+    一次联表查询取出原始成绩、学生性别和班级年级，按块向量化计算得分，
+    每块执行一次批量UPDATE并提交，返回各块耗时便于确认性能。
+    """
+    started = time.perf_counter()
+    rows = _scoring_query(db, class_id, school_year_id).order_by(PhysicalTest.id).all()
+    query_ms = round((time.perf_counter() - started) * 1000, 2)
     
-    for test in tests:
-        result = calculate_physical_test_score(db, test.id)
-        if result:
-            results.append({
-                'test_id': test.id,
-                'student_id': test.student_id,
-                'total_score': result['total_score'],
-                'grade': result['grade']
-            })
+    result = _score_rows(db, rows, chunk_size, progress_callback)
+    result['timings'] = {
+        'query_ms': query_ms,
+        'chunks': result.pop('chunks'),
+        'total_ms': round((time.perf_counter() - started) * 1000, 2)
+    }
+    return result
+
+# 增量重算过期成绩
+def rescore_stale_scores(db: Session, class_id: int = None, school_year_id: int = None, chunk_size: int = 1000) -> dict:
+    """只重算原始成绩或评分表版本发生变化的体测记录
     
-    return {
-        'total': len(results),
-        'results': results
+    过期条件：从未计分、计分时的评分表版本与当前不同、
+    或原始成绩指纹与计分时的指纹不一致（含指纹缺失的历史数据）。
+    没有评分表的记录（没有班级年级、性别未知）不参与重算，否则每次都会被重新选出；
+    这些记录的数量单独在 skipped 中返回，补全年级或性别后自然进入过期条件。
+    """
+    started = time.perf_counter()
+    version = get_score_engine().version
+    query = _scoring_query(db, class_id, school_year_id).filter(or_(
+        PhysicalTest.score_version.is_(None),
+        PhysicalTest.score_version != version,
+        PhysicalTest.score_fingerprint.is_(None),
+        PhysicalTest.measurement_fingerprint.is_(None),
+        PhysicalTest.measurement_fingerprint != PhysicalTest.score_fingerprint
+    ))
+    rows = query.filter(_scorable()).order_by(PhysicalTest.id).all()
+    skipped = query.filter(~_scorable()).count()
+    query_ms = round((time.perf_counter() - started) * 1000, 2)
+    
+    result = _score_rows(db, rows, chunk_size)
+    result['stale'] = len(rows)
+    result['skipped'] = skipped
+    result['timings'] = {
+        'query_ms': query_ms,
+        'chunks': result.pop('chunks'),
+        'total_ms': round((time.perf_counter() - started) * 1000, 2)
     }
+    return result
@@ -0,0 +1,301 @@
+# 体育教学辅助网站 - 体测汇总表CRUD操作
+# 按(学年, 班级, 测试类型, 性别, 项目)维护计数、和、平方和，
+# 体测记录新增、修改、计分、删除时增量更新，均值/方差/及格率可直接读取
+
+import math
+from typing import Any, Dict, List, Optional, Tuple
+
+from sqlalchemy import and_, case, func
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+
+from models import PhysicalTest, PhysicalTestSummary, Student, Class
+from utils.score_standards import MEASUREMENT_FIELDS
+
+# 汇总的项目：总分 + 各项原始成绩
+SUMMARY_ITEMS = ("total_score",) + MEASUREMENT_FIELDS
+
+# 汇总键字段
+SUMMARY_KEY_FIELDS = ("school_year_id", "class_id", "test_type", "gender")
+
+# 汇总值字段
+SUMMARY_VALUE_FIELDS = (
+    "value_count", "value_sum", "value_sq_sum",
+    "excellent_count", "good_count", "pass_count", "fail_count"
+)
+
+# 一致性检查的浮点容差（增量加减会带来微小的舍入误差）
+SUMMARY_REL_TOLERANCE = 1e-6
+SUMMARY_ABS_TOLERANCE = 1e-3
+
+
+def _score_level(score: float) -> str:
+    """总分 -> 等级计数字段"""
+    if score >= 90:
+        return "excellent_count"
+    elif score >= 80:
+        return "good_count"
+    elif score >= 60:
+        return "pass_count"
+    return "fail_count"
+
+
+def _item_value(item: str, value: Any) -> Optional[float]:
+    """取参与汇总的值：空值不计；总分为0视为未计分"""
+    if value is None:
+        return None
+    if item == "total_score" and not value:
+        return None
+    return float(value)
+
+
+def get_test_contribution(db: Session, test: PhysicalTest) -> Tuple[tuple, Dict[str, float]]:
+    """获取一条体测记录对汇总表的贡献：(汇总键, {项目: 值})"""
+    school_year_id = None
+    if test.class_id:
+        school_year_id = db.query(Class.school_year_id).filter(Class.id == test.class_id).scalar()
+    gender = db.query(Student.gender).filter(Student.id == test.student_id).scalar()
+    key = (school_year_id, test.class_id, test.test_type, getattr(gender, "value", gender))
+    return key, _item_values(test)
+
+
+def _item_values(row: Any) -> Dict[str, float]:
+    """一条记录参与汇总的 {项目: 值}"""
+    values = {}
+    for item in SUMMARY_ITEMS:
+        value = _item_value(item, getattr(row, item))
+        if value is not None:
+            values[item] = value
+    return values
+
+
+def get_class_contributions(db: Session, class_id: int) -> List[Tuple[tuple, Dict[str, float]]]:
+    """一次查询获取班级全部体测记录对汇总表的贡献（批量删除前扣减汇总用）"""
+    school_year_id = db.query(Class.school_year_id).filter(Class.id == class_id).scalar()
+    rows = db.query(
+        PhysicalTest.test_type, Student.gender, *(getattr(PhysicalTest, item) for item in SUMMARY_ITEMS)
+    ).outerjoin(Student, Student.id == PhysicalTest.student_id).filter(PhysicalTest.class_id == class_id)
+    return [
+        ((school_year_id, class_id, row.test_type, getattr(row.gender, "value", row.gender)), _item_values(row))
+        for row in rows
+    ]
+
+
+def _add_delta(deltas: Dict[tuple, Dict[str, float]], key: tuple, item: str, value: float, sign: int):
+    """累加单个值的增量"""
+    delta = deltas.setdefault((key, item), {field: 0 for field in SUMMARY_VALUE_FIELDS})
+    delta["value_count"] += sign
+    delta["value_sum"] += sign * value
+    delta["value_sq_sum"] += sign * value * value
+    if item == "total_score":
+        delta[_score_level(value)] += sign
+
+
+def build_summary_deltas(changes: List[Tuple[tuple, Dict[str, float], int]]) -> Dict[tuple, Dict[str, float]]:
+    """把多条 (汇总键, {项目: 值}, +1/-1) 合并为按(汇总键, 项目)的增量"""
+    deltas: Dict[tuple, Dict[str, float]] = {}
+    for key, values, sign in changes:
+        for item, value in values.items():
+            _add_delta(deltas, key, item, value, sign)
+    return deltas
+
+
+def _upsert(db: Session):
+    """按数据库方言选择支持 ON CONFLICT 的 insert"""
+    if db.get_bind().dialect.name == "postgresql":
+        return postgresql.insert
+    return sqlite.insert
+
+
+def apply_summary_deltas(db: Session, deltas: Dict[tuple, Dict[str, float]]):
+    """把增量写入汇总表（不提交，由调用方与体测数据同一事务提交）
+
+    在数据库中累加（SET field = field + 增量），不存在的行用 ON CONFLICT 插入，
+    并发写入同一汇总行时不会丢失增量。
+    """
+    insert = _upsert(db)
+    for (key, item), delta in deltas.items():
+        if not any(delta.values()):
+            continue
+        keys = dict(zip(SUMMARY_KEY_FIELDS, key), item=item)
+        if None in key:
+            # 唯一约束不约束空值，ON CONFLICT 不会触发：先按 IS NULL 条件累加，没有汇总行时插入
+            updated = db.query(PhysicalTestSummary).filter(
+                *(getattr(PhysicalTestSummary, field) == value if value is not None
+                  else getattr(PhysicalTestSummary, field).is_(None) for field, value in keys.items())
+            ).update({
+                field: getattr(PhysicalTestSummary, field) + value for field, value in delta.items()
+            }, synchronize_session=False)
+            if not updated:
+                db.execute(insert(PhysicalTestSummary).values(**keys, **delta))
+            continue
+        statement = insert(PhysicalTestSummary).values(**keys, **delta)
+        db.execute(statement.on_conflict_do_update(
+            index_elements=list(keys),
+            set_={
+                **{field: getattr(PhysicalTestSummary, field) + statement.excluded[field] for field in delta},
+                "updated_at": func.now()
+            }
+        ))
+
+
+def update_summary_for_change(db: Session, before: Optional[Tuple[tuple, Dict[str, float]]],
+                              after: Optional[Tuple[tuple, Dict[str, float]]]):
+    """按一条体测记录修改前后的贡献更新汇总表（新增时 before 为空，删除时 after 为空）"""
+    changes = []
+    if before:
+        changes.append((before[0], before[1], -1))
+    if after:
+        changes.append((after[0], after[1], 1))
+    apply_summary_deltas(db, build_summary_deltas(changes))
+
+
+def _aggregate_raw(db: Session, school_year_id: int = None) -> Dict[tuple, Dict[str, float]]:
+    """从体测原始数据一次分组聚合出汇总值"""
+    columns = []
+    for item in SUMMARY_ITEMS:
+        column = getattr(PhysicalTest, item)
+        if item == "total_score":
+            column = func.nullif(column, 0)
+        columns += [
+            func.count(column).label(f"{item}_count"),
+            func.sum(column).label(f"{item}_sum"),
+            func.sum(column * column).label(f"{item}_sq_sum")
+        ]
+    score = PhysicalTest.total_score
+    query = db.query(
+        Class.school_year_id,
+        PhysicalTest.class_id,
+        PhysicalTest.test_type,
+        Student.gender,
+        *columns,
+        func.sum(case((score >= 90, 1), else_=0)).label("excellent_count"),
+        func.sum(case((and_(score >= 80, score < 90), 1), else_=0)).label("good_count"),
+        func.sum(case((and_(score >= 60, score < 80), 1), else_=0)).label("pass_count"),
+        func.sum(case((and_(score < 60, score != 0), 1), else_=0)).label("fail_count")
+    ).outerjoin(Class, Class.id == PhysicalTest.class_id
+    ).outerjoin(Student, Student.id == PhysicalTest.student_id)
+    if school_year_id:
+        query = query.filter(Class.school_year_id == school_year_id)
+    rows = query.group_by(Class.school_year_id, PhysicalTest.class_id, PhysicalTest.test_type, Student.gender).all()
+
+    aggregated = {}
+    for row in rows:
+        key = (row.school_year_id, row.class_id, row.test_type, getattr(row.gender, "value", row.gender))
+        for item in SUMMARY_ITEMS:
+            count = getattr(row, f"{item}_count")
+            if not count:
+                continue
+            values = {
+                "value_count": count,
+                "value_sum": float(getattr(row, f"{item}_sum")),
+                "value_sq_sum": float(getattr(row, f"{item}_sq_sum")),
+                "excellent_count": 0, "good_count": 0, "pass_count": 0, "fail_count": 0
+            }
+            if item == "total_score":
+                for field in ("excellent_count", "good_count", "pass_count", "fail_count"):
+                    values[field] = getattr(row, field) or 0
+            aggregated[(key, item)] = values
+    return aggregated
+
+
+def _stored_summaries(db: Session, school_year_id: int = None) -> Dict[tuple, PhysicalTestSummary]:
+    """读取汇总表，按(汇总键, 项目)索引"""
+    query = db.query(PhysicalTestSummary)
+    if school_year_id:
+        query = query.filter(PhysicalTestSummary.school_year_id == school_year_id)
+    return {
+        (tuple(getattr(summary, field) for field in SUMMARY_KEY_FIELDS), summary.item): summary
+        for summary in query.all()
+    }
+
+
+def rebuild_physical_test_summary(db: Session, school_year_id: int = None) -> dict:
+    """从原始体测数据重建汇总表（全量或指定学年），用于回填和修复"""
+    query = db.query(PhysicalTestSummary)
+    if school_year_id:
+        query = query.filter(PhysicalTestSummary.school_year_id == school_year_id)
+    deleted = query.delete(synchronize_session=False)
+
+    aggregated = _aggregate_raw(db, school_year_id)
+    db.bulk_insert_mappings(PhysicalTestSummary, [
+        {**dict(zip(SUMMARY_KEY_FIELDS, key)), "item": item, **values}
+        for (key, item), values in aggregated.items()
+    ])
+    db.commit()
+    return {"deleted": deleted, "created": len(aggregated)}
+
+
+def check_physical_test_summary(db: Session, school_year_id: int = None) -> List[dict]:
+    """对比汇总表与原始数据，返回不一致的(汇总键, 项目)列表"""
+    aggregated = _aggregate_raw(db, school_year_id)
+    stored = _stored_summaries(db, school_year_id)
+    empty = {field: 0 for field in SUMMARY_VALUE_FIELDS}
+    mismatches = []
+    for key_item in set(aggregated) | set(stored):
+        expected = aggregated.get(key_item, empty)
+        summary = stored.get(key_item)
+        actual = {field: getattr(summary, field) for field in SUMMARY_VALUE_FIELDS} if summary else empty
+        if all(
+            math.isclose(actual[field], expected[field], rel_tol=SUMMARY_REL_TOLERANCE, abs_tol=SUMMARY_ABS_TOLERANCE)
+            for field in SUMMARY_VALUE_FIELDS
+        ):
+            continue
+        key, item = key_item
+        mismatches.append({
+            **dict(zip(SUMMARY_KEY_FIELDS, key)),
+            "item": item,
+            "expected": expected,
+            "actual": actual
+        })
+    return mismatches
+
+
+def _summary_statistics(count: int, total: float, sq_total: float) -> dict:
+    """由计数、和、平方和计算均值、方差、标准差"""
+    if not count:
+        return {"count": 0, "average": 0, "variance": 0, "std_dev": 0}
+    mean = total / count
+    variance = max(sq_total / count - mean * mean, 0.0)
+    return {
+        "count": count,
+        "average": round(mean, 2),
+        "variance": round(variance, 4),
+        "std_dev": round(math.sqrt(variance), 4)
+    }
+
+
+def get_physical_test_summary(db: Session, school_year_id: int = None, class_id: int = None,
+                              test_type: str = None, gender: str = None) -> dict:
+    """读取汇总表，返回各项目的均值、方差及总分等级分布"""
+    query = db.query(
+        PhysicalTestSummary.item,
+        func.sum(PhysicalTestSummary.value_count).label("value_count"),
+        func.sum(PhysicalTestSummary.value_sum).label("value_sum"),
+        func.sum(PhysicalTestSummary.value_sq_sum).label("value_sq_sum"),
+        func.sum(PhysicalTestSummary.excellent_count).label("excellent_count"),
+        func.sum(PhysicalTestSummary.good_count).label("good_count"),
+        func.sum(PhysicalTestSummary.pass_count).label("pass_count"),
+        func.sum(PhysicalTestSummary.fail_count).label("fail_count")
+    )
+    if school_year_id:
+        query = query.filter(PhysicalTestSummary.school_year_id == school_year_id)
+    if class_id:
+        query = query.filter(PhysicalTestSummary.class_id == class_id)
+    if test_type:
+        query = query.filter(PhysicalTestSummary.test_type == test_type)
+    if gender:
+        query = query.filter(PhysicalTestSummary.gender == gender)
+
+    result = {}
+    for row in query.group_by(PhysicalTestSummary.item).all():
+        stats = _summary_statistics(row.value_count or 0, row.value_sum or 0.0, row.value_sq_sum or 0.0)
+        if row.item == "total_score" and stats["count"]:
+            count = stats["count"]
+            for level in ("excellent", "good", "pass", "fail"):
+                stats[level] = getattr(row, f"{level}_count") or 0
+                stats[f"{level}_rate"] = round(stats[level] / count * 100, 2)
+            # 及格率：总分60分及以上
+            stats["qualified_rate"] = round((count - stats["fail"]) / count * 100, 2)
+        result[row.item] = stats
+    return result
@@ -1,7 +1,17 @@
 # 体育教学辅助网站 - 学年管理CRUD操作
+from sqlalchemy import case, func, insert, literal, select, update
 from sqlalchemy.orm import Session
 from models import SchoolYear, SchoolYearStatusEnum
-from datetime import datetime, timezone
+from utils.permissions import get_permission_cache
+from datetime import date, datetime, timezone
+from typing import Callable, Optional
+
+# 年级升级映射：原年级 -> (新年级, 新年级序号)，新年级为 None 表示毕业
+GRADE_MAP = {
+    "一年级": ("二年级", 2), "二年级": ("三年级", 3), "三年级": ("四年级", 4),
+    "四年级": ("五年级", 5), "五年级": ("六年级", 6), "六年级": ("七年级", 7),
+    "七年级": ("八年级", 8), "八年级": ("九年级", 9), "九年级": (None, None),
+}
 
 class SchoolYearCRUD:
     @staticmethod
@@ -104,136 +114,286 @@ class SchoolYearCRUD:
             return False
     
     @staticmethod
-    def promote_grades(db: Session, school_year_id: int) -> dict:
+    def preview_promotion(db: Session, school_year_id: int) -> dict:
+        """学年升级预览：只用只读查询计算完整的升级计划
+        
+        返回各年级的班级、学生数和新班级名称，已完成的年级（断点），
+        以及会阻止升级的错误（errors）和需要注意的问题（warnings）。
+        """
+        from models import Class, StudentClassRelation, SchoolYearRollover, JobStatusEnum
+        
+        current_year = db.query(SchoolYear).filter(SchoolYear.id == school_year_id).first()
+        if not current_year:
+            raise ValueError("学年不存在")
+        rollover = db.query(SchoolYearRollover).filter(SchoolYearRollover.school_year_id == school_year_id).first()
+        completed_grades = set(rollover.completed_grades or []) if rollover else set()
+        
+        start_year = current_year.start_date.year + 1
+        new_academic_year = f"{start_year}-{start_year + 1}"
+        
+        # 各班级当前学生数（一条聚合查询）
+        class_rows = db.query(
+            Class.id, Class.class_name, Class.grade, func.count(StudentClassRelation.id).label("student_count")
+        ).outerjoin(
+            StudentClassRelation,
+            (StudentClassRelation.class_id == Class.id) & (StudentClassRelation.is_current == True)
+        ).filter(
+            Class.school_year_id == school_year_id
+        ).group_by(Class.id, Class.class_name, Class.grade).order_by(Class.id).all()
+        
+        grades = {}
+        warnings = []
+        for row in class_rows:
+            if row.grade not in GRADE_MAP:
+                warnings.append(f"班级{row.class_name}（ID: {row.id}）的年级“{row.grade}”无法识别，不会升级")
+                continue
+            target_grade = GRADE_MAP[row.grade][0]
+            batch = grades.setdefault(row.grade, {
+                "grade": row.grade,
+                "target_grade": target_grade,
+                "completed": row.grade in completed_grades,
+                "class_count": 0,
+                "student_count": 0,
+                "classes": []
+            })
+            batch["class_count"] += 1
+            batch["student_count"] += row.student_count
+            batch["classes"].append({
+                "class_id": row.id,
+                "class_name": row.class_name,
+                "new_class_name": row.class_name.replace(row.grade, target_grade) if target_grade else None,
+                "student_count": row.student_count
+            })
+        batches = [grades[grade] for grade in GRADE_MAP if grade in grades]
+        
+        # 同一学生在本学年有多条当前班级关系时会被复制多次
+        duplicated = db.query(StudentClassRelation.student_id).join(
+            Class, Class.id == StudentClassRelation.class_id
+        ).filter(
+            Class.school_year_id == school_year_id,
+            StudentClassRelation.is_current == True
+        ).group_by(StudentClassRelation.student_id).having(func.count(StudentClassRelation.id) > 1).count()
+        if duplicated:
+            warnings.append(f"{duplicated}名学生有多个当前班级")
+        
+        errors = []
+        if rollover and rollover.status == JobStatusEnum.completed:
+            errors.append("该学年已完成升级")
+        existing_year = db.query(SchoolYear.id).filter(
+            SchoolYear.school_id == current_year.school_id,
+            SchoolYear.academic_year == new_academic_year
+        ).first()
+        if existing_year and not (rollover and rollover.new_school_year_id == existing_year.id):
+            errors.append(f"新学年{new_academic_year}已存在")
+        
+        pending = [batch for batch in batches if not batch["completed"]]
+        return {
+            "school_year_id": school_year_id,
+            "new_school_year": {
+                "id": rollover.new_school_year_id if rollover else None,
+                "year_name": f"{start_year}-{start_year + 1}学年",
+                "academic_year": new_academic_year,
+                "start_date": current_year.start_date.replace(year=start_year).isoformat(),
+                "end_date": current_year.end_date.replace(year=start_year).isoformat()
+            },
+            "grades": batches,
+            "checkpoint": {
+                "status": rollover.status.value,
+                "completed_grades": list(rollover.completed_grades or []),
+                "error": rollover.error
+            } if rollover else None,
+            "promoted_classes": sum(batch["class_count"] for batch in pending if batch["target_grade"]),
+            "promoted_students": sum(batch["student_count"] for batch in pending if batch["target_grade"]),
+            "graduated_students": sum(batch["student_count"] for batch in pending if not batch["target_grade"]),
+            "errors": errors,
+            "warnings": warnings
+        }
+    
+    @staticmethod
+    def _promote_grade_batch(db: Session, batch: dict, new_school_year: SchoolYear, today) -> dict:
+        """升级一个年级的全部班级（不提交）
+        
+        按集合批量执行（INSERT ... SELECT、UPDATE ... WHERE class_id IN (...)），语句数与学生数无关。
+        """
         from models import Class, Student, StudentClassRelation, StatusEnum
-        from datetime import timedelta
         
-        GRADE_MAP = {
-            "一年级": ("二年级", 2), "二年级": ("三年级", 3), "三年级": ("四年级", 4),
-            "四年级": ("五年级", 5), "五年级": ("六年级", 6), "六年级": ("七年级", 7),
-            "七年级": ("八年级", 8), "八年级": ("九年级", 9), "九年级": (None, None),
+        class_ids = [item["class_id"] for item in batch["classes"]]
+        target_grade = batch["target_grade"]
+        
+        if target_grade is None:
+            # 九年级学生标记为毕业
+            graduated = db.execute(
+                update(Student).where(Student.id.in_(
+                    select(StudentClassRelation.student_id).where(
+                        StudentClassRelation.class_id.in_(class_ids),
+                        StudentClassRelation.is_current == True
+                    )
+                )).values(
+                    status=StatusEnum.inactive, graduation_date=today,
+                    current_class_id=None, current_school_year_id=None
+                ),
+                execution_options={"synchronize_session": False}
+            ).rowcount
+            promoted_classes, promoted_students = 0, 0
+        else:
+            # 复制班级到新学年（INSERT ... RETURNING），得到 原班级ID -> 新班级ID
+            student_counts = {item["class_id"]: item["student_count"] for item in batch["classes"]}
+            old_classes = db.query(Class).filter(Class.id.in_(class_ids)).order_by(Class.id).all()
+            new_class_ids = db.execute(
+                insert(Class).returning(Class.id, sort_by_parameter_order=True),
+                [{
+                    "school_id": cls.school_id,
+                    "school_year_id": new_school_year.id,
+                    "class_name": cls.class_name.replace(cls.grade, target_grade),
+                    "grade": target_grade,
+                    "grade_level": GRADE_MAP[cls.grade][1],
+                    "class_teacher_id": cls.class_teacher_id,
+                    "class_teacher_name": cls.class_teacher_name,
+                    "assistant_teacher_name": cls.assistant_teacher_name,
+                    "max_student_count": cls.max_student_count,
+                    "current_student_count": student_counts[cls.id],
+                    "status": cls.status,
+                    "start_date": new_school_year.start_date
+                } for cls in old_classes]
+            ).scalars().all()
+            class_map = dict(zip([cls.id for cls in old_classes], new_class_ids))
+            
+            # 学生关系转入新班级（INSERT ... SELECT）
+            promoted_students = db.execute(insert(StudentClassRelation).from_select(
+                ["student_id", "class_id", "status", "join_date", "is_current", "user_id"],
+                select(
+                    StudentClassRelation.student_id,
+                    case(class_map, value=StudentClassRelation.class_id),
+                    StudentClassRelation.status,
+                    literal(today),
+                    literal(True),
+                    StudentClassRelation.user_id
+                ).where(
+                    StudentClassRelation.class_id.in_(class_ids),
+                    StudentClassRelation.is_current == True
+                )
+            )).rowcount
+            
+            # 同步学生的当前班级
+            db.execute(
+                update(Student).where(Student.current_class_id.in_(class_ids)).values(
+                    current_class_id=case(class_map, value=Student.current_class_id),
+                    current_school_year_id=new_school_year.id
+                ),
+                execution_options={"synchronize_session": False}
+            )
+            promoted_classes, graduated = len(class_map), 0
+        
+        # 结束原班级的当前关系
+        db.execute(
+            update(StudentClassRelation).where(
+                StudentClassRelation.class_id.in_(class_ids),
+                StudentClassRelation.is_current == True
+            ).values(is_current=False, leave_date=today),
+            execution_options={"synchronize_session": False}
+        )
+        return {
+            "promoted_classes": promoted_classes,
+            "promoted_students": promoted_students,
+            "graduated_students": graduated
         }
+    
+    @staticmethod
+    def _mark_rollover_failed(db: Session, school_year_id: int, error: str):
+        """记录升级失败（单独提交，保留已完成年级的断点）"""
+        from models import SchoolYearRollover, JobStatusEnum
         
-        promoted_classes = 0
-        promoted_students = 0
-        graduated_students = 0
-        new_school_year = None
+        rollover = db.query(SchoolYearRollover).filter(SchoolYearRollover.school_year_id == school_year_id).first()
+        if rollover:
+            rollover.status = JobStatusEnum.failed
+            rollover.error = error[:2000]
+            db.commit()
+    
+    @staticmethod
+    def promote_grades(db: Session, school_year_id: int, dry_run: bool = False,
+                       progress_callback: Optional[Callable[[int, int], None]] = None) -> dict:
+        """学年升级：复制升级班级到新学年、学生关系转入新班级、九年级学生毕业
+        
+        按年级分批执行，每个年级与断点记录（SchoolYearRollover）在同一事务提交；
+        中途失败时已完成的年级保留，重新执行从未完成的年级继续。全部年级完成后
+        原学年标记为已完成、新学年激活。dry_run 为真时返回只读预览，不写入。
+        """
+        from models import SchoolYearRollover, JobStatusEnum
+        
+        plan = SchoolYearCRUD.preview_promotion(db, school_year_id)
+        if dry_run:
+            return {"success": True, "dry_run": True, **plan}
         
+        if plan["errors"]:
+            raise ValueError("；".join(plan["errors"]))
+        
+        rollover = db.query(SchoolYearRollover).filter(SchoolYearRollover.school_year_id == school_year_id).first()
+        current_year = db.query(SchoolYear).filter(SchoolYear.id == school_year_id).first()
+        today = datetime.now(timezone.utc).date()
+        resumed = rollover is not None
+        try:
+            # 1. 建立断点记录和新学年（新学年在全部年级完成后才激活）
+            if rollover is None:
+                rollover = SchoolYearRollover(
+                    school_year_id=school_year_id, completed_grades=[],
+                    result={"promoted_classes": 0, "promoted_students": 0, "graduated_students": 0}
+                )
+                db.add(rollover)
+            if rollover.new_school_year_id is None:
+                new_school_year = SchoolYear(
+                    school_id=current_year.school_id,
+                    year_name=plan["new_school_year"]["year_name"],
+                    academic_year=plan["new_school_year"]["academic_year"],
+                    start_date=date.fromisoformat(plan["new_school_year"]["start_date"]),
+                    end_date=date.fromisoformat(plan["new_school_year"]["end_date"]),
+                    status=SchoolYearStatusEnum.inactive
+                )
+                db.add(new_school_year)
+                db.flush()
+                rollover.new_school_year_id = new_school_year.id
+            rollover.status = JobStatusEnum.running
+            rollover.error = None
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        new_school_year = db.query(SchoolYear).filter(SchoolYear.id == rollover.new_school_year_id).first()
+        
+        # 2. 按年级分批升级，每批与断点一起提交
+        pending = [batch for batch in plan["grades"] if not batch["completed"]]
+        for index, batch in enumerate(pending, 1):
+            try:
+                counts = SchoolYearCRUD._promote_grade_batch(db, batch, new_school_year, today)
+                rollover.completed_grades = list(rollover.completed_grades or []) + [batch["grade"]]
+                rollover.result = {key: rollover.result[key] + counts[key] for key in counts}
+                db.commit()
+                get_permission_cache().clear()
+            except Exception as e:
+                db.rollback()
+                SchoolYearCRUD._mark_rollover_failed(db, school_year_id, f"升级{batch['grade']}失败: {str(e)}")
+                raise
+            if progress_callback:
+                progress_callback(index, len(pending))
+        
+        # 3. 完成原学年，激活新学年
         try:
-            # 获取当前学年信息
-            current_year = db.query(SchoolYear).filter(SchoolYear.id == school_year_id).first()
-            if not current_year:
-                raise ValueError("学年不存在")
-            
-            # 1. 完成当前学年
             current_year.status = SchoolYearStatusEnum.completed
             current_year.completed_at = datetime.now(timezone.utc)
-            
-            # 2. 获取当前学年的班级
-            classes = db.query(Class).filter(Class.school_year_id == school_year_id).all()
-            
-            # 3. 计算新学年的日期
-            start_year = current_year.start_date.year + 1
-            new_start_date = current_year.start_date.replace(year=start_year)
-            new_end_date = current_year.end_date.replace(year=start_year)
-            
-            # 4. 创建新学年
-            new_academic_year = f"{start_year}-{start_year + 1}"
-            new_year_name = f"{start_year}-{start_year + 1}学年"
-            
-            new_school_year = SchoolYear(
-                school_id=current_year.school_id,
-                year_name=new_year_name,
-                academic_year=new_academic_year,
-                start_date=new_start_date,
-                end_date=new_end_date,
-                status=SchoolYearStatusEnum.active
-            )
-            db.add(new_school_year)
-            db.flush()  # 获取新学年的ID
-            
-            # 5. 处理班级升级
-            for cls in classes:
-                old_grade = cls.grade
-                if old_grade in GRADE_MAP:
-                    new_grade, new_level = GRADE_MAP[old_grade]
-                    
-                    if new_grade is None:
-                        # 九年级：标记学生为毕业
-                        student_relations = db.query(StudentClassRelation).filter(
-                            StudentClassRelation.class_id == cls.id,
-                            StudentClassRelation.is_current == True
-                        ).all()
-                        for relation in student_relations:
-                            student = db.query(Student).filter(Student.id == relation.student_id).first()
-                            if student:
-                                student.status = StatusEnum.inactive
-                                student.graduation_date = datetime.now(timezone.utc).date()
-                                graduated_students += 1
-                            relation.is_current = False
-                            relation.end_date = datetime.now(timezone.utc).date()
-                    else:
-                        # 其他年级：复制到新学年并升级
-                        # 复制班级到新学年
-                        new_class = Class(
-                            school_id=cls.school_id,
-                            school_year_id=new_school_year.id,
-                            class_name=cls.class_name.replace(old_grade, new_grade),
-                            grade=new_grade,
-                            grade_level=new_level,
-                            academic_year=new_academic_year,
-                            class_teacher_id=cls.class_teacher_id,
-                            class_teacher_name=cls.class_teacher_name,
-                            assistant_teacher_name=cls.assistant_teacher_name,
-                            max_student_count=cls.max_student_count,
-                            status=cls.status
-                        )
-                        db.add(new_class)
-                        db.flush()
-                        
-                        # 复制学生关系到新班级
-                        student_relations = db.query(StudentClassRelation).filter(
-                            StudentClassRelation.class_id == cls.id,
-                            StudentClassRelation.is_current == True
-                        ).all()
-                        
-                        for relation in student_relations:
-                            new_relation = StudentClassRelation(
-                                student_id=relation.student_id,
-                                class_id=new_class.id,
-                                academic_year=new_academic_year,
-                                status=relation.status,
-                                join_date=datetime.now(timezone.utc).date(),
-                                is_current=True,
-                                user_id=relation.user_id
-                            )
-                            db.add(new_relation)
-                            promoted_students += 1
-                        
-                        promoted_classes += 1
-                        
-                        # 标记原班级的关系为已结束
-                        for relation in student_relations:
-                            relation.is_current = False
-                            relation.end_date = datetime.now(timezone.utc).date()
-            
+            new_school_year.status = SchoolYearStatusEnum.active
+            rollover.status = JobStatusEnum.completed
+            rollover.finished_at = datetime.now(timezone.utc)
             db.commit()
-            
-            return {
-                "success": True,
-                "new_school_year": {
-                    "id": new_school_year.id,
-                    "year_name": new_school_year.year_name,
-                    "academic_year": new_school_year.academic_year,
-                    "start_date": new_school_year.start_date.isoformat(),
-                    "end_date": new_school_year.end_date.isoformat()
-                },
-                "promoted_classes": promoted_classes,
-                "promoted_students": promoted_students,
-                "graduated_students": graduated_students
-            }
         except Exception as e:
             db.rollback()
-            raise e
+            SchoolYearCRUD._mark_rollover_failed(db, school_year_id, f"完成学年升级失败: {str(e)}")
+            raise
+        
+        return {
+            "success": True,
+            "dry_run": False,
+            "resumed": resumed,
+            "new_school_year": {**plan["new_school_year"], "id": new_school_year.id},
+            **rollover.result
+        }
 
 school_year_crud = SchoolYearCRUD()
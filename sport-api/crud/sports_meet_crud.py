@@ -294,7 +294,7 @@ def delete_event_result(db: Session, event_result_id: int):
 
 def validate_registration(db: Session, sports_meet_id: int, event_id: int, student_id: int) -> dict:
     """验证学生是否可以报名参加某个项目"""
-    from models import Student, Class, StudentClassRelation, RegistrationStatusEnum, SportsMeetStatusEnum
+    from models import Student, Class, RegistrationStatusEnum, SportsMeetStatusEnum
     from datetime import date
     
     # 检查运动会是否存在
@@ -325,16 +325,11 @@ def validate_registration(db: Session, sports_meet_id: int, event_id: int, stude
         return {"valid": False, "reason": "学生状态不允许报名"}
     
     # 获取学生当前班级
-    current_class_relation = db.query(StudentClassRelation).filter(
-        StudentClassRelation.student_id == student_id,
-        StudentClassRelation.is_current == True
-    ).first()
-    
-    if not current_class_relation:
+    if not student.current_class_id:
         return {"valid": False, "reason": "学生没有当前班级"}
     
     # 获取班级信息
-    class_obj = db.query(Class).filter(Class.id == current_class_relation.class_id).first()
+    class_obj = db.query(Class).filter(Class.id == student.current_class_id).first()
     if not class_obj:
         return {"valid": False, "reason": "班级信息不存在"}
     
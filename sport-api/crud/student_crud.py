@@ -1,14 +1,51 @@
+from sqlalchemy import select, update
 from sqlalchemy.orm import Session, joinedload
-from models import Student, StudentClassRelation, Class, PhysicalTest
-from typing import List, Tuple
+from models import Student, StudentClassRelation, Class, PhysicalTest, SchoolYear
+from typing import Iterable, List, Optional, Tuple
+from utils.pagination import paginate, cached_count
+from utils.student_search import get_student_search_index
+from utils.permissions import get_permission_cache
+from utils.query_scope import apply_scope, student_scope
+
+
+def current_class_subqueries():
+    """学生当前班级ID、学年ID的关联子查询（按当前学生班级关系计算，多条时取最早的一条）"""
+    current_relation = select(StudentClassRelation.class_id).where(
+        StudentClassRelation.student_id == Student.id,
+        StudentClassRelation.is_current == True
+    ).order_by(StudentClassRelation.id).limit(1)
+    current_school_year = select(Class.school_year_id).join(
+        StudentClassRelation, StudentClassRelation.class_id == Class.id
+    ).where(
+        StudentClassRelation.student_id == Student.id,
+        StudentClassRelation.is_current == True
+    ).order_by(StudentClassRelation.id).limit(1)
+    return current_relation.scalar_subquery(), current_school_year.scalar_subquery()
+
+
+def sync_current_class(db: Session, student_ids: Optional[Iterable[int]] = None) -> int:
+    """按当前学生班级关系重算学生的 current_class_id / current_school_year_id（不提交）
+    
+    一条 UPDATE 完成，与学生列表一致。student_ids 为空时重算全部学生，返回更新的学生数。
+    """
+    db.flush()
+    class_id, school_year_id = current_class_subqueries()
+    stmt = update(Student).values(current_class_id=class_id, current_school_year_id=school_year_id)
+    if student_ids is not None:
+        student_ids = list(student_ids)
+        if not student_ids:
+            return 0
+        stmt = stmt.where(Student.id.in_(student_ids))
+    return db.execute(stmt, execution_options={"synchronize_session": "fetch"}).rowcount
+
 
 class StudentCrud:
     def get_student(self, db: Session, student_id: int):
         return db.query(Student).filter(Student.id == student_id).first()
 
-    def get_students(self, db: Session, params):
-        """获取学生列表，支持分页和多条件过滤"""
-        query = db.query(Student)
+    def get_students(self, db: Session, params, user=None):
+        """获取学生列表，支持分页和多条件过滤；传入 user 时只返回其可见的学生"""
+        query = apply_scope(db.query(Student), student_scope(user))
         
         # 应用过滤条件
         if params.search:
@@ -47,25 +84,33 @@ class StudentCrud:
         
         return students, total
 
-    def get_students_with_class(self, db: Session, params) -> Tuple[List[dict], int]:
+    def get_students_with_class(self, db: Session, params, user=None) -> Tuple[List[dict], int]:
         """获取学生列表，包含当前班级信息"""
-        query = db.query(Student)
-        
-        # 如果有班级ID或年级筛选，需要join班级关系表
-        if params.class_id or params.grade:
-            query = query.join(
-                StudentClassRelation,
-                (StudentClassRelation.student_id == Student.id) & (StudentClassRelation.is_current == True)
-            ).join(
-                Class,
-                Class.id == StudentClassRelation.class_id
-            )
-            
-            if params.class_id:
-                query = query.filter(Class.id == params.class_id)
-            
-            if params.grade:
-                query = query.filter(Class.grade == params.grade)
+        result, total, _ = self.get_students_page(db, params, user=user)
+        return result, total
+
+    def get_students_page(self, db: Session, params, cursor: Optional[str] = None,
+                          cached_total: bool = False, user=None) -> Tuple[List[dict], int, Optional[str]]:
+        """获取一页学生（含当前班级信息），返回 (本页学生, 总数, 下一页游标)
+        
+        学生按冗余的当前班级、学年字段外连接班级和学年，一次查询取出整页数据（加上总数共两条SQL），
+        不再逐个学生查询班级关系、班级和学年。传入 cursor 时按学生ID键集分页，
+        cached_total 为真时总数使用带缓存的计数。传入 user 时只返回其可见的学生。
+        """
+        query = db.query(
+            Student, Class, SchoolYear.academic_year
+        ).outerjoin(
+            Class, Class.id == Student.current_class_id
+        ).outerjoin(
+            SchoolYear, SchoolYear.id == Student.current_school_year_id
+        )
+        query = apply_scope(query, student_scope(user))
+        
+        if params.class_id:
+            query = query.filter(Student.current_class_id == params.class_id)
+        
+        if params.grade:
+            query = query.filter(Class.grade == params.grade)
         
         # 应用过滤条件
         if params.search:
@@ -83,23 +128,17 @@ class StudentCrud:
             query = query.filter(Student.status == params.status)
         
         # 计算总数
-        total = query.count()
+        total = cached_count(query) if cached_total else query.count()
         
-        # 应用分页
+        # 应用分页：有游标时从游标位置继续，否则按页码偏移
         skip = (params.page - 1) * params.page_size
-        limit = params.page_size
-        
-        students = query.offset(skip).limit(limit).all()
+        rows, next_cursor = paginate(
+            query, [(Student.id, False)], params.page_size, cursor, skip,
+            key=lambda row: (row.Student.id,)
+        )
         
-        # 获取每个学生的当前班级信息
         result = []
-        for student in students:
-            # 获取当前班级关系
-            current_relation = db.query(StudentClassRelation).filter(
-                StudentClassRelation.student_id == student.id,
-                StudentClassRelation.is_current == True
-            ).first()
-            
+        for student, class_obj, academic_year in rows:
             # 构建学生信息字典
             student_dict = {
                 'id': student.id,
@@ -122,36 +161,16 @@ class StudentCrud:
             }
             
             # 添加班级信息
-            if current_relation:
-                class_obj = db.query(Class).filter(Class.id == current_relation.class_id).first()
-                if class_obj:
-                    student_dict['current_class_id'] = class_obj.id
-                    student_dict['current_class_name'] = class_obj.class_name
-                    student_dict['current_grade'] = class_obj.grade
-                    student_dict['current_grade_level'] = class_obj.grade_level
-                    student_dict['current_school_year_id'] = class_obj.school_year_id
-                    if class_obj.school_year:
-                        student_dict['current_academic_year'] = class_obj.school_year.academic_year
-                    else:
-                        student_dict['current_academic_year'] = None
-                else:
-                    student_dict['current_class_id'] = None
-                    student_dict['current_class_name'] = None
-                    student_dict['current_grade'] = None
-                    student_dict['current_grade_level'] = None
-                    student_dict['current_school_year_id'] = None
-                    student_dict['current_academic_year'] = None
-            else:
-                student_dict['current_class_id'] = None
-                student_dict['current_class_name'] = None
-                student_dict['current_grade'] = None
-                student_dict['current_grade_level'] = None
-                student_dict['current_school_year_id'] = None
-                student_dict['current_academic_year'] = None
+            student_dict['current_class_id'] = class_obj.id if class_obj else None
+            student_dict['current_class_name'] = class_obj.class_name if class_obj else None
+            student_dict['current_grade'] = class_obj.grade if class_obj else None
+            student_dict['current_grade_level'] = class_obj.grade_level if class_obj else None
+            student_dict['current_school_year_id'] = class_obj.school_year_id if class_obj else None
+            student_dict['current_academic_year'] = academic_year
             
             result.append(student_dict)
         
-        return result, total
+        return result, total, next_cursor
 
     def get_student_by_student_no(self, db: Session, student_no: str):
         """根据学籍号获取学生"""
@@ -173,6 +192,8 @@ class StudentCrud:
         db.add(db_student)
         db.commit()
         db.refresh(db_student)
+        get_student_search_index().update_student(db_student)
+        get_permission_cache().clear()
         return db_student
 
     def update_student(self, db: Session, student_id: int, student_data):
@@ -201,6 +222,7 @@ class StudentCrud:
                 setattr(db_student, key, value)
             db.commit()
             db.refresh(db_student)
+            get_student_search_index().update_student(db_student)
         return db_student
 
     def get_student_classes(self, db: Session, student_id: int):
@@ -269,7 +291,12 @@ class StudentCrud:
             is_current=True
         )
         db.add(new_relation)
+        db.query(Student).filter(Student.id == student_id).update({
+            'current_class_id': class_obj.id,
+            'current_school_year_id': class_obj.school_year_id
+        }, synchronize_session='fetch')
         db.commit()
+        get_permission_cache().clear()
         return True
 
     def remove_student_from_class(self, db: Session, student_id: int, class_id: int, leave_date):
@@ -288,7 +315,9 @@ class StudentCrud:
         existing_relation.leave_date = leave_date
         existing_relation.is_current = False
         existing_relation.status = StatusEnum.transferred
+        sync_current_class(db, [student_id])
         db.commit()
+        get_permission_cache().clear()
         return True
 
     def transfer_student(self, db: Session, student_id: int, from_class_id: int, to_class_id: int, transfer_date, reason: str = None):
@@ -336,8 +365,10 @@ class StudentCrud:
         )
         db.add(to_relation)
         
-        # 更新学生状态
+        # 更新学生状态和当前班级
         student.status = StatusEnum.transferred
+        student.current_class_id = to_class.id
+        student.current_school_year_id = to_class.school_year_id
         
         # 记录数据变更日志
         change_log = DataChangeLog(
@@ -351,6 +382,7 @@ class StudentCrud:
         db.add(change_log)
         
         db.commit()
+        get_permission_cache().clear()
         return True, "转学成功"
 
     def delete_student(self, db: Session, student_id: int):
@@ -359,6 +391,8 @@ class StudentCrud:
         if db_student:
             db.delete(db_student)
             db.commit()
+            get_student_search_index().remove_student(student_id)
+            get_permission_cache().clear()
             return True
         return False
 
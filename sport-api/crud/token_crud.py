@@ -1,16 +1,27 @@
 # 体育教学辅助网站 - 令牌管理CRUD操作
 # 提供令牌的创建、查询、更新和删除功能
 
+from sqlalchemy import and_, or_
 from sqlalchemy.orm import Session
 from models import Token
 from datetime import datetime, timezone
+from utils.auth_cache import get_auth_cache, token_key
 
 class TokenCRUD:
-    """令牌CRUD操作类"""
+    """令牌CRUD操作类
+    
+    令牌表只保存令牌的 SHA-256 摘要，查询和撤销都按摘要进行；
+    摘要与认证缓存的键相同，撤销时可以直接失效缓存中的对应条目。
+    """
     
     @staticmethod
     def create_token(db: Session, token_data: dict) -> Token:
-        """创建新令牌"""
+        """创建新令牌（access_token、refresh_token 原文转换为摘要保存）"""
+        token_data = dict(token_data)
+        for field in ("access_token", "refresh_token"):
+            value = token_data.pop(field, None)
+            if value:
+                token_data[f"{field}_hash"] = token_key(value)
         db_token = Token(**token_data)
         db.add(db_token)
         db.commit()
@@ -25,12 +36,20 @@ class TokenCRUD:
     @staticmethod
     def get_token_by_access_token(db: Session, access_token: str) -> Token:
         """根据访问令牌获取令牌"""
-        return db.query(Token).filter(Token.access_token == access_token).first()
+        return db.query(Token).filter(Token.access_token_hash == token_key(access_token)).first()
     
     @staticmethod
     def get_token_by_refresh_token(db: Session, refresh_token: str) -> Token:
         """根据刷新令牌获取令牌"""
-        return db.query(Token).filter(Token.refresh_token == refresh_token).first()
+        return db.query(Token).filter(Token.refresh_token_hash == token_key(refresh_token)).first()
+    
+    @staticmethod
+    def get_token_by_value(db: Session, token_value: str) -> Token:
+        """根据访问令牌或刷新令牌获取令牌"""
+        key = token_key(token_value)
+        return db.query(Token).filter(
+            or_(Token.access_token_hash == key, Token.refresh_token_hash == key)
+        ).first()
     
     @staticmethod
     def get_user_tokens(db: Session, user_id: int) -> list[Token]:
@@ -39,16 +58,12 @@ class TokenCRUD:
     
     @staticmethod
     def revoke_token(db: Session, token_value: str) -> bool:
-        """撤销令牌（加入黑名单）"""
-        # 先尝试根据访问令牌查找
-        token = db.query(Token).filter(Token.access_token == token_value).first()
-        if not token:
-            # 再尝试根据刷新令牌查找
-            token = db.query(Token).filter(Token.refresh_token == token_value).first()
-        
+        """撤销令牌（加入黑名单），同一记录的访问令牌和刷新令牌一起失效"""
+        token = TokenCRUD.get_token_by_value(db, token_value)
         if token:
             token.revoked = True
             db.commit()
+            get_auth_cache().revoke_token_keys([token.access_token_hash, token.refresh_token_hash])
             return True
         return False
     
@@ -57,23 +72,41 @@ class TokenCRUD:
         """撤销用户的所有令牌"""
         updated = db.query(Token).filter(Token.user_id == user_id).update({"revoked": True})
         db.commit()
+        get_auth_cache().revoke_user_tokens(user_id)
         return updated > 0
     
     @staticmethod
     def is_token_revoked(db: Session, token_value: str) -> bool:
         """检查令牌是否已被撤销"""
-        # 先尝试根据访问令牌查找
-        token = db.query(Token).filter(Token.access_token == token_value).first()
-        if not token:
-            # 再尝试根据刷新令牌查找
-            token = db.query(Token).filter(Token.refresh_token == token_value).first()
-        
+        token = TokenCRUD.get_token_by_value(db, token_value)
         if not token:
             # 令牌不存在，视为已撤销
             return True
         
         return token.revoked
     
+    @staticmethod
+    def sweep_expired_tokens(db: Session, batch_size: int = 1000) -> int:
+        """分批删除不再需要的令牌记录，返回删除数量
+        
+        已撤销的、刷新令牌已过期的（没有刷新令牌时看访问令牌）记录都可以删除：
+        不存在的令牌本来就视为已撤销。每批单独提交，避免长时间锁表。
+        """
+        now = datetime.utcnow()
+        removable = or_(
+            Token.revoked == True,
+            Token.refresh_expires_at < now,
+            and_(Token.refresh_expires_at.is_(None), Token.expires_at < now)
+        )
+        deleted = 0
+        while True:
+            ids = [row.id for row in db.query(Token.id).filter(removable).limit(batch_size)]
+            if not ids:
+                break
+            deleted += db.query(Token).filter(Token.id.in_(ids)).delete(synchronize_session=False)
+            db.commit()
+        return deleted
+    
     @staticmethod
     def clean_expired_tokens(db: Session) -> int:
         """清理过期令牌"""
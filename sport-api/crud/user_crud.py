@@ -4,6 +4,7 @@
 from sqlalchemy.orm import Session
 from models import User, StatusEnum
 from datetime import datetime, timezone
+from utils.auth_cache import get_auth_cache
 
 class UserCRUD:
     """用户CRUD操作类"""
@@ -91,6 +92,7 @@ class UserCRUD:
         db_user.updated_at = datetime.now(timezone.utc)
         db.commit()
         db.refresh(db_user)
+        get_auth_cache().invalidate_user(user_id)
         return db_user
     
     @staticmethod
@@ -104,6 +106,7 @@ class UserCRUD:
         db_user.updated_at = datetime.now(timezone.utc)
         db.commit()
         db.refresh(db_user)
+        get_auth_cache().invalidate_user(user_id)
         return db_user
     
     @staticmethod
@@ -117,21 +120,23 @@ class UserCRUD:
         db_user.updated_at = datetime.now(timezone.utc)
         db.commit()
         db.refresh(db_user)
+        get_auth_cache().invalidate_user(user_id)
         return db_user
     
     @staticmethod
-    def update_user_password(db: Session, user_id: int, new_password: str) -> bool:
-        """更新用户密码"""
+    def update_user_password(db: Session, user_id: int, new_password: str, hashed: bool = False) -> bool:
+        """更新用户密码（hashed 为真时 new_password 已是哈希值，例如在线程池中算好的）"""
         from auth import AuthService
         db_user = db.query(User).filter(User.id == user_id).first()
         if not db_user:
             return False
         
         # 生成密码哈希
-        hashed_password = AuthService.get_password_hash(new_password)
+        hashed_password = new_password if hashed else AuthService.get_password_hash(new_password)
         db_user.hashed_password = hashed_password
         db_user.updated_at = datetime.now(timezone.utc)
         db.commit()
+        get_auth_cache().invalidate_user(user_id)
         return True
     
     @staticmethod
@@ -144,6 +149,7 @@ class UserCRUD:
         db_user.last_login_at = datetime.now(timezone.utc)
         db_user.updated_at = datetime.now(timezone.utc)
         db.commit()
+        get_auth_cache().invalidate_user(user_id)
         return True
     
     @staticmethod
@@ -155,6 +161,7 @@ class UserCRUD:
         
         db.delete(db_user)
         db.commit()
+        get_auth_cache().invalidate_user(user_id)
         return True
 
 # 创建user_crud实例
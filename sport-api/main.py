@@ -24,6 +24,7 @@ from routes.sports_meet import router as sports_meet_router
 from routes.school import router as school_router
 from routes.debug import router as debug_router
 from routes.dashboard import router as dashboard_router
+from routes.jobs import router as jobs_router
 
 # 创建FastAPI应用实例
 app = FastAPI(
@@ -43,6 +44,28 @@ from database import init_database
 logger.info("正在初始化数据库...")
 init_database()
 
+# 加载国家学生体质健康标准评分表
+from utils.score_standards import init_score_engine
+logger.info("正在加载体质健康标准评分表...")
+init_score_engine()
+
+# 初始化后台任务管理器（进程池在首次提交任务时创建）
+from utils.jobs import init_job_manager, get_job_manager
+init_job_manager()
+
+@app.on_event("startup")
+async def warm_student_search_index():
+    """服务启动时在后台建立学生搜索索引，首次搜索不需要等待"""
+    from utils.student_search import get_student_search_index
+    get_student_search_index().refresh_async()
+
+@app.on_event("shutdown")
+async def shutdown_job_manager():
+    """服务关闭时关闭后台任务进程池和密码哈希线程池"""
+    get_job_manager().shutdown()
+    from utils.password_pool import get_password_pool
+    get_password_pool().shutdown()
+
 # 配置CORS
 from config import settings
 
@@ -63,7 +86,7 @@ if not settings.debug:
         allow_credentials=True,
         allow_methods=["GET", "POST", "PUT", "DELETE", "PATCH"],  # 只允许必要的HTTP方法
         allow_headers=["Authorization", "Content-Type", "Accept"],  # 只允许必要的HTTP头
-        expose_headers=["X-Total-Count", "X-Page", "X-Page-Size"],  # 只暴露必要的响应头
+        expose_headers=["X-Total-Count", "X-Page", "X-Page-Size", "X-Next-Cursor"],  # 只暴露必要的响应头
         max_age=3600,  # 预检请求结果缓存1小时
     )
 else:
@@ -75,6 +98,7 @@ else:
         allow_credentials=True,
         allow_methods=["*"],
         allow_headers=["*"],
+        expose_headers=["X-Total-Count", "X-Next-Cursor"],
     )
 
 # 注册路由
@@ -88,6 +112,7 @@ app.include_router(logs_router, prefix="/api/v1/logs")
 app.include_router(sports_meet_router, prefix="/api/v1/sports-meets")
 app.include_router(school_router, prefix="/api/v1/schools")
 app.include_router(dashboard_router, prefix="/api/v1/dashboard")
+app.include_router(jobs_router, prefix="/api/v1/jobs")
 # 仅在开发环境下注册debug路由
 if settings.debug:
     app.include_router(debug_router, prefix="/api/v1/debug")
@@ -0,0 +1,30 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# 迁移脚本：任务表增加所属服务进程和心跳时间字段（多个服务进程共用任务表时识别遗留任务）
+import sqlite3
+import os
+
+db_path = 'sports_teaching.db'
+
+if not os.path.exists(db_path):
+    print(f'数据库文件不存在: {db_path}')
+    exit(1)
+
+conn = sqlite3.connect(db_path)
+cursor = conn.cursor()
+
+cursor.execute('PRAGMA table_info(jobs)')
+columns = [col[1] for col in cursor.fetchall()]
+
+for column, column_type in (('owner', 'VARCHAR(100)'), ('heartbeat_at', 'DATETIME')):
+    if column not in columns:
+        cursor.execute(f'ALTER TABLE jobs ADD COLUMN {column} {column_type}')
+        print(f'✓ 已添加 jobs.{column} 字段')
+    else:
+        print(f'jobs.{column} 字段已存在')
+cursor.execute('CREATE INDEX IF NOT EXISTS ix_jobs_owner ON jobs (owner)')
+
+conn.commit()
+conn.close()
+print()
+print('✓ 数据库迁移完成')
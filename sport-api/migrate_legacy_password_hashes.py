@@ -0,0 +1,47 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# 迁移脚本：统计仍使用旧版无盐 SHA-256 哈希或旧成本因子的用户
+# 旧哈希在用户下次登录时自动升级为 bcrypt；统计为0后在 .env 中设置
+# allow_legacy_password_hashes=False 关闭旧哈希校验。
+# 加 --invalidate 参数时清空剩余的旧版SHA256哈希（这些用户需由管理员重置密码）
+import sqlite3
+import os
+import sys
+
+from config import settings
+
+db_path = 'sports_teaching.db'
+
+if not os.path.exists(db_path):
+    print(f'数据库文件不存在: {db_path}')
+    exit(1)
+
+conn = sqlite3.connect(db_path)
+cursor = conn.cursor()
+
+legacy_condition = "hashed_password IS NOT NULL AND length(hashed_password) = 64 AND substr(hashed_password, 1, 1) <> '$'"
+cursor.execute(f'SELECT id, username, last_login FROM users WHERE {legacy_condition} ORDER BY id')
+legacy_users = cursor.fetchall()
+cursor.execute(
+    "SELECT count(*) FROM users WHERE substr(hashed_password, 1, 1) = '$' AND substr(hashed_password, 5, 2) <> ?",
+    (f'{settings.bcrypt_rounds:02d}',)
+)
+outdated_count = cursor.fetchone()[0]
+
+print(f'旧版SHA256哈希: {len(legacy_users)} 个用户')
+for user_id, username, last_login in legacy_users:
+    print(f'  - {user_id} {username}（最后登录: {last_login or "从未登录"}）')
+print(f'成本因子不是 {settings.bcrypt_rounds} 的bcrypt哈希: {outdated_count} 个用户（下次登录时升级）')
+
+if legacy_users and '--invalidate' in sys.argv:
+    cursor.execute(f'UPDATE users SET hashed_password = NULL WHERE {legacy_condition}')
+    conn.commit()
+    print(f'✓ 已清空 {cursor.rowcount} 个旧版SHA256哈希，这些用户需由管理员重置密码')
+    legacy_users = []
+
+conn.close()
+print()
+if legacy_users:
+    print('旧哈希尚未全部升级，暂时保持 allow_legacy_password_hashes=True')
+else:
+    print('✓ 已无旧版SHA256哈希，可在 .env 中设置 allow_legacy_password_hashes=False')
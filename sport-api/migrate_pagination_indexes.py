@@ -0,0 +1,25 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# 迁移脚本：为体测记录列表的游标分页添加(测试日期, ID)联合索引
+import sqlite3
+import os
+
+db_path = 'sports_teaching.db'
+
+if not os.path.exists(db_path):
+    print(f'数据库文件不存在: {db_path}')
+    exit(1)
+
+conn = sqlite3.connect(db_path)
+cursor = conn.cursor()
+
+try:
+    cursor.execute('CREATE INDEX IF NOT EXISTS ix_physical_tests_test_date_id ON physical_tests (test_date, id)')
+    print('✓ 已创建 physical_tests(test_date, id) 索引')
+except Exception as e:
+    print(f'创建 physical_tests(test_date, id) 索引失败: {e}')
+
+conn.commit()
+conn.close()
+print()
+print('✓ 数据库迁移完成')
@@ -0,0 +1,44 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# 迁移脚本：为体测记录添加增量重算所需的成绩指纹和评分表版本列
+import sqlite3
+import os
+
+db_path = 'sports_teaching.db'
+
+if not os.path.exists(db_path):
+    print(f'数据库文件不存在: {db_path}')
+    exit(1)
+
+conn = sqlite3.connect(db_path)
+cursor = conn.cursor()
+
+cursor.execute("PRAGMA table_info(physical_tests)")
+columns = [row[1] for row in cursor.fetchall()]
+
+new_columns = [
+    ('measurement_fingerprint', 'VARCHAR(64)'),
+    ('score_fingerprint', 'VARCHAR(64)'),
+    ('score_version', 'VARCHAR(32)'),
+]
+
+for name, column_type in new_columns:
+    try:
+        if name not in columns:
+            cursor.execute(f'ALTER TABLE physical_tests ADD COLUMN {name} {column_type}')
+            print(f'✓ 已添加 {name} 列')
+        else:
+            print(f'✓ {name} 列已存在')
+    except Exception as e:
+        print(f'添加 {name} 列失败: {e}')
+
+try:
+    cursor.execute('CREATE INDEX IF NOT EXISTS ix_physical_tests_score_version ON physical_tests (score_version)')
+    print('✓ 已创建 score_version 索引')
+except Exception as e:
+    print(f'创建 score_version 索引失败: {e}')
+
+conn.commit()
+conn.close()
+print()
+print('✓ 数据库迁移完成（已有记录将在下次增量重算时补齐指纹）')
@@ -0,0 +1,47 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# 迁移脚本：为学生表添加当前班级、当前学年冗余字段，并按当前学生班级关系回填
+import sqlite3
+import os
+
+db_path = 'sports_teaching.db'
+
+if not os.path.exists(db_path):
+    print(f'数据库文件不存在: {db_path}')
+    exit(1)
+
+conn = sqlite3.connect(db_path)
+cursor = conn.cursor()
+
+cursor.execute('PRAGMA table_info(students)')
+columns = [col[1] for col in cursor.fetchall()]
+
+for column, ref in [('current_class_id', 'classes'), ('current_school_year_id', 'school_years')]:
+    if column not in columns:
+        cursor.execute(f'ALTER TABLE students ADD COLUMN {column} INTEGER REFERENCES {ref}(id)')
+        print(f'✓ 已添加 students.{column} 字段')
+    else:
+        print(f'students.{column} 字段已存在')
+    cursor.execute(f'CREATE INDEX IF NOT EXISTS ix_students_{column} ON students ({column})')
+
+# 回填：存在多条当前关系时取最早的一条
+cursor.execute('''
+    UPDATE students SET
+        current_class_id = (
+            SELECT r.class_id FROM student_class_relations r
+            WHERE r.student_id = students.id AND r.is_current = 1
+            ORDER BY r.id LIMIT 1
+        ),
+        current_school_year_id = (
+            SELECT c.school_year_id FROM student_class_relations r
+            JOIN classes c ON c.id = r.class_id
+            WHERE r.student_id = students.id AND r.is_current = 1
+            ORDER BY r.id LIMIT 1
+        )
+''')
+print(f'✓ 已回填 {cursor.rowcount} 名学生的当前班级')
+
+conn.commit()
+conn.close()
+print()
+print('✓ 数据库迁移完成')
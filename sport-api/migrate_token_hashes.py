@@ -0,0 +1,54 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+# 迁移脚本：令牌表改为保存令牌的 SHA-256 摘要，回填摘要后清空原文列并删除已过期的记录
+import hashlib
+import sqlite3
+import os
+from datetime import datetime
+
+db_path = 'sports_teaching.db'
+
+if not os.path.exists(db_path):
+    print(f'数据库文件不存在: {db_path}')
+    exit(1)
+
+conn = sqlite3.connect(db_path)
+conn.create_function('sha256_hex', 1, lambda value: hashlib.sha256(value.encode('utf-8')).hexdigest() if value else None)
+cursor = conn.cursor()
+
+cursor.execute('PRAGMA table_info(tokens)')
+columns = [col[1] for col in cursor.fetchall()]
+
+for column in ('access_token_hash', 'refresh_token_hash'):
+    if column not in columns:
+        cursor.execute(f'ALTER TABLE tokens ADD COLUMN {column} VARCHAR(64)')
+        print(f'✓ 已添加 tokens.{column} 字段')
+    else:
+        print(f'tokens.{column} 字段已存在')
+    cursor.execute(f'CREATE UNIQUE INDEX IF NOT EXISTS ix_tokens_{column} ON tokens ({column})')
+cursor.execute('CREATE INDEX IF NOT EXISTS ix_tokens_refresh_expires_at ON tokens (refresh_expires_at)')
+
+# 先删除已撤销和已过期的记录，再回填摘要
+now = datetime.utcnow().isoformat(sep=' ')
+cursor.execute('''
+    DELETE FROM tokens WHERE revoked = 1
+        OR refresh_expires_at < ?
+        OR (refresh_expires_at IS NULL AND expires_at < ?)
+''', (now, now))
+print(f'✓ 已删除 {cursor.rowcount} 条已撤销或已过期的令牌')
+
+if 'access_token' in columns:
+    cursor.execute('''
+        UPDATE tokens SET
+            access_token_hash = sha256_hex(access_token),
+            refresh_token_hash = sha256_hex(refresh_token),
+            access_token = NULL,
+            refresh_token = NULL
+        WHERE access_token IS NOT NULL OR refresh_token IS NOT NULL
+    ''')
+    print(f'✓ 已回填 {cursor.rowcount} 条令牌摘要并清空令牌原文')
+
+conn.commit()
+conn.close()
+print()
+print('✓ 数据库迁移完成')
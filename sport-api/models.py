@@ -1,6 +1,6 @@
 # 体育教学辅助网站 - 数据模型定义
 
-from sqlalchemy import Column, Integer, String, Date, Text, Boolean, DateTime, Enum, ForeignKey, Float, JSON, UniqueConstraint
+from sqlalchemy import Column, Integer, String, Date, Text, Boolean, DateTime, Enum, ForeignKey, Float, JSON, UniqueConstraint, Index
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from database import Base
@@ -49,6 +49,14 @@ class RegistrationStatusEnum(str, enum.Enum):
     withdrawn = "withdrawn"  # 已撤回
     completed = "completed"  # 已完成
 
+class JobStatusEnum(str, enum.Enum):
+    """后台任务状态枚举"""
+    pending = "pending"  # 排队中
+    running = "running"  # 执行中
+    completed = "completed"  # 已完成
+    failed = "failed"  # 失败
+    cancelled = "cancelled"  # 已取消
+
 # 学校信息模型
 class School(Base):
     """学校信息表"""
@@ -163,10 +171,11 @@ class Token(Base):
     
     id = Column(Integer, primary_key=True, index=True)
     user_id = Column(Integer, ForeignKey("users.id"), comment="所属用户ID")
-    access_token = Column(String(1000), unique=True, comment="访问令牌")
-    refresh_token = Column(String(1000), unique=True, comment="刷新令牌")
+    # 只保存令牌的 SHA-256 摘要（定长64位十六进制），按摘要查找和撤销
+    access_token_hash = Column(String(64), unique=True, index=True, comment="访问令牌摘要")
+    refresh_token_hash = Column(String(64), unique=True, index=True, comment="刷新令牌摘要")
     expires_at = Column(DateTime, comment="访问令牌过期时间")
-    refresh_expires_at = Column(DateTime, comment="刷新令牌过期时间")
+    refresh_expires_at = Column(DateTime, index=True, comment="刷新令牌过期时间")
     revoked = Column(Boolean, default=False, comment="是否已撤销")
     created_at = Column(DateTime, server_default=func.now(), comment="创建时间")
     
@@ -285,7 +294,11 @@ class Student(Base):
     status = Column(Enum(StatusEnum), default=StatusEnum.active, comment="状态")
     enrollment_date = Column(Date, nullable=False, comment="入学日期")
     graduation_date = Column(Date, comment="毕业日期")
-    
+
+    # 当前班级（冗余自当前学生班级关系，由分班、转班、移出班级和升级操作同步维护）
+    current_class_id = Column(Integer, ForeignKey("classes.id"), index=True, comment="当前班级ID")
+    current_school_year_id = Column(Integer, ForeignKey("school_years.id"), index=True, comment="当前班级所属学年ID")
+
     # 用户关联（可选，用于学生登录）
     user_id = Column(Integer, ForeignKey("users.id"), comment="关联用户ID")
     created_at = Column(DateTime, server_default=func.now(), comment="创建时间")
@@ -371,6 +384,11 @@ class PhysicalTest(Base):
     """学生体测数据表"""
     __tablename__ = "physical_tests"
     
+    # 列表按(测试日期, ID)游标分页
+    __table_args__ = (
+        Index('ix_physical_tests_test_date_id', 'test_date', 'id'),
+    )
+    
     id = Column(Integer, primary_key=True, index=True)
     student_id = Column(Integer, ForeignKey("students.id"), nullable=False, comment="学生ID")
     class_id = Column(Integer, ForeignKey("classes.id"), comment="班级ID")
@@ -403,6 +421,11 @@ class PhysicalTest(Base):
     total_score = Column(Float, comment="总分")
     grade = Column(String(10), comment="等级(A/B/C/D)")
     
+    # 增量重算：原始成绩指纹、计分时的成绩指纹及评分表版本
+    measurement_fingerprint = Column(String(64), comment="原始成绩指纹")
+    score_fingerprint = Column(String(64), comment="计分时的原始成绩指纹")
+    score_version = Column(String(32), index=True, comment="计分时的评分表版本")
+    
     # 测试信息
     tester_name = Column(String(100), comment="测试员姓名")
     test_notes = Column(Text, comment="测试备注")
@@ -635,6 +658,78 @@ class DataChangeLog(Base):
     # 关联关系
     operator = relationship("User")
 
+# 体测汇总模型
+class PhysicalTestSummary(Base):
+    """体测汇总表：按(学年, 班级, 测试类型, 性别, 项目)累计计数、和、平方和，随体测数据增量维护"""
+    __tablename__ = "physical_test_summaries"
+    __table_args__ = (
+        UniqueConstraint('school_year_id', 'class_id', 'test_type', 'gender', 'item', name='uq_physical_test_summary'),
+    )
+    
+    id = Column(Integer, primary_key=True, index=True)
+    school_year_id = Column(Integer, ForeignKey("school_years.id"), index=True, comment="学年ID")
+    class_id = Column(Integer, ForeignKey("classes.id"), index=True, comment="班级ID")
+    test_type = Column(String(50), comment="测试类型")
+    gender = Column(String(10), comment="性别")
+    item = Column(String(50), nullable=False, comment="项目(total_score或体测字段名)")
+    
+    # 累计值（不含空值）
+    value_count = Column(Integer, default=0, nullable=False, comment="记录数")
+    value_sum = Column(Float, default=0.0, nullable=False, comment="成绩之和")
+    value_sq_sum = Column(Float, default=0.0, nullable=False, comment="成绩平方和")
+    
+    # 总分等级计数（仅 total_score 项目）
+    excellent_count = Column(Integer, default=0, nullable=False, comment="优秀人数(>=90)")
+    good_count = Column(Integer, default=0, nullable=False, comment="良好人数(80-89)")
+    pass_count = Column(Integer, default=0, nullable=False, comment="及格人数(60-79)")
+    fail_count = Column(Integer, default=0, nullable=False, comment="不及格人数(<60)")
+    
+    updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now(), comment="更新时间")
+
+# 后台任务模型
+class Job(Base):
+    """后台任务表：耗时操作提交到本地进程池执行，记录进度、取消请求和结果"""
+    __tablename__ = "jobs"
+    
+    id = Column(Integer, primary_key=True, index=True)
+    job_type = Column(String(50), nullable=False, index=True, comment="任务类型")
+    status = Column(Enum(JobStatusEnum), default=JobStatusEnum.pending, nullable=False, index=True, comment="任务状态")
+    params = Column(JSON, comment="任务参数")
+    
+    # 进度
+    progress = Column(Float, default=0.0, nullable=False, comment="进度(0-100)")
+    message = Column(String(500), comment="进度说明")
+    cancel_requested = Column(Boolean, default=False, nullable=False, comment="是否已请求取消")
+    
+    # 结果
+    result = Column(JSON, comment="任务结果")
+    result_file = Column(String(500), comment="结果文件路径")
+    error = Column(Text, comment="错误信息")
+    
+    # 提交任务的服务进程及其心跳：服务进程退出后遗留的未完成任务据此识别
+    owner = Column(String(100), index=True, comment="所属服务进程(主机:进程ID:启动标识)")
+    heartbeat_at = Column(DateTime, comment="所属服务进程最近一次心跳时间")
+    
+    created_by = Column(Integer, ForeignKey("users.id"), comment="提交人ID")
+    created_at = Column(DateTime, server_default=func.now(), comment="提交时间")
+    started_at = Column(DateTime, comment="开始时间")
+    finished_at = Column(DateTime, comment="结束时间")
+
+class SchoolYearRollover(Base):
+    """学年升级断点表：升级按年级分批提交，记录已完成的年级，失败后重新执行从断点继续"""
+    __tablename__ = "school_year_rollovers"
+
+    id = Column(Integer, primary_key=True, index=True)
+    school_year_id = Column(Integer, ForeignKey("school_years.id"), unique=True, nullable=False, comment="原学年ID")
+    new_school_year_id = Column(Integer, ForeignKey("school_years.id"), comment="新学年ID")
+    status = Column(Enum(JobStatusEnum), default=JobStatusEnum.running, nullable=False, comment="升级状态")
+    completed_grades = Column(JSON, comment="已完成的年级")
+    result = Column(JSON, comment="已完成年级的升级统计")
+    error = Column(Text, comment="最近一次失败的错误信息")
+    created_at = Column(DateTime, server_default=func.now(), comment="开始时间")
+    updated_at = Column(DateTime, server_default=func.now(), onupdate=func.now(), comment="更新时间")
+    finished_at = Column(DateTime, comment="完成时间")
+
 # 添加School和SchoolYear的关联关系
 School.sports_meets = relationship("SportsMeet", back_populates="school")
 SchoolYear.sports_meets = relationship("SportsMeet", back_populates="school_year")
\ No newline at end of file
@@ -0,0 +1,24 @@
+#!/usr/bin/env python3
+# 体育教学辅助网站 - 重建体测汇总表
+# 从原始体测数据全量（或按学年）重建汇总表，并校验与原始数据一致
+#
+# 用法: python rebuild_physical_test_summary.py [学年ID]
+
+import sys
+
+from database import SessionLocal
+from crud.physical_test_summary_crud import rebuild_physical_test_summary, check_physical_test_summary
+
+if __name__ == "__main__":
+    school_year_id = int(sys.argv[1]) if len(sys.argv) > 1 else None
+    db = SessionLocal()
+    try:
+        result = rebuild_physical_test_summary(db, school_year_id)
+        print(f"✓ 已删除 {result['deleted']} 条旧汇总，生成 {result['created']} 条汇总")
+        mismatches = check_physical_test_summary(db, school_year_id)
+        if mismatches:
+            print(f"❌ 汇总表仍有 {len(mismatches)} 处与原始数据不一致")
+            sys.exit(1)
+        print("✓ 汇总表与原始数据一致")
+    finally:
+        db.close()
@@ -18,6 +18,7 @@ from crud import user_crud
 from auth import AuthService, get_current_user, require_permissions, PermissionType
 from models import UserRoleEnum, StatusEnum
 from middleware.rate_limiting import limiter
+from utils.password_pool import get_password_pool
 
 # 创建路由器
 router = APIRouter(tags=["auth"])
@@ -58,8 +59,8 @@ async def login(request: Request, user_credentials: UserLogin, db: Session = Dep
                 headers={"WWW-Authenticate": "Bearer"},
             )
         
-        # 验证密码
-        is_password_valid = AuthService.verify_password(user_credentials.password, user.hashed_password)
+        # 验证密码（在密码哈希线程池中进行，不阻塞事件循环）
+        is_password_valid = await get_password_pool().verify_password(user_credentials.password, user.hashed_password)
         
         if not is_password_valid:
             raise HTTPException(
@@ -76,6 +77,11 @@ async def login(request: Request, user_credentials: UserLogin, db: Session = Dep
                 headers={"WWW-Authenticate": "Bearer"},
             )
         
+        # 旧版SHA256哈希或bcrypt成本因子已调整：用本次登录的明文重新哈希
+        if AuthService.needs_rehash(user.hashed_password):
+            new_hashed_password = await get_password_pool().hash_password(user_credentials.password)
+            user_crud.update_user_password(db, user.id, new_hashed_password, hashed=True)
+        
         # 创建访问令牌和刷新令牌
         access_token_expires = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
         refresh_token_expires = timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS)
@@ -161,7 +167,7 @@ async def register(request: Request, user_data: UserCreate, db: Session = Depend
             )
         
         # 加密密码
-        hashed_password = AuthService.get_password_hash(user_data.password)
+        hashed_password = await get_password_pool().hash_password(user_data.password)
         user_data_dict = user_data.dict(exclude={"password"})
         user_data_dict["hashed_password"] = hashed_password
         
@@ -231,7 +237,7 @@ async def change_password(
     """
     try:
         # 验证当前密码
-        if not AuthService.verify_password(password_data.current_password, current_user.hashed_password):
+        if not await get_password_pool().verify_password(password_data.current_password, current_user.hashed_password):
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail="当前密码错误"
@@ -246,10 +252,10 @@ async def change_password(
             )
         
         # 加密新密码
-        new_hashed_password = AuthService.get_password_hash(password_data.new_password)
+        new_hashed_password = await get_password_pool().hash_password(password_data.new_password)
         
         # 更新密码
-        success = user_crud.update_user_password(db, current_user.id, new_hashed_password)
+        success = user_crud.update_user_password(db, current_user.id, new_hashed_password, hashed=True)
         if not success:
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -333,7 +339,7 @@ async def refresh_token(request: RefreshTokenRequest, db: Session = Depends(get_
         )
         
         # 撤销旧令牌
-        token_crud.revoke_token(db, token.refresh_token)
+        token_crud.revoke_token(db, request.refresh_token)
         
         # 保存新令牌到数据库
         token_crud.create_token(db, {
@@ -413,6 +419,16 @@ async def logout_all_devices(
         )
 
 # 管理员专用路由
+@router.get("/password-pool/stats")
+@require_permissions([PermissionType.USER_MANAGE])
+async def get_password_pool_stats(current_user = Depends(get_current_user)):
+    """
+    获取密码哈希线程池统计（排队深度、等待时间、拒绝数）
+    
+    需要admin角色权限
+    """
+    return get_password_pool().get_stats()
+
 @router.get("/users")
 @require_permissions([PermissionType.USER_MANAGE])
 async def get_users(
@@ -23,9 +23,9 @@ async def get_classes(
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
-    """获取班级列表"""
+    """获取班级列表（只返回当前用户可见的班级）"""
     try:
-        classes = class_crud.get_classes(db, school_id=school_id, grade=grade)
+        classes = class_crud.get_classes(db, school_id=school_id, grade=grade, user=current_user)
         return classes
     except Exception as e:
         raise HTTPException(
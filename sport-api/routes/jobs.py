@@ -0,0 +1,215 @@
+# 体育教学辅助网站 - 后台任务API路由
+# 提交耗时任务、查询进度、取消任务和下载结果
+
+import os
+import shutil
+import uuid
+from fastapi import APIRouter, Depends, HTTPException, Query, UploadFile, File
+from fastapi.responses import FileResponse
+from sqlalchemy.orm import Session
+from typing import List, Optional
+from database import get_db
+from auth import get_current_user, require_role
+from config import settings
+from models import Job, JobStatusEnum, UserRoleEnum
+from utils.jobs import get_job_manager, job_to_dict
+from utils.query_scope import scope_params
+
+router = APIRouter(
+    tags=["jobs"],
+    responses={404: {"description": "Not found"}},
+)
+
+
+def _get_job_or_404(db: Session, job_id: int, current_user) -> Job:
+    """获取任务，非管理员只能访问自己提交的任务"""
+    job = db.get(Job, job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="任务不存在")
+    if current_user.role != UserRoleEnum.admin and job.created_by != current_user.id:
+        raise HTTPException(status_code=404, detail="任务不存在")
+    return job
+
+
+def _submit(db: Session, job_type: str, params: dict, current_user) -> dict:
+    """提交任务并返回任务信息"""
+    try:
+        job = get_job_manager().submit(db, job_type, params, user_id=current_user.id)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        db.rollback()
+        raise HTTPException(status_code=500, detail=f"提交任务失败: {str(e)}")
+    return job_to_dict(job)
+
+# ============ 提交任务 ============
+
+# 整学年批量计分
+@router.post("/score-year")
+@require_role([UserRoleEnum.admin.value])
+async def submit_score_year(
+    school_year_id: Optional[int] = Query(None, description="学年ID，不填则计算全部"),
+    class_id: Optional[int] = Query(None, description="班级ID"),
+    chunk_size: int = Query(1000, ge=100, le=10000, description="每批处理的记录数"),
+    db: Session = Depends(get_db),
+    current_user: dict = Depends(get_current_user)
+):
+    """提交批量计分任务"""
+    return _submit(db, "score_year", {
+        "school_year_id": school_year_id, "class_id": class_id, "chunk_size": chunk_size
+    }, current_user)
+
+# 学年升级
+@router.post("/promote-grades")
+@require_role([UserRoleEnum.admin.value])
+async def submit_promote_grades(
+    school_year_id: int = Query(..., description="学年ID"),
+    db: Session = Depends(get_db),
+    current_user: dict = Depends(get_current_user)
+):
+    """提交学年升级任务"""
+    return _submit(db, "promote_grades", {"school_year_id": school_year_id}, current_user)
+
+# 导入体测数据
+@router.post("/import-physical-tests")
+@require_role([UserRoleEnum.admin.value, UserRoleEnum.teacher.value])
+async def submit_import_physical_tests(
+    file: UploadFile = File(..., description="国家体质健康测试数据模板(.xlsx)"),
+    test_type: str = Query("国家体质健康测试", description="测试类型"),
+    chunk_size: int = Query(2000, ge=100, le=10000, description="每批校验和写入的行数"),
+    db: Session = Depends(get_db),
+    current_user: dict = Depends(get_current_user)
+):
+    """上传文件后提交导入任务（文件先保存到任务目录，由工作进程读取）"""
+    if not (file.filename or "").lower().endswith(".xlsx"):
+        raise HTTPException(status_code=400, detail="请上传 .xlsx 格式的国家体质健康测试数据模板")
+
+    upload_dir = os.path.join(settings.job_result_dir, "uploads")
+    os.makedirs(upload_dir, exist_ok=True)
+    path = os.path.join(upload_dir, f"{uuid.uuid4().hex}.xlsx")
+    with open(path, "wb") as output:
+        shutil.copyfileobj(file.file, output)
+
+    # 上传文件由任务结束时删除；提交失败时在这里删除
+    try:
+        return _submit(db, "import_physical_tests", {
+            "path": path,
+            "test_type": test_type,
+            "tester_name": getattr(current_user, "real_name", None),
+            "chunk_size": chunk_size
+        }, current_user)
+    except HTTPException:
+        os.remove(path)
+        raise
+
+# 导出体测数据
+@router.post("/export-physical-tests")
+@require_role([UserRoleEnum.admin.value, UserRoleEnum.teacher.value])
+async def submit_export_physical_tests(
+    school_year_id: Optional[int] = Query(None, description="学年ID"),
+    area: Optional[str] = Query(None, description="所属区域"),
+    school_id: Optional[int] = Query(None, description="学校ID"),
+    class_id: Optional[int] = Query(None, description="班级ID"),
+    grade: Optional[str] = Query(None, description="年级"),
+    test_type: Optional[str] = Query(None, description="测试类型"),
+    db: Session = Depends(get_db),
+    current_user: dict = Depends(get_current_user)
+):
+    """提交按国家体质健康测试数据格式导出Excel的任务，完成后通过结果接口下载"""
+    filters = {
+        'school_year_id': school_year_id,
+        'area': area,
+        'school_id': school_id,
+        'class_id': class_id,
+        'grade': grade,
+        'test_type': test_type
+    }
+    return _submit(db, "export_physical_tests", {
+        "filters": filters, "scope": scope_params(current_user)
+    }, current_user)
+
+# 数据一致性检查
+@router.post("/consistency-check")
+@require_role([UserRoleEnum.admin.value])
+async def submit_consistency_check(
+    fix: bool = Query(False, description="是否自动修复发现的问题"),
+    db: Session = Depends(get_db),
+    current_user: dict = Depends(get_current_user)
+):
+    """提交数据一致性检查任务"""
+    return _submit(db, "consistency_check", {"fix": fix}, current_user)
+
+# 清理过期令牌
+@router.post("/clean-expired-tokens")
+@require_role([UserRoleEnum.admin.value])
+async def submit_clean_expired_tokens(
+    batch_size: int = Query(1000, ge=100, le=10000, description="每批删除的记录数"),
+    db: Session = Depends(get_db),
+    current_user: dict = Depends(get_current_user)
+):
+    """提交清理已撤销和已过期令牌记录的任务（同时清理超过保留期限的任务结果文件）"""
+    return _submit(db, "clean_expired_tokens", {"batch_size": batch_size}, current_user)
+
+# ============ 查询与管理 ============
+
+# 获取任务列表
+@router.get("/", response_model=List[dict])
+async def read_jobs(
+    status: Optional[JobStatusEnum] = Query(None, description="任务状态"),
+    job_type: Optional[str] = Query(None, description="任务类型"),
+    skip: int = Query(0, ge=0, description="跳过的记录数"),
+    limit: int = Query(50, ge=1, le=500, description="返回的记录数"),
+    db: Session = Depends(get_db),
+    current_user: dict = Depends(get_current_user)
+):
+    """获取任务列表，非管理员只返回自己提交的任务"""
+    query = db.query(Job)
+    if current_user.role != UserRoleEnum.admin:
+        query = query.filter(Job.created_by == current_user.id)
+    if status:
+        query = query.filter(Job.status == status)
+    if job_type:
+        query = query.filter(Job.job_type == job_type)
+    jobs = query.order_by(Job.id.desc()).offset(skip).limit(limit).all()
+    return [job_to_dict(job) for job in jobs]
+
+# 获取任务进度
+@router.get("/{job_id}", response_model=dict)
+async def read_job(
+    job_id: int,
+    db: Session = Depends(get_db),
+    current_user: dict = Depends(get_current_user)
+):
+    """获取任务状态和进度"""
+    return job_to_dict(_get_job_or_404(db, job_id, current_user))
+
+# 取消任务
+@router.post("/{job_id}/cancel", response_model=dict)
+async def cancel_job(
+    job_id: int,
+    db: Session = Depends(get_db),
+    current_user: dict = Depends(get_current_user)
+):
+    """取消任务：排队中的任务立即取消，执行中的任务在下一批处理完成后停止"""
+    job = _get_job_or_404(db, job_id, current_user)
+    if job.status in (JobStatusEnum.completed, JobStatusEnum.failed, JobStatusEnum.cancelled):
+        raise HTTPException(status_code=400, detail="任务已结束，无法取消")
+    return job_to_dict(get_job_manager().cancel(db, job))
+
+# 下载任务结果
+@router.get("/{job_id}/result")
+async def download_job_result(
+    job_id: int,
+    db: Session = Depends(get_db),
+    current_user: dict = Depends(get_current_user)
+):
+    """下载任务结果：有结果文件时返回文件，否则返回结果JSON"""
+    job = _get_job_or_404(db, job_id, current_user)
+    if job.status != JobStatusEnum.completed:
+        raise HTTPException(status_code=409, detail=f"任务尚未完成，当前状态: {job.status.value}")
+
+    if job.result_file:
+        if not os.path.exists(job.result_file):
+            raise HTTPException(status_code=404, detail="结果文件不存在或已被清理")
+        return FileResponse(job.result_file, filename=os.path.basename(job.result_file))
+    return job.result
@@ -1,7 +1,7 @@
 # 体育教学辅助网站 - 日志API路由
 # 处理日志相关的HTTP请求
 
-from fastapi import APIRouter, Depends, HTTPException, Query
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
 from sqlalchemy.orm import Session
 from typing import List, Optional
 from database import get_db
@@ -9,6 +9,7 @@ from auth import get_current_user, require_role
 from models import UserActivityLog, DataChangeLog
 from schemas import UserActivityLogResponse
 from models import UserRoleEnum
+from utils.pagination import paginate, cached_count, set_page_headers, InvalidCursorError
 
 router = APIRouter(
     prefix="/api/v1/logs",
@@ -20,14 +21,17 @@ router = APIRouter(
 @router.get("/user-activities", response_model=List[UserActivityLogResponse])
 @require_role([UserRoleEnum.admin.value])
 async def read_user_activity_logs(
+    response: Response,
     skip: int = Query(0, ge=0, description="跳过的记录数"),
     limit: int = Query(100, ge=1, le=1000, description="返回的记录数"),
     user_id: Optional[int] = Query(None, description="用户ID"),
     action: Optional[str] = Query(None, description="操作类型"),
+    cursor: Optional[str] = Query(None, description="分页游标（取自上一页响应头 X-Next-Cursor），传入时忽略 skip"),
+    include_total: bool = Query(False, description="是否在响应头 X-Total-Count 中返回总数（缓存60秒）"),
     db: Session = Depends(get_db),
     current_user: dict = Depends(get_current_user)
 ):
-    """获取用户活动日志列表"""
+    """获取用户活动日志列表（按时间倒序，支持游标分页）"""
     
     query = db.query(UserActivityLog)
     
@@ -36,20 +40,28 @@ async def read_user_activity_logs(
     if action:
         query = query.filter(UserActivityLog.action == action)
     
-    return query.offset(skip).limit(limit).all()
+    try:
+        logs, next_cursor = paginate(query, [(UserActivityLog.id, True)], limit, cursor, skip)
+    except InvalidCursorError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    set_page_headers(response, next_cursor, cached_count(query) if include_total else None)
+    return logs
 
 # 获取数据变更日志列表
 @router.get("/data-changes", response_model=List[dict])
 @require_role([UserRoleEnum.admin.value])
 async def read_data_change_logs(
+    response: Response,
     skip: int = Query(0, ge=0, description="跳过的记录数"),
     limit: int = Query(100, ge=1, le=1000, description="返回的记录数"),
     table_name: Optional[str] = Query(None, description="表名"),
     operation: Optional[str] = Query(None, description="操作类型"),
+    cursor: Optional[str] = Query(None, description="分页游标（取自上一页响应头 X-Next-Cursor），传入时忽略 skip"),
+    include_total: bool = Query(False, description="是否在响应头 X-Total-Count 中返回总数（缓存60秒）"),
     db: Session = Depends(get_db),
     current_user: dict = Depends(get_current_user)
 ):
-    """获取数据变更日志列表"""
+    """获取数据变更日志列表（按时间倒序，支持游标分页）"""
     
     query = db.query(DataChangeLog)
     
@@ -58,7 +70,11 @@ async def read_data_change_logs(
     if operation:
         query = query.filter(DataChangeLog.operation == operation)
     
-    logs = query.offset(skip).limit(limit).all()
+    try:
+        logs, next_cursor = paginate(query, [(DataChangeLog.id, True)], limit, cursor, skip)
+    except InvalidCursorError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    set_page_headers(response, next_cursor, cached_count(query) if include_total else None)
     return [{
         "id": log.id,
         "table_name": log.table_name,
@@ -1,14 +1,19 @@
 # 体育教学辅助网站 - 体测数据API路由
 # 处理体测数据的HTTP请求
 
-from fastapi import APIRouter, Depends, HTTPException, Query
+import os
+import tempfile
+from fastapi import APIRouter, Depends, HTTPException, Query, Response, UploadFile, File
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse, FileResponse
+from starlette.background import BackgroundTask
 from sqlalchemy.orm import Session
 from typing import List, Optional
 from datetime import date
-from database import get_db
+from database import get_db, SessionLocal
 from auth import get_current_user, require_role
 from crud.physical_test_crud import (
-    get_physical_tests,
+    get_physical_tests_page,
     get_physical_tests_by_student,
     get_physical_tests_by_class,
     get_physical_test,
@@ -17,12 +22,27 @@ from crud.physical_test_crud import (
     delete_physical_test,
     get_physical_test_statistics,
     get_physical_test_history,
-    get_score_distribution,
-    get_grade_distribution,
-    get_grade_comparison,
-    get_gender_comparison,
-    get_item_analysis
+    iter_physical_test_history,
+    HISTORY_EXPORT_FIELDS,
+    HISTORY_EXPORT_HEADERS,
+    get_physical_test_analytics,
+    ANALYTICS_FACETS,
+    get_physical_test_rank,
+    get_cohort_top,
+    get_class_rankings,
+    batch_calculate_scores,
+    rescore_stale_scores
 )
+from crud.physical_test_summary_crud import (
+    get_physical_test_summary,
+    rebuild_physical_test_summary,
+    check_physical_test_summary
+)
+from utils.permissions import Permission, PermissionChecker
+from utils.rank_index import RANK_ITEMS
+from utils.streaming_export import iter_ndjson, iter_csv
+from utils.pagination import set_page_headers, InvalidCursorError
+from utils.physical_test_excel import import_physical_tests_from_excel, export_physical_tests_to_file
 from schemas import (
     PhysicalTestCreate,
     PhysicalTestUpdate,
@@ -31,13 +51,18 @@ from schemas import (
     PhysicalTestStatisticsResponse,
     BaseResponse
 )
-from models import UserRoleEnum
+from models import Student, UserRoleEnum
 
 router = APIRouter(
     tags=["physical-tests"],
     responses={404: {"description": "Not found"}},
 )
 
+def _is_own_record(db: Session, current_user, student_id: int) -> bool:
+    """学生用户的学生档案是否为体测记录所属学生（user_id 与学生ID不是同一个编号）"""
+    own_student_id = db.query(Student.id).filter(Student.user_id == current_user.id).scalar()
+    return own_student_id is not None and own_student_id == student_id
+
 # 获取体测统计数据
 @router.get("/statistics", response_model=PhysicalTestStatisticsResponse)
 @require_role([UserRoleEnum.admin.value, UserRoleEnum.teacher.value])
@@ -61,16 +86,281 @@ async def get_detailed_statistics(
     db: Session = Depends(get_db),
     current_user: dict = Depends(get_current_user)
 ):
-    """获取详细的统计分析数据，包括各种分布和对比数据"""
+    """获取详细的统计分析数据，包括各种分布和对比数据（一次分组查询完成）"""
     
+    analytics = get_physical_test_analytics(
+        db, ["score_band", "level", "grade", "gender", "item"], class_id, grade, school_year_id
+    )
     return {
-        "score_distribution": get_score_distribution(db, class_id, grade, school_year_id),
-        "grade_distribution": get_grade_distribution(db, class_id, grade, school_year_id),
-        "grade_comparison": get_grade_comparison(db, school_year_id),
-        "gender_comparison": get_gender_comparison(db, class_id, grade, school_year_id),
-        "item_analysis": get_item_analysis(db, class_id, grade, school_year_id)
+        "score_distribution": analytics["score_band"],
+        "grade_distribution": analytics["level"],
+        "grade_comparison": analytics["grade"],
+        "gender_comparison": analytics["gender"],
+        "item_analysis": analytics["item"]
     }
 
+# 多维分析：按需返回多个维度的统计数据
+@router.get("/analytics")
+@require_role([UserRoleEnum.admin.value, UserRoleEnum.teacher.value])
+async def get_analytics(
+    facets: List[str] = Query(list(ANALYTICS_FACETS), description="统计维度: score_band/level/grade/class/gender/item"),
+    class_id: Optional[int] = Query(None, description="班级ID"),
+    grade: Optional[str] = Query(None, description="等级(A/B/C/D)"),
+    school_year_id: Optional[int] = Query(None, description="学年ID"),
+    db: Session = Depends(get_db),
+    current_user: dict = Depends(get_current_user)
+):
+    """一次扫描计算所请求的全部统计维度"""
+    
+    invalid = [facet for facet in facets if facet not in ANALYTICS_FACETS]
+    if invalid:
+        raise HTTPException(status_code=400, detail=f"不支持的统计维度: {', '.join(invalid)}")
+    
+    try:
+        return get_physical_test_analytics(db, facets, class_id, grade, school_year_id)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"获取统计分析数据失败: {str(e)}")
+
+# 批量计算体测成绩
+@router.post("/calculate-scores")
+@require_role([UserRoleEnum.admin.value])
+async def batch_calculate_scores_api(
+    class_id: Optional[int] = Query(None, description="班级ID"),
+    school_year_id: Optional[int] = Query(None, description="学年ID"),
+    chunk_size: int = Query(1000, ge=100, le=10000, description="每批处理的记录数"),
+    include_results: bool = Query(False, description="是否返回每条记录的计算结果"),
+    db: Session = Depends(get_db),
+    current_user: dict = Depends(get_current_user)
+):
+    """按国家标准批量计算体测成绩，返回各批次耗时（在线程池中执行，不阻塞事件循环）"""
+    try:
+        result = await run_in_threadpool(batch_calculate_scores, db, class_id, school_year_id, chunk_size)
+    except Exception as e:
+        db.rollback()
+        raise HTTPException(status_code=500, detail=f"批量计算体测成绩失败: {str(e)}")
+    
+    if not include_results:
+        result.pop("results")
+    return result
+
+# 获取体测汇总数据（均值、方差、等级分布）
+@router.get("/summary")
+@require_role([UserRoleEnum.admin.value, UserRoleEnum.teacher.value])
+async def get_summary(
+    school_year_id: Optional[int] = Query(None, description="学年ID"),
+    class_id: Optional[int] = Query(None, description="班级ID"),
+    test_type: Optional[str] = Query(None, description="测试类型"),
+    gender: Optional[str] = Query(None, description="性别(male/female)"),
+    db: Session = Depends(get_db),
+    current_user: dict = Depends(get_current_user)
+):
+    """从体测汇总表读取各项目的均值、方差及总分等级分布"""
+    try:
+        return get_physical_test_summary(db, school_year_id, class_id, test_type, gender)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"获取体测汇总数据失败: {str(e)}")
+
+# 重建体测汇总表
+@router.post("/summary/rebuild")
+@require_role([UserRoleEnum.admin.value])
+async def rebuild_summary(
+    school_year_id: Optional[int] = Query(None, description="学年ID，不传则全量重建"),
+    db: Session = Depends(get_db),
+    current_user: dict = Depends(get_current_user)
+):
+    """从原始体测数据重建汇总表"""
+    try:
+        return rebuild_physical_test_summary(db, school_year_id)
+    except Exception as e:
+        db.rollback()
+        raise HTTPException(status_code=500, detail=f"重建体测汇总表失败: {str(e)}")
+
+# 校验体测汇总表
+@router.get("/summary/check")
+@require_role([UserRoleEnum.admin.value])
+async def check_summary(
+    school_year_id: Optional[int] = Query(None, description="学年ID"),
+    db: Session = Depends(get_db),
+    current_user: dict = Depends(get_current_user)
+):
+    """对比汇总表与原始体测数据"""
+    mismatches = check_physical_test_summary(db, school_year_id)
+    return {"consistent": not mismatches, "mismatches": mismatches}
+
+# 获取年级队列前N名
+@router.get("/rankings/top")
+@require_role([UserRoleEnum.admin.value, UserRoleEnum.teacher.value])
+async def get_rankings_top(
+    school_year_id: int = Query(..., description="学年ID"),
+    grade_level: int = Query(..., ge=1, le=12, description="年级"),
+    gender: str = Query(..., description="性别(male/female)"),
+    test_type: str = Query(..., description="测试类型"),
+    item: str = Query("total_score", description="项目"),
+    limit: int = Query(10, ge=1, le=500, description="返回名次数"),
+    db: Session = Depends(get_db),
+    current_user: dict = Depends(get_current_user)
+):
+    """获取同学年、同年级、同性别、同测试类型中某项目的前N名"""
+    if item not in RANK_ITEMS:
+        raise HTTPException(status_code=400, detail=f"不支持的排名项目: {item}")
+    return get_cohort_top(db, school_year_id, grade_level, gender, test_type, item, limit, user=current_user)
+
+# 获取班级学生的年级排名
+@router.get("/rankings/class/{class_id}")
+@require_role([UserRoleEnum.admin.value, UserRoleEnum.teacher.value])
+async def get_rankings_by_class(
+    class_id: int,
+    item: str = Query("total_score", description="项目"),
+    test_type: Optional[str] = Query(None, description="测试类型"),
+    db: Session = Depends(get_db),
+    current_user: dict = Depends(get_current_user)
+):
+    """列出班级学生在年级中的名次和百分位"""
+    if item not in RANK_ITEMS:
+        raise HTTPException(status_code=400, detail=f"不支持的排名项目: {item}")
+    PermissionChecker(db).require_class_access(current_user, class_id, Permission.PHYSICAL_TEST_VIEW)
+    return get_class_rankings(db, class_id, item, test_type)
+
+# 增量重算过期的体测成绩
+@router.post("/rescore-stale")
+@require_role([UserRoleEnum.admin.value])
+async def rescore_stale_scores_api(
+    class_id: Optional[int] = Query(None, description="班级ID"),
+    school_year_id: Optional[int] = Query(None, description="学年ID"),
+    chunk_size: int = Query(1000, ge=100, le=10000, description="每批处理的记录数"),
+    include_results: bool = Query(False, description="是否返回每条记录的计算结果"),
+    db: Session = Depends(get_db),
+    current_user: dict = Depends(get_current_user)
+):
+    """只重算原始成绩或评分表版本发生变化的体测记录（在线程池中执行，不阻塞事件循环）"""
+    try:
+        result = await run_in_threadpool(rescore_stale_scores, db, class_id, school_year_id, chunk_size)
+    except Exception as e:
+        db.rollback()
+        raise HTTPException(status_code=500, detail=f"增量重算体测成绩失败: {str(e)}")
+    
+    if not include_results:
+        result.pop("results")
+    return result
+
+# 从Excel批量导入体测数据
+@router.post("/import")
+@require_role([UserRoleEnum.admin.value, UserRoleEnum.teacher.value])
+async def import_physical_tests(
+    file: UploadFile = File(..., description="国家体质健康测试数据模板(.xlsx)"),
+    test_type: str = Query("国家体质健康测试", description="测试类型"),
+    chunk_size: int = Query(2000, ge=100, le=10000, description="每批校验和写入的行数"),
+    db: Session = Depends(get_db),
+    current_user: dict = Depends(get_current_user)
+):
+    """按国家体质健康测试数据模板导入体测数据，导入同时计分，返回逐行错误
+    
+    解析、校验和写入在线程池中执行，不阻塞事件循环。
+    """
+    if not (file.filename or "").lower().endswith(".xlsx"):
+        raise HTTPException(status_code=400, detail="请上传 .xlsx 格式的国家体质健康测试数据模板")
+    
+    try:
+        return await run_in_threadpool(
+            import_physical_tests_from_excel,
+            db, file.file, test_type=test_type,
+            tester_name=getattr(current_user, "real_name", None),
+            chunk_size=chunk_size
+        )
+    except ValueError as e:
+        db.rollback()
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        db.rollback()
+        raise HTTPException(status_code=500, detail=f"导入体测数据失败: {str(e)}")
+
+# 按国家体质健康测试数据格式导出Excel
+@router.get("/export/excel")
+@require_role([UserRoleEnum.admin.value, UserRoleEnum.teacher.value])
+async def export_physical_tests_excel(
+    school_year_id: Optional[int] = Query(None, description="学年ID"),
+    area: Optional[str] = Query(None, description="所属区域"),
+    school_id: Optional[int] = Query(None, description="学校ID"),
+    class_id: Optional[int] = Query(None, description="班级ID"),
+    grade: Optional[str] = Query(None, description="年级"),
+    test_type: Optional[str] = Query(None, description="测试类型"),
+    current_user: dict = Depends(get_current_user)
+):
+    """按"导出国家体质健康测试数据"格式导出整学年/区域的体测数据
+    
+    在线程池中以只写模式生成临时 xlsx 文件（不阻塞事件循环、不在内存中保留全部行），
+    生成后分块发送，发送完毕删除临时文件。
+    """
+    filters = {
+        'school_year_id': school_year_id,
+        'area': area,
+        'school_id': school_id,
+        'class_id': class_id,
+        'grade': grade,
+        'test_type': test_type
+    }
+    
+    fd, path = tempfile.mkstemp(suffix=".xlsx")
+    os.close(fd)
+    try:
+        await run_in_threadpool(export_physical_tests_to_file, filters, path, user=current_user)
+    except Exception as e:
+        os.remove(path)
+        raise HTTPException(status_code=500, detail=f"导出体测数据失败: {str(e)}")
+    
+    return FileResponse(
+        path,
+        filename="国家体质健康测试数据.xlsx",
+        media_type="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+        background=BackgroundTask(os.remove, path)
+    )
+
+# 流式导出体测历史数据
+@router.get("/history/export")
+@require_role([UserRoleEnum.admin.value, UserRoleEnum.teacher.value])
+async def export_physical_test_history(
+    format: str = Query("ndjson", pattern="^(ndjson|csv)$", description="导出格式: ndjson/csv"),
+    student_id: Optional[int] = Query(None, description="学生ID"),
+    class_id: Optional[int] = Query(None, description="班级ID"),
+    grade: Optional[str] = Query(None, description="年级"),
+    school_year_id: Optional[int] = Query(None, description="学年ID"),
+    test_type: Optional[str] = Query(None, description="测试类型"),
+    start_date: Optional[date] = Query(None, description="开始日期"),
+    end_date: Optional[date] = Query(None, description="结束日期"),
+    current_user: dict = Depends(get_current_user)
+):
+    """逐行流式导出体测历史数据（NDJSON 或 CSV），内存占用与导出行数无关"""
+    
+    filters = {
+        'student_id': student_id,
+        'class_id': class_id,
+        'grade': grade,
+        'school_year_id': school_year_id,
+        'test_type': test_type,
+        'start_date': start_date,
+        'end_date': end_date
+    }
+    
+    def generate():
+        # 响应体在处理函数返回后才开始生成，使用独立会话并在导出结束后关闭
+        db = SessionLocal()
+        try:
+            rows = iter_physical_test_history(db, filters, user=current_user)
+            if format == "csv":
+                yield from iter_csv(rows, HISTORY_EXPORT_FIELDS, HISTORY_EXPORT_HEADERS)
+            else:
+                yield from iter_ndjson(rows)
+        finally:
+            db.close()
+    
+    filename = f"physical_test_history.{format}"
+    media_type = "text/csv; charset=utf-8" if format == "csv" else "application/x-ndjson"
+    return StreamingResponse(
+        generate(),
+        media_type=media_type,
+        headers={"Content-Disposition": f"attachment; filename={filename}"}
+    )
+
 # 获取体测历史数据，支持多条件过滤
 @router.get("/history", response_model=List[dict])
 @require_role([UserRoleEnum.admin.value, UserRoleEnum.teacher.value])
@@ -107,28 +397,37 @@ async def get_physical_test_history_api(
         filters['end_date'] = end_date
     
     # 获取体测历史数据
-    history_data = get_physical_test_history(db, filters, skip, limit)
+    history_data = get_physical_test_history(db, filters, skip, limit, user=current_user)
     return history_data
 
 # 获取体测记录列表
 @router.get("/", response_model=List[dict])
 @require_role([UserRoleEnum.admin.value, UserRoleEnum.teacher.value])
 async def read_physical_tests(
+    response: Response,
     skip: int = Query(0, ge=0, description="跳过的记录数"),
     limit: int = Query(100, ge=1, le=1000, description="返回的记录数"),
     student_id: Optional[int] = Query(None, description="学生ID"),
     class_id: Optional[int] = Query(None, description="班级ID"),
+    cursor: Optional[str] = Query(None, description="分页游标（取自上一页响应头 X-Next-Cursor），传入时忽略 skip"),
+    include_total: bool = Query(False, description="是否在响应头 X-Total-Count 中返回总数（缓存60秒）"),
     db: Session = Depends(get_db),
     current_user: dict = Depends(get_current_user)
 ):
-    """获取体测记录列表，可以按学生ID或班级ID过滤"""
+    """获取体测记录列表，可以按学生ID或班级ID过滤；不过滤时按测试日期倒序游标分页"""
     
+    # 教师只能看到自己班级的记录，在查询中过滤
     if student_id:
-        return get_physical_tests_by_student(db, student_id)
+        return get_physical_tests_by_student(db, student_id, user=current_user)
     elif class_id:
-        return get_physical_tests_by_class(db, class_id)
-    else:
-        return get_physical_tests(db, skip=skip, limit=limit)
+        return get_physical_tests_by_class(db, class_id, user=current_user)
+    
+    try:
+        tests, next_cursor, total = get_physical_tests_page(db, limit, cursor, skip, include_total, user=current_user)
+    except InvalidCursorError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    set_page_headers(response, next_cursor, total)
+    return tests
 
 # 获取单个体测记录
 @router.get("/{physical_test_id}", response_model=dict)
@@ -145,11 +444,35 @@ async def read_physical_test(
         raise HTTPException(status_code=404, detail="体测记录不存在")
     
     # 学生只能查看自己的体测记录
-    if current_user["role"] == UserRoleEnum.student and current_user["id"] != db_physical_test["student_id"]:
+    if current_user.role == UserRoleEnum.student and not _is_own_record(db, current_user, db_physical_test["student_id"]):
         raise HTTPException(status_code=403, detail="没有权限查看此体测记录")
     
     return db_physical_test
 
+# 获取体测记录的年级排名
+@router.get("/{physical_test_id}/rank", response_model=dict)
+@require_role([UserRoleEnum.admin.value, UserRoleEnum.teacher.value, UserRoleEnum.student.value])
+async def read_physical_test_rank(
+    physical_test_id: int,
+    items: List[str] = Query(["total_score"], description="项目列表"),
+    db: Session = Depends(get_db),
+    current_user: dict = Depends(get_current_user)
+):
+    """获取体测记录各项目在同年级同性别中的名次和百分位"""
+    invalid = [item for item in items if item not in RANK_ITEMS]
+    if invalid:
+        raise HTTPException(status_code=400, detail=f"不支持的排名项目: {', '.join(invalid)}")
+    
+    rank = get_physical_test_rank(db, physical_test_id, items)
+    if rank is None:
+        raise HTTPException(status_code=404, detail="体测记录不存在")
+    
+    # 学生只能查看自己的体测排名
+    if current_user.role == UserRoleEnum.student and not _is_own_record(db, current_user, rank["student_id"]):
+        raise HTTPException(status_code=403, detail="没有权限查看此体测记录")
+    
+    return rank
+
 # 创建体测记录
 @router.post("/", response_model=dict)
 @require_role([UserRoleEnum.admin.value, UserRoleEnum.teacher.value])
@@ -251,11 +251,34 @@ async def complete_school_year(
             detail=f"结束学年失败: {str(e)}"
         )
 
+# 学年升级预览 - 只读计算升级计划
+@router.get("/{school_year_id}/promote/preview")
+@require_permissions([PermissionType.USER_MANAGE])
+async def preview_school_year_promotion(
+    school_year_id: int,
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    学年升级预览 - 返回各年级的班级、学生数、新班级名称和断点进度，
+    以及会阻止升级的错误（errors）和需要注意的问题（warnings），不修改数据
+    """
+    try:
+        return school_year_crud.preview_promotion(db, school_year_id)
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail=str(e))
+    except Exception as e:
+        raise HTTPException(
+            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
+            detail=f"获取学年升级预览失败: {str(e)}"
+        )
+
 # 学年升级 - 升级班级名称和学生年级
 @router.post("/{school_year_id}/promote")
 @require_permissions([PermissionType.USER_MANAGE])
 async def promote_school_year(
     school_year_id: int,
+    dry_run: bool = Query(False, description="只返回升级计划（同升级预览），不写入"),
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
@@ -266,6 +289,9 @@ async def promote_school_year(
     - 一年级 -> 二年级 (grade_level: 1 -> 2)
     - 六年级 -> 七年级 (grade_level: 6 -> 7, 小升初)
     - 九年级学生 -> 标记为毕业
+    
+    按年级分批提交并记录断点，失败后再次调用从未完成的年级继续。
+    dry_run=true 时返回升级计划，不修改数据
     """
     try:
         # 检查学年是否存在
@@ -277,20 +303,27 @@ async def promote_school_year(
             )
         
         # 调用升级逻辑
-        result = school_year_crud.promote_grades(db, school_year_id)
+        result = school_year_crud.promote_grades(db, school_year_id, dry_run=dry_run)
+        if dry_run:
+            return {"message": "学年升级预览", **result}
         
         return {
             "message": "学年升级成功",
+            "dry_run": False,
+            "resumed": result.get("resumed", False),
+            "new_school_year": result.get("new_school_year"),
             "promoted_classes": result.get("promoted_classes", 0),
             "promoted_students": result.get("promoted_students", 0),
             "graduated_students": result.get("graduated_students", 0)
         }
     except HTTPException:
         raise
+    except ValueError as e:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=str(e))
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=f"学年升级失败: {str(e)}"
+            detail=f"学年升级失败（已完成的年级已保存，可再次执行继续）: {str(e)}"
         )
 
 
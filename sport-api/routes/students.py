@@ -11,8 +11,11 @@ from schemas import (
     StudentListResponse, StudentQueryParams, BaseResponse, ErrorResponse,
     ClassResponse, SchoolResponse
 )
-from models import GenderEnum, StatusEnum, SportsLevelEnum, User
+from models import GenderEnum, StatusEnum, SportsLevelEnum, User, UserRoleEnum
 from auth import get_current_user
+from utils.pagination import InvalidCursorError
+from utils.permissions import PermissionChecker
+from utils.student_search import get_student_search_index
 import models
 
 # 创建路由器
@@ -28,11 +31,12 @@ async def get_students(
     gender: Optional[str] = Query(None, description="性别"),
     status: Optional[str] = Query(None, description="状态"),
     include_class: bool = Query(True, description="是否包含班级信息"),
+    cursor: Optional[str] = Query(None, description="分页游标（取自上一页的 next_cursor），传入时忽略页码，总数使用60秒缓存"),
     db: Session = Depends(get_db),
     current_user: User = Depends(get_current_user)
 ):
     """
-    获取学生列表，支持分页、搜索和多条件过滤
+    获取学生列表，支持分页、游标分页、搜索和多条件过滤
     """
     try:
         # 构建查询参数
@@ -46,8 +50,10 @@ async def get_students(
             status=status
         )
         
-        # 使用包含班级信息的方法
-        students, total = student_crud.get_students_with_class(db, params)
+        # 使用包含班级信息的方法，只返回当前用户可见的学生
+        students, total, next_cursor = student_crud.get_students_page(
+            db, params, cursor=cursor, cached_total=bool(cursor), user=current_user
+        )
         
         # 计算分页信息
         total_pages = (total + page_size - 1) // page_size
@@ -57,12 +63,35 @@ async def get_students(
             page=page,
             page_size=page_size,
             total_pages=total_pages,
-            items=students  # 已经是字典列表
+            items=students,  # 已经是字典列表
+            next_cursor=next_cursor
         )
         
+    except InvalidCursorError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"获取学生列表失败: {str(e)}")
 
+@router.get("/search", response_model=List[dict])
+async def search_students(
+    q: str = Query(..., min_length=1, max_length=50, description="姓名、拼音、拼音首字母、学籍号或身份证号（含后几位）"),
+    limit: int = Query(10, ge=1, le=50, description="返回的记录数"),
+    db: Session = Depends(get_db),
+    current_user: User = Depends(get_current_user)
+):
+    """
+    搜索框联想：基于进程内搜索索引，不扫描学生表
+    
+    只返回当前用户可见的学生（与学生列表一致）；按身份证号后几位搜索仅限管理员。
+    """
+    try:
+        if current_user.role == UserRoleEnum.admin:
+            return get_student_search_index().search(db, q, limit)
+        visible = PermissionChecker(db).get_snapshot(current_user).student_ids
+        return get_student_search_index().search(db, q, limit, student_ids=visible, allow_id_suffix=False)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"搜索学生失败: {str(e)}")
+
 @router.get("/{student_id}", response_model=StudentDetailResponse)
 async def get_student(student_id: int, db: Session = Depends(get_db), current_user: User = Depends(get_current_user)):
     """
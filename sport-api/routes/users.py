@@ -14,6 +14,7 @@ from auth import (
     PermissionType,
 )
 from models import User
+from utils.password_pool import get_password_pool
 
 router = APIRouter(tags=["users"])
 
@@ -82,8 +83,7 @@ async def create_user(
         # 将UserCreate对象转换为字典
         user_dict = user_data.dict()
         # 生成密码哈希
-        from auth import AuthService
-        hashed_password = AuthService.get_password_hash(user_dict['password'])
+        hashed_password = await get_password_pool().hash_password(user_dict['password'])
         user_dict['hashed_password'] = hashed_password
         # 删除明文密码
         del user_dict['password']
@@ -154,14 +154,15 @@ async def change_password(
         
         # 如果不是管理员，需要验证当前密码
         if current_user.id == user_id:
-            if not AuthService.verify_password(password_data.current_password, current_user.hashed_password):
+            if not await get_password_pool().verify_password(password_data.current_password, current_user.hashed_password):
                 raise HTTPException(
                     status_code=status.HTTP_400_BAD_REQUEST,
                     detail="当前密码错误"
                 )
         
         # 更新密码
-        success = user_crud.update_user_password(db, user_id=user_id, new_password=password_data.new_password)
+        new_hashed_password = await get_password_pool().hash_password(password_data.new_password)
+        success = user_crud.update_user_password(db, user_id=user_id, new_password=new_hashed_password, hashed=True)
         if not success:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
@@ -246,14 +247,15 @@ async def change_current_password(
     """修改当前用户密码"""
     try:
         # 验证当前密码
-        if not AuthService.verify_password(password_data.current_password, current_user.hashed_password):
+        if not await get_password_pool().verify_password(password_data.current_password, current_user.hashed_password):
             raise HTTPException(
                 status_code=status.HTTP_400_BAD_REQUEST,
                 detail="当前密码错误"
             )
         
         # 更新密码
-        success = user_crud.update_user_password(db, user_id=current_user.id, new_password=password_data.new_password)
+        new_hashed_password = await get_password_pool().hash_password(password_data.new_password)
+        success = user_crud.update_user_password(db, user_id=current_user.id, new_password=new_hashed_password, hashed=True)
         if not success:
             raise HTTPException(
                 status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -561,6 +561,7 @@ class StudentQueryParams(PaginationParams):
 class StudentListResponse(PaginatedResponse):
     """学生列表响应"""
     items: List[dict]  # 使用 dict 以支持包含班级信息的返回
+    next_cursor: Optional[str] = None  # 下一页游标，没有下一页时为空
 
 # 更新前向引用
 StudentDetailResponse.model_rebuild()
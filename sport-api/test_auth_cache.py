@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+# 测试认证缓存：令牌撤销状态和当前用户快照（内存SQLite）
+import time
+from datetime import datetime, timedelta, timezone
+
+from fastapi import HTTPException
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from auth import AuthService
+from crud import token_crud, user_crud
+from models import Base, StatusEnum, Token, User, UserRoleEnum
+from utils.auth_cache import get_auth_cache
+from test_student_list_queries import count_statements
+
+
+def create_session():
+    """创建内存数据库和一个教师用户"""
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine)
+    db = sessionmaker(bind=engine)()
+    db.add(User(username="teacher1", real_name="教师1", role=UserRoleEnum.teacher, hashed_password="x"))
+    db.commit()
+    get_auth_cache().clear()
+    return db
+
+
+def login(db, user_id=1, expires_delta=None):
+    """签发访问令牌并登记到令牌表"""
+    token = AuthService.create_access_token({"sub": str(user_id)}, expires_delta)
+    token_crud.create_token(db, {
+        "user_id": user_id, "access_token": token,
+        "expires_at": datetime.now(timezone.utc) + timedelta(minutes=30)
+    })
+    return token
+
+
+def assert_unauthorized(db, token, detail):
+    try:
+        AuthService.get_current_user(token, db)
+    except HTTPException as e:
+        assert e.status_code == 401 and e.detail == detail, e.detail
+    else:
+        raise AssertionError("应当返回401")
+
+
+def test_cache_hit_skips_database():
+    """第二次认证命中缓存，不查询数据库，返回的用户信息一致"""
+    db = create_session()
+    token = login(db)
+    with count_statements(db) as statements:
+        user = AuthService.get_current_user(token, db)
+    assert user.username == "teacher1" and len(statements) == 2
+    with count_statements(db) as statements:
+        cached = AuthService.get_current_user(token, db)
+    assert statements == []
+    assert (cached.id, cached.username, cached.role, cached.hashed_password) == (1, "teacher1", UserRoleEnum.teacher, "x")
+
+
+def test_logout_and_revoke_all_take_effect_immediately():
+    """登出和撤销全部令牌后，缓存中的令牌立即失效"""
+    db = create_session()
+    first, second = login(db), login(db, expires_delta=timedelta(minutes=5))
+    AuthService.get_current_user(first, db)
+    AuthService.get_current_user(second, db)
+
+    assert token_crud.revoke_token(db, first)
+    assert_unauthorized(db, first, "令牌已被撤销")
+    AuthService.get_current_user(second, db)
+
+    assert token_crud.revoke_all_tokens(db, 1)
+    assert_unauthorized(db, second, "令牌已被撤销")
+    # 未登记的令牌视为已撤销，结果同样被缓存
+    unknown = AuthService.create_access_token({"sub": "1"})
+    assert_unauthorized(db, unknown, "令牌已被撤销")
+    with count_statements(db) as statements:
+        assert_unauthorized(db, unknown, "令牌已被撤销")
+    assert statements == []
+
+
+def test_user_changes_refresh_snapshot():
+    """修改角色、状态、密码、删除用户后重新加载用户"""
+    db = create_session()
+    token = login(db)
+    assert AuthService.get_current_user(token, db).role == UserRoleEnum.teacher
+
+    user_crud.update_user_role(db, 1, UserRoleEnum.admin)
+    assert AuthService.get_current_user(token, db).role == UserRoleEnum.admin
+    user_crud.update_user_status(db, 1, StatusEnum.inactive)
+    assert AuthService.get_current_user(token, db).status == StatusEnum.inactive
+    user_crud.update_user(db, 1, {"real_name": "新名字"})
+    assert AuthService.get_current_user(token, db).real_name == "新名字"
+
+    db.query(Token).delete()
+    db.commit()
+    user_crud.delete_user(db, 1)
+    assert_unauthorized(db, token, "用户不存在")
+
+
+def test_expired_token_rejected():
+    """缓存条目不超过令牌本身的过期时间"""
+    db = create_session()
+    token = login(db, expires_delta=timedelta(seconds=1))
+    AuthService.get_current_user(token, db)
+    # JWT 按整秒判断过期
+    time.sleep(2.1)
+    assert_unauthorized(db, token, "无效的令牌")
+
+
+def test_cached_overhead():
+    """命中缓存时每次认证的开销在微秒级"""
+    db = create_session()
+    token = login(db)
+    AuthService.get_current_user(token, db)
+    rounds = 2000
+    started = time.perf_counter()
+    for _ in range(rounds):
+        AuthService.get_current_user(token, db)
+    per_request = (time.perf_counter() - started) / rounds
+    print(f"命中缓存每次认证 {per_request * 1e6:.1f}μs")
+    assert per_request < 0.001
+    stats = get_auth_cache().get_stats()
+    assert stats["tokens"] == 1 and stats["users"] == 1
+
+
+if __name__ == "__main__":
+    test_cache_hit_skips_database()
+    print("✅ PASS test_cache_hit_skips_database")
+    test_logout_and_revoke_all_take_effect_immediately()
+    print("✅ PASS test_logout_and_revoke_all_take_effect_immediately")
+    test_user_changes_refresh_snapshot()
+    print("✅ PASS test_user_changes_refresh_snapshot")
+    test_expired_token_rejected()
+    print("✅ PASS test_expired_token_rejected")
+    test_cached_overhead()
+    print("✅ PASS test_cached_overhead")
@@ -0,0 +1,138 @@
+#!/usr/bin/env python3
+# 测试体测成绩批量向量化计算（内存SQLite）
+import random
+import time
+from datetime import date
+
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from database import Base
+from models import SchoolYear, Class, Student, PhysicalTest, GenderEnum
+from crud.physical_test_crud import (
+    batch_calculate_scores, calculate_physical_test_score, rescore_stale_scores, update_physical_test
+)
+from schemas import PhysicalTestUpdate
+from utils.score_standards import get_score_engine
+
+
+def create_session(student_count=200, seed=7, url="sqlite://", **engine_options):
+    """创建数据库（默认内存数据库）并生成模拟体测数据"""
+    engine = create_engine(url, **engine_options)
+    Base.metadata.create_all(engine)
+    db = sessionmaker(bind=engine)()
+    rng = random.Random(seed)
+
+    school_year = SchoolYear(
+        year_name="2025-2026学年", academic_year="2025-2026",
+        start_date=date(2025, 9, 1), end_date=date(2026, 7, 31)
+    )
+    db.add(school_year)
+    db.flush()
+    classes = []
+    for grade_level in range(1, 13):
+        class_obj = Class(
+            class_name=f"{grade_level}年级1班", grade=f"{grade_level}年级", grade_level=grade_level,
+            school_year_id=school_year.id, start_date=date(2025, 9, 1)
+        )
+        db.add(class_obj)
+        classes.append(class_obj)
+    db.flush()
+
+    for index in range(student_count):
+        class_obj = classes[index % len(classes)]
+        student = Student(
+            student_no=f"S{index:05d}", real_name=f"学生{index}",
+            gender=GenderEnum.male if index % 2 else GenderEnum.female,
+            birth_date=date(2012, 1, 1), enrollment_date=date(2020, 9, 1)
+        )
+        db.add(student)
+        db.flush()
+        db.add(PhysicalTest(
+            student_id=student.id, class_id=class_obj.id, test_date=date(2026, 5, 1), test_type="期末测试",
+            height=rng.uniform(110, 180), weight=rng.uniform(18, 75),
+            vital_capacity=rng.randint(600, 5000), run_50m=rng.uniform(6.5, 13),
+            run_800m=rng.randint(180, 330), run_1000m=rng.randint(190, 360),
+            sit_and_reach=rng.uniform(-5, 25), standing_long_jump=rng.randint(120, 270),
+            pull_up=rng.randint(0, 20), skip_rope=rng.randint(20, 200), sit_ups=rng.randint(5, 60),
+            run_50m_8=rng.randint(90, 150) if index % 5 else None,
+        ))
+    db.commit()
+    return db
+
+
+def test_batch_matches_single_row_scoring():
+    """批量结果与逐条计算结果一致"""
+    db = create_session()
+    batch = batch_calculate_scores(db, chunk_size=64)
+    assert batch["total"] == 200
+    assert len(batch["timings"]["chunks"]) == 4
+
+    for item in batch["results"]:
+        single = calculate_physical_test_score(db, item["test_id"])
+        assert single["total_score"] == item["total_score"], item
+        assert single["grade"] == item["grade"], item
+
+    stored = db.query(PhysicalTest).filter(PhysicalTest.total_score.is_(None)).count()
+    assert stored == 0
+
+
+def test_rescore_stale_only_touches_changed_rows():
+    """增量重算只处理原始成绩或评分表版本变化的记录"""
+    db = create_session()
+    first = rescore_stale_scores(db)
+    assert first["stale"] == 200
+
+    assert rescore_stale_scores(db)["stale"] == 0
+
+    update_physical_test(db, 5, PhysicalTestUpdate(run_50m=7.1))
+    update_physical_test(db, 9, PhysicalTestUpdate(tester_name="张老师"))
+    second = rescore_stale_scores(db)
+    assert second["stale"] == 1
+    assert second["results"][0]["test_id"] == 5
+
+    # 计分时评分表版本与当前不同的记录需要重算
+    db.query(PhysicalTest).filter(PhysicalTest.id <= 3).update({"score_version": "old"})
+    db.commit()
+    assert rescore_stale_scores(db)["stale"] == 3
+    assert db.query(PhysicalTest).filter(PhysicalTest.score_version != get_score_engine().version).count() == 0
+
+
+def test_rescore_stale_skips_rows_without_score_table():
+    """没有评分表的记录单独计入 skipped，不会每次都被重新选出"""
+    db = create_session(student_count=60)
+    db.query(Class).filter(Class.id == 1).update({"grade_level": 0})
+    db.commit()
+    first = rescore_stale_scores(db)
+    assert (first["stale"], first["total"], first["skipped"]) == (55, 55, 5)
+    second = rescore_stale_scores(db)
+    assert (second["stale"], second["total"], second["skipped"]) == (0, 0, 5)
+
+    # 补全年级后这些记录进入重算
+    db.query(Class).filter(Class.id == 1).update({"grade_level": 1})
+    db.commit()
+    third = rescore_stale_scores(db)
+    assert (third["stale"], third["skipped"]) == (5, 0)
+    assert rescore_stale_scores(db)["stale"] == 0
+
+
+def test_batch_scoring_benchmark():
+    """2000条记录批量计算应在数秒内完成"""
+    db = create_session(student_count=2000)
+    started = time.perf_counter()
+    batch = batch_calculate_scores(db)
+    elapsed = time.perf_counter() - started
+    print(f"批量计算 {batch['total']} 条记录耗时 {elapsed:.3f}s, 分块耗时: {batch['timings']['chunks']}")
+    assert batch["total"] == 2000
+    assert elapsed < 5
+
+
+if __name__ == "__main__":
+    test_batch_matches_single_row_scoring()
+    print("✅ PASS test_batch_matches_single_row_scoring")
+    test_rescore_stale_only_touches_changed_rows()
+    print("✅ PASS test_rescore_stale_only_touches_changed_rows")
+    test_rescore_stale_skips_rows_without_score_table()
+    print("✅ PASS test_rescore_stale_skips_rows_without_score_table")
+    test_batch_scoring_benchmark()
+    print("✅ PASS test_batch_scoring_benchmark")
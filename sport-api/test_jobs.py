@@ -0,0 +1,198 @@
+#!/usr/bin/env python3
+# 测试后台任务子系统（文件SQLite，工作进程通过 DATABASE_URL 连接同一数据库）
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import create_engine
+
+import database
+from config import settings
+from models import Class, Job, JobStatusEnum, PhysicalTest, User, UserRoleEnum
+from utils.jobs import JobManager, JobContext, JobCancelled, fail_orphaned_jobs
+from utils.query_scope import scope_params
+from test_batch_scoring import create_session
+
+
+@pytest.fixture
+def job_env():
+    """临时文件数据库 + 结果目录，父进程会话和工作进程都连接到它"""
+    workdir = tempfile.mkdtemp()
+    url = f"sqlite:///{os.path.join(workdir, 'jobs.db')}"
+    db = create_session(student_count=120, url=url)
+    old_url = os.environ.get("DATABASE_URL")
+    old_result_dir = settings.job_result_dir
+    os.environ["DATABASE_URL"] = url
+    os.environ["job_result_dir"] = workdir
+    settings.job_result_dir = workdir
+    database.SessionLocal.configure(bind=create_engine(url))
+    manager = JobManager(max_workers=1)
+    yield db, manager
+    manager.shutdown(wait=True)
+    db.close()
+    database.SessionLocal.configure(bind=database.engine)
+    settings.job_result_dir = old_result_dir
+    os.environ.pop("job_result_dir")
+    if old_url is None:
+        os.environ.pop("DATABASE_URL")
+    else:
+        os.environ["DATABASE_URL"] = old_url
+
+
+def finished(db, manager, job):
+    """等待任务结束并重新读取任务记录"""
+    manager.wait(job.id, timeout=120)
+    db.expire_all()
+    return db.get(Job, job.id)
+
+
+def test_score_year_and_export_jobs(job_env):
+    """计分、导出任务在工作进程中完成，记录进度、结果和结果文件"""
+    db, manager = job_env
+    job = finished(db, manager, manager.submit(db, "score_year", {"school_year_id": 1, "chunk_size": 50}))
+    assert job.status == JobStatusEnum.completed, job.error
+    assert job.progress == 100 and job.result["total"] == 120
+    assert db.query(PhysicalTest).filter(PhysicalTest.total_score.is_(None)).count() == 0
+
+    job = finished(db, manager, manager.submit(db, "export_physical_tests", {"filters": {"school_year_id": 1}}))
+    assert job.status == JobStatusEnum.completed, job.error
+    assert job.result == {"rows": 120} and os.path.exists(job.result_file)
+
+
+def test_export_job_is_limited_to_submitter_scope(job_env):
+    """教师提交的导出任务只包含自己班级的记录"""
+    db, manager = job_env
+    db.query(Class).filter(Class.id == 1).update({"class_teacher_id": 99})
+    db.commit()
+    teacher = User(id=99, username="teacher99", role=UserRoleEnum.teacher, hashed_password="x")
+    job = finished(db, manager, manager.submit(db, "export_physical_tests", {
+        "filters": {"school_year_id": 1}, "scope": scope_params(teacher)
+    }))
+    assert job.status == JobStatusEnum.completed, job.error
+    assert job.result == {"rows": 10}
+
+
+def test_failed_and_cancelled_jobs(job_env):
+    """处理函数出错时任务失败并记录错误；排队中的任务可取消"""
+    db, manager = job_env
+    failed = manager.submit(db, "import_physical_tests", {"path": "/nonexistent.xlsx"})
+    queued = [manager.submit(db, "consistency_check", {}) for _ in range(3)]
+    cancelled = manager.cancel(db, queued[-1])
+    assert cancelled.cancel_requested
+
+    assert finished(db, manager, failed).status == JobStatusEnum.failed
+    assert "nonexistent" in db.get(Job, failed.id).error
+    assert finished(db, manager, queued[0]).status == JobStatusEnum.completed
+    manager.wait(queued[1].id, timeout=120)
+    assert finished(db, manager, queued[-1]).status == JobStatusEnum.cancelled
+
+    with pytest.raises(ValueError):
+        manager.submit(db, "unknown", {})
+
+
+def test_shutdown_marks_queued_jobs_cancelled(job_env):
+    """关闭进程池时取消的排队任务标记为已取消，不会一直停在排队中"""
+    db, manager = job_env
+    jobs = [manager.submit(db, "consistency_check", {}) for _ in range(6)]
+    manager.shutdown(wait=True)
+    db.expire_all()
+    statuses = [db.get(Job, job.id).status for job in jobs]
+    assert JobStatusEnum.pending not in statuses and JobStatusEnum.running not in statuses
+    assert statuses[-1] == JobStatusEnum.cancelled and statuses[0] == JobStatusEnum.completed
+
+
+def test_job_files_are_cleaned_up(job_env):
+    """导入任务结束（包括排队中被取消）后删除上传文件；清理令牌任务删除过期的结果文件"""
+    db, manager = job_env
+    upload_dir = os.path.join(settings.job_result_dir, "uploads")
+    os.makedirs(upload_dir, exist_ok=True)
+    uploads = []
+    for name in ("bad.xlsx", "queued.xlsx"):
+        uploads.append(os.path.join(upload_dir, name))
+        with open(uploads[-1], "wb") as file:
+            file.write(b"not a workbook")
+    failed = manager.submit(db, "import_physical_tests", {"path": uploads[0]})
+    blocker = manager.submit(db, "consistency_check", {})
+    queued = manager.submit(db, "import_physical_tests", {"path": uploads[1]})
+    manager.cancel(db, queued)
+    assert finished(db, manager, failed).status == JobStatusEnum.failed
+    manager.wait(blocker.id, timeout=120)
+    assert finished(db, manager, queued).status == JobStatusEnum.cancelled
+    assert not any(os.path.exists(path) for path in uploads)
+
+    export = finished(db, manager, manager.submit(db, "export_physical_tests", {}))
+    leftover = os.path.join(upload_dir, "leftover.xlsx")
+    open(leftover, "wb").close()
+    in_use = os.path.join(upload_dir, "in_use.xlsx")
+    open(in_use, "wb").close()
+    db.add(Job(job_type="import_physical_tests", params={"path": in_use}, status=JobStatusEnum.pending,
+               owner=manager.owner, heartbeat_at=datetime.now()))
+    db.commit()
+    expired = time.time() - (settings.job_result_retention_days + 1) * 86400
+    for path in (export.result_file, leftover, in_use):
+        os.utime(path, (expired, expired))
+
+    job = finished(db, manager, manager.submit(db, "clean_expired_tokens", {}))
+    assert job.status == JobStatusEnum.completed, job.error
+    assert job.result["deleted_files"] == 2
+    assert not os.path.exists(export.result_file) and not os.path.exists(leftover) and os.path.exists(in_use)
+    assert os.path.exists(os.path.join(settings.job_result_dir, "jobs.db"))
+
+
+def test_orphaned_jobs_failed_on_startup(job_env):
+    """只把所属服务进程已退出的未完成任务标记为失败，其他服务进程的任务和已结束的任务不变"""
+    db, manager = job_env
+    exited = subprocess.Popen([sys.executable, "-c", "pass"])
+    exited.wait()
+    now = datetime.now()
+    stale = now - timedelta(seconds=settings.job_heartbeat_timeout + 60)
+    rows = [
+        (JobStatusEnum.pending, None, None),                                      # 旧版本遗留，无所属进程
+        (JobStatusEnum.running, "other-host:1:abcd", stale),                      # 心跳超时
+        (JobStatusEnum.running, f"{socket.gethostname()}:{exited.pid}:abcd", now),  # 同一主机上进程已退出
+        (JobStatusEnum.running, "other-host:1:abcd", now),                        # 其他服务进程仍在运行
+        (JobStatusEnum.pending, manager.owner, now),                              # 本进程
+        (JobStatusEnum.completed, None, None),
+    ]
+    jobs = [Job(job_type="score_year", params={}, status=status, owner=owner, heartbeat_at=heartbeat_at)
+            for status, owner, heartbeat_at in rows]
+    db.add_all(jobs)
+    db.commit()
+    assert fail_orphaned_jobs() == 3
+    db.expire_all()
+    assert [job.status for job in jobs] == [JobStatusEnum.failed] * 3 + [
+        JobStatusEnum.running, JobStatusEnum.pending, JobStatusEnum.completed]
+    assert jobs[0].finished_at is not None and jobs[5].error is None
+
+    # 心跳只更新本进程的任务
+    jobs[4].heartbeat_at = stale
+    db.commit()
+    assert manager.heartbeat() == 1
+    db.expire_all()
+    assert jobs[4].heartbeat_at > stale and jobs[3].heartbeat_at == now
+    assert fail_orphaned_jobs() == 0
+
+
+def test_running_job_sees_cancel_request(job_env):
+    """执行中的任务在汇报进度时发现取消请求"""
+    db, manager = job_env
+    job = Job(job_type="score_year", params={}, status=JobStatusEnum.running)
+    db.add(job)
+    db.commit()
+    context = JobContext(job.id)
+    context.update_progress(10, "处理中", force=True)
+
+    job.cancel_requested = True
+    db.commit()
+    with pytest.raises(JobCancelled):
+        context.update_progress(20, force=True)
+    context.close()
+
+
+if __name__ == "__main__":
+    pytest.main([__file__, "-q"])
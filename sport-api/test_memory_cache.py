@@ -0,0 +1,137 @@
+#!/usr/bin/env python3
+# 测试内存缓存：O(1) LRU 淘汰、TinyLFU 准入、按字节限制，并与原实现对比性能
+import time
+from datetime import datetime
+
+from utils.cache import MemoryCache, POLICY_TINYLFU, estimate_size
+
+
+class LegacyMemoryCache:
+    """原实现：写满后每次写入都全表扫描找最早创建的条目"""
+
+    def __init__(self, max_size=1000):
+        self.cache = {}
+        self.max_size = max_size
+
+    def get(self, key):
+        entry = self.cache.get(key)
+        if entry is None:
+            return None
+        value, created_at, ttl = entry
+        if (datetime.now() - created_at).total_seconds() > ttl:
+            del self.cache[key]
+            return None
+        return value
+
+    def set(self, key, value, ttl=300):
+        if len(self.cache) >= self.max_size:
+            oldest_key = min(self.cache.keys(), key=lambda k: self.cache[k][1])
+            del self.cache[oldest_key]
+        self.cache[key] = (value, datetime.now(), ttl)
+
+
+def run_workload(cache, operations=20000):
+    """写满后的读写混合负载：热点 200 个键反复读取，其余为一次性写入"""
+    started = time.perf_counter()
+    for index in range(operations):
+        hot = f"hot:{index % 200}"
+        if cache.get(hot) is None:
+            cache.set(hot, index)
+        cache.set(f"scan:{index}", index)
+    return time.perf_counter() - started
+
+
+def test_lru_evicts_least_recently_used():
+    """淘汰最久未使用（而不是最早创建）的条目"""
+    cache = MemoryCache(max_size=3)
+    for key in "abc":
+        cache.set(key, key)
+    assert cache.get("a") == "a"
+    cache.set("d", "d")
+    assert cache.get("b") is None
+    assert [cache.get(key) for key in "acd"] == ["a", "c", "d"]
+    # 覆盖已有键不淘汰其他条目
+    cache.set("a", "A")
+    assert list(cache.cache) == ["c", "d", "a"] and cache.get_stats()["evictions"] == 1
+
+    cache.set("e", "e", ttl=-1)
+    assert cache.get("e") is None and cache.cleanup_expired() == 0
+    assert cache.get_stats()["size"] == 2
+
+
+def test_tinylfu_keeps_hot_entries_under_scan():
+    """一次性的扫描写入不会冲掉被反复访问的热点条目"""
+    lru = MemoryCache(max_size=100)
+    tinylfu = MemoryCache(max_size=100, policy=POLICY_TINYLFU)
+    for cache in (lru, tinylfu):
+        for round_ in range(5):
+            for index in range(50):
+                if cache.get(f"hot:{index}") is None:
+                    cache.set(f"hot:{index}", index)
+        for index in range(1000):
+            cache.set(f"scan:{index}", index)
+    lru_hot = sum(lru.get(f"hot:{index}") is not None for index in range(50))
+    tinylfu_hot = sum(tinylfu.get(f"hot:{index}") is not None for index in range(50))
+    assert lru_hot == 0 and tinylfu_hot == 50
+    assert tinylfu.get_stats()["rejections"] > 0
+
+
+def test_tinylfu_does_not_reject_in_favour_of_expired_entries():
+    """待淘汰的条目已过期时直接移除，新条目不会因频率比较被拒绝"""
+    cache = MemoryCache(max_size=2, policy=POLICY_TINYLFU)
+    for _ in range(5):
+        cache.get("a")
+        cache.get("b")
+    cache.set("a", 1, ttl=-1)
+    cache.set("b", 2)
+    cache.set("c", 3)
+    assert cache.get("c") == 3 and cache.get("b") == 2
+    stats = cache.get_stats()
+    assert (stats["rejections"], stats["evictions"], stats["size"]) == (0, 0, 2)
+
+    # 未过期时仍按频率拒绝
+    cache.set("d", 4)
+    assert cache.get("d") is None and cache.get_stats()["rejections"] == 1
+
+
+def test_byte_bounded_mode():
+    """按估算字节数限制总内存，超过上限时淘汰最久未使用的条目"""
+    row = {"id": 1, "real_name": "学生1", "scores": [90.5, 88.0, 76.5]}
+    row_size = estimate_size(row)
+    assert row_size > estimate_size({})
+    cache = MemoryCache(max_size=1000, max_bytes=row_size * 10)
+    for index in range(25):
+        cache.set(str(index), dict(row, id=index))
+    stats = cache.get_stats()
+    assert stats["size"] == 10 and stats["bytes"] <= row_size * 10
+    assert cache.get("14") is None and cache.get("24")["id"] == 24
+
+    # 单个条目超过上限时不写入
+    cache.set("big", [row] * 100)
+    assert cache.get("big") is None and cache.get_stats()["rejections"] == 1
+    cache.delete("24")
+    cache.clear()
+    assert cache.get_stats()["bytes"] == 0
+
+
+def test_faster_than_legacy_when_full():
+    """1000 条目写满后的读写负载：新实现明显快于原来每次写入全表扫描的实现"""
+    legacy_time = run_workload(LegacyMemoryCache(max_size=1000), operations=5000)
+    lru_time = run_workload(MemoryCache(max_size=1000), operations=5000)
+    tinylfu_time = run_workload(MemoryCache(max_size=1000, policy=POLICY_TINYLFU), operations=5000)
+    print(f"5000次读写: 原实现 {legacy_time * 1000:.0f}ms, LRU {lru_time * 1000:.0f}ms, TinyLFU {tinylfu_time * 1000:.0f}ms")
+    assert lru_time * 5 < legacy_time
+    assert tinylfu_time * 5 < legacy_time
+
+
+if __name__ == "__main__":
+    test_lru_evicts_least_recently_used()
+    print("✅ PASS test_lru_evicts_least_recently_used")
+    test_tinylfu_keeps_hot_entries_under_scan()
+    print("✅ PASS test_tinylfu_keeps_hot_entries_under_scan")
+    test_tinylfu_does_not_reject_in_favour_of_expired_entries()
+    print("✅ PASS test_tinylfu_does_not_reject_in_favour_of_expired_entries")
+    test_byte_bounded_mode()
+    print("✅ PASS test_byte_bounded_mode")
+    test_faster_than_legacy_when_full()
+    print("✅ PASS test_faster_than_legacy_when_full")
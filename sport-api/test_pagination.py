@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+# 测试游标分页（内存SQLite）
+import random
+from datetime import date, timedelta
+
+import pytest
+from sqlalchemy import insert, text
+
+from models import PhysicalTest, UserActivityLog
+from schemas import StudentQueryParams
+from crud.physical_test_crud import get_physical_tests_page
+from crud.student_crud import StudentCrud
+from utils.cache import get_cache_manager
+from utils.pagination import paginate, InvalidCursorError
+from test_batch_scoring import create_session
+from test_student_list_queries import count_statements, create_student_session
+
+
+def add_dated_tests(db, count, seed=5):
+    """批量插入测试日期大量重复的体测记录"""
+    rng = random.Random(seed)
+    db.execute(insert(PhysicalTest), [{
+        "student_id": rng.randint(1, 200), "class_id": rng.randint(1, 12),
+        "test_date": date(2026, 1, 1) + timedelta(days=rng.randint(0, 30)),
+    } for _ in range(count)])
+    db.commit()
+
+
+def walk(fetch):
+    """沿游标取完所有页"""
+    pages, cursor = [], None
+    while True:
+        items, cursor = fetch(cursor)
+        pages.append(items)
+        if cursor is None:
+            return pages
+
+
+def test_physical_test_cursor_walk_covers_every_row_in_order():
+    """游标逐页遍历：每条记录恰好出现一次，顺序为(测试日期, ID)倒序"""
+    db = create_session(student_count=200)
+    add_dated_tests(db, 3000)
+    pages = walk(lambda cursor: get_physical_tests_page(db, limit=97, cursor=cursor)[:2])
+    rows = [(item["test_date"], item["id"]) for page in pages for item in page]
+    assert len(rows) == len(set(rows)) == 3200
+    assert rows == sorted(rows, reverse=True)
+    assert all(len(page) == 97 for page in pages[:-1])
+
+    # 与偏移分页结果一致
+    offset_page, _, total = get_physical_tests_page(db, limit=97, skip=97 * 5, include_total=True)
+    assert [item["id"] for item in offset_page] == [item["id"] for item in pages[5]]
+    assert total == 3200
+
+
+def test_deep_page_uses_keyset_index():
+    """深页查询按(测试日期, ID)键集条件经索引定位，总数命中缓存"""
+    db = create_session(student_count=200)
+    add_dated_tests(db, 2000)
+    get_cache_manager().get_cache("statistics").clear()
+    _, cursor, _ = get_physical_tests_page(db, limit=50, skip=1500)
+    get_physical_tests_page(db, limit=50, include_total=True)
+
+    with count_statements(db) as statements:
+        items, _, total = get_physical_tests_page(db, limit=50, cursor=cursor, include_total=True)
+    assert len(items) == 50 and total == 2200
+    # SQLite 在有 LIMIT 时总会生成 OFFSET ?（参数为0），这里检查键集条件
+    assert len(statements) == 1 and "physical_tests.test_date < ?" in statements[0]
+
+    plan = db.execute(text("EXPLAIN QUERY PLAN " + statements[0].replace("?", "'2026-01-15'", 2).replace("?", "1"))).fetchall()
+    assert any("ix_physical_tests_test_date_id" in str(row) for row in plan), plan
+
+
+def test_student_and_log_cursors():
+    """学生列表、日志的游标分页与偏移分页一致，无效游标报错"""
+    db = create_student_session(95)
+    crud = StudentCrud()
+    params = StudentQueryParams(page=1, page_size=10, gender="male")
+    pages = walk(lambda cursor: crud.get_students_page(db, params, cursor=cursor, cached_total=True)[::2])
+    ids = [item["id"] for page in pages for item in page]
+    expected, total = crud.get_students_with_class(db, StudentQueryParams(page=1, page_size=100, gender="male"))
+    assert ids == [item["id"] for item in expected] and total == len(ids)
+
+    db.execute(insert(UserActivityLog), [{"user_id": 1, "action": "login"} for _ in range(25)])
+    db.commit()
+    query = db.query(UserActivityLog)
+    pages = walk(lambda cursor: paginate(query, [(UserActivityLog.id, True)], 10, cursor))
+    assert [log.id for page in pages for log in page] == list(range(25, 0, -1))
+
+    with pytest.raises(InvalidCursorError):
+        crud.get_students_page(db, params, cursor="not-a-cursor")
+
+
+if __name__ == "__main__":
+    test_physical_test_cursor_walk_covers_every_row_in_order()
+    print("✅ PASS test_physical_test_cursor_walk_covers_every_row_in_order")
+    test_deep_page_uses_keyset_index()
+    print("✅ PASS test_deep_page_uses_keyset_index")
+    test_student_and_log_cursors()
+    print("✅ PASS test_student_and_log_cursors")
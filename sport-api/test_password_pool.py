@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+# 测试密码哈希线程池：登录高峰时事件循环不被阻塞，排队有上限
+import asyncio
+import threading
+import time
+
+from fastapi import HTTPException
+
+from auth import AuthService
+from utils.password_pool import PasswordHashPool
+
+
+async def measure_loop_lag(work, interval=0.005):
+    """执行 work 的同时每隔 interval 唤醒一次，返回 (work 结果, 最大唤醒延迟)"""
+    lags = []
+    done = asyncio.Event()
+
+    async def ticker():
+        while not done.is_set():
+            expected = time.perf_counter() + interval
+            await asyncio.sleep(interval)
+            lags.append(time.perf_counter() - expected)
+
+    task = asyncio.create_task(ticker())
+    await asyncio.sleep(0)
+    try:
+        result = await work()
+    finally:
+        done.set()
+        await task
+    return result, max(lags)
+
+
+def test_login_burst_keeps_event_loop_responsive():
+    """一个班同时登录：校验在线程池中进行，事件循环延迟远小于一次 bcrypt"""
+    password = "Student123!"
+    hashed = AuthService.get_password_hash(password)
+    started = time.perf_counter()
+    AuthService.verify_password(password, hashed)
+    one_check = time.perf_counter() - started
+
+    pool = PasswordHashPool(max_workers=4, max_queue=100)
+
+    async def burst():
+        return await asyncio.gather(*(
+            pool.verify_password(password if index % 5 else "wrong", hashed) for index in range(20)
+        ))
+
+    results, lag = asyncio.run(measure_loop_lag(burst))
+    pool.shutdown(wait=True)
+    print(f"单次校验 {one_check * 1000:.0f}ms，线程池中20次登录时事件循环最大延迟 {lag * 1000:.1f}ms")
+    assert results == [bool(index % 5) for index in range(20)]
+    assert lag < max(one_check / 2, 0.02)
+    stats = pool.get_stats()
+    assert stats["completed"] == 20 and stats["queued"] == 0 and stats["running"] == 0
+    assert stats["peak_queued"] >= 16 and stats["rejected"] == 0
+
+
+def test_queue_limit_rejects_with_503():
+    """排队已满时立即返回503，不无限堆积"""
+    pool = PasswordHashPool(max_workers=1, max_queue=2)
+    release = threading.Event()
+
+    async def scenario():
+        tasks = [asyncio.create_task(pool.run(release.wait)) for _ in range(3)]
+        # 等第一个任务开始执行，另外两个在排队
+        while pool.get_stats()["running"] < 1:
+            await asyncio.sleep(0.001)
+        assert pool.get_stats()["queued"] == 2
+        try:
+            await pool.run(release.wait)
+        except HTTPException as e:
+            assert e.status_code == 503 and e.headers["Retry-After"] == "1"
+        else:
+            raise AssertionError("应当返回503")
+        release.set()
+        return await asyncio.gather(*tasks)
+
+    assert asyncio.run(scenario()) == [True, True, True]
+    pool.shutdown(wait=True)
+    stats = pool.get_stats()
+    assert (stats["completed"], stats["rejected"], stats["peak_queued"]) == (3, 1, 2)
+    assert stats["max_wait_ms"] > 0
+
+
+def test_cancelled_waiters_release_queue_slots():
+    """排队中的请求被取消后归还排队名额，不会让后续请求一直返回503"""
+    pool = PasswordHashPool(max_workers=1, max_queue=2)
+    release = threading.Event()
+    calls = []
+
+    async def scenario():
+        running = asyncio.create_task(pool.run(release.wait))
+        while pool.get_stats()["running"] < 1:
+            await asyncio.sleep(0.001)
+        try:
+            for _ in range(3):
+                waiters = [asyncio.create_task(pool.run(calls.append, 1)) for _ in range(2)]
+                await asyncio.sleep(0.01)
+                assert pool.get_stats()["queued"] == 2
+                for waiter in waiters:
+                    waiter.cancel()
+                await asyncio.gather(*waiters, return_exceptions=True)
+                assert pool.get_stats()["queued"] == 0
+        finally:
+            release.set()
+        assert await running
+        return await pool.run(calls.append, 2)
+
+    asyncio.run(scenario())
+    pool.shutdown(wait=True)
+    stats = pool.get_stats()
+    # 被取消的任务没有执行
+    assert calls == [2] and stats["queued"] == 0 and stats["rejected"] == 0 and stats["completed"] == 2
+
+
+if __name__ == "__main__":
+    test_login_burst_keeps_event_loop_responsive()
+    print("✅ PASS test_login_burst_keeps_event_loop_responsive")
+    test_queue_limit_rejects_with_503()
+    print("✅ PASS test_queue_limit_rejects_with_503")
+    test_cancelled_waiters_release_queue_slots()
+    print("✅ PASS test_cancelled_waiters_release_queue_slots")
@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+# 测试登录时升级旧版SHA256密码哈希和调整bcrypt成本因子（内存SQLite）
+import asyncio
+import hashlib
+from contextlib import contextmanager
+
+from fastapi import HTTPException
+
+from auth import AuthService
+from calibrate_bcrypt import calibrate, MIN_ROUNDS
+from config import settings
+from models import User
+from routes.auth import login
+from schemas import UserLogin
+from test_auth_cache import create_session
+
+
+@contextmanager
+def override_settings(**values):
+    old = {key: getattr(settings, key) for key in values}
+    for key, value in values.items():
+        setattr(settings, key, value)
+    try:
+        yield
+    finally:
+        for key, value in old.items():
+            setattr(settings, key, value)
+
+
+def do_login(db, password, username="teacher1"):
+    """调用登录路由，返回HTTP状态码"""
+    try:
+        asyncio.run(login(None, UserLogin(username=username, password=password), db))
+    except HTTPException as e:
+        return e.status_code
+    return 200
+
+
+def stored_hash(db):
+    db.expire_all()
+    return db.query(User).filter(User.id == 1).one().hashed_password
+
+
+def test_legacy_sha256_upgraded_on_login():
+    """旧版SHA256哈希登录成功后升级为配置成本因子的bcrypt，之后不再重新哈希"""
+    db = create_session()
+    legacy = hashlib.sha256("Teacher#2024".encode()).hexdigest()
+    db.query(User).update({"hashed_password": legacy})
+    db.commit()
+    with override_settings(bcrypt_rounds=4):
+        assert do_login(db, "wrong-password") == 401
+        assert stored_hash(db) == legacy
+
+        assert do_login(db, "Teacher#2024") == 200
+        upgraded = stored_hash(db)
+        assert upgraded.startswith("$2b$04$") and not AuthService.needs_rehash(upgraded)
+
+        assert do_login(db, "Teacher#2024") == 200
+        assert stored_hash(db) == upgraded
+
+
+def test_cost_change_rehashes_on_login():
+    """调整 bcrypt_rounds 后，旧成本因子的哈希在下次登录时按新成本重新生成"""
+    db = create_session()
+    with override_settings(bcrypt_rounds=4):
+        db.query(User).update({"hashed_password": AuthService.get_password_hash("Teacher#2024")})
+        db.commit()
+    with override_settings(bcrypt_rounds=5):
+        assert AuthService.needs_rehash(stored_hash(db))
+        assert do_login(db, "Teacher#2024") == 200
+        assert stored_hash(db).startswith("$2b$05$")
+
+
+def test_legacy_hashes_rejected_when_disabled():
+    """关闭 allow_legacy_password_hashes 后旧版SHA256哈希不能登录；空哈希不能登录"""
+    db = create_session()
+    legacy = hashlib.sha256("Teacher#2024".encode()).hexdigest()
+    db.query(User).update({"hashed_password": legacy})
+    db.commit()
+    with override_settings(allow_legacy_password_hashes=False):
+        assert do_login(db, "Teacher#2024") == 401
+    assert stored_hash(db) == legacy
+    db.query(User).update({"hashed_password": None})
+    db.commit()
+    assert do_login(db, "Teacher#2024") == 401
+
+
+def test_calibration_respects_budget():
+    """预算不足时取最小成本因子，且只测量到第一个超预算的成本因子"""
+    chosen, timings = calibrate(budget_ms=0, samples=1)
+    assert chosen == MIN_ROUNDS and list(timings) == [MIN_ROUNDS]
+    chosen, timings = calibrate(budget_ms=timings[MIN_ROUNDS] * 1.5 + 5, samples=1)
+    assert chosen in (MIN_ROUNDS, MIN_ROUNDS + 1) and max(timings) == chosen + 1
+
+
+if __name__ == "__main__":
+    test_legacy_sha256_upgraded_on_login()
+    print("✅ PASS test_legacy_sha256_upgraded_on_login")
+    test_cost_change_rehashes_on_login()
+    print("✅ PASS test_cost_change_rehashes_on_login")
+    test_legacy_hashes_rejected_when_disabled()
+    print("✅ PASS test_legacy_hashes_rejected_when_disabled")
+    test_calibration_respects_budget()
+    print("✅ PASS test_calibration_respects_budget")
@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+# 测试权限快照：检查为集合成员判断，班级/班主任/分班变化后失效（内存SQLite）
+from datetime import date
+from types import SimpleNamespace
+
+from models import FamilyInfo, UserRoleEnum
+from crud.class_crud import ClassCrud
+from crud.student_crud import StudentCrud
+from utils.permissions import (
+    Permission, PermissionChecker, PermissionSnapshot, PermissionSnapshotCache, get_permission_cache
+)
+from test_batch_scoring import create_session
+from test_student_list_queries import count_statements
+
+
+def teacher(user_id=99):
+    return SimpleNamespace(id=user_id, role=UserRoleEnum.teacher, phone=None)
+
+
+def create_class_session():
+    """3 个学生分到 1、2 班，1 班班主任为 99"""
+    db = create_session(student_count=3)
+    crud = StudentCrud()
+    ClassCrud().update_class(db, 1, {"class_teacher_id": 99})
+    crud.assign_student_to_class(db, 1, 1)
+    crud.assign_student_to_class(db, 2, 1)
+    crud.assign_student_to_class(db, 3, 2)
+    get_permission_cache().clear()
+    return db
+
+
+def test_checks_after_first_use_run_no_queries():
+    """首次检查计算快照，之后的班级/学生检查不再查询数据库"""
+    db = create_class_session()
+    checker = PermissionChecker(db)
+    user = teacher()
+    assert checker.check_class_access(user, 1, Permission.CLASS_VIEW)
+    with count_statements(db) as statements:
+        assert [checker.check_student_access(user, student_id, Permission.STUDENT_VIEW)
+                for student_id in (1, 2, 3)] == [True, True, False]
+        assert not checker.check_class_access(user, 2, Permission.CLASS_VIEW)
+        assert checker.get_accessible_classes(user) == [1]
+        # 基础权限不足时仍然拒绝
+        assert not checker.check_class_access(user, 1, Permission.CLASS_DELETE)
+    assert statements == []
+    assert get_permission_cache().get_stats()["hits"] >= 5
+
+    admin = SimpleNamespace(id=1, role=UserRoleEnum.admin, phone=None)
+    with count_statements(db) as statements:
+        assert checker.get_accessible_classes(admin) == list(range(1, 13))
+    assert len(statements) == 1 and "classes.class_name" not in statements[0]
+
+
+def test_class_and_transfer_changes_invalidate():
+    """更换班主任、转班、删除班级后快照重新计算"""
+    db = create_class_session()
+    checker = PermissionChecker(db)
+    user = teacher()
+    assert checker.check_student_access(user, 1, Permission.STUDENT_VIEW)
+
+    ok, _ = StudentCrud().transfer_student(db, 1, 1, 2, date(2026, 3, 1))
+    assert ok and not checker.check_student_access(user, 1, Permission.STUDENT_VIEW)
+
+    ClassCrud().update_class(db, 2, {"class_teacher_id": 99})
+    assert checker.get_accessible_classes(user) == [1, 2]
+    assert checker.check_student_access(user, 3, Permission.STUDENT_VIEW)
+
+    ClassCrud().update_class(db, 1, {"class_teacher_id": 100})
+    assert checker.get_accessible_classes(user) == [2]
+    assert not checker.check_student_access(user, 2, Permission.STUDENT_VIEW)
+    assert checker.check_student_access(teacher(100), 2, Permission.STUDENT_VIEW)
+
+    assert ClassCrud().delete_class(db, 2, force=True)["success"]
+    assert checker.get_accessible_classes(user) == []
+
+
+def test_parent_matches_father_or_mother_phone():
+    """家长按父亲或母亲电话匹配孩子；没有电话的家长不匹配任何学生"""
+    db = create_class_session()
+    db.add_all([
+        FamilyInfo(student_id=1, father_phone="13900000001", mother_phone="13900000002"),
+        FamilyInfo(student_id=3, father_phone=None, mother_phone="13900000001"),
+        FamilyInfo(student_id=2),
+    ])
+    db.commit()
+    checker = PermissionChecker(db)
+    parent = SimpleNamespace(id=200, role=UserRoleEnum.parent, phone="13900000001")
+    assert checker.get_accessible_classes(parent) == [1, 2]
+    assert [checker.check_student_access(parent, student_id, Permission.STUDENT_VIEW)
+            for student_id in (1, 2, 3)] == [True, False, True]
+
+    # 电话变化后快照自动失效
+    parent.phone = "13900000002"
+    assert checker.get_accessible_classes(parent) == [1]
+    parent.phone = None
+    assert checker.get_accessible_classes(parent) == []
+    assert not checker.check_student_access(parent, 2, Permission.STUDENT_VIEW)
+
+
+def test_cache_bounded_and_drops_stale_snapshots():
+    """条目数有上限；失效前开始计算的快照不写入缓存"""
+    cache = PermissionSnapshotCache(ttl=60, max_entries=2)
+    snapshot = PermissionSnapshot(UserRoleEnum.teacher, None, {1}, {1}, expires_at=float("inf"))
+    for user_id in (1, 2, 3):
+        cache.set(user_id, snapshot, cache.generation)
+    assert cache.get(teacher(1)) is None and cache.get(teacher(3)) is snapshot
+
+    generation = cache.generation
+    cache.clear()
+    cache.set(4, snapshot, generation)
+    assert cache.get(teacher(4)) is None
+    assert cache.get_stats()["snapshots"] == 0
+
+
+if __name__ == "__main__":
+    test_checks_after_first_use_run_no_queries()
+    print("✅ PASS test_checks_after_first_use_run_no_queries")
+    test_class_and_transfer_changes_invalidate()
+    print("✅ PASS test_class_and_transfer_changes_invalidate")
+    test_parent_matches_father_or_mother_phone()
+    print("✅ PASS test_parent_matches_father_or_mother_phone")
+    test_cache_bounded_and_drops_stale_snapshots()
+    print("✅ PASS test_cache_bounded_and_drops_stale_snapshots")
@@ -0,0 +1,69 @@
+#!/usr/bin/env python3
+# 测试按国家体质健康测试数据格式导出Excel（内存SQLite）
+import io
+import time
+import tracemalloc
+
+from openpyxl import load_workbook
+
+from models import PhysicalTest, Class, School
+from crud.physical_test_crud import iter_physical_test_history, batch_calculate_scores
+from utils.physical_test_excel import write_physical_test_workbook, EXPORT_HEADERS
+from test_batch_scoring import create_session
+from test_physical_test_statistics import add_scored_tests
+
+
+def test_export_matches_template_layout():
+    """表头与导出模板一致，性别、等级、BMI 按模板格式输出，区域过滤生效"""
+    db = create_session(student_count=120)
+    batch_calculate_scores(db)
+    school = School(school_name="第一小学", area="城区")
+    db.add(school)
+    db.flush()
+    db.query(Class).filter(Class.id.in_([1, 2])).update({"school_id": school.id})
+    db.commit()
+
+    output = io.BytesIO()
+    count = write_physical_test_workbook(iter_physical_test_history(db, {"school_year_id": 1, "area": "城区"}), output)
+    assert count == 20
+
+    output.seek(0)
+    sheet = load_workbook(output, read_only=True)["体测数据"]
+    rows = list(sheet.iter_rows(values_only=True))
+    assert list(rows[0]) == EXPORT_HEADERS
+    assert len(rows) == 21
+
+    record = dict(zip(EXPORT_HEADERS, rows[1]))
+    test = db.query(PhysicalTest).join(PhysicalTest.student).filter_by(student_no=record["学号"]).one()
+    assert record["性别"] in ("男", "女")
+    assert record["等级"] in ("优秀", "良好", "及格", "不及格")
+    assert record["测试日期"] == test.test_date.isoformat()
+    assert record["总分"] == test.total_score
+    assert abs(record["体重指数(BMI)"] - test.weight / (test.height / 100) ** 2) < 0.06
+
+
+def test_export_memory_is_bounded():
+    """导出行数增长10倍，峰值内存基本不变"""
+    db = create_session(student_count=200)
+    peaks = []
+    for total in (5000, 50000):
+        add_scored_tests(db, total - db.query(PhysicalTest).count(), seed=total)
+        output = io.BytesIO()
+        started = time.perf_counter()
+        tracemalloc.start()
+        count = write_physical_test_workbook(iter_physical_test_history(db, {"school_year_id": 1}), output)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        elapsed = time.perf_counter() - started
+        peaks.append(peak - output.getbuffer().nbytes)
+        print(f"  {count} 行: 文件 {output.tell() / 1024:.0f}KB, 峰值内存 {peak / 1024:.0f}KB, 耗时 {elapsed:.2f}s")
+        assert count == total
+    # 文件本身写入内存缓冲区，扣除后其余内存不随行数增长
+    assert peaks[1] < peaks[0] * 2
+
+
+if __name__ == "__main__":
+    test_export_matches_template_layout()
+    print("✅ PASS test_export_matches_template_layout")
+    test_export_memory_is_bounded()
+    print("✅ PASS test_export_memory_is_bounded")
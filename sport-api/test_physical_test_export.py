@@ -0,0 +1,52 @@
+#!/usr/bin/env python3
+# 测试体测历史流式导出（内存SQLite）
+import csv
+import io
+import json
+import tracemalloc
+
+from models import PhysicalTest
+from crud.physical_test_crud import iter_physical_test_history, HISTORY_EXPORT_FIELDS, HISTORY_EXPORT_HEADERS
+from utils.streaming_export import iter_ndjson, iter_csv
+from test_batch_scoring import create_session
+from test_physical_test_statistics import add_scored_tests
+
+
+def test_export_ndjson_and_csv():
+    """NDJSON 与 CSV 导出行数、字段正确，过滤条件生效"""
+    db = create_session(student_count=120)
+    lines = b"".join(iter_ndjson(iter_physical_test_history(db), batch_size=7)).decode("utf-8").splitlines()
+    assert len(lines) == 120
+    first = json.loads(lines[0])
+    assert set(first) == set(HISTORY_EXPORT_FIELDS)
+    assert first["gender"] in ("male", "female")
+
+    filtered = list(iter_physical_test_history(db, {"class_id": 1, "school_year_id": 1, "grade": "1年级"}))
+    assert len(filtered) == 10 and all(row["class_id"] == 1 for row in filtered)
+
+    text = b"".join(iter_csv(iter_physical_test_history(db), HISTORY_EXPORT_FIELDS, HISTORY_EXPORT_HEADERS)).decode("utf-8-sig")
+    rows = list(csv.reader(io.StringIO(text)))
+    assert rows[0][:4] == ["记录ID", "学生ID", "学号", "姓名"]
+    assert len(rows) == 121
+
+
+def test_export_memory_is_constant():
+    """导出行数增长10倍，峰值内存基本不变"""
+    db = create_session(student_count=200)
+    peaks = []
+    for total in (4000, 40000):
+        add_scored_tests(db, total - db.query(PhysicalTest).count(), seed=total)
+        tracemalloc.start()
+        size = sum(len(chunk) for chunk in iter_ndjson(iter_physical_test_history(db)))
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        peaks.append(peak)
+        print(f"{total} 行: 输出 {size / 1024:.0f}KB, 峰值内存 {peak / 1024:.0f}KB")
+    assert peaks[1] < peaks[0] * 2
+
+
+if __name__ == "__main__":
+    test_export_ndjson_and_csv()
+    print("✅ PASS test_export_ndjson_and_csv")
+    test_export_memory_is_constant()
+    print("✅ PASS test_export_memory_is_constant")
@@ -0,0 +1,134 @@
+#!/usr/bin/env python3
+# 测试国家体质健康测试数据Excel导入（内存SQLite）
+import io
+import random
+import time
+from datetime import date
+
+from openpyxl import Workbook
+from sqlalchemy import insert
+
+from models import PhysicalTest, Student, StudentClassRelation
+from crud.physical_test_crud import calculate_physical_test_score
+from crud.physical_test_summary_crud import rebuild_physical_test_summary, check_physical_test_summary
+from utils.physical_test_excel import import_physical_tests_from_excel
+from test_batch_scoring import create_session
+
+TEMPLATE_HEADERS = [
+    "学号", "姓名", "性别", "年级", "班级", "测试日期", "身高(cm)", "体重(kg)", "体重指数(BMI)",
+    "肺活量(ml)", "50米跑(s)", "坐位体前屈(cm)", "一分钟跳绳(次)", "总分", "等级"
+]
+
+
+def create_import_session(student_count, **engine_options):
+    """创建内存数据库，批量生成学生及当前班级关系"""
+    db = create_session(student_count=0, **engine_options)
+    db.execute(insert(Student), [{
+        "student_no": f"2024{index:07d}", "real_name": f"学生{index}",
+        "gender": "male" if index % 2 else "female",
+        "birth_date": date(2016, 1, 1), "enrollment_date": date(2024, 9, 1),
+        "current_class_id": index % 3 + 1, "current_school_year_id": 1
+    } for index in range(student_count)])
+    db.execute(insert(StudentClassRelation), [{
+        "student_id": index + 1, "class_id": index % 3 + 1, "join_date": date(2025, 9, 1), "is_current": True
+    } for index in range(student_count)])
+    db.commit()
+    return db
+
+
+def build_workbook(student_count, seed=7):
+    """按导入模板生成工作簿（数值以文本形式存放，与模板一致）"""
+    rng = random.Random(seed)
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet()
+    sheet.append(TEMPLATE_HEADERS)
+    for index in range(student_count):
+        sheet.append([
+            f"2024{index:07d}", f"学生{index}", "男" if index % 2 else "女", "一年级", "主校区1班", "2026-01-04",
+            f"{rng.uniform(110, 140):.1f}", f"{rng.uniform(18, 40):.1f}", "", str(rng.randint(600, 2000)),
+            f"{rng.uniform(8, 13):.1f}", f"{rng.uniform(-5, 25):.1f}", str(rng.randint(20, 180)), "", ""
+        ])
+    output = io.BytesIO()
+    workbook.save(output)
+    output.seek(0)
+    return output
+
+
+def test_import_validates_and_scores_rows():
+    """合格行导入并计分（与逐条计算一致），错误行按行号报告"""
+    db = create_import_session(30)
+    rebuild_physical_test_summary(db)
+    workbook = Workbook()
+    sheet = workbook.active
+    sheet.append(TEMPLATE_HEADERS)
+    sheet.append(["20240000001", "学生1", "男", "一年级", "主校区1班", "2026-01-04", "125.3", "24.1", "", "1300", "10.2", "8.5", "110", "", ""])
+    sheet.append(["20240000002", "学生2", "女", "一年级", "主校区1班", date(2026, 1, 4), 121, 22.5, None, 1100, 10.9, 12, 98, None, None])
+    sheet.append(["20249999999", "查无此人", "男", "一年级", "主校区1班", "2026-01-04", "125", "24", "", "1300", "10", "8", "110", "", ""])
+    sheet.append(["20240000003", "学生3", "女", "一年级", "主校区1班", "2026-01-04", "125", "24", "", "1300", "10", "8", "110", "", ""])
+    sheet.append(["20240000004", "学生4", "女", "一年级", "主校区1班", "2026/13/40", "125", "24", "", "1300", "10", "8", "110", "", ""])
+    sheet.append(["20240000005", "学生5", "男", "一年级", "主校区1班", "2026-01-04", "125", "240", "", "abc", "10", "8", "110", "", ""])
+    output = io.BytesIO()
+    workbook.save(output)
+    output.seek(0)
+
+    result = import_physical_tests_from_excel(db, output, test_type="期末测试", chunk_size=100)
+    assert result["total_rows"] == 6
+    assert result["imported"] == 2 and result["scored"] == 2
+    assert [error["row"] for error in result["errors"]] == [4, 5, 6, 7]
+    assert "学号不存在" in result["errors"][0]["error"]
+    assert "性别" in result["errors"][1]["error"]
+    assert "日期" in result["errors"][2]["error"]
+
+    for test in db.query(PhysicalTest).all():
+        stored = (test.total_score, test.grade)
+        single = calculate_physical_test_score(db, test.id)
+        assert stored == (single["total_score"], single["grade"])
+    assert check_physical_test_summary(db) == []
+
+
+def test_import_50k_rows_performance():
+    """5万行导入在一分钟内完成"""
+    db = create_import_session(50000)
+    output = build_workbook(50000)
+
+    started = time.perf_counter()
+    result = import_physical_tests_from_excel(db, output, test_type="期末测试", chunk_size=5000)
+    elapsed = time.perf_counter() - started
+    print(f"  导入 {result['imported']} 行，耗时 {elapsed:.2f}s")
+    assert result["imported"] == 50000 and result["failed"] == 0
+    assert db.query(PhysicalTest).filter(PhysicalTest.total_score.isnot(None)).count() == 50000
+    assert elapsed < 60
+
+
+def test_import_uses_student_current_class():
+    """导入记录的班级取学生表的 current_class_id，不受多余的当前班级关系影响"""
+    db = create_import_session(3)
+    # 学生1 有一条多余的当前班级关系（数据异常），学生2 没有当前班级
+    db.execute(insert(StudentClassRelation), [{
+        "student_id": 1, "class_id": 3, "join_date": date(2025, 10, 1), "is_current": True
+    }])
+    db.query(Student).filter(Student.id == 2).update({"current_class_id": None})
+    db.commit()
+    workbook = Workbook()
+    sheet = workbook.active
+    sheet.append(TEMPLATE_HEADERS)
+    for index in range(3):
+        sheet.append([f"2024{index:07d}", f"学生{index}", "男" if index % 2 else "女", "一年级", "主校区1班",
+                      "2026-01-04", "125", "24", "", "1300", "10", "8", "110", "", ""])
+    output = io.BytesIO()
+    workbook.save(output)
+    output.seek(0)
+
+    result = import_physical_tests_from_excel(db, output, test_type="期末测试")
+    assert result["imported"] == 2 and [error["row"] for error in result["errors"]] == [3]
+    assert "未分配班级" in result["errors"][0]["error"]
+    assert {test.student_id: test.class_id for test in db.query(PhysicalTest)} == {1: 1, 3: 3}
+
+
+if __name__ == "__main__":
+    test_import_validates_and_scores_rows()
+    print("✅ PASS test_import_validates_and_scores_rows")
+    test_import_uses_student_current_class()
+    print("✅ PASS test_import_uses_student_current_class")
+    test_import_50k_rows_performance()
+    print("✅ PASS test_import_50k_rows_performance")
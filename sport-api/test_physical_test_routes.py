@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+# 测试体测路由的访问控制：通过 TestClient 调用接口（内存SQLite）
+import io
+import threading
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from openpyxl import load_workbook
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+import database
+from auth import get_current_user
+from database import get_db
+from models import PhysicalTest, User, UserRoleEnum
+import routes.physical_test
+from routes.physical_test import router
+from utils.rank_index import get_rank_index
+from test_query_scope import create_scope_session
+from test_physical_test_import import create_import_session, build_workbook
+
+
+def create_client(db, user, api_router=router, prefix="/api/v1/physical-tests"):
+    """挂载路由（默认体测路由），数据库会话和当前用户替换为测试数据"""
+    app = FastAPI()
+    app.include_router(api_router, prefix=prefix)
+    Session = sessionmaker(bind=db.get_bind())
+
+    def override_get_db():
+        session = Session()
+        try:
+            yield session
+        finally:
+            session.close()
+
+    app.dependency_overrides[get_db] = override_get_db
+    app.dependency_overrides[get_current_user] = lambda: user
+    return TestClient(app)
+
+
+def make_user(user_id, role):
+    return User(id=user_id, username=f"user{user_id}", real_name=f"用户{user_id}", role=role, hashed_password="x")
+
+
+def create_route_session():
+    """多线程共享的内存数据库（TestClient 在其他线程中执行路由）"""
+    return create_scope_session(connect_args={"check_same_thread": False}, poolclass=StaticPool)
+
+
+def call_recording_thread(name, path, db=None, **kwargs):
+    """以管理员调用接口，记录路由中被调用的 crud 函数所在线程，返回 (响应, 线程名)"""
+    original = getattr(routes.physical_test, name)
+    threads = []
+
+    def recording(*args, **call_kwargs):
+        threads.append(threading.current_thread().name)
+        return original(*args, **call_kwargs)
+
+    setattr(routes.physical_test, name, recording)
+    try:
+        client = create_client(db or create_route_session(), make_user(1, UserRoleEnum.admin))
+        return client.post(path, **kwargs), threads
+    finally:
+        setattr(routes.physical_test, name, original)
+
+
+def test_import_runs_in_threadpool():
+    """Excel 导入在线程池中执行，不阻塞事件循环"""
+    db = create_import_session(20, connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    response, threads = call_recording_thread(
+        "import_physical_tests_from_excel", "/api/v1/physical-tests/import", db,
+        params={"test_type": "期末测试"}, files={"file": ("tests.xlsx", build_workbook(20).read())}
+    )
+    assert response.status_code == 200, response.text
+    assert response.json()["imported"] == 20
+    assert threads and threads[0].startswith("AnyIO worker thread"), threads
+
+
+def test_calculate_scores_runs_in_threadpool():
+    """批量计分在线程池中执行"""
+    response, threads = call_recording_thread("batch_calculate_scores", "/api/v1/physical-tests/calculate-scores")
+    assert response.status_code == 200, response.text
+    assert response.json()["total"] == 120 and "results" not in response.json()
+    assert threads and threads[0].startswith("AnyIO worker thread"), threads
+
+
+def test_rescore_stale_runs_in_threadpool():
+    """增量重算在线程池中执行"""
+    response, threads = call_recording_thread("rescore_stale_scores", "/api/v1/physical-tests/rescore-stale")
+    assert response.status_code == 200, response.text
+    assert "results" not in response.json()
+    assert threads and threads[0].startswith("AnyIO worker thread"), threads
+
+
+def test_student_can_only_read_own_test_and_rank():
+    """学生（用户50 对应学生5）只能查看自己的体测记录和排名"""
+    db = create_route_session()
+    client = create_client(db, make_user(50, UserRoleEnum.student))
+    for path in ("/api/v1/physical-tests/5", "/api/v1/physical-tests/5/rank"):
+        response = client.get(path)
+        assert response.status_code == 200, response.text
+        assert response.json()["student_id"] == 5
+    # 体测记录50属于学生50，与用户ID相同也不能查看
+    for path in ("/api/v1/physical-tests/50", "/api/v1/physical-tests/50/rank", "/api/v1/physical-tests/6/rank"):
+        assert client.get(path).status_code == 403, path
+
+    # 没有学生档案的学生用户什么都看不到
+    client = create_client(db, make_user(51, UserRoleEnum.student))
+    assert client.get("/api/v1/physical-tests/5/rank").status_code == 403
+
+    client = create_client(db, make_user(1, UserRoleEnum.admin))
+    response = client.get("/api/v1/physical-tests/50/rank", params={"items": ["total_score", "run_50m"]})
+    assert response.status_code == 200 and set(response.json()["items"]) == {"total_score", "run_50m"}
+    assert client.get("/api/v1/physical-tests/100000/rank").status_code == 404
+
+
+def test_teacher_rankings_are_limited_to_own_classes():
+    """教师（1、2 班班主任）只能查看自己班级的排名"""
+    db = create_route_session()
+    get_rank_index().clear()
+    db.query(PhysicalTest).update({"total_score": PhysicalTest.id}, synchronize_session=False)
+    db.commit()
+    teacher = create_client(db, make_user(99, UserRoleEnum.teacher))
+    assert teacher.get("/api/v1/physical-tests/rankings/class/3").status_code == 403
+    response = teacher.get("/api/v1/physical-tests/rankings/class/1")
+    assert response.status_code == 200 and len(response.json()) == 10
+
+    # 1 年级（1 班）女生：教师只能看到本班记录，名次仍为年级名次
+    params = {"school_year_id": 1, "grade_level": 1, "gender": "female", "test_type": "期末测试", "limit": 100}
+    own = {row.id for row in db.query(PhysicalTest.id).filter(PhysicalTest.class_id.in_([1, 2]))}
+    top = teacher.get("/api/v1/physical-tests/rankings/top", params=params).json()
+    assert top and {entry["physical_test_id"] for entry in top} <= own
+    admin = create_client(db, make_user(1, UserRoleEnum.admin))
+    everyone = admin.get("/api/v1/physical-tests/rankings/top", params=params).json()
+    assert [entry for entry in everyone if entry["physical_test_id"] in own] == top
+
+    params["grade_level"] = 3
+    assert teacher.get("/api/v1/physical-tests/rankings/top", params=params).json() == []
+    assert admin.get("/api/v1/physical-tests/rankings/top", params=params).json()
+
+
+def test_teacher_excel_export_contains_only_own_classes():
+    """教师导出的 xlsx 只包含自己班级的体测数据"""
+    db = create_route_session()
+    old_bind = database.SessionLocal.kw["bind"]
+    database.SessionLocal.configure(bind=db.get_bind())
+    try:
+        for user, expected in ((make_user(99, UserRoleEnum.teacher), 20), (make_user(1, UserRoleEnum.admin), 120)):
+            response = create_client(db, user).get("/api/v1/physical-tests/export/excel")
+            assert response.status_code == 200, response.text
+            sheet = load_workbook(io.BytesIO(response.content), read_only=True)["体测数据"]
+            assert len(list(sheet.iter_rows(values_only=True))) - 1 == expected
+    finally:
+        database.SessionLocal.configure(bind=old_bind)
+
+
+if __name__ == "__main__":
+    test_import_runs_in_threadpool()
+    print("✅ PASS test_import_runs_in_threadpool")
+    test_calculate_scores_runs_in_threadpool()
+    print("✅ PASS test_calculate_scores_runs_in_threadpool")
+    test_rescore_stale_runs_in_threadpool()
+    print("✅ PASS test_rescore_stale_runs_in_threadpool")
+    test_student_can_only_read_own_test_and_rank()
+    print("✅ PASS test_student_can_only_read_own_test_and_rank")
+    test_teacher_rankings_are_limited_to_own_classes()
+    print("✅ PASS test_teacher_rankings_are_limited_to_own_classes")
+    test_teacher_excel_export_contains_only_own_classes()
+    print("✅ PASS test_teacher_excel_export_contains_only_own_classes")
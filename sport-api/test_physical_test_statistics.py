@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+# 测试体测统计SQL聚合（内存SQLite）
+import random
+import time
+import tracemalloc
+from datetime import date
+
+from sqlalchemy import event, insert
+
+from models import PhysicalTest
+from crud.physical_test_crud import (
+    get_physical_test_statistics, get_physical_test_analytics, get_score_distribution,
+    get_grade_distribution, get_grade_comparison, get_gender_comparison, get_item_analysis
+)
+from test_batch_scoring import create_session
+
+
+def add_scored_tests(db, count, seed=11):
+    """为已有学生批量插入带总分的体测记录"""
+    rng = random.Random(seed)
+    db.execute(insert(PhysicalTest), [
+        {
+            "student_id": rng.randint(1, 200),
+            "class_id": rng.randint(1, 12),
+            "test_date": date(2026, 5, 1),
+            "total_score": rng.choice([None, 0, rng.uniform(30, 105)]),
+        }
+        for _ in range(count)
+    ])
+    db.commit()
+
+
+def expected_statistics(db):
+    """按原逐行统计逻辑计算期望结果"""
+    tests = db.query(PhysicalTest).all()
+    total = len(tests)
+    scores = [t.total_score for t in tests]
+    return {
+        "tested_students": len({t.student_id for t in tests}),
+        "average_score": sum(s or 0 for s in scores) / total,
+        "excellent_rate": len([s for s in scores if s and s >= 90]) / total * 100,
+        "good_rate": len([s for s in scores if s and 80 <= s < 90]) / total * 100,
+        "pass_rate": len([s for s in scores if s and 60 <= s < 80]) / total * 100,
+        "fail_rate": len([s for s in scores if s and s < 60]) / total * 100,
+    }
+
+
+def test_statistics_match_row_by_row_result():
+    """SQL聚合结果与逐行统计一致"""
+    db = create_session()
+    add_scored_tests(db, 500)
+    stats = get_physical_test_statistics(db)
+    assert stats["total_students"] == 200
+    for key, value in expected_statistics(db).items():
+        assert abs(stats[key] - value) < 1e-9, key
+
+
+def test_statistics_empty_table():
+    """无体测记录时返回0"""
+    db = create_session(student_count=3)
+    db.query(PhysicalTest).delete()
+    db.commit()
+    stats = get_physical_test_statistics(db)
+    assert stats["tested_students"] == 0
+    assert stats["average_score"] == 0.0
+
+
+def test_statistics_memory_is_constant():
+    """记录数增长20倍，统计时的峰值内存基本不变"""
+    db = create_session()
+    peaks = []
+    for total in (2000, 40000):
+        add_scored_tests(db, total - db.query(PhysicalTest).count(), seed=total)
+        tracemalloc.start()
+        started = time.perf_counter()
+        get_physical_test_statistics(db)
+        elapsed = time.perf_counter() - started
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        peaks.append(peak)
+        print(f"{total} 条记录: 峰值内存 {peak / 1024:.1f}KB, 耗时 {elapsed * 1000:.1f}ms")
+    assert peaks[1] < peaks[0] * 2
+
+
+def test_analytics_single_query_matches_per_facet_functions():
+    """多维分析一次查询得到与各独立统计函数相同的结果"""
+    db = create_session()
+    add_scored_tests(db, 500)
+
+    statements = []
+    listener = lambda *args: statements.append(args[2])
+    event.listen(db.get_bind(), "before_cursor_execute", listener)
+    analytics = get_physical_test_analytics(db)
+    event.remove(db.get_bind(), "before_cursor_execute", listener)
+    assert len(statements) == 1
+
+    assert analytics["score_band"] == get_score_distribution(db)
+    assert analytics["level"] == get_grade_distribution(db)
+    assert analytics["grade"] == get_grade_comparison(db)
+    assert analytics["gender"] == get_gender_comparison(db)
+    assert analytics["item"] == get_item_analysis(db)
+    assert sum(item["count"] for item in analytics["class"].values()) == sum(
+        item["count"] for item in analytics["grade"].values()
+    )
+
+    only_gender = get_physical_test_analytics(db, ["gender"])
+    assert set(only_gender) == {"total", "gender"}
+
+
+if __name__ == "__main__":
+    test_statistics_match_row_by_row_result()
+    print("✅ PASS test_statistics_match_row_by_row_result")
+    test_statistics_empty_table()
+    print("✅ PASS test_statistics_empty_table")
+    test_analytics_single_query_matches_per_facet_functions()
+    print("✅ PASS test_analytics_single_query_matches_per_facet_functions")
+    test_statistics_memory_is_constant()
+    print("✅ PASS test_statistics_memory_is_constant")
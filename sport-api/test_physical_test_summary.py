@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+# 测试体测汇总表增量维护（内存SQLite）
+import os
+import tempfile
+from datetime import date
+
+from sqlalchemy.orm import sessionmaker
+
+from models import PhysicalTest, PhysicalTestSummary
+from schemas import PhysicalTestCreate, PhysicalTestUpdate
+from crud.physical_test_crud import (
+    create_physical_test, update_physical_test, delete_physical_test,
+    calculate_physical_test_score, batch_calculate_scores
+)
+from crud.physical_test_summary_crud import (
+    rebuild_physical_test_summary, check_physical_test_summary, get_physical_test_summary,
+    apply_summary_deltas, build_summary_deltas
+)
+from crud.class_crud import class_crud
+from utils.data_consistency import DataConsistencyChecker
+from utils.rank_index import get_rank_index
+from test_batch_scoring import create_session
+
+
+def test_incremental_summary_matches_raw_data():
+    """新增、修改、计分、删除后汇总表与原始数据一致"""
+    db = create_session(student_count=60)
+    rebuild_physical_test_summary(db)
+    assert check_physical_test_summary(db) == []
+
+    batch_calculate_scores(db, chunk_size=25)
+    assert check_physical_test_summary(db) == []
+
+    created = create_physical_test(db, PhysicalTestCreate(
+        student_id=1, class_id=1, test_date=date(2026, 6, 1), test_type="期末测试",
+        height=130, weight=28, vital_capacity=1500, run_50m=9.8, sit_and_reach=12, skip_rope=120
+    ))
+    calculate_physical_test_score(db, created.id)
+    update_physical_test(db, 2, PhysicalTestUpdate(vital_capacity=2100, test_type="期中测试"))
+    calculate_physical_test_score(db, 2)
+    delete_physical_test(db, 3)
+    assert check_physical_test_summary(db) == []
+
+
+def test_summary_statistics_and_consistency_check():
+    """汇总读取结果正确，篡改后一致性检查能发现并修复"""
+    db = create_session(student_count=60)
+    rebuild_physical_test_summary(db)
+    batch_calculate_scores(db)
+
+    summary = get_physical_test_summary(db, class_id=1)
+    tests = db.query(PhysicalTest).filter(PhysicalTest.class_id == 1).all()
+    heights = [t.height for t in tests]
+    mean = sum(heights) / len(heights)
+    assert summary["height"]["count"] == len(heights)
+    assert abs(summary["height"]["average"] - round(mean, 2)) < 1e-9
+    variance = sum((h - mean) ** 2 for h in heights) / len(heights)
+    assert abs(summary["height"]["variance"] - variance) < 1e-3
+    assert summary["total_score"]["count"] == len([t for t in tests if t.total_score])
+
+    db.query(PhysicalTestSummary).filter(PhysicalTestSummary.item == "height").update({"value_count": 999})
+    db.commit()
+    checker = DataConsistencyChecker(db)
+    checker.check_physical_test_summary()
+    assert checker.issues and all(i["type"] == "physical_test_summary_mismatch" for i in checker.issues)
+
+    checker.auto_fix_issues(dry_run=False)
+    assert check_physical_test_summary(db) == []
+
+
+def test_summary_deltas_are_applied_in_database():
+    """增量在数据库中累加：另一会话先读过汇总行也不会覆盖其他事务的增量；空键不产生重复行"""
+    url = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'summary.db')}"
+    db = create_session(student_count=20, url=url)
+    rebuild_physical_test_summary(db)
+    other = sessionmaker(bind=db.get_bind())()
+    key = (1, 2, "期末测试", "male")
+    stale = other.query(PhysicalTestSummary).filter_by(class_id=2, test_type="期末测试", gender="male",
+                                                       item="height").one()
+    before = stale.value_count
+
+    apply_summary_deltas(db, build_summary_deltas([(key, {"height": 150.0}, 1)]))
+    db.commit()
+    apply_summary_deltas(other, build_summary_deltas([(key, {"height": 140.0}, 1)]))
+    other.commit()
+    other.expire_all()
+    assert stale.value_count == before + 2
+
+    null_key = (None, None, "期末测试", "female")
+    for _ in range(2):
+        apply_summary_deltas(db, build_summary_deltas([(null_key, {"height": 150.0}, 1)]))
+        db.commit()
+    rows = db.query(PhysicalTestSummary).filter_by(class_id=None, test_type="期末测试", item="height").all()
+    assert [(row.value_count, row.value_sum) for row in rows] == [(2, 300.0)]
+    other.close()
+
+
+def test_delete_class_updates_summary_and_rank_index():
+    """删除班级时同一事务扣减其体测记录的汇总，排名索引不再包含这些记录"""
+    db = create_session(student_count=60)
+    rebuild_physical_test_summary(db)
+    batch_calculate_scores(db)
+    rank_index = get_rank_index()
+    rank_index.clear()
+    test = db.query(PhysicalTest).filter(PhysicalTest.class_id == 1).first()
+    cohort = rank_index.get_test_cohort(db, test)
+    assert test.id in rank_index.get_ranking(db, cohort, "total_score").members
+
+    assert class_crud.delete_class(db, 1, force=True)["success"]
+    assert db.query(PhysicalTest).filter(PhysicalTest.class_id == 1).count() == 0
+    assert check_physical_test_summary(db) == []
+    assert get_physical_test_summary(db, class_id=1)["height"]["count"] == 0
+    assert test.id not in rank_index.get_ranking(db, cohort, "total_score").members
+
+
+if __name__ == "__main__":
+    test_incremental_summary_matches_raw_data()
+    print("✅ PASS test_incremental_summary_matches_raw_data")
+    test_summary_statistics_and_consistency_check()
+    print("✅ PASS test_summary_statistics_and_consistency_check")
+    test_summary_deltas_are_applied_in_database()
+    print("✅ PASS test_summary_deltas_are_applied_in_database")
+    test_delete_class_updates_summary_and_rank_index()
+    print("✅ PASS test_delete_class_updates_summary_and_rank_index")
@@ -0,0 +1,272 @@
+#!/usr/bin/env python3
+# 测试学年升级（内存SQLite），并与原逐条实现对比耗时
+import time
+from datetime import date, datetime, timezone
+
+from sqlalchemy import create_engine, insert
+from sqlalchemy.orm import sessionmaker
+
+from models import (
+    Base, SchoolYear, SchoolYearStatusEnum, Class, Student, StudentClassRelation,
+    GenderEnum, StatusEnum, SchoolYearRollover, JobStatusEnum
+)
+from crud.school_year_crud import school_year_crud, SchoolYearCRUD, GRADE_MAP
+from crud.student_crud import sync_current_class
+from utils.data_consistency import DataConsistencyChecker
+from test_student_list_queries import count_statements
+
+GRADES = list(GRADE_MAP)
+
+
+def create_school(student_count, classes_per_grade=2):
+    """一至九年级，每个年级若干班级，学生平均分到各班并建立当前班级关系"""
+    engine = create_engine("sqlite://")
+    Base.metadata.create_all(engine)
+    db = sessionmaker(bind=engine)()
+    school_year = SchoolYear(
+        year_name="2025-2026学年", academic_year="2025-2026",
+        start_date=date(2025, 9, 1), end_date=date(2026, 7, 31), status=SchoolYearStatusEnum.active
+    )
+    db.add(school_year)
+    db.flush()
+    class_ids = db.execute(insert(Class).returning(Class.id, sort_by_parameter_order=True), [{
+        "class_name": f"{grade}{number}班", "grade": grade, "grade_level": level,
+        "school_year_id": school_year.id, "class_teacher_id": level * 10 + number,
+        "start_date": date(2025, 9, 1)
+    } for level, grade in enumerate(GRADES, 1) for number in range(1, classes_per_grade + 1)]).scalars().all()
+    db.execute(insert(Student), [{
+        "student_no": f"S{index:05d}", "real_name": f"学生{index}",
+        "gender": GenderEnum.male if index % 2 else GenderEnum.female,
+        "birth_date": date(2012, 1, 1), "enrollment_date": date(2020, 9, 1)
+    } for index in range(1, student_count + 1)])
+    db.execute(insert(StudentClassRelation), [{
+        "student_id": student_id, "class_id": class_ids[student_id % len(class_ids)],
+        "join_date": date(2025, 9, 1), "is_current": True
+    } for student_id in range(1, student_count + 1)])
+    # 历史关系，不应被复制
+    db.execute(insert(StudentClassRelation), [{
+        "student_id": 1, "class_id": class_ids[0], "join_date": date(2024, 9, 1), "is_current": False
+    }])
+    sync_current_class(db)
+    db.commit()
+    return db, school_year.id
+
+
+def legacy_promote_grades(db, school_year_id):
+    """原逐条实现（仅修正 academic_year、start_date 字段错误使其可运行），作为对比基准"""
+    promoted_classes = promoted_students = graduated_students = 0
+    current_year = db.query(SchoolYear).filter(SchoolYear.id == school_year_id).first()
+    current_year.status = SchoolYearStatusEnum.completed
+    classes = db.query(Class).filter(Class.school_year_id == school_year_id).all()
+    start_year = current_year.start_date.year + 1
+    new_school_year = SchoolYear(
+        school_id=current_year.school_id, year_name=f"{start_year}-{start_year + 1}学年",
+        academic_year=f"{start_year}-{start_year + 1}",
+        start_date=current_year.start_date.replace(year=start_year),
+        end_date=current_year.end_date.replace(year=start_year), status=SchoolYearStatusEnum.active
+    )
+    db.add(new_school_year)
+    db.flush()
+    for cls in classes:
+        new_grade, new_level = GRADE_MAP[cls.grade]
+        relations = db.query(StudentClassRelation).filter(
+            StudentClassRelation.class_id == cls.id, StudentClassRelation.is_current == True
+        ).all()
+        if new_grade is None:
+            for relation in relations:
+                student = db.query(Student).filter(Student.id == relation.student_id).first()
+                if student:
+                    student.status = StatusEnum.inactive
+                    student.graduation_date = datetime.now(timezone.utc).date()
+                    graduated_students += 1
+                relation.is_current = False
+        else:
+            new_class = Class(
+                school_id=cls.school_id, school_year_id=new_school_year.id,
+                class_name=cls.class_name.replace(cls.grade, new_grade), grade=new_grade,
+                grade_level=new_level, class_teacher_id=cls.class_teacher_id,
+                max_student_count=cls.max_student_count, status=cls.status,
+                start_date=new_school_year.start_date
+            )
+            db.add(new_class)
+            db.flush()
+            for relation in relations:
+                db.add(StudentClassRelation(
+                    student_id=relation.student_id, class_id=new_class.id, status=relation.status,
+                    join_date=datetime.now(timezone.utc).date(), is_current=True, user_id=relation.user_id
+                ))
+                promoted_students += 1
+            promoted_classes += 1
+            for relation in relations:
+                relation.is_current = False
+    db.commit()
+    return {"promoted_classes": promoted_classes, "promoted_students": promoted_students,
+            "graduated_students": graduated_students}
+
+
+def snapshot(db):
+    """升级后的可比较状态：学生当前班级名称、学年和状态"""
+    rows = db.query(Student.id, Student.status, Class.class_name, Class.grade_level, Class.class_teacher_id,
+                    SchoolYear.academic_year
+    ).outerjoin(StudentClassRelation, (StudentClassRelation.student_id == Student.id) & (StudentClassRelation.is_current == True)
+    ).outerjoin(Class, Class.id == StudentClassRelation.class_id
+    ).outerjoin(SchoolYear, SchoolYear.id == Class.school_year_id).order_by(Student.id).all()
+    return [tuple(row) for row in rows]
+
+
+def test_promotion_matches_legacy_and_keeps_current_class():
+    """升级结果与原实现一致，学生当前班级字段同步，未升级历史关系"""
+    db, school_year_id = create_school(200)
+    result = school_year_crud.promote_grades(db, school_year_id)
+    legacy_db, legacy_year_id = create_school(200)
+    legacy = legacy_promote_grades(legacy_db, legacy_year_id)
+
+    for key in ("promoted_classes", "promoted_students", "graduated_students"):
+        assert result[key] == legacy[key]
+    assert result["promoted_classes"] == 16 and result["graduated_students"] == 22
+    assert result["new_school_year"]["academic_year"] == "2026-2027"
+    assert snapshot(db) == snapshot(legacy_db)
+
+    student = db.get(Student, 10)
+    assert student.current_class_id is not None and student.current_school_year_id == result["new_school_year"]["id"]
+    assert db.get(Class, student.current_class_id).grade == "七年级"
+    graduate = db.get(Student, 16)
+    assert graduate.status == StatusEnum.inactive and graduate.current_class_id is None
+    assert db.query(StudentClassRelation).filter(StudentClassRelation.is_current == False,
+                                                 StudentClassRelation.leave_date.is_(None)).count() == 1
+    issues = DataConsistencyChecker(db).check_all()["issues"]
+    assert not [issue for issue in issues if issue["type"] == "student_current_class_mismatch"]
+
+
+def test_dry_run_reports_plan_without_writes():
+    """预览只返回计划数量，不修改任何数据"""
+    db, school_year_id = create_school(200)
+    before = snapshot(db)
+    plan = school_year_crud.promote_grades(db, school_year_id, dry_run=True)
+    assert plan["dry_run"] and plan["new_school_year"]["id"] is None
+    assert (plan["promoted_classes"], plan["promoted_students"], plan["graduated_students"]) == (16, 178, 22)
+    assert snapshot(db) == before and db.query(SchoolYear).count() == 1
+    assert db.get(SchoolYear, school_year_id).status == SchoolYearStatusEnum.active
+
+    result = school_year_crud.promote_grades(db, school_year_id)
+    assert (result["promoted_classes"], result["promoted_students"], result["graduated_students"]) == (16, 178, 22)
+
+
+def test_failed_run_resumes_from_checkpoint():
+    """中途失败时已完成的年级保留，再次执行从断点继续，结果与一次完成相同"""
+    db, school_year_id = create_school(200)
+    legacy_db, legacy_year_id = create_school(200)
+    legacy = legacy_promote_grades(legacy_db, legacy_year_id)
+
+    original_batch = SchoolYearCRUD._promote_grade_batch
+
+    def failing_batch(db, batch, new_school_year, today):
+        if batch["grade"] == "五年级":
+            original_batch(db, batch, new_school_year, today)
+            raise RuntimeError("磁盘已满")
+        return original_batch(db, batch, new_school_year, today)
+
+    SchoolYearCRUD._promote_grade_batch = staticmethod(failing_batch)
+    try:
+        school_year_crud.promote_grades(db, school_year_id)
+        assert False, "应抛出异常"
+    except RuntimeError:
+        pass
+    finally:
+        SchoolYearCRUD._promote_grade_batch = staticmethod(original_batch)
+
+    rollover = db.query(SchoolYearRollover).one()
+    assert rollover.status == JobStatusEnum.failed and "磁盘已满" in rollover.error
+    assert rollover.completed_grades == ["一年级", "二年级", "三年级", "四年级"]
+    assert db.get(SchoolYear, school_year_id).status == SchoolYearStatusEnum.active
+    # 失败的五年级整批回滚，未开始的年级不受影响
+    assert db.get(Class, db.get(Student, 8).current_class_id).school_year_id == school_year_id
+    assert db.get(Class, db.get(Student, 2).current_class_id).grade == "三年级"
+
+    plan = school_year_crud.preview_promotion(db, school_year_id)
+    assert plan["checkpoint"]["status"] == "failed" and not plan["errors"]
+    assert [batch["grade"] for batch in plan["grades"] if not batch["completed"]] == GRADES[4:]
+
+    result = school_year_crud.promote_grades(db, school_year_id)
+    assert result["resumed"]
+    for key in ("promoted_classes", "promoted_students", "graduated_students"):
+        assert result[key] == legacy[key]
+    assert snapshot(db) == snapshot(legacy_db)
+    assert db.query(SchoolYear).count() == 2
+    assert db.get(SchoolYear, school_year_id).status == SchoolYearStatusEnum.completed
+    assert db.get(SchoolYear, result["new_school_year"]["id"]).status == SchoolYearStatusEnum.active
+
+    # 已完成后再次执行被拒绝
+    try:
+        school_year_crud.promote_grades(db, school_year_id)
+        assert False, "应抛出异常"
+    except ValueError as e:
+        assert "已完成升级" in str(e)
+
+
+def test_preview_is_read_only_and_reports_problems():
+    """预览只执行 SELECT，给出各年级计划、无法识别的年级、重复当前班级和新学年冲突"""
+    db, school_year_id = create_school(200)
+    db.add(Class(class_name="特长班", grade="体育特长", grade_level=0, school_year_id=school_year_id,
+                 start_date=date(2025, 9, 1)))
+    db.add(StudentClassRelation(student_id=3, class_id=1, join_date=date(2025, 9, 1), is_current=True))
+    db.commit()
+
+    with count_statements(db) as statements:
+        plan = school_year_crud.preview_promotion(db, school_year_id)
+    assert all(statement.lstrip().upper().startswith("SELECT") for statement in statements), statements
+    assert [batch["grade"] for batch in plan["grades"]] == GRADES
+    first = plan["grades"][0]
+    assert first["target_grade"] == "二年级" and first["class_count"] == 2
+    assert first["classes"][0]["new_class_name"] == "二年级1班"
+    assert plan["grades"][-1]["target_grade"] is None
+    assert len(plan["warnings"]) == 2 and not plan["errors"]
+
+    db.add(SchoolYear(year_name="2026-2027学年", academic_year="2026-2027",
+                      start_date=date(2026, 9, 1), end_date=date(2027, 7, 31)))
+    db.commit()
+    assert school_year_crud.preview_promotion(db, school_year_id)["errors"] == ["新学年2026-2027已存在"]
+
+
+def test_statement_count_independent_of_student_count():
+    """语句数与学生数无关（按年级分批提交断点；SQLite 复制班级时按班级逐条 INSERT ... RETURNING）"""
+    counts = []
+    for student_count in (100, 1000):
+        db, school_year_id = create_school(student_count)
+        with count_statements(db) as statements:
+            school_year_crud.promote_grades(db, school_year_id)
+        counts.append(len(statements))
+    assert counts[0] == counts[1] <= 9 * 12, counts
+
+
+def test_benchmark_10k_students():
+    """1万学生：批量实现与原逐条实现对比"""
+    db, school_year_id = create_school(10000, classes_per_grade=20)
+    started = time.perf_counter()
+    result = school_year_crud.promote_grades(db, school_year_id)
+    elapsed = time.perf_counter() - started
+
+    legacy_db, legacy_year_id = create_school(10000, classes_per_grade=20)
+    started = time.perf_counter()
+    legacy_promote_grades(legacy_db, legacy_year_id)
+    legacy_elapsed = time.perf_counter() - started
+
+    print(f"  升级 {result['promoted_students']} 名、毕业 {result['graduated_students']} 名学生: "
+          f"批量 {elapsed:.2f}s，原实现 {legacy_elapsed:.2f}s（{legacy_elapsed / elapsed:.0f}倍）")
+    assert snapshot(db) == snapshot(legacy_db)
+    assert elapsed * 5 < legacy_elapsed
+
+
+if __name__ == "__main__":
+    test_promotion_matches_legacy_and_keeps_current_class()
+    print("✅ PASS test_promotion_matches_legacy_and_keeps_current_class")
+    test_dry_run_reports_plan_without_writes()
+    print("✅ PASS test_dry_run_reports_plan_without_writes")
+    test_failed_run_resumes_from_checkpoint()
+    print("✅ PASS test_failed_run_resumes_from_checkpoint")
+    test_preview_is_read_only_and_reports_problems()
+    print("✅ PASS test_preview_is_read_only_and_reports_problems")
+    test_statement_count_independent_of_student_count()
+    print("✅ PASS test_statement_count_independent_of_student_count")
+    test_benchmark_10k_students()
+    print("✅ PASS test_benchmark_10k_students")
@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+# 测试行级数据范围：列表查询在SQL中只返回用户可见的行，与 PermissionChecker 判断一致（内存SQLite）
+from types import SimpleNamespace
+
+from models import Class, FamilyInfo, PhysicalTest, Student, UserRoleEnum
+from schemas import StudentQueryParams
+from crud.student_crud import StudentCrud
+from crud.class_crud import ClassCrud
+from crud.physical_test_crud import (
+    get_physical_tests_page, get_physical_tests_by_class, get_physical_test_history, iter_physical_test_history
+)
+from utils.cache import get_cache_manager
+from utils.permissions import Permission, PermissionChecker, get_permission_cache
+from test_student_list_queries import count_statements, create_student_session
+
+PHONE = "13900000001"
+
+USERS = {
+    "admin": SimpleNamespace(id=1, role=UserRoleEnum.admin, phone=None),
+    "teacher": SimpleNamespace(id=99, role=UserRoleEnum.teacher, phone=None),
+    "student": SimpleNamespace(id=50, role=UserRoleEnum.student, phone=None),
+    "parent": SimpleNamespace(id=60, role=UserRoleEnum.parent, phone=PHONE),
+    "parent_without_phone": SimpleNamespace(id=61, role=UserRoleEnum.parent, phone=None),
+}
+
+
+def create_scope_session(**engine_options):
+    """120 个学生；1、2 班班主任为 99；学生 5 对应用户 50；学生 7、8 的家长电话为 PHONE"""
+    db = create_student_session(120, **engine_options)
+    db.query(Class).filter(Class.id.in_([1, 2])).update({"class_teacher_id": 99}, synchronize_session=False)
+    db.query(Student).filter(Student.id == 5).update({"user_id": 50}, synchronize_session=False)
+    db.add_all([
+        FamilyInfo(student_id=7, father_phone=PHONE),
+        FamilyInfo(student_id=8, mother_phone=PHONE),
+        FamilyInfo(student_id=9),
+    ])
+    db.commit()
+    get_permission_cache().clear()
+    get_cache_manager().get_cache("statistics").clear()
+    return db
+
+
+def visible_students(db, user):
+    checker = PermissionChecker(db)
+    return {row.id for row in db.query(Student.id)
+            if checker.check_student_access(user, row.id, Permission.STUDENT_VIEW)}
+
+
+def visible_tests(db, user, name):
+    """按定义逐条判断可见的体测记录：教师按记录所属班级，其他角色按学生"""
+    checker = PermissionChecker(db)
+    tests = db.query(PhysicalTest.id, PhysicalTest.class_id, PhysicalTest.student_id).all()
+    if name == "teacher":
+        return {test.id for test in tests if checker.check_class_access(user, test.class_id, Permission.CLASS_VIEW)}
+    return {test.id for test in tests if checker.check_student_access(user, test.student_id, Permission.STUDENT_VIEW)}
+
+
+def test_student_and_class_lists_match_permission_checker():
+    """学生、班级列表只返回 PermissionChecker 判断可访问的行"""
+    db = create_scope_session()
+    crud = StudentCrud()
+    params = StudentQueryParams(page=1, page_size=100)
+    expected_sizes = {"admin": 100, "teacher": 10, "student": 1, "parent": 2, "parent_without_phone": 0}
+    for name, user in USERS.items():
+        expected = visible_students(db, user)
+        rows, total, next_cursor = crud.get_students_page(db, params, user=user)
+        cursor_rows = []
+        while next_cursor:
+            page, _, next_cursor = crud.get_students_page(db, params, cursor=next_cursor, user=user)
+            cursor_rows += page
+        assert {row["id"] for row in rows + cursor_rows} == expected and total == len(expected), name
+        assert len(rows) == expected_sizes[name], name
+        legacy_rows, legacy_total = crud.get_students(db, params, user=user)
+        assert {student.id for student in legacy_rows} <= expected and legacy_total == len(expected), name
+
+        classes = ClassCrud().get_classes(db, user=user)
+        assert sorted(c.id for c in classes) == PermissionChecker(db).get_accessible_classes(user), name
+
+
+def test_physical_test_lists_match_permission_checker():
+    """体测列表、历史、导出只返回可见的记录"""
+    db = create_scope_session()
+    for name, user in USERS.items():
+        expected = visible_tests(db, user, name)
+        tests, _, total = get_physical_tests_page(db, limit=1000, include_total=True, user=user)
+        assert {test["id"] for test in tests} == expected and total == len(expected), name
+        assert {test["id"] for test in get_physical_test_history(db, None, 0, 1000, user=user)} == expected, name
+        exported = {row["id"] for row in iter_physical_test_history(db, {"school_year_id": 1}, user=user)}
+        assert exported == expected, name
+    # 教师指定不属于自己的班级时返回空
+    assert get_physical_tests_by_class(db, 3, user=USERS["teacher"]) == []
+    assert len(get_physical_tests_by_class(db, 1, user=USERS["teacher"])) == 10
+
+
+def test_scoping_adds_no_queries():
+    """范围过滤以子查询方式并入原查询，SQL条数不变"""
+    db = create_scope_session()
+    params = StudentQueryParams(page=1, page_size=20)
+    with count_statements(db) as statements:
+        StudentCrud().get_students_page(db, params, user=USERS["parent"])
+    assert len(statements) == 2
+    with count_statements(db) as statements:
+        get_physical_tests_page(db, limit=20, user=USERS["teacher"])
+    assert len(statements) == 1
+
+
+if __name__ == "__main__":
+    test_student_and_class_lists_match_permission_checker()
+    print("✅ PASS test_student_and_class_lists_match_permission_checker")
+    test_physical_test_lists_match_permission_checker()
+    print("✅ PASS test_physical_test_lists_match_permission_checker")
+    test_scoping_adds_no_queries()
+    print("✅ PASS test_scoping_adds_no_queries")
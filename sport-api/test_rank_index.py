@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+# 测试体测成绩排名索引（内存SQLite）
+from models import PhysicalTest, Class, Student
+from schemas import PhysicalTestUpdate
+from crud.class_crud import class_crud
+from crud.physical_test_crud import (
+    batch_calculate_scores, update_physical_test, delete_physical_test,
+    get_physical_test_rank, get_class_rankings, get_cohort_top
+)
+from utils.rank_index import RankIndex, get_rank_index
+from test_batch_scoring import create_session
+
+
+def cohort_values(db, test, item):
+    """暴力计算：同学年、同年级、同性别、同测试类型的全部成绩"""
+    class_obj = db.get(Class, test.class_id)
+    gender = db.get(Student, test.student_id).gender
+    rows = db.query(PhysicalTest).join(Class, Class.id == PhysicalTest.class_id).join(Student, Student.id == PhysicalTest.student_id).filter(
+        Class.school_year_id == class_obj.school_year_id,
+        Class.grade_level == class_obj.grade_level,
+        Student.gender == gender,
+        PhysicalTest.test_type == test.test_type
+    ).all()
+    return [getattr(row, item) for row in rows if getattr(row, item)]
+
+
+def test_rank_matches_brute_force():
+    """名次和百分位与暴力计算一致（计时项目越小越好）"""
+    db = create_session(student_count=600)
+    get_rank_index().clear()
+    batch_calculate_scores(db)
+
+    for test_id in (1, 50, 333):
+        test = db.get(PhysicalTest, test_id)
+        rank = get_physical_test_rank(db, test_id, ["total_score", "run_50m"])["items"]
+
+        scores = cohort_values(db, test, "total_score")
+        assert rank["total_score"]["total"] == len(scores)
+        assert rank["total_score"]["rank"] == len([s for s in scores if s > test.total_score]) + 1
+
+        times = cohort_values(db, test, "run_50m")
+        assert rank["run_50m"]["rank"] == len([t for t in times if t < test.run_50m]) + 1
+        worse = len([t for t in times if t > test.run_50m])
+        ties = len([t for t in times if t == test.run_50m])
+        assert rank["run_50m"]["percentile"] == round((worse + ties / 2) / len(times) * 100, 2)
+
+
+def test_incremental_updates_match_reload():
+    """增量更新后的索引与重新加载结果一致"""
+    db = create_session(student_count=300)
+    index = get_rank_index()
+    index.clear()
+    batch_calculate_scores(db)
+    get_class_rankings(db, 1)
+
+    update_physical_test(db, 1, PhysicalTestUpdate(run_50m=6.0))
+    batch_calculate_scores(db, class_id=1)
+    delete_physical_test(db, 13)
+
+    fresh = RankIndex()
+    test = db.get(PhysicalTest, 1)
+    cohort = index.get_test_cohort(db, test)
+    assert index.get_ranking(db, cohort, "total_score").entries == fresh.get_ranking(db, cohort, "total_score").entries
+
+    rankings = get_class_rankings(db, 1)
+    assert rankings[0]["percentile"] >= rankings[-1]["percentile"]
+    top = get_cohort_top(db, *cohort, limit=3)
+    assert top[0]["rank"] == 1
+    assert top[0]["value"] >= top[-1]["value"]
+
+
+def test_class_changes_refresh_cohorts():
+    """班级年级修改后体测记录归入新队列；其他进程修改的班级在有效期后生效"""
+    db = create_session(student_count=60)
+    index = get_rank_index()
+    index.clear()
+    test = db.get(PhysicalTest, 1)
+    school_year_id, grade_level, gender, test_type = index.get_test_cohort(db, test)
+
+    class_crud.update_class(db, test.class_id, {"grade_level": grade_level + 1})
+    assert index.get_test_cohort(db, test) == (school_year_id, grade_level + 1, gender, test_type)
+
+    # 绕过 class_crud 直接修改（如学年升级任务在工作进程中执行）
+    short_lived = RankIndex(ttl=0)
+    short_lived.get_test_cohort(db, test)
+    db.query(Class).filter(Class.id == test.class_id).update({"grade_level": grade_level + 2})
+    db.commit()
+    assert short_lived.get_test_cohort(db, test)[1] == grade_level + 2
+
+
+if __name__ == "__main__":
+    test_rank_matches_brute_force()
+    print("✅ PASS test_rank_matches_brute_force")
+    test_incremental_updates_match_reload()
+    print("✅ PASS test_incremental_updates_match_reload")
+    test_class_changes_refresh_cohorts()
+    print("✅ PASS test_class_changes_refresh_cohorts")
@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+# 测试国家学生体质健康标准评分引擎
+from config import settings
+from utils.score_standards import ScoreStandardEngine, get_score_engine, parse_measurement
+
+
+def test_parse_measurement():
+    """测试评分表单元格解析"""
+    assert parse_measurement("1'36\"") == 96
+    assert parse_measurement("-35\"") == -35
+    assert parse_measurement("10.2") == 10.2
+    assert parse_measurement("") is None
+
+
+def test_item_lookup():
+    """测试单项二分查找（数值越大越好 / 计时项目越小越好）"""
+    engine = get_score_engine()
+    # 初二男生引体向上：14个满分，5个及格
+    assert engine.score_item("pull_up", "male", 8, 14) == 100
+    assert engine.score_item("pull_up", "male", 8, 20) == 100
+    assert engine.score_item("pull_up", "male", 8, 5) == 60
+    assert engine.score_item("pull_up", "male", 8, 0) == 0
+    # 初二男生1000米：3'50"满分，恰好等于阈值也应命中
+    assert engine.score_item("run_1000m", "male", 8, 230) == 100
+    assert engine.score_item("run_1000m", "male", 8, 231) == 95
+    assert engine.score_item("run_1000m", "male", 8, 500) == 0
+
+
+def test_bmi_lookup():
+    """测试BMI区间查找"""
+    engine = get_score_engine()
+    assert engine.score_item("bmi", "female", 3, 16.0) == 100
+    assert engine.score_item("bmi", "female", 3, 12.0) == 80
+    assert engine.score_item("bmi", "female", 3, 25.0) == 60
+
+
+def test_calculate_with_bonus():
+    """测试加权总分与加分"""
+    engine = get_score_engine()
+    result = engine.calculate({"run_1000m": 200, "pull_up": 14}, "male", 8)
+    assert result["bonus_score"] > 0
+    assert result["total_score"] == round(result["standard_score"] + result["bonus_score"], 1)
+    assert engine.calculate({}, "male", None) is None
+
+
+def test_engine_is_independent():
+    """测试引擎可独立加载"""
+    engine = ScoreStandardEngine().load_directory(settings.score_standards_dir)
+    assert engine.get_stats()["score_tables"] == len(get_score_engine().tables)
+
+
+
+def test_artifact_matches_csv():
+    """预编译评分表与CSV解析结果一致，且版本号与当前CSV一致（CSV更新后需重新编译）"""
+    from_csv = ScoreStandardEngine().load_directory(settings.score_standards_dir)
+    from_artifact = ScoreStandardEngine().load_artifact(settings.score_tables_artifact)
+    assert from_artifact.version == from_csv.version
+    assert from_artifact.to_artifact() == from_csv.to_artifact()
+    measurements = {"height": 160, "weight": 50, "vital_capacity": 3200, "run_50m": 7.8, "run_1000m": 220, "pull_up": 16}
+    assert from_artifact.calculate(measurements, "male", 9) == from_csv.calculate(measurements, "male", 9)
+
+
+if __name__ == "__main__":
+    for name, func in list(globals().items()):
+        if name.startswith("test_") and callable(func):
+            func()
+            print(f"✅ PASS {name}")
@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+# 测试学生当前班级冗余字段的同步与校验（内存SQLite）
+from datetime import date
+from types import SimpleNamespace
+
+from models import Class, SchoolYear, Student, UserRoleEnum
+from crud.student_crud import StudentCrud, sync_current_class
+from crud.class_crud import ClassCrud
+from utils.data_consistency import DataConsistencyChecker
+from utils.permissions import PermissionChecker, Permission
+from test_batch_scoring import create_session
+
+
+def current(db, student_id):
+    db.expire_all()
+    student = db.query(Student).filter(Student.id == student_id).one()
+    return student.current_class_id, student.current_school_year_id
+
+
+def add_next_year_class(db):
+    """新学年的一个班级"""
+    school_year = SchoolYear(
+        year_name="2026-2027学年", academic_year="2026-2027",
+        start_date=date(2026, 9, 1), end_date=date(2027, 7, 31)
+    )
+    db.add(school_year)
+    db.flush()
+    class_obj = Class(class_name="2年级1班", grade="2年级", grade_level=2,
+                      school_year_id=school_year.id, start_date=date(2026, 9, 1))
+    db.add(class_obj)
+    db.commit()
+    return class_obj
+
+
+def test_class_operations_keep_current_class_in_sync():
+    """分班、转班、移出班级、删除班级都同步学生的当前班级和学年"""
+    db = create_session(student_count=3)
+    crud = StudentCrud()
+    next_class = add_next_year_class(db)
+    assert current(db, 1) == (None, None)
+
+    assert crud.assign_student_to_class(db, 1, 3)
+    assert current(db, 1) == (3, 1)
+    assert crud.assign_student_to_class(db, 1, 4)
+    assert current(db, 1) == (4, 1)
+
+    ok, _ = crud.transfer_student(db, 1, 4, next_class.id, date(2026, 9, 1))
+    assert ok and current(db, 1) == (next_class.id, next_class.school_year_id)
+
+    assert crud.remove_student_from_class(db, 1, next_class.id, date(2026, 10, 1))
+    assert current(db, 1) == (None, None)
+
+    assert crud.assign_student_to_class(db, 2, 5)
+    assert ClassCrud().delete_class(db, 5, force=True)["success"]
+    assert current(db, 2) == (None, None)
+    issues = DataConsistencyChecker(db).check_all()["issues"]
+    assert not [issue for issue in issues if issue["type"] == "student_current_class_mismatch"]
+
+
+def test_access_checks_use_current_class():
+    """教师访问学生、学生可访问班级、报名校验都按当前班级判断"""
+    db = create_session(student_count=3)
+    crud = StudentCrud()
+    db.query(Class).filter(Class.id == 3).update({"class_teacher_id": 99})
+    db.commit()
+    crud.assign_student_to_class(db, 1, 3)
+    crud.assign_student_to_class(db, 2, 4)
+    db.query(Student).filter(Student.id == 1).update({"user_id": 50})
+    db.commit()
+
+    checker = PermissionChecker(db)
+    teacher = SimpleNamespace(id=99, role=UserRoleEnum.teacher, phone=None)
+    assert checker.check_student_access(teacher, 1, Permission.STUDENT_VIEW)
+    assert not checker.check_student_access(teacher, 2, Permission.STUDENT_VIEW)
+    assert not checker.check_student_access(teacher, 3, Permission.STUDENT_VIEW)
+
+    student_user = SimpleNamespace(id=50, role=UserRoleEnum.student, phone=None)
+    assert checker.get_accessible_classes(student_user) == [3]
+    assert checker.check_class_access(student_user, 3, Permission.CLASS_VIEW)
+    assert not checker.check_class_access(student_user, 4, Permission.CLASS_VIEW)
+
+
+def test_checker_detects_and_fixes_drift():
+    """冗余字段与关系不一致时一致性检查报告问题，自动修复后一致"""
+    db = create_session(student_count=4)
+    crud = StudentCrud()
+    for student_id in (1, 2, 3):
+        crud.assign_student_to_class(db, student_id, student_id)
+    db.query(Student).filter(Student.id.in_([1, 4])).update({"current_class_id": 7}, synchronize_session=False)
+    db.query(Student).filter(Student.id == 2).update({"current_school_year_id": None}, synchronize_session=False)
+    db.commit()
+
+    checker = DataConsistencyChecker(db)
+    checker.check_all()
+    drift = sorted(issue["record_id"] for issue in checker.issues if issue["type"] == "student_current_class_mismatch")
+    assert drift == [1, 2, 4]
+
+    checker.auto_fix_issues(dry_run=False)
+    assert [current(db, student_id) for student_id in (1, 2, 3, 4)] == [(1, 1), (2, 1), (3, 1), (None, None)]
+    assert sync_current_class(db, []) == 0
+
+
+if __name__ == "__main__":
+    test_class_operations_keep_current_class_in_sync()
+    print("✅ PASS test_class_operations_keep_current_class_in_sync")
+    test_access_checks_use_current_class()
+    print("✅ PASS test_access_checks_use_current_class")
+    test_checker_detects_and_fixes_drift()
+    print("✅ PASS test_checker_detects_and_fixes_drift")
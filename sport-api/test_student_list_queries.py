@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+# 测试学生列表（含班级信息）的查询次数（内存SQLite）
+from contextlib import contextmanager
+from datetime import date
+
+from sqlalchemy import event, insert
+
+from models import StudentClassRelation, Class
+from schemas import StudentQueryParams
+from crud.student_crud import StudentCrud, sync_current_class
+from test_batch_scoring import create_session
+
+
+@contextmanager
+def count_statements(db):
+    """统计代码块内执行的SQL语句数"""
+    statements = []
+    engine = db.get_bind()
+
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        yield statements
+    finally:
+        event.remove(engine, "before_cursor_execute", before_cursor_execute)
+
+
+def create_student_session(student_count, **engine_options):
+    """生成学生及当前班级关系（每6个学生有1个没有班级）"""
+    db = create_session(student_count=student_count, **engine_options)
+    db.execute(insert(StudentClassRelation), [{
+        "student_id": student_id, "class_id": student_id % 12 + 1,
+        "join_date": date(2025, 9, 1), "is_current": True
+    } for student_id in range(1, student_count + 1) if student_id % 6])
+    # 一条历史关系，不应出现在结果中
+    db.execute(insert(StudentClassRelation), [{
+        "student_id": 1, "class_id": 12, "join_date": date(2024, 9, 1), "is_current": False
+    }])
+    sync_current_class(db)
+    db.commit()
+    db.expunge_all()
+    return db
+
+
+def test_student_page_uses_constant_queries():
+    """整页学生列表（总数 + 数据）固定为2条SQL，与每页行数无关"""
+    db = create_student_session(300)
+    crud = StudentCrud()
+    for page_size in (10, 100):
+        db.expunge_all()
+        with count_statements(db) as statements:
+            items, total = crud.get_students_with_class(db, StudentQueryParams(page=1, page_size=page_size))
+        assert total == 300 and len(items) == page_size
+        assert len(statements) == 2, statements
+
+
+def test_student_page_class_info_is_correct():
+    """班级、学年信息正确，无班级的学生保留，班级/年级过滤生效"""
+    db = create_student_session(60)
+    crud = StudentCrud()
+    items, total = crud.get_students_with_class(db, StudentQueryParams(page=1, page_size=100))
+    assert total == 60
+    for item in items:
+        if item["id"] % 6 == 0:
+            assert item["current_class_id"] is None and item["current_academic_year"] is None
+            continue
+        class_obj = db.get(Class, item["id"] % 12 + 1)
+        assert item["current_class_id"] == class_obj.id
+        assert item["current_class_name"] == class_obj.class_name
+        assert item["current_grade_level"] == class_obj.grade_level
+        assert item["current_academic_year"] == "2025-2026"
+
+    items, total = crud.get_students_with_class(db, StudentQueryParams(page=1, page_size=100, class_id=2))
+    assert total == len(items) == 5 and all(item["current_class_id"] == 2 for item in items)
+    items, total = crud.get_students_with_class(db, StudentQueryParams(page=1, page_size=100, grade="2年级", gender="female"))
+    assert total == 5 and all(item["gender"] == "female" for item in items)
+
+
+if __name__ == "__main__":
+    test_student_page_uses_constant_queries()
+    print("✅ PASS test_student_page_uses_constant_queries")
+    test_student_page_class_info_is_correct()
+    print("✅ PASS test_student_page_class_info_is_correct")
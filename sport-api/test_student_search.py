@@ -0,0 +1,203 @@
+#!/usr/bin/env python3
+# 测试学生搜索索引（内存SQLite）
+import random
+import threading
+import time
+from datetime import date
+
+from sqlalchemy import insert
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import StaticPool
+
+from models import Student, UserRoleEnum
+from schemas import StudentCreate, StudentUpdate
+from crud.student_crud import StudentCrud
+from utils.student_search import StudentSearchIndex, get_student_search_index
+from routes.students import router as students_router
+from test_batch_scoring import create_session
+from test_physical_test_routes import create_client, create_route_session, make_user
+
+SURNAMES = "王李张刘陈杨黄赵吴周徐孙马朱胡郭何高林罗郑梁谢宋唐许韩冯邓曹彭曾肖田董袁潘于蒋蔡余杜叶程苏魏吕丁任沈"
+GIVEN_CHARS = "伟芳娜秀英敏静丽强磊军洋勇艳杰娟涛明超秀兰霞平刚桂英华玉萍红娥玲芬芳燕彩春菊兰凤洁梅琳素云莲真环雪荣爱妹霞香月莺媛艳瑞凡佳嘉琼勤珍贞莉桂娣叶璧璐娅琦晶妍茜秋珊莎锦黛青倩婷姣婉娴瑾颖露瑶怡婵雁蓓纨仪荷丹蓉眉君琴蕊薇菁梦岚苑婕馨瑗琰韵融园艺咏卿聪澜纯毓悦昭冰爽琬茗羽希宁欣飘育滢馥筠柔竹霭凝晓欢霄枫芸菲寒伊亚宜可姬舒影荔枝思丽"
+
+NAMED_STUDENTS = [
+    ("S90001", "张三丰", "110101201001011234"),
+    ("S90002", "张小凡", "11010120100202123X"),
+    ("S90003", "李三", None),
+]
+
+
+def add_named_students(db):
+    """添加用于校验的学生"""
+    db.execute(insert(Student), [{
+        "student_no": student_no, "real_name": real_name, "id_card": id_card, "gender": "male",
+        "birth_date": date(2012, 1, 1), "enrollment_date": date(2020, 9, 1)
+    } for student_no, real_name, id_card in NAMED_STUDENTS])
+    db.commit()
+
+
+def names(results):
+    return [item["real_name"] for item in results]
+
+
+def test_search_by_name_pinyin_and_numbers():
+    """姓名、名字、全拼、首字母、学籍号前缀、身份证号前缀和后几位均可搜索"""
+    db = create_session(student_count=20)
+    add_named_students(db)
+    index = StudentSearchIndex()
+
+    assert names(index.search(db, "张三丰")) == ["张三丰"]
+    assert set(names(index.search(db, "三"))) == {"张三丰", "李三"}
+    assert names(index.search(db, "小凡")) == ["张小凡"]
+    assert names(index.search(db, "zhangsanfeng")) == ["张三丰"]
+    assert set(names(index.search(db, "zhang"))) == {"张三丰", "张小凡"}
+    assert names(index.search(db, "zsf")) == ["张三丰"]
+    assert "李三" in names(index.search(db, "san"))
+    assert names(index.search(db, "S9000")) == ["张三丰", "张小凡", "李三"]
+    assert names(index.search(db, "s90003")) == ["李三"]
+    assert names(index.search(db, "11010120100202")) == ["张小凡"]
+    assert names(index.search(db, "123x")) == ["张小凡"]
+    assert names(index.search(db, "1234")) == ["张三丰"]
+    assert index.search(db, "不存在") == [] and index.search(db, "  ") == []
+    assert len(index.search(db, "s", limit=5)) == 5
+
+
+def test_index_follows_student_writes():
+    """通过 CRUD 新增、修改、删除学生后索引同步更新"""
+    db = create_session(student_count=5)
+    index = get_student_search_index()
+    index.clear()
+    crud = StudentCrud()
+    assert index.search(db, "wangwu") == []
+
+    student = crud.create_student(db, StudentCreate(
+        student_no="S80001", real_name="王五", gender="male",
+        birth_date=date(2012, 1, 1), enrollment_date=date(2020, 9, 1)
+    ))
+    assert names(index.search(db, "wangwu")) == ["王五"]
+
+    crud.update_student(db, student.id, StudentUpdate(real_name="王六"))
+    assert index.search(db, "wangwu") == []
+    assert names(index.search(db, "wl")) == ["王六"]
+
+    crud.delete_student(db, student.id)
+    assert index.search(db, "S80001") == []
+    index.clear()
+
+
+def test_expired_index_rebuilds_in_background():
+    """索引过期后在后台重建，期间查询使用旧索引不阻塞；重建期间的增量修改不丢失"""
+    db = create_session(student_count=20, connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    add_named_students(db)
+    gate = threading.Event()
+    Session = sessionmaker(bind=db.get_bind())
+
+    def slow_session():
+        gate.wait(10)
+        return Session()
+
+    index = StudentSearchIndex(ttl=60, session_factory=slow_session)
+    index.load(db)
+    index._refresh_after = time.time() - 1
+    db.execute(insert(Student), [{
+        "student_no": "S90004", "real_name": "赵四", "gender": "male",
+        "birth_date": date(2012, 1, 1), "enrollment_date": date(2020, 9, 1)
+    }])
+    db.commit()
+
+    started = time.perf_counter()
+    assert names(index.search(db, "zhang")) == ["张三丰", "张小凡"]
+    assert index.search(db, "赵四") == []
+    assert time.perf_counter() - started < 1 and index.get_stats()["refreshing"]
+    # 重建期间的修改：先作用于旧索引，替换后重放到新索引
+    student = db.query(Student).filter(Student.student_no == "S90002").one()
+    student.real_name = "王小凡"
+    db.commit()
+    index.update_student(student)
+    index.remove_student(db.query(Student.id).filter(Student.student_no == "S90003").scalar())
+    assert names(index.search(db, "小凡")) == ["王小凡"]
+
+    gate.set()
+    deadline = time.time() + 10
+    while index.get_stats()["refreshing"] and time.time() < deadline:
+        time.sleep(0.01)
+    assert names(index.search(db, "赵四")) == ["赵四"]
+    assert names(index.search(db, "小凡")) == ["王小凡"] and index.search(db, "李三") == []
+    assert index.get_stats()["last_error"] is None
+
+
+def test_search_is_limited_to_visible_students():
+    """非管理员只能搜到自己可见的学生，且不能按身份证号后几位搜索"""
+    db = create_route_session()
+    db.query(Student).filter(Student.id == 13).update({"id_card": "110101201001015678"})
+    db.commit()
+    get_student_search_index().clear()
+
+    def search(user, q, limit=50):
+        client = create_client(db, user, students_router, "/api/v1/students")
+        response = client.get("/api/v1/students/search", params={"q": q, "limit": limit})
+        assert response.status_code == 200, response.text
+        return {item["id"] for item in response.json()}
+
+    admin = make_user(1, UserRoleEnum.admin)
+    teacher = make_user(99, UserRoleEnum.teacher)
+    # 教师为 1、2 班班主任：学生ID除以12余0或1（每6个学生中有1个没有班级），学生ID为 n 的姓名为"学生{n-1}"
+    own = {student_id for student_id in range(1, 121) if student_id % 12 in (0, 1) and student_id % 6}
+    assert len(search(admin, "学生")) == 50
+    assert search(teacher, "学生") == own
+    assert search(teacher, "学生", limit=3) == set(sorted(own, key=lambda student_id: f"学生{student_id - 1}")[:3])
+    assert search(teacher, "学生1") == {student_id for student_id in own if str(student_id - 1).startswith("1")}
+    assert search(make_user(50, UserRoleEnum.student), "学生") == {5}
+
+    # 身份证号后几位只有管理员可以搜索，前缀在可见范围内可以搜索
+    assert search(admin, "5678") == {13}
+    assert search(teacher, "5678") == set()
+    assert search(teacher, "1101012010") == {13}
+    assert search(make_user(50, UserRoleEnum.student), "1101012010") == set()
+    get_student_search_index().clear()
+
+
+def test_search_latency_at_100k_students():
+    """10万学生时搜索 p99 低于 10ms"""
+    db = create_session(student_count=0)
+    rng = random.Random(3)
+    db.execute(insert(Student), [{
+        "student_no": f"2024{index:07d}",
+        "real_name": rng.choice(SURNAMES) + "".join(rng.choice(GIVEN_CHARS) for _ in range(rng.randint(1, 2))),
+        "id_card": f"1101012012{index:08d}",
+        "gender": "male" if index % 2 else "female",
+        "birth_date": date(2012, 1, 1), "enrollment_date": date(2020, 9, 1)
+    } for index in range(100000)])
+    db.commit()
+
+    index = StudentSearchIndex()
+    started = time.perf_counter()
+    index.load(db)
+    print(f"  建立索引: {time.perf_counter() - started:.2f}s, {index.get_stats()}")
+
+    queries = ["王", "张伟", "芳", "li", "zhangw", "zw", "wangxiu", "2024000", "20240051234", "1101012012", "0042", "秀英"]
+    queries += [rng.choice(SURNAMES) + rng.choice(GIVEN_CHARS) for _ in range(200)]
+    latencies = []
+    for _ in range(3):
+        for query in queries:
+            started = time.perf_counter()
+            results = index.search(db, query)
+            latencies.append((time.perf_counter() - started) * 1000)
+            assert len(results) <= 10
+    latencies.sort()
+    p99 = latencies[int(len(latencies) * 0.99)]
+    print(f"  {len(latencies)} 次搜索: p50 {latencies[len(latencies) // 2]:.3f}ms, p99 {p99:.3f}ms")
+    assert p99 < 10
+
+
+if __name__ == "__main__":
+    test_search_by_name_pinyin_and_numbers()
+    print("✅ PASS test_search_by_name_pinyin_and_numbers")
+    test_index_follows_student_writes()
+    print("✅ PASS test_index_follows_student_writes")
+    test_expired_index_rebuilds_in_background()
+    print("✅ PASS test_expired_index_rebuilds_in_background")
+    test_search_is_limited_to_visible_students()
+    print("✅ PASS test_search_is_limited_to_visible_students")
+    test_search_latency_at_100k_students()
+    print("✅ PASS test_search_latency_at_100k_students")
@@ -0,0 +1,88 @@
+#!/usr/bin/env python3
+# 测试令牌表按摘要保存、查找、撤销和分批清理（内存SQLite）
+from datetime import datetime, timedelta
+
+from auth import AuthService
+from crud import token_crud
+from models import Token
+from utils.auth_cache import get_auth_cache, token_key
+from test_auth_cache import create_session, assert_unauthorized
+from test_student_list_queries import count_statements
+
+
+def issue(db, user_id=1, refresh_expires_in=timedelta(days=7), access_expires_in=timedelta(minutes=30)):
+    """签发一对访问令牌和刷新令牌并登记"""
+    access_token = AuthService.create_access_token({"sub": str(user_id)}, access_expires_in)
+    refresh_token = AuthService.create_refresh_token({"sub": str(user_id)}, timedelta(days=7))
+    now = datetime.utcnow()
+    token_crud.create_token(db, {
+        "user_id": user_id, "access_token": access_token, "refresh_token": refresh_token,
+        "expires_at": now + access_expires_in,
+        "refresh_expires_at": now + refresh_expires_in if refresh_expires_in is not None else None
+    })
+    return access_token, refresh_token
+
+
+def test_tokens_stored_as_digests():
+    """令牌表只保存定长摘要，按摘要用索引查找"""
+    db = create_session()
+    access_token, refresh_token = issue(db)
+    row = db.query(Token).one()
+    assert row.access_token_hash == token_key(access_token) and len(row.access_token_hash) == 64
+    assert row.refresh_token_hash == token_key(refresh_token)
+    assert token_crud.get_token_by_access_token(db, access_token).id == row.id
+    assert token_crud.get_token_by_refresh_token(db, refresh_token).id == row.id
+    assert token_crud.get_token_by_refresh_token(db, access_token) is None
+
+    with count_statements(db) as statements:
+        assert not token_crud.is_token_revoked(db, access_token)
+    assert len(statements) == 1
+    plan = " ".join(str(step[-1]) for step in db.connection().exec_driver_sql(
+        "EXPLAIN QUERY PLAN " + statements[0], (row.access_token_hash, row.access_token_hash, 1, 0)
+    ))
+    assert "ix_tokens_access_token_hash" in plan and "ix_tokens_refresh_token_hash" in plan, plan
+
+
+def test_revoking_refresh_token_revokes_pair():
+    """用刷新令牌撤销（刷新接口），同一记录的访问令牌在数据库和缓存中同时失效"""
+    db = create_session()
+    access_token, refresh_token = issue(db)
+    AuthService.get_current_user(access_token, db)
+    assert token_crud.revoke_token(db, refresh_token)
+    assert token_crud.is_token_revoked(db, access_token)
+    assert_unauthorized(db, access_token, "令牌已被撤销")
+    assert not token_crud.revoke_token(db, "not-a-token")
+
+
+def test_sweep_removes_revoked_and_expired_in_batches():
+    """分批删除已撤销和已过期的记录，保留仍有效的令牌"""
+    db = create_session()
+    live = [issue(db) for _ in range(3)]
+    issue(db, refresh_expires_in=None)
+    for _ in range(5):
+        issue(db, refresh_expires_in=timedelta(days=-1))
+    issue(db, refresh_expires_in=None, access_expires_in=timedelta(minutes=-1))
+    revoked = [issue(db) for _ in range(2)]
+    for access_token, _ in revoked:
+        token_crud.revoke_token(db, access_token)
+
+    with count_statements(db) as statements:
+        assert token_crud.sweep_expired_tokens(db, batch_size=3) == 8
+    # 3 批删除各需一次查询和一次删除，最后一次查询为空
+    assert len([s for s in statements if s.lstrip().startswith(("SELECT", "DELETE"))]) == 7
+    assert db.query(Token).count() == 4
+    for access_token, refresh_token in live:
+        assert not token_crud.is_token_revoked(db, access_token)
+        assert token_crud.get_token_by_refresh_token(db, refresh_token) is not None
+    # 被清理的令牌视为已撤销
+    assert token_crud.is_token_revoked(db, revoked[0][0])
+    get_auth_cache().clear()
+
+
+if __name__ == "__main__":
+    test_tokens_stored_as_digests()
+    print("✅ PASS test_tokens_stored_as_digests")
+    test_revoking_refresh_token_revokes_pair()
+    print("✅ PASS test_revoking_refresh_token_revokes_pair")
+    test_sweep_removes_revoked_and_expired_in_batches()
+    print("✅ PASS test_sweep_removes_revoked_and_expired_in_batches")
@@ -0,0 +1,151 @@
+# 体育教学辅助网站 - 认证缓存
+# 进程内缓存每个请求认证都要做的两次查询：令牌撤销状态和当前用户
+# - 令牌：已解码的载荷和撤销状态，有效期取缓存有效期与令牌过期时间中较早者
+# - 用户：用户表各列的快照，每次请求据此构造一个不属于任何会话的 User 对象
+# 本进程内的登出、撤销全部令牌、修改角色/状态/密码会立即失效对应条目；
+# 其他进程（多 worker 部署）的修改最多延迟一个缓存有效期生效
+
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+from config import settings
+from models import User
+
+# 用户快照包含的列
+USER_SNAPSHOT_COLUMNS = [column.key for column in User.__table__.columns]
+
+
+def token_key(token: str) -> str:
+    """令牌的 SHA-256 摘要，用作缓存键，也是令牌表中保存的值（不保存令牌原文）"""
+    return hashlib.sha256(token.encode("utf-8")).hexdigest()
+
+
+class AuthCache:
+    """令牌撤销状态和用户快照缓存（按最近使用淘汰，条目数有上限）"""
+
+    def __init__(self, ttl: int = 30, max_entries: int = 10000):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        # 令牌键 -> (缓存到期时间, 载荷, 是否已撤销)
+        self._tokens: "OrderedDict[str, Tuple[float, Dict[str, Any], bool]]" = OrderedDict()
+        # 用户ID -> (缓存到期时间, 用户列快照)
+        self._users: "OrderedDict[int, Tuple[float, Dict[str, Any]]]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def _get(entries: OrderedDict, key):
+        entry = entries.get(key)
+        if entry is None:
+            return None
+        if entry[0] < time.time():
+            del entries[key]
+            return None
+        entries.move_to_end(key)
+        return entry
+
+    def _put(self, entries: OrderedDict, key, entry):
+        entries[key] = entry
+        entries.move_to_end(key)
+        while len(entries) > self.max_entries:
+            entries.popitem(last=False)
+
+    # ============ 令牌 ============
+
+    def get_token(self, token: str) -> Optional[Tuple[Dict[str, Any], bool]]:
+        """获取令牌的 (载荷, 是否已撤销)，未缓存或已过期时返回 None"""
+        with self._lock:
+            entry = self._get(self._tokens, token_key(token))
+            if entry is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            return entry[1], entry[2]
+
+    def set_token(self, token: str, payload: Dict[str, Any], revoked: bool):
+        """缓存令牌的载荷和撤销状态"""
+        expires_at = time.time() + self.ttl
+        if payload.get("exp"):
+            expires_at = min(expires_at, float(payload["exp"]))
+        with self._lock:
+            self._put(self._tokens, token_key(token), (expires_at, payload, revoked))
+
+    def revoke_token(self, token: str):
+        """令牌被撤销（登出）后立即生效"""
+        self.revoke_token_keys([token_key(token)])
+
+    def revoke_token_keys(self, keys):
+        """按令牌摘要撤销（同一令牌记录的访问令牌和刷新令牌）"""
+        with self._lock:
+            for key in keys:
+                entry = self._tokens.get(key)
+                if entry is not None:
+                    self._tokens[key] = (entry[0], entry[1], True)
+
+    def revoke_user_tokens(self, user_id: int):
+        """用户全部令牌被撤销后立即生效"""
+        with self._lock:
+            for key, (expires_at, payload, _) in list(self._tokens.items()):
+                if str(payload.get("sub")) == str(user_id):
+                    self._tokens[key] = (expires_at, payload, True)
+
+    # ============ 用户 ============
+
+    def get_user(self, user_id: int) -> Optional[User]:
+        """按快照构造用户对象（不属于任何会话），未缓存或已过期时返回 None"""
+        with self._lock:
+            entry = self._get(self._users, user_id)
+            if entry is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            return User(**entry[1])
+
+    def set_user(self, user: User):
+        """缓存用户各列的快照"""
+        snapshot = {key: getattr(user, key) for key in USER_SNAPSHOT_COLUMNS}
+        with self._lock:
+            self._put(self._users, user.id, (time.time() + self.ttl, snapshot))
+
+    def invalidate_user(self, user_id: int):
+        """用户信息（角色、状态、密码等）修改后失效快照"""
+        with self._lock:
+            self._users.pop(user_id, None)
+
+    def clear(self):
+        """清空缓存"""
+        with self._lock:
+            self._tokens.clear()
+            self._users.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取缓存统计信息"""
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "tokens": len(self._tokens),
+                "users": len(self._users),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / total * 100, 2) if total else 0,
+                "ttl": self.ttl,
+                "max_entries": self.max_entries
+            }
+
+
+# 全局认证缓存实例
+_auth_cache: Optional[AuthCache] = None
+
+
+def get_auth_cache() -> AuthCache:
+    """获取全局认证缓存"""
+    global _auth_cache
+    if _auth_cache is None:
+        _auth_cache = AuthCache(ttl=settings.auth_cache_ttl, max_entries=settings.auth_cache_max_entries)
+    return _auth_cache
@@ -2,39 +2,123 @@
 # 提供查询结果缓存功能
 
 from typing import Any, Optional, Callable, Dict, List
-from datetime import datetime, timedelta
+from collections import OrderedDict
+from datetime import datetime
 import hashlib
 import json
+import sys
+import threading
+import time
+
+# 淘汰策略
+POLICY_LRU = "lru"            # 最近最少使用
+POLICY_TINYLFU = "tinylfu"    # LRU + TinyLFU 准入：新条目的访问频率不高于被淘汰条目时不写入
+
+
+def estimate_size(value: Any, _depth: int = 0) -> int:
+    """估算对象占用的内存字节数（递归统计容器内容，最多3层，足以覆盖查询结果）"""
+    size = sys.getsizeof(value)
+    if _depth >= 3:
+        return size
+    if isinstance(value, dict):
+        size += sum(estimate_size(k, _depth + 1) + estimate_size(v, _depth + 1) for k, v in value.items())
+    elif isinstance(value, (list, tuple, set, frozenset)):
+        size += sum(estimate_size(item, _depth + 1) for item in value)
+    elif hasattr(value, "__dict__"):
+        size += estimate_size(vars(value), _depth + 1)
+    return size
+
 
 class CacheEntry:
     """缓存条目"""
-    def __init__(self, key: str, value: Any, ttl: int = 300):
+    __slots__ = ("key", "value", "created_at", "expires_at", "ttl", "size")
+
+    def __init__(self, key: str, value: Any, ttl: int = 300, size: int = 0):
         self.key = key
         self.value = value
-        self.created_at = datetime.now()
+        self.created_at = time.time()
+        self.expires_at = self.created_at + ttl
         self.ttl = ttl
+        self.size = size
     
     def is_expired(self) -> bool:
         """检查是否过期"""
-        return (datetime.now() - self.created_at).total_seconds() > self.ttl
+        return time.time() > self.expires_at
     
     def to_dict(self) -> Dict[str, Any]:
         """转换为字典"""
         return {
             "key": self.key,
             "value": self.value,
-            "created_at": self.created_at.isoformat(),
-            "ttl": self.ttl
+            "created_at": datetime.fromtimestamp(self.created_at).isoformat(),
+            "ttl": self.ttl,
+            "size": self.size
         }
 
+
+class FrequencySketch:
+    """近似访问频率（Count-Min Sketch，4行4位计数器）
+    
+    累计记录次数达到采样上限后所有计数减半，使频率反映近期访问。
+    """
+    SEEDS = (0x9E3779B1, 0x85EBCA77, 0xC2B2AE3D, 0x27D4EB2F)
+    # 所有计数减半的转换表
+    HALVE = bytes(value >> 1 for value in range(256))
+
+    def __init__(self, capacity: int):
+        width = 16
+        while width < capacity * 2:
+            width <<= 1
+        self.mask = width - 1
+        self.rows = [bytearray(width) for _ in self.SEEDS]
+        self.sample_size = max(capacity, 16) * 10
+        self.additions = 0
+
+    def _indexes(self, key: str):
+        h = hash(key)
+        return [((h ^ (h >> 17)) * seed >> 7) & self.mask for seed in self.SEEDS]
+
+    def increment(self, key: str):
+        """记录一次访问"""
+        for row, index in zip(self.rows, self._indexes(key)):
+            if row[index] < 15:
+                row[index] += 1
+        self.additions += 1
+        if self.additions >= self.sample_size:
+            self._reset()
+
+    def frequency(self, key: str) -> int:
+        """估算访问频率"""
+        return min(row[index] for row, index in zip(self.rows, self._indexes(key)))
+
+    def _reset(self):
+        for row in self.rows:
+            row[:] = row.translate(self.HALVE)
+        self.additions //= 2
+
+
 class MemoryCache:
-    """内存缓存"""
+    """内存缓存
     
-    def __init__(self, max_size: int = 1000):
-        self.cache: Dict[str, CacheEntry] = {}
+    基于 OrderedDict 的 LRU：读取时移到末尾，淘汰时从头部取，get/set/淘汰均为 O(1)。
+    policy 为 tinylfu 时按近似访问频率决定新条目是否准入，避免一次性的扫描访问冲掉热点条目。
+    max_bytes 不为空时按估算的条目大小限制总内存（同时仍受 max_size 限制）。
+    """
+    
+    def __init__(self, max_size: int = 1000, max_bytes: Optional[int] = None, policy: str = POLICY_LRU):
+        if policy not in (POLICY_LRU, POLICY_TINYLFU):
+            raise ValueError(f"不支持的淘汰策略: {policy}")
+        self.cache: "OrderedDict[str, CacheEntry]" = OrderedDict()
         self.max_size = max_size
+        self.max_bytes = max_bytes
+        self.policy = policy
+        self.sketch = FrequencySketch(max_size) if policy == POLICY_TINYLFU else None
+        self.total_bytes = 0
         self.hits = 0
         self.misses = 0
+        self.evictions = 0
+        self.rejections = 0
+        self._lock = threading.Lock()
     
     def _generate_key(self, prefix: str, *args, **kwargs) -> str:
         """生成缓存键"""
@@ -46,72 +130,116 @@ class MemoryCache:
     
     def get(self, key: str) -> Optional[Any]:
         """获取缓存值"""
-        entry = self.cache.get(key)
-        if entry is None:
-            self.misses += 1
-            return None
-        
-        if entry.is_expired():
-            del self.cache[key]
-            self.misses += 1
-            return None
-        
-        self.hits += 1
-        return entry.value
+        with self._lock:
+            if self.sketch is not None:
+                self.sketch.increment(key)
+            entry = self.cache.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            
+            if entry.is_expired():
+                self._remove(key)
+                self.misses += 1
+                return None
+            
+            self.cache.move_to_end(key)
+            self.hits += 1
+            return entry.value
     
     def set(self, key: str, value: Any, ttl: int = 300):
-        """设置缓存值"""
-        # 检查缓存大小
+        """设置缓存值（TinyLFU 策略下频率不足的新条目可能不被写入）"""
+        size = estimate_size(value) if self.max_bytes is not None else 0
+        with self._lock:
+            if self.max_bytes is not None and size > self.max_bytes:
+                self.rejections += 1
+                return
+            if key in self.cache:
+                self._remove(key)
+            elif self.sketch is not None and self._is_full(size):
+                # 已过期的待淘汰条目直接移除，不参与准入比较
+                while self.cache and self._is_full(size):
+                    victim, entry = next(iter(self.cache.items()))
+                    if not entry.is_expired():
+                        break
+                    self._remove(victim)
+                # 准入判断：与即将被淘汰的最久未使用条目比较访问频率
+                if self.cache and self._is_full(size) and self.sketch.frequency(key) <= self.sketch.frequency(victim):
+                    self.rejections += 1
+                    return
+            
+            while self.cache and self._is_full(size):
+                self._evict_oldest()
+            
+            self.cache[key] = CacheEntry(key, value, ttl, size)
+            self.total_bytes += size
+    
+    def _is_full(self, incoming_size: int = 0) -> bool:
+        """再写入一个条目是否会超出条目数或内存上限"""
         if len(self.cache) >= self.max_size:
-            self._evict_oldest()
-        
-        self.cache[key] = CacheEntry(key, value, ttl)
+            return True
+        return self.max_bytes is not None and self.total_bytes + incoming_size > self.max_bytes
+    
+    def _remove(self, key: str):
+        entry = self.cache.pop(key)
+        self.total_bytes -= entry.size
     
     def delete(self, key: str):
         """删除缓存值"""
-        if key in self.cache:
-            del self.cache[key]
+        with self._lock:
+            if key in self.cache:
+                self._remove(key)
     
     def clear(self):
         """清空缓存"""
-        self.cache.clear()
-        self.hits = 0
-        self.misses = 0
+        with self._lock:
+            self.cache.clear()
+            self.total_bytes = 0
+            self.hits = 0
+            self.misses = 0
+            self.evictions = 0
+            self.rejections = 0
     
     def _evict_oldest(self):
-        """淘汰最旧的缓存条目"""
+        """淘汰最久未使用的缓存条目"""
         if not self.cache:
             return
         
-        oldest_key = min(
-            self.cache.keys(),
-            key=lambda k: self.cache[k].created_at
-        )
-        del self.cache[oldest_key]
+        _, entry = self.cache.popitem(last=False)
+        self.total_bytes -= entry.size
+        self.evictions += 1
     
     def get_stats(self) -> Dict[str, Any]:
         """获取缓存统计信息"""
-        total_requests = self.hits + self.misses
-        hit_rate = (self.hits / total_requests * 100) if total_requests > 0 else 0
-        
-        return {
-            "size": len(self.cache),
-            "max_size": self.max_size,
-            "hits": self.hits,
-            "misses": self.misses,
-            "hit_rate": round(hit_rate, 2),
-            "total_requests": total_requests
-        }
+        with self._lock:
+            total_requests = self.hits + self.misses
+            hit_rate = (self.hits / total_requests * 100) if total_requests > 0 else 0
+            
+            return {
+                "size": len(self.cache),
+                "max_size": self.max_size,
+                "policy": self.policy,
+                "bytes": self.total_bytes if self.max_bytes is not None else None,
+                "max_bytes": self.max_bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(hit_rate, 2),
+                "total_requests": total_requests,
+                "evictions": self.evictions,
+                "rejections": self.rejections
+            }
     
     def cleanup_expired(self):
         """清理过期缓存"""
-        expired_keys = [
-            key for key, entry in self.cache.items()
-            if entry.is_expired()
-        ]
-        
-        for key in expired_keys:
-            del self.cache[key]
+        with self._lock:
+            now = time.time()
+            expired_keys = [
+                key for key, entry in self.cache.items()
+                if now > entry.expires_at
+            ]
+            
+            for key in expired_keys:
+                self._remove(key)
         
         return len(expired_keys)
 
@@ -123,7 +251,7 @@ class CacheManager:
             "default": MemoryCache(),
             "students": MemoryCache(max_size=500),
             "classes": MemoryCache(max_size=200),
-            "physical_tests": MemoryCache(max_size=1000),
+            "physical_tests": MemoryCache(max_size=1000, policy=POLICY_TINYLFU),
             "sports_meets": MemoryCache(max_size=100),
             "registrations": MemoryCache(max_size=1000),
             "statistics": MemoryCache(max_size=200)
@@ -4,7 +4,7 @@
 from sqlalchemy.orm import Session
 from models import (
     Student, Class, StudentClassRelation, PhysicalTest, 
-    SportsMeet, Event, Registration, SchoolYear, StatusEnum
+    SportsMeet, Event, Registration, SchoolYear, SchoolYearStatusEnum, StatusEnum
 )
 from typing import List, Dict, Any
 from datetime import date
@@ -25,9 +25,15 @@ class DataConsistencyChecker:
         # 检查学生班级关系
         self.check_student_class_relations()
         
+        # 检查学生当前班级冗余字段
+        self.check_student_current_class()
+        
         # 检查体测数据
         self.check_physical_test_data()
         
+        # 检查体测汇总表
+        self.check_physical_test_summary()
+        
         # 检查运动会数据
         self.check_sports_meet_data()
         
@@ -93,6 +99,31 @@ class DataConsistencyChecker:
                     }
                 })
     
+    def check_student_current_class(self):
+        """检查学生的当前班级冗余字段与当前学生班级关系是否一致"""
+        from crud.student_crud import current_class_subqueries
+        
+        expected_class_id, expected_school_year_id = current_class_subqueries()
+        rows = self.db.query(
+            Student.id, Student.real_name, Student.current_class_id,
+            expected_class_id.label("expected_class_id")
+        ).filter(
+            Student.current_class_id.is_distinct_from(expected_class_id) |
+            Student.current_school_year_id.is_distinct_from(expected_school_year_id)
+        ).all()
+        
+        for row in rows:
+            self.issues.append({
+                "type": "student_current_class_mismatch",
+                "severity": "medium",
+                "description": f"学生{row.real_name}（ID: {row.id}）的当前班级不一致：记录{row.current_class_id}，实际{row.expected_class_id}",
+                "table": "students",
+                "record_id": row.id,
+                "suggested_fix": {
+                    "action": "sync_current_class"
+                }
+            })
+    
     def check_physical_test_data(self):
         """检查体测数据一致性"""
         # 检查体测记录的学生是否存在
@@ -138,6 +169,26 @@ class DataConsistencyChecker:
                     }
                 })
     
+    def check_physical_test_summary(self):
+        """检查体测汇总表与原始体测数据是否一致"""
+        from crud.physical_test_summary_crud import check_physical_test_summary
+        
+        for mismatch in check_physical_test_summary(self.db):
+            self.issues.append({
+                "type": "physical_test_summary_mismatch",
+                "severity": "medium",
+                "description": (
+                    f"体测汇总（学年ID: {mismatch['school_year_id']}，班级ID: {mismatch['class_id']}，"
+                    f"测试类型: {mismatch['test_type']}，性别: {mismatch['gender']}，项目: {mismatch['item']}）与原始数据不一致"
+                ),
+                "table": "physical_test_summaries",
+                "record_id": mismatch["class_id"],
+                "suggested_fix": {
+                    "action": "rebuild_summary",
+                    "school_year_id": mismatch["school_year_id"]
+                }
+            })
+    
     def check_sports_meet_data(self):
         """检查运动会数据一致性"""
         # 检查运动会项目数量统计
@@ -248,7 +299,7 @@ class DataConsistencyChecker:
             # 检查是否有多个当前学年
             if sy.status.value == "active":
                 active_years = self.db.query(SchoolYear).filter(
-                    SchoolYear.status.value == "active"
+                    SchoolYear.status == SchoolYearStatusEnum.active
                 ).count()
                 
                 if active_years > 1:
@@ -264,6 +315,8 @@ class DataConsistencyChecker:
         """自动修复可修复的问题"""
         fixed_count = 0
         skipped_count = 0
+        # 汇总表按学年重建，同一学年只需重建一次
+        rebuilt_school_years = set()
         
         for issue in self.issues:
             if "suggested_fix" in issue:
@@ -298,6 +351,19 @@ class DataConsistencyChecker:
                                         meet.total_registrations = fix["new_value"]
                                     self.db.commit()
                                     fixed_count += 1
+                        elif fix["action"] == "sync_current_class":
+                            from crud.student_crud import sync_current_class
+                            from utils.permissions import get_permission_cache
+                            sync_current_class(self.db, [issue["record_id"]])
+                            self.db.commit()
+                            get_permission_cache().clear()
+                            fixed_count += 1
+                        elif fix["action"] == "rebuild_summary":
+                            from crud.physical_test_summary_crud import rebuild_physical_test_summary
+                            if fix["school_year_id"] not in rebuilt_school_years:
+                                rebuild_physical_test_summary(self.db, fix["school_year_id"])
+                                rebuilt_school_years.add(fix["school_year_id"])
+                            fixed_count += 1
                         elif fix["action"] == "calculate_score":
                             from crud.physical_test_crud import calculate_physical_test_score
                             result = calculate_physical_test_score(self.db, issue["record_id"])
@@ -0,0 +1,499 @@
+# 体育教学辅助网站 - 后台任务
+# 把整学年计分、学年升级、Excel导入导出、数据一致性检查等耗时操作提交到本地进程池执行，
+# 任务状态、进度、取消请求和结果保存在 jobs 表中，不依赖外部消息队列
+
+import json
+import multiprocessing
+import os
+import socket
+import threading
+import time
+import uuid
+from concurrent.futures import Future, ProcessPoolExecutor
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, Optional
+
+from sqlalchemy.orm import Session
+
+from config import settings
+from models import Job, JobStatusEnum
+
+# 已结束的任务状态
+FINISHED_STATUSES = (JobStatusEnum.completed, JobStatusEnum.failed, JobStatusEnum.cancelled)
+
+# 进度写入数据库的最小间隔（秒），避免频繁更新任务表
+PROGRESS_INTERVAL = 0.5
+
+
+class JobCancelled(Exception):
+    """任务已被取消"""
+
+
+class JobContext:
+    """任务执行上下文：汇报进度、检查取消请求、登记结果文件
+
+    进度写入使用独立会话，不影响任务本身的事务。
+    """
+
+    def __init__(self, job_id: int):
+        from database import SessionLocal
+
+        self.job_id = job_id
+        self.result_file: Optional[str] = None
+        self._db = SessionLocal()
+        self._last_update = 0.0
+
+    def update_progress(self, progress: Optional[float] = None, message: Optional[str] = None, force: bool = False):
+        """更新进度（0-100，None 表示不变），同时检查取消请求，已取消则抛出 JobCancelled"""
+        now = time.monotonic()
+        if not force and now - self._last_update < PROGRESS_INTERVAL:
+            return
+        self._last_update = now
+        job = self._db.get(Job, self.job_id)
+        if progress is not None:
+            job.progress = round(min(max(progress, 0.0), 100.0), 2)
+        if message is not None:
+            job.message = message[:500]
+        cancel_requested = job.cancel_requested
+        self._db.commit()
+        if cancel_requested:
+            raise JobCancelled()
+
+    def result_path(self, suffix: str) -> str:
+        """生成并登记结果文件路径"""
+        os.makedirs(settings.job_result_dir, exist_ok=True)
+        self.result_file = os.path.join(settings.job_result_dir, f"job_{self.job_id}{suffix}")
+        return self.result_file
+
+    def close(self):
+        self._db.close()
+
+
+# ============ 任务处理函数 ============
+
+def _run_score_year(db: Session, params: Dict[str, Any], context: JobContext) -> Dict[str, Any]:
+    """整学年（或单个班级）批量计分"""
+    from crud.physical_test_crud import batch_calculate_scores
+
+    result = batch_calculate_scores(
+        db,
+        class_id=params.get("class_id"),
+        school_year_id=params.get("school_year_id"),
+        chunk_size=params.get("chunk_size", 1000),
+        progress_callback=lambda done, total: context.update_progress(
+            done / total * 100 if total else 100, f"已计分 {done}/{total} 条"
+        )
+    )
+    result.pop("results")
+    return result
+
+
+def _run_promote_grades(db: Session, params: Dict[str, Any], context: JobContext) -> Dict[str, Any]:
+    """学年升级（按年级分批提交，取消或失败后重新提交从未完成的年级继续）"""
+    from crud.school_year_crud import school_year_crud
+
+    context.update_progress(0, "正在执行学年升级", force=True)
+    return school_year_crud.promote_grades(
+        db, params["school_year_id"],
+        progress_callback=lambda done, total: context.update_progress(
+            done / total * 100 if total else 100, f"已完成 {done}/{total} 个年级"
+        )
+    )
+
+
+def _run_import_physical_tests(db: Session, params: Dict[str, Any], context: JobContext) -> Dict[str, Any]:
+    """导入国家体质健康测试数据模板（按块提交，取消时已导入的块保留）"""
+    from utils.physical_test_excel import import_physical_tests_from_excel
+
+    # 上传文件在任务结束时删除（见 _finish_job）
+    with open(params["path"], "rb") as file:
+        return import_physical_tests_from_excel(
+            db, file,
+            test_type=params.get("test_type", "国家体质健康测试"),
+            tester_name=params.get("tester_name"),
+            chunk_size=params.get("chunk_size", 2000),
+            progress_callback=lambda rows, imported: context.update_progress(
+                None, f"已读取 {rows} 行，导入 {imported} 行"
+            )
+        )
+
+
+def _run_export_physical_tests(db: Session, params: Dict[str, Any], context: JobContext) -> Dict[str, Any]:
+    """按国家体质健康测试数据格式导出Excel，结果为 xlsx 文件（只包含提交者可见的记录）"""
+    from crud.physical_test_crud import iter_physical_test_history
+    from utils.physical_test_excel import write_physical_test_workbook
+    from utils.query_scope import scope_user
+
+    user = scope_user(params.get("scope"))
+
+    def rows():
+        for count, row in enumerate(iter_physical_test_history(db, params.get("filters"), user=user), start=1):
+            if count % 2000 == 0:
+                context.update_progress(None, f"已写出 {count} 行")
+            yield row
+
+    count = write_physical_test_workbook(rows(), context.result_path(".xlsx"))
+    return {"rows": count}
+
+
+def _run_consistency_check(db: Session, params: Dict[str, Any], context: JobContext) -> Dict[str, Any]:
+    """数据一致性检查，fix 为真时自动修复"""
+    from utils.data_consistency import run_data_consistency_check, fix_data_consistency_issues
+
+    context.update_progress(0, "正在检查数据一致性", force=True)
+    if params.get("fix"):
+        return fix_data_consistency_issues(db, dry_run=False)
+    return run_data_consistency_check(db)
+
+
+def _run_clean_expired_tokens(db: Session, params: Dict[str, Any], context: JobContext) -> Dict[str, Any]:
+    """分批清理已撤销和已过期的令牌记录"""
+    from crud import token_crud
+
+    context.update_progress(0, "正在清理过期令牌", force=True)
+    deleted = token_crud.sweep_expired_tokens(db, batch_size=params.get("batch_size", 1000))
+    context.update_progress(None, "正在清理过期的任务文件", force=True)
+    return {"deleted": deleted, "deleted_files": sweep_job_files(db)}
+
+
+# 任务类型 -> 处理函数
+JOB_HANDLERS: Dict[str, Callable[[Session, Dict[str, Any], JobContext], Dict[str, Any]]] = {
+    "score_year": _run_score_year,
+    "promote_grades": _run_promote_grades,
+    "import_physical_tests": _run_import_physical_tests,
+    "export_physical_tests": _run_export_physical_tests,
+    "consistency_check": _run_consistency_check,
+    "clean_expired_tokens": _run_clean_expired_tokens,
+}
+
+
+# ============ 任务文件 ============
+
+def remove_job_upload(job: Job):
+    """删除任务的上传文件（导入任务结束后不再需要）"""
+    path = (job.params or {}).get("path")
+    if job.job_type == "import_physical_tests" and path and os.path.exists(path):
+        os.remove(path)
+
+
+def sweep_job_files(db: Session, retention_days: Optional[int] = None) -> int:
+    """删除超过保留期限的结果文件和遗留的上传文件，返回删除的文件数
+
+    按文件修改时间判断，未结束的任务正在使用的文件不删除；
+    结果文件被删除的任务下载时返回“结果文件不存在或已被清理”。
+    """
+    if retention_days is None:
+        retention_days = settings.job_result_retention_days
+    cutoff = time.time() - retention_days * 86400
+    in_use = set()
+    for job in db.query(Job).filter(Job.status.in_([JobStatusEnum.pending, JobStatusEnum.running])):
+        in_use.update(path for path in (job.result_file, (job.params or {}).get("path")) if path)
+
+    deleted = 0
+    for directory in (settings.job_result_dir, os.path.join(settings.job_result_dir, "uploads")):
+        if not os.path.isdir(directory):
+            continue
+        for entry in os.scandir(directory):
+            if not entry.is_file() or entry.path in in_use or entry.stat().st_mtime >= cutoff:
+                continue
+            try:
+                os.remove(entry.path)
+                deleted += 1
+            except FileNotFoundError:
+                pass
+    return deleted
+
+
+# ============ 工作进程 ============
+
+def _init_worker():
+    """工作进程初始化：加载评分表"""
+    from utils.score_standards import init_score_engine
+    init_score_engine()
+
+
+def _finish_job(job_id: int, status: JobStatusEnum, unfinished_only: bool = False, **fields):
+    """记录任务结束状态（unfinished_only 为真时不覆盖已结束的任务），并删除任务的上传文件"""
+    from database import SessionLocal
+
+    db = SessionLocal()
+    try:
+        job = db.get(Job, job_id)
+        if job is None:
+            return
+        remove_job_upload(job)
+        if unfinished_only and job.status in FINISHED_STATUSES:
+            return
+        job.status = status
+        job.finished_at = datetime.now()
+        for field, value in fields.items():
+            setattr(job, field, value)
+        db.commit()
+    finally:
+        db.close()
+
+
+def execute_job(job_id: int):
+    """在工作进程中执行一个任务"""
+    from database import SessionLocal
+
+    db = SessionLocal()
+    context = JobContext(job_id)
+    try:
+        job = db.get(Job, job_id)
+        if job is None or job.status != JobStatusEnum.pending:
+            return
+        if job.cancel_requested:
+            _finish_job(job_id, JobStatusEnum.cancelled, message="任务已取消")
+            return
+        job.status = JobStatusEnum.running
+        job.started_at = datetime.now()
+        db.commit()
+
+        handler = JOB_HANDLERS[job.job_type]
+        result = handler(db, job.params or {}, context)
+        # 结果转为可JSON序列化的结构（日期等转为字符串）
+        result = json.loads(json.dumps(result, ensure_ascii=False, default=str))
+        _finish_job(job_id, JobStatusEnum.completed, unfinished_only=True, progress=100.0, message="任务已完成",
+                    result=result, result_file=context.result_file)
+    except JobCancelled:
+        db.rollback()
+        _finish_job(job_id, JobStatusEnum.cancelled, unfinished_only=True, message="任务已取消")
+    except Exception as e:
+        db.rollback()
+        _finish_job(job_id, JobStatusEnum.failed, unfinished_only=True, message="任务失败", error=str(e))
+    finally:
+        context.close()
+        db.close()
+
+
+# ============ 任务管理 ============
+
+def job_to_dict(job: Job) -> Dict[str, Any]:
+    """任务转字典"""
+    return {
+        "id": job.id,
+        "job_type": job.job_type,
+        "status": job.status.value if job.status else None,
+        "params": job.params,
+        "progress": job.progress,
+        "message": job.message,
+        "cancel_requested": job.cancel_requested,
+        "result": job.result,
+        "has_result_file": bool(job.result_file),
+        "error": job.error,
+        "created_by": job.created_by,
+        "created_at": job.created_at,
+        "started_at": job.started_at,
+        "finished_at": job.finished_at
+    }
+
+
+class JobManager:
+    """后台任务管理器：任务写入 jobs 表后提交到本地进程池"""
+
+    def __init__(self, max_workers: int = 2, heartbeat_interval: float = 30):
+        self.max_workers = max_workers
+        # 本服务进程的标识，写入提交的任务；启动标识区分复用的进程ID
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.heartbeat_interval = heartbeat_interval
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._futures: Dict[int, Future] = {}
+        self._lock = threading.Lock()
+        self._heartbeat_thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        """按需创建进程池（spawn 方式启动，工作进程自建数据库连接），同时启动心跳线程"""
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.max_workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=_init_worker
+                )
+            if self._heartbeat_thread is None:
+                self._stop.clear()
+                self._heartbeat_thread = threading.Thread(
+                    target=self._heartbeat_loop, name="job-heartbeat", daemon=True
+                )
+                self._heartbeat_thread.start()
+            return self._executor
+
+    def heartbeat(self) -> int:
+        """为本进程提交的未完成任务更新心跳时间，返回任务数"""
+        from database import SessionLocal
+
+        db = SessionLocal()
+        try:
+            count = db.query(Job).filter(
+                Job.owner == self.owner,
+                Job.status.in_([JobStatusEnum.pending, JobStatusEnum.running])
+            ).update({"heartbeat_at": datetime.now()}, synchronize_session=False)
+            db.commit()
+            return count
+        finally:
+            db.close()
+
+    def _heartbeat_loop(self):
+        """定期写心跳，并清理其他已退出的服务进程遗留的任务"""
+        while not self._stop.wait(self.heartbeat_interval):
+            try:
+                self.heartbeat()
+                fail_orphaned_jobs()
+            except Exception:
+                # 数据库暂时不可用时下次再试
+                pass
+
+    def _on_done(self, job_id: int, future: Future):
+        """任务进程结束回调：排队中被取消（包括关闭进程池时）的任务标记为已取消，进程异常退出时标记任务失败"""
+        with self._lock:
+            self._futures.pop(job_id, None)
+        if future.cancelled():
+            _finish_job(job_id, JobStatusEnum.cancelled, unfinished_only=True, message="任务已取消")
+            return
+        error = future.exception()
+        if error is not None:
+            _finish_job(job_id, JobStatusEnum.failed, message="任务进程异常退出", error=str(error))
+            # 进程池损坏后下次提交时重建
+            with self._lock:
+                if self._executor is not None and getattr(self._executor, "_broken", False):
+                    self._executor = None
+
+    def submit(self, db: Session, job_type: str, params: Dict[str, Any] = None, user_id: int = None) -> Job:
+        """提交任务，返回任务记录"""
+        if job_type not in JOB_HANDLERS:
+            raise ValueError(f"不支持的任务类型: {job_type}")
+        job = Job(job_type=job_type, params=params or {}, status=JobStatusEnum.pending,
+                  progress=0.0, message="排队中", created_by=user_id,
+                  owner=self.owner, heartbeat_at=datetime.now())
+        db.add(job)
+        db.commit()
+        db.refresh(job)
+
+        future = self._get_executor().submit(execute_job, job.id)
+        with self._lock:
+            self._futures[job.id] = future
+        future.add_done_callback(lambda f, job_id=job.id: self._on_done(job_id, f))
+        return job
+
+    def cancel(self, db: Session, job: Job) -> Job:
+        """取消任务：排队中的直接取消，执行中的在下次汇报进度时停止"""
+        if job.status in FINISHED_STATUSES:
+            return job
+        job.cancel_requested = True
+        db.commit()
+
+        with self._lock:
+            future = self._futures.get(job.id)
+        if future is not None and future.cancel():
+            job.status = JobStatusEnum.cancelled
+            job.message = "任务已取消"
+            job.finished_at = datetime.now()
+            db.commit()
+        db.refresh(job)
+        return job
+
+    def wait(self, job_id: int, timeout: float = None):
+        """等待任务结束（用于脚本和测试）"""
+        with self._lock:
+            future = self._futures.get(job_id)
+        if future is not None:
+            try:
+                future.result(timeout)
+            except Exception:
+                pass
+
+    def shutdown(self, wait: bool = False):
+        """关闭进程池和心跳线程"""
+        with self._lock:
+            executor, self._executor = self._executor, None
+            heartbeat_thread, self._heartbeat_thread = self._heartbeat_thread, None
+        self._stop.set()
+        if heartbeat_thread is not None:
+            heartbeat_thread.join()
+        if executor is not None:
+            executor.shutdown(wait=wait, cancel_futures=True)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取任务管理器统计信息"""
+        with self._lock:
+            return {
+                "max_workers": self.max_workers,
+                "active_jobs": len(self._futures)
+            }
+
+
+# 全局任务管理器实例
+_job_manager: Optional[JobManager] = None
+
+
+def get_job_manager() -> JobManager:
+    """获取全局任务管理器"""
+    global _job_manager
+    if _job_manager is None:
+        _job_manager = JobManager(
+            max_workers=settings.job_workers, heartbeat_interval=settings.job_heartbeat_interval
+        )
+    return _job_manager
+
+
+def _owner_alive(job: Job, stale_before: datetime) -> bool:
+    """任务所属的服务进程是否仍在运行：心跳未超时，且同一主机上的进程仍存在"""
+    if not job.owner or job.heartbeat_at is None or job.heartbeat_at < stale_before:
+        return False
+    host, _, rest = job.owner.partition(":")
+    if host != socket.gethostname():
+        return True
+    try:
+        os.kill(int(rest.split(":")[0]), 0)
+    except (ValueError, ProcessLookupError):
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def fail_orphaned_jobs(timeout: Optional[float] = None) -> int:
+    """把所属服务进程已退出的排队中、执行中任务标记为失败，返回数量
+
+    进程池随服务进程一起退出，这些任务不会再执行，否则客户端会一直轮询到它们。
+    多个服务进程共用任务表，只处理心跳超时（或同一主机上进程已不存在）的任务，
+    其他仍在运行的服务进程的任务不受影响。
+    """
+    from database import SessionLocal
+
+    if timeout is None:
+        timeout = settings.job_heartbeat_timeout
+    stale_before = datetime.now() - timedelta(seconds=timeout)
+    unfinished = (JobStatusEnum.pending, JobStatusEnum.running)
+    db = SessionLocal()
+    try:
+        orphaned = []
+        for job in db.query(Job).filter(Job.status.in_(unfinished)):
+            if not _owner_alive(job, stale_before):
+                orphaned.append(job.id)
+                remove_job_upload(job)
+        if not orphaned:
+            return 0
+        count = db.query(Job).filter(
+            Job.id.in_(orphaned), Job.status.in_(unfinished)
+        ).update({
+            "status": JobStatusEnum.failed,
+            "message": "任务失败",
+            "error": "所属服务进程已退出，任务已中断",
+            "finished_at": datetime.now()
+        }, synchronize_session=False)
+        db.commit()
+        return count
+    finally:
+        db.close()
+
+
+def init_job_manager():
+    """初始化全局任务管理器，并清理已退出的服务进程遗留的未完成任务"""
+    global _job_manager
+    _job_manager = JobManager(
+        max_workers=settings.job_workers, heartbeat_interval=settings.job_heartbeat_interval
+    )
+    fail_orphaned_jobs()
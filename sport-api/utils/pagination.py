@@ -0,0 +1,119 @@
+# 体育教学辅助网站 - 游标分页
+# 按(排序键, ID)做键集分页：下一页条件为 (排序键, ID) 严格位于上一页最后一行之后，
+# 任意深度的页面代价与第一页相同；游标为不透明字符串，总数可选且带缓存
+
+import base64
+import hashlib
+import json
+from datetime import date, datetime
+from typing import Any, Callable, List, Optional, Sequence, Tuple
+
+from sqlalchemy import and_, or_
+
+from utils.cache import get_cache_manager
+
+# 排序列：(列, 是否降序)，最后一列必须唯一（通常为主键ID）
+OrderColumns = Sequence[Tuple[Any, bool]]
+
+# 缓存总数的有效期（秒）
+COUNT_CACHE_TTL = 60
+
+
+class InvalidCursorError(ValueError):
+    """分页游标无效"""
+
+
+def _encode_value(value: Any) -> Any:
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    return getattr(value, "value", value)
+
+
+def _decode_value(column, value: Any) -> Any:
+    """按列类型还原游标中的值"""
+    if value is None:
+        return None
+    try:
+        python_type = column.type.python_type
+    except NotImplementedError:
+        return value
+    if python_type is datetime:
+        return datetime.fromisoformat(value)
+    if python_type is date:
+        return date.fromisoformat(value)
+    return value
+
+
+def encode_cursor(values: Sequence[Any]) -> str:
+    """把最后一行的排序键编码为不透明游标"""
+    payload = json.dumps([_encode_value(value) for value in values], separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str, order: OrderColumns) -> List[Any]:
+    """解析游标，格式错误时抛出 InvalidCursorError"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+        if not isinstance(values, list) or len(values) != len(order):
+            raise ValueError
+        return [_decode_value(column, value) for (column, _), value in zip(order, values)]
+    except (ValueError, TypeError, UnicodeError):
+        raise InvalidCursorError("分页游标无效")
+
+
+def _after(order: OrderColumns, values: Sequence[Any]):
+    """(c1, c2, ...) 在排序方向上严格位于 values 之后的条件"""
+    conditions = []
+    for index, (column, descending) in enumerate(order):
+        equal = [order[i][0] == values[i] for i in range(index)]
+        beyond = column < values[index] if descending else column > values[index]
+        conditions.append(and_(*equal, beyond))
+    return or_(*conditions)
+
+
+def _default_key(order: OrderColumns) -> Callable[[Any], Tuple]:
+    return lambda row: tuple(getattr(row, column.key) for column, _ in order)
+
+
+def paginate(query, order: OrderColumns, limit: int, cursor: Optional[str] = None, skip: int = 0,
+             key: Callable[[Any], Tuple] = None) -> Tuple[list, Optional[str]]:
+    """键集分页，返回 (本页行, 下一页游标)
+
+    传入 cursor 时从游标位置继续（忽略 skip），否则按 skip 偏移（兼容原有分页参数）。
+    多取一行判断是否还有下一页，没有下一页时游标为 None。
+    """
+    if cursor:
+        query = query.filter(_after(order, decode_cursor(cursor, order)))
+    query = query.order_by(*[column.desc() if descending else column.asc() for column, descending in order])
+    if skip and not cursor:
+        query = query.offset(skip)
+
+    rows = query.limit(limit + 1).all()
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    key = key or _default_key(order)
+    return rows, encode_cursor(key(rows[-1]))
+
+
+def cached_count(query, ttl: int = COUNT_CACHE_TTL) -> int:
+    """带缓存的总数：相同查询条件在有效期内复用上次计数，避免翻页时反复全表计数"""
+    statement = query.statement.compile()
+    cache_key = "count:" + hashlib.md5(
+        (str(statement) + repr(sorted(statement.params.items(), key=lambda item: item[0]))).encode("utf-8")
+    ).hexdigest()
+    cache = get_cache_manager().get_cache("statistics")
+    total = cache.get(cache_key)
+    if total is None:
+        total = query.order_by(None).count()
+        cache.set(cache_key, total, ttl)
+    return total
+
+
+def set_page_headers(response, next_cursor: Optional[str], total: Optional[int] = None):
+    """通过响应头返回下一页游标和总数（列表接口保持响应体格式不变）"""
+    if next_cursor:
+        response.headers["X-Next-Cursor"] = next_cursor
+    if total is not None:
+        response.headers["X-Total-Count"] = str(total)
@@ -0,0 +1,130 @@
+# 体育教学辅助网站 - 密码哈希线程池
+# bcrypt 校验/生成一次需要上百毫秒，在 async 路由中直接调用会阻塞整个事件循环，
+# 全班同时登录时该 worker 上的其他请求都要排队。这里把哈希计算放到有界线程池中
+# （bcrypt 计算时释放 GIL），并限制排队数量：排队已满时直接返回 503，而不是无限堆积。
+
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional
+
+from fastapi import HTTPException, status
+
+from config import settings
+
+
+class PasswordHashPool:
+    """有界的密码哈希线程池，记录排队深度和等待时间"""
+
+    def __init__(self, max_workers: int = 4, max_queue: int = 200):
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._lock = threading.Lock()
+        # 统计信息
+        self.queued = 0
+        self.running = 0
+        self.peak_queued = 0
+        self.completed = 0
+        self.rejected = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+        self.total_run = 0.0
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(
+                    max_workers=self.max_workers, thread_name_prefix="password-hash"
+                )
+            return self._executor
+
+    async def run(self, func: Callable, *args) -> Any:
+        """在线程池中执行 func(*args)，排队已满时返回 503"""
+        with self._lock:
+            if self.queued >= self.max_queue:
+                self.rejected += 1
+                raise HTTPException(
+                    status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+                    detail="登录请求过多，请稍后重试",
+                    headers={"Retry-After": "1"},
+                )
+            self.queued += 1
+            self.peak_queued = max(self.peak_queued, self.queued)
+        submitted = time.perf_counter()
+        # 排队中的请求被取消（如客户端断开）时任务不会再执行，由等待方归还排队名额
+        state = {"started": False, "abandoned": False}
+
+        def task():
+            started = time.perf_counter()
+            with self._lock:
+                if state["abandoned"]:
+                    return None
+                state["started"] = True
+                self.queued -= 1
+                self.running += 1
+                self.total_wait += started - submitted
+                self.max_wait = max(self.max_wait, started - submitted)
+            try:
+                return func(*args)
+            finally:
+                with self._lock:
+                    self.running -= 1
+                    self.completed += 1
+                    self.total_run += time.perf_counter() - started
+
+        try:
+            return await asyncio.get_running_loop().run_in_executor(self._get_executor(), task)
+        finally:
+            with self._lock:
+                if not state["started"] and not state["abandoned"]:
+                    state["abandoned"] = True
+                    self.queued -= 1
+
+    async def verify_password(self, plain_password: str, hashed_password: str) -> bool:
+        """在线程池中校验密码"""
+        from auth import AuthService
+        return await self.run(AuthService.verify_password, plain_password, hashed_password)
+
+    async def hash_password(self, password: str) -> str:
+        """在线程池中生成密码哈希"""
+        from auth import AuthService
+        return await self.run(AuthService.get_password_hash, password)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取线程池统计信息"""
+        with self._lock:
+            return {
+                "max_workers": self.max_workers,
+                "max_queue": self.max_queue,
+                "queued": self.queued,
+                "running": self.running,
+                "peak_queued": self.peak_queued,
+                "completed": self.completed,
+                "rejected": self.rejected,
+                "avg_wait_ms": round(self.total_wait / self.completed * 1000, 2) if self.completed else 0,
+                "max_wait_ms": round(self.max_wait * 1000, 2),
+                "avg_run_ms": round(self.total_run / self.completed * 1000, 2) if self.completed else 0
+            }
+
+    def shutdown(self, wait: bool = False):
+        """关闭线程池"""
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=wait)
+                self._executor = None
+
+
+# 全局密码哈希线程池
+_password_pool: Optional[PasswordHashPool] = None
+
+
+def get_password_pool() -> PasswordHashPool:
+    """获取全局密码哈希线程池"""
+    global _password_pool
+    if _password_pool is None:
+        _password_pool = PasswordHashPool(
+            max_workers=settings.password_hash_workers, max_queue=settings.password_hash_max_queue
+        )
+    return _password_pool
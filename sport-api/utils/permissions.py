@@ -1,11 +1,16 @@
 # 体育教学辅助网站 - 权限管理系统
 # 提供细粒度的权限控制功能
 
+import threading
+import time
+from collections import OrderedDict
 from enum import Enum
-from typing import List, Dict, Set, Optional
+from typing import Any, List, Dict, Set, Optional
 from fastapi import HTTPException, status
+from sqlalchemy import or_
 from sqlalchemy.orm import Session
-from models import User, UserRoleEnum, StudentClassRelation
+from config import settings
+from models import User, UserRoleEnum
 
 class Permission(Enum):
     """权限枚举"""
@@ -166,8 +171,104 @@ class RolePermissionManager:
         role_permissions = cls.get_role_permissions(role)
         return all(perm in role_permissions for perm in permissions)
 
+class PermissionSnapshot:
+    """非管理员用户可访问的班级ID集合和学生ID集合"""
+    __slots__ = ("role", "phone", "class_ids", "student_ids", "expires_at")
+
+    def __init__(self, role: UserRoleEnum, phone: Optional[str], class_ids: Set[int], student_ids: Set[int], expires_at: float):
+        self.role = role
+        self.phone = phone
+        self.class_ids = frozenset(class_ids)
+        self.student_ids = frozenset(student_ids)
+        self.expires_at = expires_at
+
+
+class PermissionSnapshotCache:
+    """权限快照缓存（按用户，最近使用淘汰，条目数有上限）
+    
+    班级、班主任、学生分班/转班变化时调用 clear() 全部失效：这些操作远少于权限检查，
+    而一次变化可能同时影响班主任、学生本人和家长。clear() 同时递增代数，
+    失效前开始计算的快照不会再写入缓存。用户角色或电话变化时快照自动失效。
+    其他进程（多 worker 部署）的变化最多延迟一个有效期生效。
+    """
+
+    def __init__(self, ttl: int = 300, max_entries: int = 10000):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._snapshots: "OrderedDict[int, PermissionSnapshot]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.generation = 0
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, user) -> Optional[PermissionSnapshot]:
+        """获取用户的有效快照，未缓存、已过期或角色/电话已变化时返回 None"""
+        with self._lock:
+            snapshot = self._snapshots.get(user.id)
+            if snapshot is None or snapshot.expires_at < time.time() \
+                    or snapshot.role != user.role or snapshot.phone != user.phone:
+                self.misses += 1
+                return None
+            self._snapshots.move_to_end(user.id)
+            self.hits += 1
+            return snapshot
+
+    def set(self, user_id: int, snapshot: PermissionSnapshot, generation: int):
+        """写入快照（计算期间缓存已被清空时丢弃）"""
+        with self._lock:
+            if generation != self.generation:
+                return
+            self._snapshots[user_id] = snapshot
+            self._snapshots.move_to_end(user_id)
+            while len(self._snapshots) > self.max_entries:
+                self._snapshots.popitem(last=False)
+
+    def invalidate_user(self, user_id: int):
+        """失效单个用户的快照"""
+        with self._lock:
+            self._snapshots.pop(user_id, None)
+
+    def clear(self):
+        """班级、班主任或学生班级关系变化后失效全部快照"""
+        with self._lock:
+            self._snapshots.clear()
+            self.generation += 1
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取缓存统计信息"""
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "snapshots": len(self._snapshots),
+                "generation": self.generation,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / total * 100, 2) if total else 0,
+                "ttl": self.ttl,
+                "max_entries": self.max_entries
+            }
+
+
+# 全局权限快照缓存实例
+_permission_cache: Optional[PermissionSnapshotCache] = None
+
+
+def get_permission_cache() -> PermissionSnapshotCache:
+    """获取全局权限快照缓存"""
+    global _permission_cache
+    if _permission_cache is None:
+        _permission_cache = PermissionSnapshotCache(
+            ttl=settings.permission_cache_ttl, max_entries=settings.permission_cache_max_entries
+        )
+    return _permission_cache
+
+
 class PermissionChecker:
-    """权限检查器"""
+    """权限检查器
+    
+    非管理员用户的班级、学生访问检查基于权限快照（可访问的班级ID和学生ID集合），
+    快照按用户缓存，检查本身只是集合成员判断。
+    """
     
     def __init__(self, db: Session):
         self.db = db
@@ -180,6 +281,53 @@ class PermissionChecker:
         user_role = user.role if isinstance(user.role, UserRoleEnum) else UserRoleEnum(user.role)
         return RolePermissionManager.has_permission(user_role, permission)
     
+    def get_snapshot(self, user: User) -> PermissionSnapshot:
+        """获取用户的权限快照，缓存中没有时计算并写入"""
+        cache = get_permission_cache()
+        snapshot = cache.get(user)
+        if snapshot is None:
+            generation = cache.generation
+            snapshot = self._build_snapshot(user)
+            cache.set(user.id, snapshot, generation)
+        return snapshot
+    
+    def _build_snapshot(self, user: User) -> PermissionSnapshot:
+        """按角色计算可访问的班级和学生（均按学生的当前班级）"""
+        from models import Class, Student, FamilyInfo
+        
+        user_role = user.role if isinstance(user.role, UserRoleEnum) else UserRoleEnum(user.role)
+        class_ids: Set[int] = set()
+        student_ids: Set[int] = set()
+        rows = []
+        
+        # 教师：自己担任班主任的班级及其学生
+        if user_role == UserRoleEnum.teacher:
+            class_ids = {row.id for row in self.db.query(Class.id).filter(Class.class_teacher_id == user.id)}
+            if class_ids:
+                student_ids = {row.id for row in self.db.query(Student.id).filter(Student.current_class_id.in_(class_ids))}
+        
+        # 学生：自己及自己的班级
+        elif user_role == UserRoleEnum.student:
+            rows = self.db.query(Student.id, Student.current_class_id).filter(Student.user_id == user.id).all()
+        
+        # 家长：父亲或母亲电话与用户电话一致的孩子及其班级
+        elif user_role == UserRoleEnum.parent and user.phone:
+            rows = self.db.query(Student.id, Student.current_class_id).join(
+                FamilyInfo, FamilyInfo.student_id == Student.id
+            ).filter(
+                or_(FamilyInfo.father_phone == user.phone, FamilyInfo.mother_phone == user.phone)
+            ).all()
+        
+        for row in rows:
+            student_ids.add(row.id)
+            if row.current_class_id:
+                class_ids.add(row.current_class_id)
+        
+        return PermissionSnapshot(
+            user_role, user.phone, class_ids, student_ids,
+            expires_at=time.time() + get_permission_cache().ttl
+        )
+    
     def check_class_access(self, user: User, class_id: int, required_permission: Permission) -> bool:
         """检查用户是否可以访问指定班级"""
         if not user:
@@ -195,45 +343,8 @@ class PermissionChecker:
         if not self.check_permission(user, required_permission):
             return False
         
-        # 教师只能访问自己管理的班级
-        if user_role == UserRoleEnum.teacher:
-            from models import Class
-            class_obj = self.db.query(Class).filter(Class.id == class_id).first()
-            if class_obj and class_obj.class_teacher_id == user.id:
-                return True
-            return False
-        
-        # 学生只能访问自己的班级
-        if user_role == UserRoleEnum.student:
-            from models import Student
-            student = self.db.query(Student).filter(Student.user_id == user.id).first()
-            if student:
-                current_relation = self.db.query(StudentClassRelation).filter(
-                    StudentClassRelation.student_id == student.id,
-                    StudentClassRelation.is_current == True
-                ).first()
-                if current_relation and current_relation.class_id == class_id:
-                    return True
-            return False
-        
-        # 家长只能访问自己孩子的班级
-        if user_role == UserRoleEnum.parent:
-            from models import Student, FamilyInfo
-            # 获取家长关联的学生
-            students = self.db.query(Student).join(FamilyInfo).filter(
-                FamilyInfo.father_phone == user.phone or FamilyInfo.mother_phone == user.phone
-            ).all()
-            
-            for student in students:
-                current_relation = self.db.query(StudentClassRelation).filter(
-                    StudentClassRelation.student_id == student.id,
-                    StudentClassRelation.is_current == True
-                ).first()
-                if current_relation and current_relation.class_id == class_id:
-                    return True
-            return False
-        
-        return False
+        # 教师：自己管理的班级；学生：自己的班级；家长：孩子的班级
+        return class_id in self.get_snapshot(user).class_ids
     
     def check_student_access(self, user: User, student_id: int, required_permission: Permission) -> bool:
         """检查用户是否可以访问指定学生"""
@@ -250,41 +361,8 @@ class PermissionChecker:
         if not self.check_permission(user, required_permission):
             return False
         
-        # 教师可以访问自己班级的学生
-        if user_role == UserRoleEnum.teacher:
-            from models import Student, Class
-            student = self.db.query(Student).filter(Student.id == student_id).first()
-            if student:
-                current_relation = self.db.query(StudentClassRelation).filter(
-                    StudentClassRelation.student_id == student.id,
-                    StudentClassRelation.is_current == True
-                ).first()
-                if current_relation:
-                    class_obj = self.db.query(Class).filter(Class.id == current_relation.class_id).first()
-                    if class_obj and class_obj.class_teacher_id == user.id:
-                        return True
-            return False
-        
-        # 学生只能访问自己的信息
-        if user_role == UserRoleEnum.student:
-            from models import Student
-            student = self.db.query(Student).filter(Student.id == student_id).first()
-            if student and student.user_id == user.id:
-                return True
-            return False
-        
-        # 家长只能访问自己的孩子
-        if user_role == UserRoleEnum.parent:
-            from models import Student, FamilyInfo
-            student = self.db.query(Student).filter(Student.id == student_id).first()
-            if student:
-                family_info = self.db.query(FamilyInfo).filter(FamilyInfo.student_id == student.id).first()
-                if family_info:
-                    if family_info.father_phone == user.phone or family_info.mother_phone == user.phone:
-                        return True
-            return False
-        
-        return False
+        # 教师：自己班级的学生；学生：自己；家长：自己的孩子
+        return student_id in self.get_snapshot(user).student_ids
     
     def get_accessible_classes(self, user: User) -> List[int]:
         """获取用户可访问的班级ID列表"""
@@ -293,48 +371,12 @@ class PermissionChecker:
         
         user_role = user.role if isinstance(user.role, UserRoleEnum) else UserRoleEnum(user.role)
         
-        # 管理员可以访问所有班级
+        # 管理员可以访问所有班级（只查询ID）
         if user_role == UserRoleEnum.admin:
             from models import Class
-            return [c.id for c in self.db.query(Class).all()]
-        
-        # 教师可以访问自己管理的班级
-        if user_role == UserRoleEnum.teacher:
-            from models import Class
-            classes = self.db.query(Class).filter(Class.class_teacher_id == user.id).all()
-            return [c.id for c in classes]
-        
-        # 学生只能访问自己的班级
-        if user_role == UserRoleEnum.student:
-            from models import Student
-            student = self.db.query(Student).filter(Student.user_id == user.id).first()
-            if student:
-                current_relation = self.db.query(StudentClassRelation).filter(
-                    StudentClassRelation.student_id == student.id,
-                    StudentClassRelation.is_current == True
-                ).first()
-                if current_relation:
-                    return [current_relation.class_id]
-            return []
-        
-        # 家长只能访问自己孩子的班级
-        if user_role == UserRoleEnum.parent:
-            from models import Student, FamilyInfo
-            students = self.db.query(Student).join(FamilyInfo).filter(
-                FamilyInfo.father_phone == user.phone or FamilyInfo.mother_phone == user.phone
-            ).all()
-            
-            class_ids = []
-            for student in students:
-                current_relation = self.db.query(StudentClassRelation).filter(
-                    StudentClassRelation.student_id == student.id,
-                    StudentClassRelation.is_current == True
-                ).first()
-                if current_relation:
-                    class_ids.append(current_relation.class_id)
-            return list(set(class_ids))
+            return [row.id for row in self.db.query(Class.id)]
         
-        return []
+        return sorted(self.get_snapshot(user).class_ids)
     
     def require_permission(self, user: User, permission: Permission):
         """要求用户拥有指定权限，否则抛出异常"""
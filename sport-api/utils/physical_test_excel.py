@@ -0,0 +1,325 @@
+# 体育教学辅助网站 - 国家体质健康测试数据Excel导入导出
+# 导入：按"导入国家体质健康测试数据模板"格式流式读取（openpyxl 只读模式），
+# 分块校验、按块批量查询学号、批量写入体测记录并在同一流程中计分
+# 导出：按"导出国家体质健康测试数据"格式以 openpyxl 只写模式逐行写出，
+# 数据来自服务端游标，内存占用与导出行数无关
+
+import time
+from datetime import date, datetime
+from typing import Any, BinaryIO, Dict, Iterable, Iterator, List, Optional, Tuple
+
+from sqlalchemy import insert
+from sqlalchemy.orm import Session
+
+from models import PhysicalTest, Student, Class
+from utils.score_standards import MEASUREMENT_FIELDS, measurement_fingerprint, calculate_bmi
+
+# 模板表头 -> 体测字段（兼容导出模板的全部项目列）
+EXCEL_COLUMN_FIELDS = {
+    "学号": "student_no",
+    "姓名": "real_name",
+    "性别": "gender",
+    "年级": "grade_name",
+    "班级": "class_name",
+    "测试日期": "test_date",
+    "身高(cm)": "height",
+    "体重(kg)": "weight",
+    "肺活量(ml)": "vital_capacity",
+    "50米跑(s)": "run_50m",
+    "1000米跑(s)": "run_1000m",
+    "800米跑(s)": "run_800m",
+    "坐位体前屈(cm)": "sit_and_reach",
+    "立定跳远(cm)": "standing_long_jump",
+    "引体向上(次)": "pull_up",
+    "一分钟仰卧起坐(次)": "sit_ups",
+    "一分钟跳绳(次)": "skip_rope",
+    "50米×8往返跑(s)": "run_50m_8",
+}
+
+# 各项目合理取值范围，超出视为录入错误
+MEASUREMENT_RANGES = {
+    "height": (50, 250),
+    "weight": (10, 200),
+    "vital_capacity": (100, 10000),
+    "run_50m": (4, 30),
+    "run_800m": (90, 900),
+    "run_1000m": (90, 900),
+    "sit_and_reach": (-40, 60),
+    "standing_long_jump": (20, 400),
+    "pull_up": (0, 100),
+    "skip_rope": (0, 400),
+    "sit_ups": (0, 150),
+    "run_50m_8": (40, 400),
+}
+
+# 整数项目
+INTEGER_FIELDS = {"vital_capacity", "standing_long_jump", "pull_up", "skip_rope", "sit_ups"}
+
+GENDER_VALUES = {"男": "male", "女": "female", "male": "male", "female": "female"}
+
+# 导出模板表头（工作表"体测数据"）
+EXPORT_SHEET_TITLE = "体测数据"
+EXPORT_HEADERS = [
+    "学号", "姓名", "性别", "年级", "班级", "测试日期", "身高(cm)", "体重(kg)", "体重指数(BMI)",
+    "肺活量(ml)", "50米跑(s)", "1000米跑(s)", "800米跑(s)", "坐位体前屈(cm)", "立定跳远(cm)",
+    "引体向上(次)", "一分钟仰卧起坐(次)", "一分钟跳绳(次)", "50米×8往返跑(s)", "总分", "等级",
+    "审核状态", "审核人", "审核时间"
+]
+
+GENDER_LABELS = {"male": "男", "female": "女"}
+GRADE_LABELS = {"A": "优秀", "B": "良好", "C": "及格", "D": "不及格"}
+
+# 单个导入任务最多返回的错误条数
+MAX_REPORTED_ERRORS = 1000
+
+
+class ImportRowError(ValueError):
+    """单行数据校验错误"""
+
+
+def _parse_date(value: Any) -> date:
+    """解析测试日期：支持日期单元格和 YYYY-MM-DD / YYYY/MM/DD 文本"""
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    text = str(value).strip()
+    for pattern in ("%Y-%m-%d", "%Y/%m/%d", "%Y.%m.%d"):
+        try:
+            return datetime.strptime(text, pattern).date()
+        except ValueError:
+            continue
+    raise ImportRowError(f"测试日期格式错误: {text}")
+
+
+def _parse_measurement(field: str, value: Any) -> Optional[float]:
+    """解析并校验单项成绩，空单元格返回 None"""
+    if value is None or (isinstance(value, str) and not value.strip()):
+        return None
+    try:
+        number = float(value)
+    except (TypeError, ValueError):
+        raise ImportRowError(f"{field} 不是有效数字: {value}")
+    low, high = MEASUREMENT_RANGES[field]
+    if not low <= number <= high:
+        raise ImportRowError(f"{field} 超出合理范围({low}~{high}): {value}")
+    return int(round(number)) if field in INTEGER_FIELDS else number
+
+
+def iter_excel_rows(file: BinaryIO) -> Iterator[Tuple[int, Dict[str, Any]]]:
+    """以只读模式流式读取工作簿第一个工作表，产生(行号, {字段: 值})"""
+    from openpyxl import load_workbook
+
+    workbook = load_workbook(file, read_only=True, data_only=True)
+    try:
+        rows = workbook.worksheets[0].iter_rows(values_only=True)
+        header = next(rows, None)
+        if header is None:
+            return
+        columns = {index: EXCEL_COLUMN_FIELDS[str(name).strip()]
+                   for index, name in enumerate(header) if name and str(name).strip() in EXCEL_COLUMN_FIELDS}
+        if "student_no" not in columns.values():
+            raise ValueError("工作表缺少“学号”列，请使用国家体质健康测试数据模板")
+        for row_number, row in enumerate(rows, start=2):
+            if not any(cell is not None and str(cell).strip() for cell in row):
+                continue
+            yield row_number, {field: row[index] for index, field in columns.items() if index < len(row)}
+    finally:
+        workbook.close()
+
+
+def _lookup_students(db: Session, student_nos: List[str]) -> Dict[str, Any]:
+    """按学号批量查询学生及其当前班级（一次查询，当前班级取学生表的 current_class_id）"""
+    rows = db.query(
+        Student.id, Student.student_no, Student.real_name, Student.gender,
+        Student.current_class_id.label("class_id"), Class.school_year_id, Class.grade_level
+    ).outerjoin(Class, Class.id == Student.current_class_id
+    ).filter(Student.student_no.in_(student_nos)).all()
+    return {row.student_no: row for row in rows}
+
+
+def _validate_row(row: Dict[str, Any], student) -> Dict[str, Any]:
+    """校验单行数据，返回待插入的体测记录字段"""
+    if student is None:
+        raise ImportRowError(f"学号不存在: {row.get('student_no')}")
+    if student.class_id is None:
+        raise ImportRowError("学生未分配班级，无法计分")
+    name = str(row.get("real_name") or "").strip()
+    if name and name != student.real_name:
+        raise ImportRowError(f"姓名与学号不符: {name}（系统中为 {student.real_name}）")
+    gender = GENDER_VALUES.get(str(row.get("gender") or "").strip())
+    student_gender = getattr(student.gender, "value", student.gender)
+    if gender and gender != student_gender:
+        raise ImportRowError(f"性别与学生档案不符: {row.get('gender')}")
+    if row.get("test_date") in (None, ""):
+        raise ImportRowError("测试日期不能为空")
+
+    record = {
+        "student_id": student.id,
+        "class_id": student.class_id,
+        "test_date": _parse_date(row["test_date"]),
+    }
+    for field in MEASUREMENT_FIELDS:
+        record[field] = _parse_measurement(field, row.get(field))
+    if all(record[field] is None for field in MEASUREMENT_FIELDS):
+        raise ImportRowError("没有任何体测成绩")
+    return record
+
+
+def import_physical_tests_from_excel(db: Session, file: BinaryIO, test_type: str = "国家体质健康测试",
+                                     tester_name: str = None, chunk_size: int = 2000,
+                                     progress_callback=None) -> Dict[str, Any]:
+    """导入国家体质健康测试数据模板
+
+    每 chunk_size 行：一次批量查询学号 -> 学生/当前班级，逐行校验，
+    批量插入合格行，随后对本块新记录向量化计分并更新汇总表、排名索引。
+    校验失败的行不导入，错误按行号返回。
+    """
+    from crud.physical_test_crud import _scoring_query, _score_rows
+    from crud.physical_test_summary_crud import build_summary_deltas, apply_summary_deltas
+    from utils.rank_index import get_rank_index, RANK_ITEMS
+
+    started = time.perf_counter()
+    errors: List[Dict[str, Any]] = []
+    error_count = 0
+    total_rows = 0
+    imported = 0
+    scored = 0
+    chunks = []
+
+    def flush(chunk: List[Tuple[int, Dict[str, Any]]]):
+        nonlocal error_count, imported, scored
+        chunk_started = time.perf_counter()
+        student_nos = list({str(row.get("student_no") or "").strip() for _, row in chunk})
+        students = _lookup_students(db, student_nos)
+
+        records = []
+        summary_changes = []
+        cohorts = []
+        for row_number, row in chunk:
+            student = students.get(str(row.get("student_no") or "").strip())
+            try:
+                record = _validate_row(row, student)
+            except ImportRowError as e:
+                error_count += 1
+                if len(errors) < MAX_REPORTED_ERRORS:
+                    errors.append({"row": row_number, "student_no": row.get("student_no"), "error": str(e)})
+                continue
+            record.update({
+                "test_type": test_type,
+                "tester_name": tester_name,
+                "is_official": True,
+                "measurement_fingerprint": measurement_fingerprint(record, record["class_id"]),
+            })
+            records.append(record)
+            gender = getattr(student.gender, "value", student.gender)
+            summary_values = {field: float(record[field]) for field in MEASUREMENT_FIELDS if record[field] is not None}
+            summary_changes.append(((student.school_year_id, student.class_id, test_type, gender), summary_values, 1))
+            cohorts.append((student.school_year_id, student.grade_level, gender, test_type))
+
+        new_ids = []
+        if records:
+            new_ids = list(db.execute(insert(PhysicalTest).returning(PhysicalTest.id, sort_by_parameter_order=True), records).scalars())
+            apply_summary_deltas(db, build_summary_deltas(summary_changes))
+            db.commit()
+            imported += len(new_ids)
+
+            rank_index = get_rank_index()
+            for test_id, record, cohort in zip(new_ids, records, cohorts):
+                for item in RANK_ITEMS:
+                    if item in record:
+                        rank_index.update_value(cohort, item, test_id, record["student_id"], record[item])
+
+            rows = _scoring_query(db).filter(PhysicalTest.id.in_(new_ids)).order_by(PhysicalTest.id).all()
+            scored += _score_rows(db, rows, len(rows) or 1)["total"]
+
+        chunks.append({
+            "rows": len(chunk),
+            "imported": len(new_ids),
+            "elapsed_ms": round((time.perf_counter() - chunk_started) * 1000, 2)
+        })
+        if progress_callback:
+            progress_callback(total_rows, imported)
+
+    chunk: List[Tuple[int, Dict[str, Any]]] = []
+    for row_number, row in iter_excel_rows(file):
+        total_rows += 1
+        chunk.append((row_number, row))
+        if len(chunk) >= chunk_size:
+            flush(chunk)
+            chunk = []
+    if chunk:
+        flush(chunk)
+
+    return {
+        "total_rows": total_rows,
+        "imported": imported,
+        "scored": scored,
+        "failed": error_count,
+        "errors": errors,
+        "errors_truncated": error_count > len(errors),
+        "chunks": chunks,
+        "elapsed_ms": round((time.perf_counter() - started) * 1000, 2)
+    }
+
+
+def _export_row(record: Dict[str, Any]) -> List[Any]:
+    """体测历史记录 -> 导出模板一行"""
+    test_date = record.get("test_date")
+    return [
+        record.get("student_no"),
+        record.get("real_name"),
+        GENDER_LABELS.get(record.get("gender"), record.get("gender")),
+        record.get("student_grade"),
+        record.get("class_name"),
+        test_date.isoformat() if test_date else None,
+        record.get("height"),
+        record.get("weight"),
+        calculate_bmi(record.get("height"), record.get("weight")),
+        record.get("vital_capacity"),
+        record.get("run_50m"),
+        record.get("run_1000m"),
+        record.get("run_800m"),
+        record.get("sit_and_reach"),
+        record.get("standing_long_jump"),
+        record.get("pull_up"),
+        record.get("sit_ups"),
+        record.get("skip_rope"),
+        record.get("run_50m_8"),
+        record.get("total_score"),
+        GRADE_LABELS.get(record.get("grade"), record.get("grade")),
+        None,
+        None,
+        None,
+    ]
+
+
+def write_physical_test_workbook(rows: Iterable[Dict[str, Any]], output) -> int:
+    """以只写模式把体测记录逐行写入导出模板格式的工作簿，返回写入行数
+
+    只写模式下行数据先顺序写入临时文件，保存时再压缩进 xlsx，
+    内存中不保留已写出的行。output 可以是文件路径或可写文件对象。
+    """
+    from openpyxl import Workbook
+
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet(EXPORT_SHEET_TITLE)
+    sheet.append(EXPORT_HEADERS)
+    count = 0
+    for record in rows:
+        sheet.append(_export_row(record))
+        count += 1
+    workbook.save(output)
+    return count
+
+
+def export_physical_tests_to_file(filters: Dict[str, Any], path: str, chunk_size: int = 2000, user=None) -> int:
+    """按过滤条件把用户可见的体测数据导出到 xlsx 文件（使用独立会话，可在线程池中执行）"""
+    from database import SessionLocal
+    from crud.physical_test_crud import iter_physical_test_history
+
+    db = SessionLocal()
+    try:
+        return write_physical_test_workbook(iter_physical_test_history(db, filters, chunk_size, user=user), path)
+    finally:
+        db.close()
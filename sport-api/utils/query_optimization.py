@@ -42,7 +42,7 @@ class QueryOptimizer:
             )
         
         if school_year_id:
-            query = query.join(StudentClassRelation).join(Class).filter(
+            query = query.join(StudentClassRelation).join(Class, Class.id == StudentClassRelation.class_id).filter(
                 Class.school_year_id == school_year_id,
                 StudentClassRelation.is_current == True
             )
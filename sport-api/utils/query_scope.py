@@ -0,0 +1,87 @@
+# 体育教学辅助网站 - 行级数据范围
+# 把用户角色转换为 SQLAlchemy 过滤条件，列表查询直接在数据库中只返回可见的行，
+# 不再先查出全部数据再逐条用 PermissionChecker 判断。范围与 PermissionChecker 一致：
+# - 管理员：不限制
+# - 教师：自己担任班主任的班级，及当前在这些班级的学生；体测记录按记录所属班级
+# - 学生：自己（学生档案 user_id 为当前用户）及自己的当前班级
+# - 家长：父亲或母亲电话与用户电话一致的孩子及其当前班级
+# 各函数返回 None 表示不限制；user 为 None（内部调用）时同样不限制。
+# 后台任务在其他进程中执行，提交时用 scope_params 把范围信息写入任务参数，执行时用 scope_user 还原。
+
+from collections import namedtuple
+from typing import Any, Dict, Optional
+
+from sqlalchemy import false, or_, select
+from sqlalchemy.sql.elements import ColumnElement
+
+from models import Class, FamilyInfo, PhysicalTest, Student, UserRoleEnum
+
+# 范围过滤所需的用户信息
+ScopeUser = namedtuple("ScopeUser", ["id", "role", "phone"])
+
+
+def _role(user) -> Optional[UserRoleEnum]:
+    if user is None:
+        return None
+    return user.role if isinstance(user.role, UserRoleEnum) else UserRoleEnum(user.role)
+
+
+def _teacher_class_ids(user):
+    return select(Class.id).where(Class.class_teacher_id == user.id)
+
+
+def student_scope(user) -> Optional[ColumnElement]:
+    """学生查询的过滤条件"""
+    role = _role(user)
+    if role is None or role == UserRoleEnum.admin:
+        return None
+    if role == UserRoleEnum.teacher:
+        return Student.current_class_id.in_(_teacher_class_ids(user))
+    if role == UserRoleEnum.student:
+        return Student.user_id == user.id
+    if role == UserRoleEnum.parent and user.phone:
+        return Student.id.in_(
+            select(FamilyInfo.student_id).where(
+                or_(FamilyInfo.father_phone == user.phone, FamilyInfo.mother_phone == user.phone)
+            )
+        )
+    return false()
+
+
+def class_scope(user) -> Optional[ColumnElement]:
+    """班级查询的过滤条件"""
+    role = _role(user)
+    if role is None or role == UserRoleEnum.admin:
+        return None
+    if role == UserRoleEnum.teacher:
+        return Class.class_teacher_id == user.id
+    return Class.id.in_(select(Student.current_class_id).where(student_scope(user)))
+
+
+def physical_test_scope(user) -> Optional[ColumnElement]:
+    """体测记录查询的过滤条件"""
+    role = _role(user)
+    if role is None or role == UserRoleEnum.admin:
+        return None
+    if role == UserRoleEnum.teacher:
+        return PhysicalTest.class_id.in_(_teacher_class_ids(user))
+    return PhysicalTest.student_id.in_(select(Student.id).where(student_scope(user)))
+
+
+def apply_scope(query, condition: Optional[ColumnElement]):
+    """对查询应用过滤条件（None 时原样返回）"""
+    return query if condition is None else query.filter(condition)
+
+
+def scope_params(user) -> Optional[Dict[str, Any]]:
+    """用户的范围信息转为可写入任务参数的字典"""
+    if user is None:
+        return None
+    return {"id": user.id, "role": _role(user).value, "phone": getattr(user, "phone", None)}
+
+
+def scope_user(params: Optional[Dict[str, Any]]) -> Optional[ScopeUser]:
+    """由任务参数中的范围信息还原用户"""
+    if not params:
+        return None
+    return ScopeUser(params["id"], UserRoleEnum(params["role"]), params.get("phone"))
@@ -0,0 +1,230 @@
+# 体育教学辅助网站 - 体测成绩排名索引
+# 按(学年, 年级, 性别, 测试类型, 项目)维护有序成绩数组，
+# 百分位、名次查询为二分查找 O(log n)，体测数据变化时增量更新
+
+import bisect
+import threading
+import time
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from sqlalchemy.orm import Session
+
+from config import settings
+from models import PhysicalTest, Student, Class
+from utils.score_standards import LOWER_IS_BETTER, MEASUREMENT_FIELDS
+
+# 可排名的项目
+RANK_ITEMS = ("total_score",) + MEASUREMENT_FIELDS
+
+# 队列键：(学年ID, 年级, 性别, 测试类型)
+CohortKey = Tuple[Optional[int], Optional[int], Optional[str], Optional[str]]
+
+
+def _sort_value(item: str, value: float) -> float:
+    """排序值：升序排列即成绩从好到差（计时项目越小越好，其余越大越好）"""
+    return float(value) if item in LOWER_IS_BETTER else -float(value)
+
+
+def _rankable(item: str, value: Any) -> bool:
+    """空值不参与排名；总分为0视为未计分"""
+    if value is None:
+        return False
+    return not (item == "total_score" and not value)
+
+
+class CohortRanking:
+    """单个队列、单个项目的有序成绩数组"""
+
+    def __init__(self, item: str):
+        self.item = item
+        # (排序值, 体测ID)，升序即名次顺序
+        self.entries: List[Tuple[float, int]] = []
+        # 与 entries 对齐的排序值，用于二分查找
+        self.keys: List[float] = []
+        # 体测ID -> (排序值, 学生ID)
+        self.members: Dict[int, Tuple[float, int]] = {}
+        self.loaded_at = time.time()
+
+    def load(self, rows: List[Tuple[int, int, float]]):
+        """批量载入 (体测ID, 学生ID, 成绩)"""
+        for test_id, student_id, value in rows:
+            self.members[test_id] = (_sort_value(self.item, value), student_id)
+        self.entries = sorted((sort_value, test_id) for test_id, (sort_value, _) in self.members.items())
+        self.keys = [entry[0] for entry in self.entries]
+        self.loaded_at = time.time()
+
+    def add(self, test_id: int, student_id: int, value: float):
+        """插入一条成绩"""
+        self.remove(test_id)
+        sort_value = _sort_value(self.item, value)
+        position = bisect.bisect_left(self.entries, (sort_value, test_id))
+        self.entries.insert(position, (sort_value, test_id))
+        self.keys.insert(position, sort_value)
+        self.members[test_id] = (sort_value, student_id)
+
+    def remove(self, test_id: int):
+        """移除一条成绩"""
+        member = self.members.pop(test_id, None)
+        if member is None:
+            return
+        position = bisect.bisect_left(self.entries, (member[0], test_id))
+        if position < len(self.entries) and self.entries[position][1] == test_id:
+            del self.entries[position]
+            del self.keys[position]
+
+    def rank(self, value: float) -> Dict[str, Any]:
+        """查询成绩在队列中的名次和百分位（并列取相同名次）"""
+        total = len(self.keys)
+        sort_value = _sort_value(self.item, value)
+        better = bisect.bisect_left(self.keys, sort_value)
+        not_worse = bisect.bisect_right(self.keys, sort_value)
+        if total == 0:
+            return {"rank": None, "total": 0, "percentile": None}
+        # 百分位：成绩差于该值的比例，并列者计一半
+        percentile = ((total - not_worse) + (not_worse - better) / 2) / total * 100
+        return {"rank": better + 1, "total": total, "percentile": round(percentile, 2)}
+
+    def top(self, limit: int, test_ids: Optional[Set[int]] = None) -> List[Dict[str, Any]]:
+        """前N名（指定 test_ids 时只取其中的记录）"""
+        result = []
+        for sort_value, test_id in self.entries:
+            if len(result) >= limit:
+                break
+            if test_ids is not None and test_id not in test_ids:
+                continue
+            value = sort_value if self.item in LOWER_IS_BETTER else -sort_value
+            result.append({
+                "rank": bisect.bisect_left(self.keys, sort_value) + 1,
+                "physical_test_id": test_id,
+                "student_id": self.members[test_id][1],
+                "value": value
+            })
+        return result
+
+
+class RankIndex:
+    """体测成绩排名索引（进程内缓存，按需加载队列，超过有效期后重新加载）"""
+
+    def __init__(self, ttl: int = 300):
+        self.ttl = ttl
+        self._rankings: Dict[Tuple[CohortKey, str], CohortRanking] = {}
+        # 班级ID -> (载入时间, (学年ID, 年级))，与排名使用同一有效期
+        self._class_cache: Dict[int, Tuple[float, Tuple[Optional[int], Optional[int]]]] = {}
+        self._lock = threading.RLock()
+
+    def _load_ranking(self, db: Session, cohort: CohortKey, item: str) -> CohortRanking:
+        """从数据库载入一个队列的成绩（只查询ID和成绩两列）"""
+        school_year_id, grade_level, gender, test_type = cohort
+        column = getattr(PhysicalTest, item)
+        query = db.query(PhysicalTest.id, PhysicalTest.student_id, column
+        ).join(Class, Class.id == PhysicalTest.class_id
+        ).join(Student, Student.id == PhysicalTest.student_id
+        ).filter(
+            Class.school_year_id == school_year_id,
+            Class.grade_level == grade_level,
+            Student.gender == gender,
+            PhysicalTest.test_type == test_type,
+            column.isnot(None)
+        )
+        if item == "total_score":
+            query = query.filter(column != 0)
+        ranking = CohortRanking(item)
+        ranking.load(query.all())
+        return ranking
+
+    def get_ranking(self, db: Session, cohort: CohortKey, item: str) -> CohortRanking:
+        """获取队列排名数组，未加载或已过期时从数据库载入"""
+        if item not in RANK_ITEMS:
+            raise ValueError(f"不支持的排名项目: {item}")
+        key = (cohort, item)
+        with self._lock:
+            ranking = self._rankings.get(key)
+            if ranking is None or time.time() - ranking.loaded_at > self.ttl:
+                ranking = self._load_ranking(db, cohort, item)
+                self._rankings[key] = ranking
+            return ranking
+
+    def _class_info(self, db: Session, class_id: Optional[int]) -> Tuple[Optional[int], Optional[int]]:
+        """班级ID -> (学年ID, 年级)，结果缓存，超过有效期后重新查询
+
+        班级修改、删除时由 class_crud 清空索引；其他进程（如学年升级任务）修改的班级在有效期后生效。
+        """
+        if class_id is None:
+            return None, None
+        cached = self._class_cache.get(class_id)
+        if cached is not None and time.time() - cached[0] <= self.ttl:
+            return cached[1]
+        row = db.query(Class.school_year_id, Class.grade_level).filter(Class.id == class_id).first()
+        info = (row.school_year_id, row.grade_level) if row else (None, None)
+        self._class_cache[class_id] = (time.time(), info)
+        return info
+
+    def get_test_cohort(self, db: Session, test: PhysicalTest) -> CohortKey:
+        """获取体测记录所属队列"""
+        school_year_id, grade_level = self._class_info(db, test.class_id)
+        gender = db.query(Student.gender).filter(Student.id == test.student_id).scalar()
+        return school_year_id, grade_level, getattr(gender, "value", gender), test.test_type
+
+    def update_value(self, cohort: CohortKey, item: str, test_id: int, student_id: int, value: Any):
+        """更新已加载队列中的一条成绩（未加载的队列下次查询时自然包含最新数据）"""
+        with self._lock:
+            ranking = self._rankings.get((cohort, item))
+            if ranking is None:
+                return
+            if _rankable(item, value):
+                ranking.add(test_id, student_id, value)
+            else:
+                ranking.remove(test_id)
+
+    def remove_test(self, test_id: int):
+        """从所有已加载队列中移除一条体测记录"""
+        with self._lock:
+            for ranking in self._rankings.values():
+                ranking.remove(test_id)
+
+    def apply_change(self, db: Session, test: PhysicalTest, before_cohort: Optional[CohortKey] = None):
+        """体测记录新增或修改后更新索引（队列变化时先从原队列移除）"""
+        cohort = self.get_test_cohort(db, test)
+        if before_cohort is not None and before_cohort != cohort:
+            self.remove_test(test.id)
+        for item in RANK_ITEMS:
+            self.update_value(cohort, item, test.id, test.student_id, getattr(test, item))
+
+    def rank_test(self, db: Session, test: PhysicalTest, items: List[str]) -> Dict[str, Any]:
+        """查询一条体测记录各项目在同年级同性别中的名次和百分位"""
+        cohort = self.get_test_cohort(db, test)
+        result = {}
+        for item in items:
+            value = getattr(test, item)
+            if not _rankable(item, value):
+                result[item] = {"value": value, "rank": None, "total": None, "percentile": None}
+                continue
+            result[item] = {"value": value, **self.get_ranking(db, cohort, item).rank(value)}
+        return result
+
+    def clear(self):
+        """清空索引"""
+        with self._lock:
+            self._rankings.clear()
+            self._class_cache.clear()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取索引统计信息"""
+        with self._lock:
+            return {
+                "rankings": len(self._rankings),
+                "entries": sum(len(ranking.entries) for ranking in self._rankings.values()),
+                "ttl": self.ttl
+            }
+
+
+# 全局排名索引实例
+_rank_index: Optional[RankIndex] = None
+
+
+def get_rank_index() -> RankIndex:
+    """获取全局排名索引"""
+    global _rank_index
+    if _rank_index is None:
+        _rank_index = RankIndex(ttl=settings.rank_index_ttl)
+    return _rank_index
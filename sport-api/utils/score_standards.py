@@ -0,0 +1,622 @@
+# 体育教学辅助网站 - 国家学生体质健康标准评分引擎
+# 启动时一次性加载《国家学生体质健康标准》评分表CSV，
+# 按(项目, 性别, 年级)编译为有序阈值数组，评分时使用二分查找，不再逐级 if/elif 判断
+# 也可由 compile_score_tables.py 预编译为 JSON 文件，启动时直接加载
+
+import bisect
+import csv
+import hashlib
+import io
+import json
+import math
+import os
+import re
+import threading
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from config import settings
+
+# 评分表年级列名 -> 年级级别(grade_level)
+GRADE_COLUMN_LEVELS: Dict[str, Tuple[int, ...]] = {
+    "一年级": (1,), "二年级": (2,), "三年级": (3,),
+    "四年级": (4,), "五年级": (5,), "六年级": (6,),
+    "初一": (7,), "初二": (8,), "初三": (9,),
+    "高一": (10,), "高二": (11,), "高三": (12,),
+    "大一大二": (13, 14), "大三大四": (15, 16),
+    "大学": (13, 14, 15, 16),
+}
+
+# 体测原始成绩字段（评分输入，与 PhysicalTest 字段同名）
+MEASUREMENT_FIELDS = (
+    "height", "weight", "vital_capacity", "run_50m", "run_800m", "run_1000m",
+    "sit_and_reach", "standing_long_jump", "pull_up", "skip_rope", "sit_ups", "run_50m_8",
+)
+
+# 数值越小成绩越好的项目（计时项目）
+LOWER_IS_BETTER = {"run_50m", "run_50m_8", "run_800m", "run_1000m"}
+
+# BMI 等级默认得分（评分表中"超重"一行未填写得分）
+BMI_LEVEL_SCORES = {"正常": 100.0, "低体重": 80.0, "超重": 80.0, "肥胖": 60.0}
+
+# 各学段单项指标权重（%）
+_PRIMARY_LOW_WEIGHTS = {
+    "bmi": 15, "vital_capacity": 15, "run_50m": 20, "sit_and_reach": 30, "skip_rope": 20,
+}
+_PRIMARY_MID_WEIGHTS = {
+    "bmi": 15, "vital_capacity": 15, "run_50m": 20, "sit_and_reach": 20, "skip_rope": 20, "sit_ups": 10,
+}
+_PRIMARY_HIGH_WEIGHTS = {
+    "bmi": 15, "vital_capacity": 15, "run_50m": 20, "sit_and_reach": 10, "skip_rope": 10,
+    "sit_ups": 20, "run_50m_8": 10,
+}
+_SECONDARY_MALE_WEIGHTS = {
+    "bmi": 15, "vital_capacity": 15, "run_50m": 20, "sit_and_reach": 10,
+    "standing_long_jump": 10, "pull_up": 10, "run_1000m": 20,
+}
+_SECONDARY_FEMALE_WEIGHTS = {
+    "bmi": 15, "vital_capacity": 15, "run_50m": 20, "sit_and_reach": 10,
+    "standing_long_jump": 10, "sit_ups": 10, "run_800m": 20,
+}
+
+# 预编译评分表文件格式版本
+ARTIFACT_FORMAT = 1
+
+# 加分上限
+MAX_BONUS_SCORE = 20.0
+
+_TIME_PATTERN = re.compile(r"^(-)?(?:(\d+)')?(\d+(?:\.\d+)?)\"?$")
+
+
+def normalize_gender(gender: Any) -> Optional[str]:
+    """统一性别取值为 male/female"""
+    value = getattr(gender, "value", gender)
+    if value in ("male", "男", "男生"):
+        return "male"
+    if value in ("female", "女", "女生"):
+        return "female"
+    return None
+
+
+def get_item_weights(gender: Any, grade_level: int) -> Dict[str, int]:
+    """获取指定性别和年级的单项指标权重"""
+    if grade_level is None or grade_level < 1:
+        return {}
+    if grade_level <= 2:
+        return _PRIMARY_LOW_WEIGHTS
+    if grade_level <= 4:
+        return _PRIMARY_MID_WEIGHTS
+    if grade_level <= 6:
+        return _PRIMARY_HIGH_WEIGHTS
+    if normalize_gender(gender) == "male":
+        return _SECONDARY_MALE_WEIGHTS
+    return _SECONDARY_FEMALE_WEIGHTS
+
+
+def get_bonus_items(gender: Any, grade_level: int) -> List[str]:
+    """获取指定性别和年级的加分项目"""
+    if grade_level is None or grade_level < 1:
+        return []
+    if grade_level <= 6:
+        return ["skip_rope"]
+    if normalize_gender(gender) == "male":
+        return ["pull_up", "run_1000m"]
+    return ["sit_ups", "run_800m"]
+
+
+def measurement_fingerprint(measurements: Dict[str, Any], class_id: Optional[int] = None) -> str:
+    """计算原始成绩指纹：原始成绩与所在班级（决定年级）未变则指纹不变"""
+    parts = ["" if measurements.get(field) is None else repr(float(measurements[field])) for field in MEASUREMENT_FIELDS]
+    parts.append("" if class_id is None else str(class_id))
+    return hashlib.sha256("|".join(parts).encode("utf-8")).hexdigest()
+
+
+def calculate_bmi(height: Optional[float], weight: Optional[float]) -> Optional[float]:
+    """根据身高(cm)和体重(kg)计算BMI，保留一位小数"""
+    if not height or not weight:
+        return None
+    return math.floor(weight / ((height / 100) ** 2) * 10 + 0.5) / 10
+
+
+def parse_measurement(raw: str) -> Optional[float]:
+    """解析评分表单元格：普通数值或 分'秒" 格式的时间（返回秒）"""
+    text = (raw or "").strip()
+    if not text:
+        return None
+    match = _TIME_PATTERN.match(text)
+    if match and ("'" in text or '"' in text):
+        sign, minutes, seconds = match.groups()
+        value = int(minutes or 0) * 60 + float(seconds)
+        return -value if sign else value
+    try:
+        return float(text)
+    except ValueError:
+        return None
+
+
+class ScoreTable:
+    """单个(项目, 性别, 年级)的有序阈值表"""
+
+    __slots__ = ("thresholds", "scores", "lower_is_better")
+
+    def __init__(self, rows: Iterable[Tuple[float, float]], lower_is_better: bool = False):
+        # 阈值升序排列；相同阈值时，使二分查找命中的位置恰好是最高得分
+        if lower_is_better:
+            ordered = sorted(rows, key=lambda r: (r[0], -r[1]))
+        else:
+            ordered = sorted(rows, key=lambda r: (r[0], r[1]))
+        self.thresholds: List[float] = [r[0] for r in ordered]
+        self.scores: List[float] = [r[1] for r in ordered]
+        self.lower_is_better = lower_is_better
+
+    def lookup(self, value: float) -> float:
+        """二分查找成绩对应的得分，未达到最低标准返回0"""
+        if self.lower_is_better:
+            index = bisect.bisect_left(self.thresholds, value)
+            return self.scores[index] if index < len(self.scores) else 0.0
+        index = bisect.bisect_right(self.thresholds, value) - 1
+        return self.scores[index] if index >= 0 else 0.0
+
+    def lookup_array(self, values):
+        """向量化查找：对一列成绩一次 searchsorted，缺失值(NaN)得0分"""
+        import numpy as np
+
+        values = np.asarray(values, dtype=float)
+        thresholds = np.asarray(self.thresholds, dtype=float)
+        # 末尾追加0分，越界下标（-1 或 len）均落在该位置
+        scores = np.append(np.asarray(self.scores, dtype=float), 0.0)
+        if self.lower_is_better:
+            index = np.searchsorted(thresholds, values, side="left")
+        else:
+            index = np.searchsorted(thresholds, values, side="right") - 1
+        return np.where(np.isnan(values), 0.0, scores[index])
+
+    def full_score_threshold(self) -> Optional[float]:
+        """获取满分(100分)对应的标准值"""
+        best = None
+        for threshold, score in zip(self.thresholds, self.scores):
+            if score >= 100:
+                if best is None:
+                    best = threshold
+                elif self.lower_is_better:
+                    best = max(best, threshold)
+                else:
+                    best = min(best, threshold)
+        return best
+
+    def to_dict(self) -> Dict[str, Any]:
+        """转换为字典"""
+        return {
+            "thresholds": self.thresholds,
+            "scores": self.scores,
+            "lower_is_better": self.lower_is_better,
+        }
+
+
+class BMITable:
+    """BMI 区间表：按区间下界升序排列，二分查找所在区间"""
+
+    __slots__ = ("lower_bounds", "scores")
+
+    def __init__(self, rows: Iterable[Tuple[float, float]]):
+        ordered = sorted(rows, key=lambda r: r[0])
+        self.lower_bounds: List[float] = [r[0] for r in ordered]
+        self.scores: List[float] = [r[1] for r in ordered]
+
+    def lookup(self, bmi: float) -> float:
+        """二分查找BMI所在区间的得分"""
+        index = bisect.bisect_right(self.lower_bounds, bmi) - 1
+        return self.scores[max(index, 0)] if self.scores else 0.0
+
+    def lookup_array(self, values):
+        """向量化查找BMI区间得分，缺失值(NaN)得0分"""
+        import numpy as np
+
+        values = np.asarray(values, dtype=float)
+        index = np.searchsorted(np.asarray(self.lower_bounds, dtype=float), values, side="right") - 1
+        scores = np.asarray(self.scores, dtype=float)[np.clip(index, 0, None)]
+        return np.where(np.isnan(values), 0.0, scores)
+
+    def to_dict(self) -> Dict[str, Any]:
+        """转换为字典"""
+        return {"lower_bounds": self.lower_bounds, "scores": self.scores}
+
+
+class ScoreStandardEngine:
+    """国家学生体质健康标准评分引擎"""
+
+    def __init__(self):
+        # (项目, 性别, 年级) -> 评分表
+        self.tables: Dict[Tuple[str, str, int], Any] = {}
+        # (项目, 性别, 年级) -> 加分表（阈值为超出满分标准的幅度）
+        self.bonus_tables: Dict[Tuple[str, str, int], ScoreTable] = {}
+        self.source_files: List[str] = []
+        # 评分表内容摘要，评分表任一文件变化都会改变版本号
+        self._digest = hashlib.sha256()
+        # 从预编译文件加载时直接使用文件中记录的版本号
+        self._version: Optional[str] = None
+
+    @property
+    def version(self) -> str:
+        """评分表版本号（评分表CSV内容的SHA-256前16位）"""
+        return self._version or self._digest.hexdigest()[:16]
+
+    # ---------- 加载 ----------
+
+    def load_directory(self, directory: str) -> "ScoreStandardEngine":
+        """从评分表目录加载所有CSV"""
+        for filename in sorted(os.listdir(directory)):
+            if not filename.endswith(".csv") or ("评分表" not in filename and "加分表" not in filename):
+                continue
+            self.load_csv(os.path.join(directory, filename))
+        return self
+
+    def load_csv(self, path: str):
+        """加载单个评分表CSV"""
+        filename = os.path.basename(path)
+        gender = "male" if "男生" in filename else "female"
+        is_bonus = "加分表" in filename
+
+        with open(path, "rb") as f:
+            content = f.read()
+        self._digest.update(filename.encode("utf-8"))
+        self._digest.update(content)
+        text = content.decode("utf-8-sig")
+        rows = [row for row in csv.reader(io.StringIO(text, newline="")) if any(cell.strip() for cell in row)]
+        if not rows:
+            return
+
+        header = rows[0]
+        data_rows = rows[1:]
+        # 第二行为表头续行（如"大一"+"大二"）
+        if data_rows and not data_rows[0][0].strip() and data_rows[0][1].strip() == "得分":
+            continuation = data_rows[0]
+            header = [
+                head.strip() + (continuation[i].strip() if i < len(continuation) and i >= 2 else "")
+                for i, head in enumerate(header)
+            ]
+            data_rows = data_rows[1:]
+
+        if is_bonus:
+            self._load_bonus_rows(filename, gender, header, data_rows)
+        elif "BMI" in filename:
+            self._load_bmi_rows(gender, header, data_rows)
+        else:
+            self._load_score_rows(filename, gender, header, data_rows)
+        self.source_files.append(filename)
+
+    def _grade_columns(self, header: List[str], first_column: int):
+        """遍历年级列，返回(列序号, 年级级别元组)"""
+        for index in range(first_column, len(header)):
+            levels = GRADE_COLUMN_LEVELS.get(header[index].strip())
+            if levels:
+                yield index, levels
+
+    def _load_score_rows(self, filename: str, gender: str, header: List[str], data_rows: List[List[str]]):
+        """加载普通单项评分表"""
+        columns: Dict[Tuple[str, int], List[Tuple[float, float]]] = {}
+        for row in data_rows:
+            score = parse_measurement(row[1]) if len(row) > 1 else None
+            if score is None:
+                continue
+            for index, levels in self._grade_columns(header, 2):
+                value = parse_measurement(row[index]) if index < len(row) else None
+                if value is None:
+                    continue
+                for level in levels:
+                    item = _resolve_item(filename, gender, level)
+                    if item:
+                        columns.setdefault((item, level), []).append((value, score))
+
+        for (item, level), rows in columns.items():
+            self.tables[(item, gender, level)] = ScoreTable(rows, item in LOWER_IS_BETTER)
+
+    def _load_bmi_rows(self, gender: str, header: List[str], data_rows: List[List[str]]):
+        """加载BMI评分表（单元格为区间：a~b、≤a、≥a）"""
+        columns: Dict[int, List[Tuple[float, float]]] = {}
+        for row in data_rows:
+            label = row[0].strip()
+            score = parse_measurement(row[1]) if len(row) > 1 else None
+            if score is None:
+                score = BMI_LEVEL_SCORES.get(label)
+            if score is None:
+                continue
+            for index, levels in self._grade_columns(header, 2):
+                cell = row[index].strip() if index < len(row) else ""
+                if not cell:
+                    continue
+                if cell.startswith("≤"):
+                    lower = float("-inf")
+                elif cell.startswith("≥"):
+                    lower = float(cell[1:])
+                else:
+                    lower = float(cell.split("~")[0])
+                for level in levels:
+                    columns.setdefault(level, []).append((lower, score))
+
+        for level, rows in columns.items():
+            self.tables[("bmi", gender, level)] = BMITable(rows)
+
+    def _load_bonus_rows(self, filename: str, gender: str, header: List[str], data_rows: List[List[str]]):
+        """加载加分表（单元格为超出满分标准的次数或缩短的秒数）"""
+        columns: Dict[Tuple[str, int], List[Tuple[float, float]]] = {}
+        for row in data_rows:
+            bonus = parse_measurement(row[0])
+            if bonus is None:
+                continue
+            for index, levels in self._grade_columns(header, 1):
+                value = parse_measurement(row[index]) if index < len(row) else None
+                if value is None:
+                    continue
+                for level in levels:
+                    item = _resolve_item(filename, gender, level)
+                    if item:
+                        columns.setdefault((item, level), []).append((abs(value), bonus))
+
+        for (item, level), rows in columns.items():
+            self.bonus_tables[(item, gender, level)] = ScoreTable(rows)
+
+    # ---------- 预编译文件 ----------
+
+    def to_artifact(self) -> Dict[str, Any]:
+        """导出为预编译评分表（可JSON序列化），BMI 的无下界区间记为 null"""
+        tables = []
+        for (item, gender, level), table in sorted(self.tables.items()):
+            entry = {"item": item, "gender": gender, "grade_level": level}
+            if isinstance(table, BMITable):
+                entry["lower_bounds"] = [None if b == float("-inf") else b for b in table.lower_bounds]
+                entry["scores"] = table.scores
+            else:
+                entry.update(table.to_dict())
+            tables.append(entry)
+        bonus_tables = [
+            {"item": item, "gender": gender, "grade_level": level, **table.to_dict()}
+            for (item, gender, level), table in sorted(self.bonus_tables.items())
+        ]
+        return {
+            "format": ARTIFACT_FORMAT,
+            "version": self.version,
+            "source_files": self.source_files,
+            "tables": tables,
+            "bonus_tables": bonus_tables,
+        }
+
+    def save_artifact(self, path: str):
+        """写入预编译评分表文件"""
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.to_artifact(), f, ensure_ascii=False, separators=(",", ":"))
+
+    def load_artifact(self, path: str) -> "ScoreStandardEngine":
+        """加载预编译评分表文件（无需解析CSV）"""
+        with open(path, encoding="utf-8") as f:
+            artifact = json.load(f)
+        if artifact.get("format") != ARTIFACT_FORMAT:
+            raise ValueError(f"不支持的评分表文件格式: {artifact.get('format')}")
+
+        for entry in artifact["tables"]:
+            key = (entry["item"], entry["gender"], entry["grade_level"])
+            if "lower_bounds" in entry:
+                bounds = [float("-inf") if b is None else b for b in entry["lower_bounds"]]
+                self.tables[key] = BMITable(zip(bounds, entry["scores"]))
+            else:
+                self.tables[key] = ScoreTable(zip(entry["thresholds"], entry["scores"]), entry["lower_is_better"])
+        for entry in artifact["bonus_tables"]:
+            key = (entry["item"], entry["gender"], entry["grade_level"])
+            self.bonus_tables[key] = ScoreTable(zip(entry["thresholds"], entry["scores"]), entry["lower_is_better"])
+        self.source_files = list(artifact.get("source_files", []))
+        self._version = artifact["version"]
+        return self
+
+    # ---------- 评分 ----------
+
+    def score_item(self, item: str, gender: Any, grade_level: int, value: Optional[float]) -> float:
+        """计算单项得分（0-100）"""
+        if value is None:
+            return 0.0
+        table = self.tables.get((item, normalize_gender(gender), grade_level))
+        if table is None:
+            return 0.0
+        return table.lookup(value)
+
+    def score_bonus(self, item: str, gender: Any, grade_level: int, value: Optional[float]) -> float:
+        """计算单项加分：超出满分标准的部分查加分表"""
+        if value is None:
+            return 0.0
+        gender = normalize_gender(gender)
+        bonus_table = self.bonus_tables.get((item, gender, grade_level))
+        table = self.tables.get((item, gender, grade_level))
+        if bonus_table is None or not isinstance(table, ScoreTable):
+            return 0.0
+        full_score = table.full_score_threshold()
+        if full_score is None:
+            return 0.0
+        excess = full_score - value if table.lower_is_better else value - full_score
+        if excess <= 0:
+            return 0.0
+        return bonus_table.lookup(excess)
+
+    def calculate(self, measurements: Dict[str, Any], gender: Any, grade_level: Optional[int]) -> Optional[Dict[str, Any]]:
+        """按国家标准计算总分：单项得分加权求和 + 加分
+
+        measurements 使用 PhysicalTest 的字段名（height、weight、run_50m 等）。
+        年级未知或不在标准范围内时返回 None。
+        """
+        weights = get_item_weights(gender, grade_level)
+        if not weights or normalize_gender(gender) is None:
+            return None
+
+        item_scores: Dict[str, float] = {}
+        # 加权和以"单项得分×权重百分数"累加，保持整数精度，最后统一四舍五入
+        weighted_sum = 0.0
+        for item, weight in weights.items():
+            if item == "bmi":
+                value = calculate_bmi(measurements.get("height"), measurements.get("weight"))
+            else:
+                value = measurements.get(item)
+            score = self.score_item(item, gender, grade_level, value)
+            item_scores[item] = score
+            weighted_sum += score * weight
+
+        bonus_score = 0.0
+        for item in get_bonus_items(gender, grade_level):
+            bonus_score += self.score_bonus(item, gender, grade_level, measurements.get(item))
+        bonus_score = min(bonus_score, MAX_BONUS_SCORE)
+
+        total_score = round_score(weighted_sum + bonus_score * 100)
+        return {
+            "total_score": total_score,
+            "standard_score": round_score(weighted_sum),
+            "bonus_score": bonus_score,
+            "grade": calculate_grade(total_score),
+            "item_scores": item_scores,
+        }
+
+    def calculate_batch(self, columns: Dict[str, Any], genders: List[Any], grade_levels: List[Optional[int]]) -> Dict[str, Any]:
+        """列式批量计算总分
+
+        columns 为字段名 -> 成绩数组（缺失值为 NaN），按(性别, 年级)分组，
+        每组每个项目只做一次向量化查找。返回与输入等长的数组，
+        valid 为 False 的行表示年级或性别未知、无法评分。
+        """
+        import numpy as np
+
+        size = len(genders)
+        genders = np.array([normalize_gender(g) for g in genders], dtype=object)
+        levels = np.array([np.nan if level is None else level for level in grade_levels], dtype=float)
+        weighted_sum = np.zeros(size)
+        bonus_score = np.zeros(size)
+        valid = np.zeros(size, dtype=bool)
+
+        height = np.asarray(columns["height"], dtype=float)
+        weight = np.asarray(columns["weight"], dtype=float)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            bmi = np.floor(weight / ((height / 100) ** 2) * 10 + 0.5) / 10
+        bmi[~np.isfinite(bmi) | (height <= 0) | (weight <= 0)] = np.nan
+
+        for gender in ("male", "female"):
+            for level in np.unique(levels[~np.isnan(levels)]):
+                level = int(level)
+                weights = get_item_weights(gender, level)
+                mask = (genders == gender) & (levels == level)
+                if not weights or not mask.any():
+                    continue
+                valid[mask] = True
+
+                group_score = np.zeros(int(mask.sum()))
+                for item, weight_percent in weights.items():
+                    values = bmi[mask] if item == "bmi" else np.asarray(columns[item], dtype=float)[mask]
+                    table = self.tables.get((item, gender, level))
+                    if table is not None:
+                        group_score += table.lookup_array(values) * weight_percent
+                weighted_sum[mask] = group_score
+
+                group_bonus = np.zeros(int(mask.sum()))
+                for item in get_bonus_items(gender, level):
+                    table = self.tables.get((item, gender, level))
+                    bonus_table = self.bonus_tables.get((item, gender, level))
+                    full_score = table.full_score_threshold() if isinstance(table, ScoreTable) else None
+                    if bonus_table is None or full_score is None:
+                        continue
+                    values = np.asarray(columns[item], dtype=float)[mask]
+                    excess = full_score - values if table.lower_is_better else values - full_score
+                    group_bonus += np.where(excess > 0, bonus_table.lookup_array(excess), 0.0)
+                bonus_score[mask] = np.minimum(group_bonus, MAX_BONUS_SCORE)
+
+        total_score = np.floor((weighted_sum + bonus_score * 100) / 10 + 0.5) / 10
+        grade = np.select([total_score >= 90, total_score >= 80, total_score >= 60], ["A", "B", "C"], "D")
+        return {
+            "valid": valid,
+            "total_score": total_score,
+            "standard_score": np.floor(weighted_sum / 10 + 0.5) / 10,
+            "bonus_score": bonus_score,
+            "grade": grade,
+        }
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取已加载评分表的统计信息"""
+        return {
+            "version": self.version,
+            "source_files": len(self.source_files),
+            "score_tables": len(self.tables),
+            "bonus_tables": len(self.bonus_tables),
+        }
+
+
+def _resolve_item(filename: str, gender: str, grade_level: int) -> Optional[str]:
+    """根据评分表文件名和年级确定对应的体测项目字段"""
+    if "引体向上" in filename and "仰卧起坐" in filename:
+        # 男生表：小学为仰卧起坐，初中及以上为引体向上
+        return "pull_up" if grade_level >= 7 else "sit_ups"
+    if "引体向上" in filename:
+        return "pull_up"
+    if "仰卧起坐" in filename:
+        return "sit_ups"
+    if "耐力跑" in filename:
+        # 小学五、六年级为50米×8往返跑
+        if grade_level <= 6:
+            return "run_50m_8"
+        return "run_1000m" if gender == "male" else "run_800m"
+    if "1000米跑" in filename:
+        return "run_1000m"
+    if "800米跑" in filename:
+        return "run_800m"
+    if "50米跑" in filename:
+        return "run_50m"
+    if "肺活量" in filename:
+        return "vital_capacity"
+    if "坐位体前屈" in filename:
+        return "sit_and_reach"
+    if "跳绳" in filename:
+        return "skip_rope"
+    if "立定跳远" in filename:
+        return "standing_long_jump"
+    return None
+
+
+def round_score(weighted_sum: float) -> float:
+    """将"单项得分×权重百分数"之和换算为总分，四舍五入保留一位小数"""
+    return math.floor(weighted_sum / 10 + 0.5) / 10
+
+
+def calculate_grade(total_score: float) -> str:
+    """根据总分计算等级：优秀A、良好B、及格C、不及格D"""
+    if total_score >= 90:
+        return "A"
+    elif total_score >= 80:
+        return "B"
+    elif total_score >= 60:
+        return "C"
+    else:
+        return "D"
+
+
+def load_score_engine(directory: Optional[str] = None) -> ScoreStandardEngine:
+    """加载评分引擎：优先使用预编译评分表文件，不存在时解析CSV目录"""
+    if directory is None and os.path.exists(settings.score_tables_artifact):
+        return ScoreStandardEngine().load_artifact(settings.score_tables_artifact)
+    return ScoreStandardEngine().load_directory(directory or settings.score_standards_dir)
+
+
+# 全局评分引擎实例
+_score_engine: Optional[ScoreStandardEngine] = None
+_score_engine_lock = threading.Lock()
+
+
+def get_score_engine() -> ScoreStandardEngine:
+    """获取全局评分引擎（首次调用时加载评分表）"""
+    global _score_engine
+    if _score_engine is None:
+        with _score_engine_lock:
+            if _score_engine is None:
+                _score_engine = load_score_engine()
+    return _score_engine
+
+
+def init_score_engine(directory: Optional[str] = None) -> ScoreStandardEngine:
+    """初始化评分引擎（应用启动时调用）"""
+    global _score_engine
+    with _score_engine_lock:
+        _score_engine = load_score_engine(directory)
+    return _score_engine
@@ -0,0 +1,61 @@
+# 体育教学辅助网站 - 流式导出工具
+# 把逐行产生的字典序列编码为 NDJSON / CSV 文本块，配合 StreamingResponse 使用，
+# 内存占用只与单批行数有关，与导出总行数无关
+
+import csv
+import io
+import json
+from datetime import date, datetime
+from typing import Any, Dict, Iterable, Iterator, Sequence
+
+
+def _json_default(value: Any):
+    """JSON序列化日期等非基本类型"""
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    return getattr(value, "value", str(value))
+
+
+def iter_ndjson(rows: Iterable[Dict[str, Any]], batch_size: int = 500) -> Iterator[bytes]:
+    """逐行编码为 NDJSON，每 batch_size 行输出一个块"""
+    buffer = []
+    for row in rows:
+        buffer.append(json.dumps(row, ensure_ascii=False, default=_json_default))
+        if len(buffer) >= batch_size:
+            yield ("\n".join(buffer) + "\n").encode("utf-8")
+            buffer = []
+    if buffer:
+        yield ("\n".join(buffer) + "\n").encode("utf-8")
+
+
+def iter_csv(rows: Iterable[Dict[str, Any]], fields: Sequence[str], headers: Dict[str, str] = None,
+             batch_size: int = 500) -> Iterator[bytes]:
+    """逐行编码为 CSV（UTF-8 BOM，便于 Excel 直接打开），每 batch_size 行输出一个块"""
+    headers = headers or {}
+    output = io.StringIO()
+    writer = csv.writer(output)
+    writer.writerow([headers.get(field, field) for field in fields])
+    yield ("﻿" + output.getvalue()).encode("utf-8")
+    output.seek(0)
+    output.truncate()
+
+    count = 0
+    for row in rows:
+        writer.writerow([_csv_value(row.get(field)) for field in fields])
+        count += 1
+        if count >= batch_size:
+            yield output.getvalue().encode("utf-8")
+            output.seek(0)
+            output.truncate()
+            count = 0
+    if count:
+        yield output.getvalue().encode("utf-8")
+
+
+def _csv_value(value: Any) -> Any:
+    """CSV单元格取值"""
+    if value is None:
+        return ""
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    return getattr(value, "value", value)
@@ -0,0 +1,323 @@
+# 体育教学辅助网站 - 学生搜索索引
+# 进程内索引，供搜索框联想使用，代替每次按键 LIKE '%x%' 全表扫描：
+# - 有序键数组（二分查找前缀）：学籍号、身份证号、身份证号后几位、姓名、姓名全拼、名字全拼、拼音首字母
+# - 汉字倒排表：姓名中间的子串（如只输入名字）通过逐字倒排求交后校验
+# 学生增删改时增量更新，超过有效期后从数据库整体重建（兼容多进程部署和批量导入）；
+# 重建在后台线程中进行，完成后整体替换，重建期间查询继续使用旧索引
+
+import bisect
+import threading
+import time
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from sqlalchemy.orm import Session
+
+from config import settings
+from models import Student
+
+try:
+    from pypinyin import lazy_pinyin
+except ImportError:
+    # 未安装 pypinyin 时不支持拼音搜索，其余搜索不受影响
+    lazy_pinyin = None
+
+# 身份证号后缀键的前缀标记（与其他键区分）
+SUFFIX_MARK = "~"
+
+# 身份证号后缀搜索的最短长度
+MIN_SUFFIX_LENGTH = 4
+
+
+def _is_cjk(char: str) -> bool:
+    return "一" <= char <= "鿿"
+
+
+def _normalize(text: str) -> str:
+    return (text or "").strip().lower().replace(" ", "")
+
+
+def build_search_keys(student_no: str, real_name: str, id_card: Optional[str]) -> List[str]:
+    """生成学生的前缀搜索键"""
+    keys = {_normalize(student_no), _normalize(real_name)}
+    if id_card:
+        id_card = _normalize(id_card)
+        keys.add(id_card)
+        keys.add(SUFFIX_MARK + id_card[::-1])
+    name = (real_name or "").strip()
+    if lazy_pinyin and name:
+        syllables = [syllable.lower() for syllable in lazy_pinyin(name) if syllable.strip()]
+        if syllables:
+            keys.add("".join(syllables))                              # 全拼 zhangsan
+            keys.add("".join(syllable[0] for syllable in syllables))  # 首字母 zs
+            if len(syllables) > 1:
+                keys.add("".join(syllables[1:]))                      # 名字全拼 san
+    keys.discard("")
+    keys.discard(SUFFIX_MARK)
+    return sorted(keys)
+
+
+class StudentSearchIndex:
+    """学生搜索索引（进程内，按需加载）"""
+
+    def __init__(self, ttl: int = 300, session_factory=None):
+        self.ttl = ttl
+        # 后台重建使用的会话工厂，默认 database.SessionLocal
+        self.session_factory = session_factory
+        # (键, 学生ID)，按键有序
+        self._keys: List[Tuple[str, int]] = []
+        # 汉字 -> 姓名包含该字的学生ID
+        self._chars: Dict[str, Set[int]] = {}
+        # 学生ID -> (结果字段, 搜索键)
+        self._docs: Dict[int, Tuple[Dict[str, Any], List[str]]] = {}
+        self._loaded_at: Optional[float] = None
+        # 下次重建的时间（重建开始时推后，失败时不会每次查询都重试）
+        self._refresh_after: Optional[float] = None
+        # 重建期间的增量修改，新索引替换后重放
+        self._pending: Optional[List[Tuple]] = None
+        self._last_error: Optional[str] = None
+        self._lock = threading.RLock()
+        # 同一时间只有一个重建
+        self._rebuild_lock = threading.Lock()
+
+    # ============ 维护 ============
+
+    def _add(self, student_id: int, student_no: str, real_name: str, id_card: Optional[str],
+             gender: Any, status: Any, bulk: bool = False):
+        keys = build_search_keys(student_no, real_name, id_card)
+        doc = {
+            "id": student_id,
+            "student_no": student_no,
+            "real_name": real_name,
+            "gender": getattr(gender, "value", gender),
+            "status": getattr(status, "value", status),
+        }
+        self._docs[student_id] = (doc, keys)
+        for key in keys:
+            if bulk:
+                self._keys.append((key, student_id))
+            else:
+                bisect.insort(self._keys, (key, student_id))
+        for char in set(real_name or ""):
+            if _is_cjk(char):
+                self._chars.setdefault(char, set()).add(student_id)
+
+    def _remove(self, student_id: int):
+        entry = self._docs.pop(student_id, None)
+        if entry is None:
+            return
+        doc, keys = entry
+        for key in keys:
+            position = bisect.bisect_left(self._keys, (key, student_id))
+            if position < len(self._keys) and self._keys[position] == (key, student_id):
+                del self._keys[position]
+        for char in set(doc["real_name"] or ""):
+            postings = self._chars.get(char)
+            if postings is not None:
+                postings.discard(student_id)
+                if not postings:
+                    del self._chars[char]
+
+    def load(self, db: Session):
+        """从数据库重建索引（只查询搜索需要的列）
+
+        新索引在锁外建立，完成后整体替换；建立期间的增量修改在替换后重放。
+        """
+        with self._rebuild_lock:
+            self._start_rebuild()
+            self._rebuild(db)
+
+    def _start_rebuild(self):
+        """开始记录增量修改（在查询数据库之前），推后下次重建时间"""
+        with self._lock:
+            self._pending = []
+            self._refresh_after = time.time() + self.ttl
+
+    def _rebuild(self, db: Session):
+        try:
+            rows = db.query(
+                Student.id, Student.student_no, Student.real_name, Student.id_card, Student.gender, Student.status
+            ).all()
+            fresh = StudentSearchIndex(self.ttl)
+            for row in rows:
+                fresh._add(row.id, row.student_no, row.real_name, row.id_card, row.gender, row.status, bulk=True)
+            fresh._keys.sort()
+        except Exception:
+            with self._lock:
+                self._pending = None
+            raise
+        with self._lock:
+            self._keys, self._chars, self._docs = fresh._keys, fresh._chars, fresh._docs
+            for fields in self._pending:
+                self._remove(fields[0])
+                if len(fields) > 1:
+                    self._add(*fields)
+            self._pending = None
+            self._loaded_at = time.time()
+            self._refresh_after = self._loaded_at + self.ttl
+            self._last_error = None
+
+    def refresh_async(self) -> bool:
+        """在后台线程中重建索引，已有重建在进行时返回 False"""
+        if not self._rebuild_lock.acquire(blocking=False):
+            return False
+        self._start_rebuild()
+
+        def run():
+            try:
+                if self.session_factory is None:
+                    from database import SessionLocal
+                    self.session_factory = SessionLocal
+                db = self.session_factory()
+                try:
+                    self._rebuild(db)
+                finally:
+                    db.close()
+            except Exception as e:
+                with self._lock:
+                    self._pending = None
+                    self._last_error = str(e)
+            finally:
+                self._rebuild_lock.release()
+
+        threading.Thread(target=run, name="student-search-refresh", daemon=True).start()
+        return True
+
+    def _ensure_loaded(self, db: Session):
+        """首次查询时同步建立索引；过期后在后台重建，期间继续使用旧索引"""
+        if self._loaded_at is None:
+            with self._rebuild_lock:
+                if self._loaded_at is None:
+                    self._start_rebuild()
+                    self._rebuild(db)
+        elif time.time() > self._refresh_after:
+            self.refresh_async()
+
+    def _apply(self, fields: Tuple):
+        """应用一条增量修改：(学生ID,) 为删除，否则为新增或修改"""
+        with self._lock:
+            if self._pending is not None:
+                self._pending.append(fields)
+            if self._loaded_at is None:
+                return
+            self._remove(fields[0])
+            if len(fields) > 1:
+                self._add(*fields)
+
+    def update_student(self, student: Student):
+        """学生新增或修改后更新索引（索引未加载时忽略，首次搜索时自然包含最新数据）"""
+        self._apply((student.id, student.student_no, student.real_name, student.id_card,
+                     student.gender, student.status))
+
+    def remove_student(self, student_id: int):
+        """学生删除后从索引移除"""
+        self._apply((student_id,))
+
+    def clear(self):
+        """清空索引"""
+        with self._lock:
+            self._keys = []
+            self._chars = {}
+            self._docs = {}
+            self._loaded_at = None
+            self._refresh_after = None
+
+    # ============ 查询 ============
+
+    def _prefix_ids(self, prefix: str, limit: int, found: Dict[int, None]):
+        """有序键数组上二分查找前缀，按键顺序收集学生ID"""
+        position = bisect.bisect_left(self._keys, (prefix, -1))
+        while position < len(self._keys) and len(found) < limit:
+            key, student_id = self._keys[position]
+            if not key.startswith(prefix):
+                break
+            found.setdefault(student_id)
+            position += 1
+
+    def _substring_ids(self, query: str, limit: int, found: Dict[int, None]):
+        """汉字倒排表求交，再校验姓名包含查询串"""
+        chars = {char for char in query if _is_cjk(char)}
+        postings = sorted((self._chars.get(char, set()) for char in chars), key=len)
+        if not postings or not postings[0]:
+            return
+        candidates = set.intersection(*postings) if len(postings) > 1 else postings[0]
+        for student_id in sorted(candidates):
+            if len(found) >= limit:
+                break
+            if student_id not in found and query in self._docs[student_id][0]["real_name"]:
+                found.setdefault(student_id)
+
+    def _scoped_ids(self, query: str, limit: int, student_ids: Set[int], allow_id_suffix: bool,
+                    found: Dict[int, None]):
+        """只在指定学生中查找（可见学生通常只有一两个班，直接逐个比较搜索键）"""
+        suffix = SUFFIX_MARK + query[::-1] if allow_id_suffix and len(query) >= MIN_SUFFIX_LENGTH else None
+        cjk = any(_is_cjk(char) for char in query)
+        prefix_matches = []
+        suffix_matches = []
+        substring_matches = []
+        for student_id in student_ids:
+            entry = self._docs.get(student_id)
+            if entry is None:
+                continue
+            doc, keys = entry
+            matched = [key for key in keys if key.startswith(query) and not key.startswith(SUFFIX_MARK)]
+            if matched:
+                prefix_matches.append((min(matched), student_id))
+            elif suffix and not cjk and any(key.startswith(suffix) for key in keys):
+                suffix_matches.append((suffix, student_id))
+            elif cjk and query in (doc["real_name"] or ""):
+                substring_matches.append(student_id)
+        for _, student_id in sorted(prefix_matches) + sorted(suffix_matches):
+            found.setdefault(student_id)
+        for student_id in sorted(substring_matches):
+            found.setdefault(student_id)
+        for student_id in list(found)[limit:]:
+            del found[student_id]
+
+    def search(self, db: Session, query: str, limit: int = 10, student_ids: Optional[Set[int]] = None,
+               allow_id_suffix: bool = True) -> List[Dict[str, Any]]:
+        """搜索学生：前缀匹配优先（键越短越靠前），汉字查询再补充姓名中间匹配
+
+        student_ids 不为空时只返回其中的学生；allow_id_suffix 为假时不按身份证号后几位匹配。
+        """
+        query = _normalize(query)
+        if not query:
+            return []
+        self._ensure_loaded(db)
+        with self._lock:
+            found: Dict[int, None] = {}
+            if student_ids is not None:
+                self._scoped_ids(query, limit, student_ids, allow_id_suffix, found)
+                return [dict(self._docs[student_id][0]) for student_id in found]
+            self._prefix_ids(query, limit, found)
+            if (allow_id_suffix and len(found) < limit and len(query) >= MIN_SUFFIX_LENGTH
+                    and not any(_is_cjk(c) for c in query)):
+                self._prefix_ids(SUFFIX_MARK + query[::-1], limit, found)
+            if len(found) < limit and any(_is_cjk(char) for char in query):
+                self._substring_ids(query, limit, found)
+            return [dict(self._docs[student_id][0]) for student_id in found]
+
+    def get_stats(self) -> Dict[str, Any]:
+        """获取索引统计信息"""
+        with self._lock:
+            return {
+                "students": len(self._docs),
+                "keys": len(self._keys),
+                "chars": len(self._chars),
+                "pinyin_enabled": lazy_pinyin is not None,
+                "loaded_at": self._loaded_at,
+                "refreshing": self._rebuild_lock.locked(),
+                "last_error": self._last_error,
+                "ttl": self.ttl
+            }
+
+
+# 全局学生搜索索引实例
+_student_search_index: Optional[StudentSearchIndex] = None
+
+
+def get_student_search_index() -> StudentSearchIndex:
+    """获取全局学生搜索索引"""
+    global _student_search_index
+    if _student_search_index is None:
+        _student_search_index = StudentSearchIndex(ttl=settings.student_search_ttl)
+    return _student_search_index